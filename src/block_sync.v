@@ -0,0 +1,94 @@
+module block_sync #(
+    parameter PCS_DATA_WIDTH = 64
+) (
+    input clk,
+    input rst,
+
+    // 66 consecutive line bits per in_valid, the first one in bit 0, in
+    // any alignment to the block boundaries
+    input [PCS_DATA_WIDTH+1:0] in_data,
+    input in_valid,
+
+    // aligned blocks, a clock after the in_data that completes them
+    output reg [PCS_DATA_WIDTH-1:0] out_data,
+    output reg [1:0] out_header,
+    output reg out_valid,
+
+    output reg block_lock
+);
+
+    // IEEE 802.3 clause 49 block synchronization (the lock state diagram).
+    // An aligned block has its sync header in the first two bits, 01 or 10
+    // for a valid one. block_offset is how many bits of the previous word
+    // the current block takes: the block is those bits and the front of
+    // in_data, in_data itself at offset 0. A slip moves the boundary one
+    // bit, taking effect with the next word.
+    //
+    // Out of lock, every invalid header slips. 64 valid headers in a row
+    // at one offset give block_lock. In lock, headers are counted in
+    // windows of 64; 16 invalid ones within a window drop block_lock and
+    // slip, fewer start a new window. The counters follow sh_cnt and
+    // sh_invld_cnt of the standard, one header per in_valid; the slip
+    // itself takes no time, so there is no waiting for slip_done.
+    //
+    // From a random offset, a wrong one is left after two headers on
+    // average, so lock takes 64 headers plus about two per bit of offset.
+
+    localparam BLOCK_WIDTH = PCS_DATA_WIDTH + 2;
+    localparam [7:0] BLOCK_BITS = BLOCK_WIDTH;
+    localparam [6:0] LAST_OFFSET = BLOCK_WIDTH - 1;
+    localparam [6:0] SH_WINDOW = 64;
+    localparam [4:0] SH_INVALID_MAX = 16;
+
+    reg [BLOCK_WIDTH-1:0] prev_data;
+    reg [6:0] block_offset;
+    reg [6:0] sh_cnt;
+    reg [4:0] sh_invld_cnt;
+
+    wire [2*BLOCK_WIDTH-1:0] window = {in_data, prev_data};
+    wire [7:0] block_start = BLOCK_BITS - {1'b0, block_offset};
+    wire [BLOCK_WIDTH-1:0] block = window[block_start+:BLOCK_WIDTH];
+    wire sh_valid = block[0] ^ block[1];
+
+    // the 64th header of a window, or the 16th invalid one
+    wire window_done = sh_cnt == SH_WINDOW - 7'd1;
+    wire invalid_done = !sh_valid && sh_invld_cnt == SH_INVALID_MAX - 5'd1;
+    wire slip = !block_lock ? !sh_valid : invalid_done;
+
+    always @(posedge clk) begin
+        if (!rst) begin
+            prev_data <= 0;
+            block_offset <= 0;
+            sh_cnt <= 0;
+            sh_invld_cnt <= 0;
+            block_lock <= 1'b0;
+            out_data <= 0;
+            out_header <= 0;
+            out_valid <= 1'b0;
+        end else begin
+            out_valid <= in_valid;
+
+            if (in_valid) begin
+                prev_data <= in_data;
+                out_header <= block[1:0];
+                out_data <= block[BLOCK_WIDTH-1:2];
+
+                if (slip) begin
+                    block_lock <= 1'b0;
+                    block_offset <= (block_offset == LAST_OFFSET) ? 7'd0 : block_offset + 7'd1;
+                    sh_cnt <= 0;
+                    sh_invld_cnt <= 0;
+                end else if (window_done) begin
+                    // out of lock every header so far was valid
+                    block_lock <= 1'b1;
+                    sh_cnt <= 0;
+                    sh_invld_cnt <= 0;
+                end else begin
+                    sh_cnt <= sh_cnt + 7'd1;
+                    sh_invld_cnt <= sh_invld_cnt + {4'd0, !sh_valid};
+                end
+            end
+        end
+    end
+
+endmodule
@@ -1,9 +1,19 @@
+// Slicing tables written by tb/common/gen_crc_tables.py. The path is
+// relative to the simulator's working directory unless overridden, e.g.
+// -DCRC_TABLES_FILE=\"/abs/path/crc_tables.mem\"
+`ifndef CRC_TABLES_FILE
+`define CRC_TABLES_FILE "crc_tables.mem"
+`endif
+
 module crc32 #(
     parameter SLICE_LENGTH = 4,
     parameter INITIAL_CRC = 32'hFFFFFFFF,
     parameter INVERT_OUTPUT = 1,
     parameter REGISTER_OUTPUT = 1,
-    parameter MAX_SLICE_LENGTH = 16
+    parameter MAX_SLICE_LENGTH = 16,
+    // 1: register the data table lookups ahead of the CRC feedback, see below
+    parameter PIPELINE = 0,
+    parameter TABLES_FILE = `CRC_TABLES_FILE
     )(
     input clk,
     input rst,
@@ -14,10 +24,12 @@ module crc32 #(
     );
     
     localparam NUM_INPUT_BYTES_WIDTH = $clog2(SLICE_LENGTH) + 1;
+    // clocks from in_* to the CRC update, 0 without PIPELINE
+    localparam PIPELINE_LATENCY = PIPELINE ? 2 : 0;
     
     reg [31:0] crc_tables [0:MAX_SLICE_LENGTH-1][0:255];
     initial begin
-        $readmemh("crc_tables.mem", crc_tables);
+        $readmemh(TABLES_FILE, crc_tables);
     end
     
     reg [NUM_INPUT_BYTES_WIDTH-1:0] num_input_bytes;
@@ -28,7 +40,7 @@ module crc32 #(
         num_input_bytes = 0; 
         for (i = 0; i < SLICE_LENGTH; i = i + 1) begin
             if (in_valid[i]) begin
-                num_input_bytes = i + 1;
+                num_input_bytes = i[NUM_INPUT_BYTES_WIDTH-1:0] + 1'b1;
             end
         end
     end
@@ -40,38 +52,115 @@ module crc32 #(
     reg [31:0] prev_crc, crc_calc;
     wire [31:0] crc_out;
     
-    always @(posedge clk) begin
-        if (!rst || in_crc_reset) begin
-            prev_crc <= INITIAL_CRC;
-        end else if (any_valid) begin
-            prev_crc <= crc_calc;
-        end
-    end
-    
-    wire [31:0] table_outs[0:SLICE_LENGTH-1];
+    // With PIPELINE=1 the data bytes are looked up ahead of the feedback.
+    // The CRC is linear, so a table entry of (data ^ crc) is the entry of
+    // data XOR the entry of crc. Stage 1 registers the slice and its byte
+    // count, stage 2 the data lookups XORed in groups of four. The clock
+    // that updates prev_crc only adds the lookups of the low four prev_crc
+    // bytes and the shifted prev_crc to those group sums, a fixed depth
+    // whatever SLICE_LENGTH is. in_data, in_valid and in_crc_reset go down
+    // the pipeline together: out_crc is the same as with PIPELINE=0, two
+    // clocks later. Partial and sparse in_valid masks work as without it.
+    localparam NUM_GROUPS = (SLICE_LENGTH + 3) / 4;
+    localparam FEEDBACK_BYTES = SLICE_LENGTH < 4 ? SLICE_LENGTH : 4;
+
     generate
-        for(genvar gi = 0; gi < SLICE_LENGTH; gi = gi + 1) begin
-            wire [7:0] table_lookup;
-            wire [31:0] table_out;
-            if(gi < 4) begin
-                assign table_lookup = in_data[8*gi+:8] ^ prev_crc[8*gi+:8];
-            end else begin
-                assign table_lookup = in_data[8*gi+:8];
-            end 
-            assign table_out = crc_tables[num_input_bytes - gi - 1][table_lookup];
-            assign table_outs[gi] = table_out;
-        end
-    endgenerate 
-    
-    always @(*) begin
-        crc_calc = 0;
-        for(i = 0; i < SLICE_LENGTH; i = i + 1) begin
-            if(in_valid[i]) begin
-                crc_calc = crc_calc ^ table_outs[i];
+        if (PIPELINE) begin : gen_pipeline
+            reg [8*SLICE_LENGTH-1:0] s1_data;
+            reg [SLICE_LENGTH-1:0] s1_valid;
+            reg [NUM_INPUT_BYTES_WIDTH-1:0] s1_bytes;
+            reg s1_reset;
+
+            reg [31:0] s2_groups [0:NUM_GROUPS-1];
+            reg [SLICE_LENGTH-1:0] s2_valid;
+            reg [NUM_INPUT_BYTES_WIDTH-1:0] s2_bytes;
+            reg s2_reset;
+
+            always @(posedge clk) begin
+                if (!rst) begin
+                    s1_valid <= 0;
+                    s1_reset <= 1'b0;
+                    s2_valid <= 0;
+                    s2_reset <= 1'b0;
+                end else begin
+                    s1_data <= in_data;
+                    s1_valid <= in_valid;
+                    s1_bytes <= num_input_bytes;
+                    s1_reset <= in_crc_reset;
+                    s2_valid <= s1_valid;
+                    s2_bytes <= s1_bytes;
+                    s2_reset <= s1_reset;
+                end
             end
-        end 
-        crc_calc = crc_calc ^ (prev_crc >> (8*num_input_bytes));
-    end
+
+            for (genvar gg = 0; gg < NUM_GROUPS; gg = gg + 1) begin : gen_group
+                reg [31:0] group_sum;
+                integer j;
+                always @(*) begin
+                    group_sum = 0;
+                    for (j = 4*gg; j < 4*gg + 4 && j < SLICE_LENGTH; j = j + 1) begin
+                        if (s1_valid[j]) begin
+                            group_sum = group_sum ^ crc_tables[{{(32-NUM_INPUT_BYTES_WIDTH){1'b0}}, s1_bytes} - j - 1][s1_data[8*j+:8]];
+                        end
+                    end
+                end
+                always @(posedge clk) begin
+                    s2_groups[gg] <= group_sum;
+                end
+            end
+
+            always @(*) begin
+                crc_calc = prev_crc >> (8*s2_bytes);
+                for (i = 0; i < FEEDBACK_BYTES; i = i + 1) begin
+                    if (s2_valid[i]) begin
+                        crc_calc = crc_calc ^ crc_tables[{{(32-NUM_INPUT_BYTES_WIDTH){1'b0}}, s2_bytes} - i - 1][prev_crc[8*i+:8]];
+                    end
+                end
+                for (i = 0; i < NUM_GROUPS; i = i + 1) begin
+                    crc_calc = crc_calc ^ s2_groups[i];
+                end
+            end
+
+            always @(posedge clk) begin
+                if (!rst || s2_reset) begin
+                    prev_crc <= INITIAL_CRC;
+                end else if (|s2_valid) begin
+                    prev_crc <= crc_calc;
+                end
+            end
+        end else begin : gen_direct
+            always @(posedge clk) begin
+                if (!rst || in_crc_reset) begin
+                    prev_crc <= INITIAL_CRC;
+                end else if (any_valid) begin
+                    prev_crc <= crc_calc;
+                end
+            end
+            
+            wire [31:0] table_outs[0:SLICE_LENGTH-1];
+            for(genvar gi = 0; gi < SLICE_LENGTH; gi = gi + 1) begin
+                wire [7:0] table_lookup;
+                wire [31:0] table_out;
+                if(gi < 4) begin
+                    assign table_lookup = in_data[8*gi+:8] ^ prev_crc[8*gi+:8];
+                end else begin
+                    assign table_lookup = in_data[8*gi+:8];
+                end 
+                assign table_out = crc_tables[num_input_bytes - gi - 1][table_lookup];
+                assign table_outs[gi] = table_out;
+            end
+            
+            always @(*) begin
+                crc_calc = 0;
+                for(i = 0; i < SLICE_LENGTH; i = i + 1) begin
+                    if(in_valid[i]) begin
+                        crc_calc = crc_calc ^ table_outs[i];
+                    end
+                end 
+                crc_calc = crc_calc ^ (prev_crc >> (8*num_input_bytes));
+            end
+        end
+    endgenerate
     
     assign crc_out = REGISTER_OUTPUT ? prev_crc : crc_calc;
     assign out_crc = INVERT_OUTPUT ? ~crc_out : crc_out;
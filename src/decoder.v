@@ -76,8 +76,8 @@ module decoder #(
                             end
                             
                             BLOCK_TYPE_S4: begin
-                                decoded_data <= {in_encoded_data[31:0], XGMII_START, in_encoded_data[55:32]};
-                                decoded_ctrl <= 8'h10; 
+                                decoded_data <= {in_encoded_data[31:0], in_encoded_data[55:32], XGMII_IDLE};
+                                decoded_ctrl <= 8'h1F; 
                             end
                             
                             BLOCK_TYPE_T0: begin
@@ -138,34 +138,54 @@ module decoder #(
         end
     end
     
-    always @(posedge clk) begin
-        if (!rst) begin
-            state <= FIRST;
-            out_xgmii_data <= {XGMII_DATA_WIDTH{1'b0}};
-            out_xgmii_ctl <= {XGMII_DATA_BYTES{1'b0}};
-            out_xgmii_valid <= 1'b0;
-        end else begin
-            case (state)
-                FIRST: begin
+    generate
+        if (XGMII_DATA_WIDTH == 64) begin : gen_xgmii64
+            // one XGMII word per block
+            always @(posedge clk) begin
+                if (!rst) begin
+                    state <= FIRST;
+                    out_xgmii_data <= {XGMII_DATA_WIDTH{1'b0}};
+                    out_xgmii_ctl <= {XGMII_DATA_BYTES{1'b0}};
                     out_xgmii_valid <= 1'b0;
+                end else begin
+                    out_xgmii_valid <= block_valid && in_xgmii_ready;
                     if (block_valid && in_xgmii_ready) begin
-                        out_xgmii_data <= decoded_data[31:0];
-                        out_xgmii_ctl <= decoded_ctrl[3:0];
-                        out_xgmii_valid <= 1'b1;
-                        state <= SECOND;
+                        out_xgmii_data <= decoded_data;
+                        out_xgmii_ctl <= decoded_ctrl;
                     end
                 end
-                
-                SECOND: begin
-                    out_xgmii_data <= decoded_data[63:32];
-                    out_xgmii_ctl <= decoded_ctrl[7:4];
-                    out_xgmii_valid <= 1'b1;
+            end
+        end else begin : gen_xgmii32
+            always @(posedge clk) begin
+                if (!rst) begin
                     state <= FIRST;
+                    out_xgmii_data <= {XGMII_DATA_WIDTH{1'b0}};
+                    out_xgmii_ctl <= {XGMII_DATA_BYTES{1'b0}};
+                    out_xgmii_valid <= 1'b0;
+                end else begin
+                    case (state)
+                        FIRST: begin
+                            out_xgmii_valid <= 1'b0;
+                            if (block_valid && in_xgmii_ready) begin
+                                out_xgmii_data <= decoded_data[31:0];
+                                out_xgmii_ctl <= decoded_ctrl[3:0];
+                                out_xgmii_valid <= 1'b1;
+                                state <= SECOND;
+                            end
+                        end
+                        
+                        SECOND: begin
+                            out_xgmii_data <= decoded_data[63:32];
+                            out_xgmii_ctl <= decoded_ctrl[7:4];
+                            out_xgmii_valid <= 1'b1;
+                            state <= FIRST;
+                        end
+                        
+                        default: state <= FIRST;
+                    endcase
                 end
-                
-                default: state <= FIRST;
-            endcase
+            end
         end
-    end
+    endgenerate
 
 endmodule
\ No newline at end of file
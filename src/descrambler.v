@@ -1,29 +1,60 @@
 module descrambler #( 
-    parameter PCS_DATA_WIDTH = 64 
+    parameter PCS_DATA_WIDTH = 64,
+    parameter REGISTER_OUTPUT = 0
 )( 
     input clk, 
     input rst, 
     input [PCS_DATA_WIDTH-1:0] in_data, 
     input in_data_valid, 
-    output [PCS_DATA_WIDTH-1:0] out_data 
+    output [PCS_DATA_WIDTH-1:0] out_data,
+    output out_data_valid
 ); 
-    reg [127:0] data; 
-    wire [127:0] next_data;
+    // Inverse of scrambler, G(x) = 1 + x^39 + x^58:
+    //   out[n] = in[n] ^ in[n-39] ^ in[n-58]
+    // Self-synchronizing: the state is the last 58 bits received, exactly
+    // what the scrambler kept of its own output, so out_data is right from
+    // the 59th bit after reset or any bit error on. Every tap is an input
+    // bit, there is no chain within the word. REGISTER_OUTPUT as in
+    // scrambler.
+    localparam STATE_WIDTH = 58;
+
+    reg [STATE_WIDTH-1:0] state; 
+    wire [PCS_DATA_WIDTH+STATE_WIDTH-1:0] history = {in_data, state};
+    wire [PCS_DATA_WIDTH-1:0] descrambled;
     
     always @(posedge clk) begin
         if(!rst) begin
-            data <= {128{1'b1}};
+            state <= {STATE_WIDTH{1'b1}};
         end else if(in_data_valid) begin
-            data <= next_data;
+            state <= history[PCS_DATA_WIDTH +: STATE_WIDTH];
         end
     end 
         
-    assign next_data = {out_data, data[63:0]};
-    
     genvar i;
     generate 
-        for(i = 0; i < PCS_DATA_WIDTH; i = i + 1) begin
-            assign out_data[i] = in_data[i] ^ data[PCS_DATA_WIDTH + i - 39] ^ data[PCS_DATA_WIDTH + i - 58];
+        for(i = 0; i < PCS_DATA_WIDTH; i = i + 1) begin : gen_taps
+            assign descrambled[i] = in_data[i] ^ history[i + 19] ^ history[i];
+        end
+
+        if (REGISTER_OUTPUT) begin : gen_out_reg
+            reg [PCS_DATA_WIDTH-1:0] out_data_reg;
+            reg out_data_valid_reg;
+
+            always @(posedge clk) begin
+                if (!rst) begin
+                    out_data_reg <= 0;
+                    out_data_valid_reg <= 1'b0;
+                end else begin
+                    out_data_reg <= descrambled;
+                    out_data_valid_reg <= in_data_valid;
+                end
+            end
+
+            assign out_data = out_data_reg;
+            assign out_data_valid = out_data_valid_reg;
+        end else begin : gen_out_comb
+            assign out_data = descrambled;
+            assign out_data_valid = in_data_valid;
         end
     endgenerate
-endmodule
\ No newline at end of file
+endmodule
@@ -47,42 +47,62 @@ module encoder #(
     reg [7:0] xgmii_ctrl_block;
     reg block_ready;
     
-    assign out_xgmii_ready = state == FIRST;
+    // 32 bit XGMII takes two words per 66b block, 64 bit XGMII one
+    assign out_xgmii_ready = XGMII_DATA_WIDTH == 64 || state == FIRST;
     
     // XGMII 
-    always @(posedge clk) begin
-        if (!rst) begin
-            state <= FIRST;
-            xgmii_data_block <= 64'h0;
-            xgmii_ctrl_block <= 8'h0;
-            block_ready <= 1'b0;
-        end else begin
-            case (state)
-                FIRST: begin
+    generate
+        if (XGMII_DATA_WIDTH == 64) begin : gen_xgmii64
+            always @(posedge clk) begin
+                if (!rst) begin
+                    state <= FIRST;
+                    xgmii_data_block <= 64'h0;
+                    xgmii_ctrl_block <= 8'h0;
                     block_ready <= 1'b0;
+                end else begin
+                    block_ready <= in_xgmii_valid;
                     if (in_xgmii_valid) begin
-                        xgmii_data_block[31:0] <= in_xgmii_data;
-                        xgmii_ctrl_block[3:0] <= in_xgmii_ctl;
-                        state <= SECOND;
+                        xgmii_data_block <= in_xgmii_data;
+                        xgmii_ctrl_block <= in_xgmii_ctl;
                     end
                 end
-                
-                SECOND: begin
-                    if (in_xgmii_valid) begin
-                        xgmii_data_block[63:32] <= in_xgmii_data;
-                        xgmii_ctrl_block[7:4] <= in_xgmii_ctl;
-                        block_ready <= 1'b1;
-                        state <= FIRST;
-                    end
+            end
+        end else begin : gen_xgmii32
+            always @(posedge clk) begin
+                if (!rst) begin
+                    state <= FIRST;
+                    xgmii_data_block <= 64'h0;
+                    xgmii_ctrl_block <= 8'h0;
+                    block_ready <= 1'b0;
+                end else begin
+                    case (state)
+                        FIRST: begin
+                            block_ready <= 1'b0;
+                            if (in_xgmii_valid) begin
+                                xgmii_data_block[31:0] <= in_xgmii_data;
+                                xgmii_ctrl_block[3:0] <= in_xgmii_ctl;
+                                state <= SECOND;
+                            end
+                        end
+                        
+                        SECOND: begin
+                            if (in_xgmii_valid) begin
+                                xgmii_data_block[63:32] <= in_xgmii_data;
+                                xgmii_ctrl_block[7:4] <= in_xgmii_ctl;
+                                block_ready <= 1'b1;
+                                state <= FIRST;
+                            end
+                        end
+                    endcase
                 end
-            endcase
+            end
         end
-    end
+    endgenerate
     
     // 64B/66B 
     always @(posedge clk) begin
         if (!rst) begin
-            out_encoded_data <= 66'h0;
+            out_encoded_data <= {PCS_DATA_WIDTH{1'b0}};
             out_encoded_valid <= 1'b0;
         end else if (block_ready) begin
             out_encoded_valid <= 1'b1;
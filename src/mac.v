@@ -3,10 +3,12 @@ module mac #(
     parameter AXIS_DATA_BYTES = AXIS_DATA_WIDTH/8,
     parameter XGMII_DATA_WIDTH = 32,
     parameter XGMII_DATA_BYTES = XGMII_DATA_WIDTH/8,
+    parameter TX_CUT_THROUGH = 0,  // tx_mac CUT_THROUGH
     
     parameter [47:0] LOCAL_MAC = 48'hAA_BB_CC_DD_EE_FF,
     parameter [47:0] DEFAULT_DEST_MAC = 48'h00_11_22_33_44_55,
-    parameter [15:0] DEFAULT_ETHER_TYPE = 16'h0800         
+    parameter [15:0] DEFAULT_ETHER_TYPE = 16'h0800,
+    parameter DEFAULT_PROMISCUOUS = 1
 ) (
     input mac_clk,             
     input mac_rst,                
@@ -39,7 +41,22 @@ module mac #(
             
     output rx_frame_valid,              
     output rx_frame_error,          
-    output rx_crc_error
+    output rx_crc_error,
+    
+    // RX address filter
+    input [47:0] config_local_mac,
+    input config_promiscuous,
+    input [63:0] config_multicast_hash,
+    input config_valid,
+    output [31:0] rx_unicast_drop_count,
+    output [31:0] rx_multicast_drop_count,
+    
+    // frame statistics of both directions, snapshot and cleared together
+    input stats_snapshot,
+    input stats_clear,
+    input [3:0] stats_read_addr,
+    output [63:0] tx_stats_read_data,
+    output [63:0] rx_stats_read_data
 );
     
     wire tx_mac_frame_error;
@@ -57,34 +74,12 @@ module mac #(
     assign rx_frame_error = rx_mac_frame_error;
     assign rx_crc_error = rx_mac_crc_error;
     
-    reg [3:0] tx_byte_count_current;
-    reg [3:0] rx_byte_count_current;
-    
-    always @(*) begin
-        case(tx_axis_tkeep)
-            4'b1111: tx_byte_count_current = 4;
-            4'b0111: tx_byte_count_current = 3;
-            4'b0011: tx_byte_count_current = 2;
-            4'b0001: tx_byte_count_current = 1;
-            default: tx_byte_count_current = 0;
-        endcase
-    end
-    
-    always @(*) begin
-        case(rx_axis_tkeep)
-            4'b1111: rx_byte_count_current = 4;
-            4'b0111: rx_byte_count_current = 3;
-            4'b0011: rx_byte_count_current = 2;
-            4'b0001: rx_byte_count_current = 1;
-            default: rx_byte_count_current = 0;
-        endcase
-    end
-    
     tx_mac #(
         .AXIS_DATA_WIDTH(AXIS_DATA_WIDTH),
         .AXIS_DATA_BYTES(AXIS_DATA_BYTES),
         .XGMII_DATA_WIDTH(XGMII_DATA_WIDTH),
-        .XGMII_DATA_BYTES(XGMII_DATA_BYTES)
+        .XGMII_DATA_BYTES(XGMII_DATA_BYTES),
+        .CUT_THROUGH(TX_CUT_THROUGH)
     ) tx_mac_inst (
         .tx_clk(mac_clk),
         .tx_rst(mac_rst),
@@ -100,15 +95,22 @@ module mac #(
         .out_xgmii_valid(xgmii_tx_valid),
         .in_xgmii_pcs_ready(xgmii_tx_pcs_ready),
 
-        .frame_valid(tx_frame_valid),
-        .frame_error(tx_frame_error)
+        .frame_valid(tx_mac_frame_valid),
+        .frame_error(tx_mac_frame_error),
+        
+        .stats_snapshot(stats_snapshot),
+        .stats_clear(stats_clear),
+        .stats_read_addr(stats_read_addr),
+        .stats_read_data(tx_stats_read_data)
     );
     
     rx_mac #(
         .AXIS_DATA_WIDTH(AXIS_DATA_WIDTH),
         .AXIS_DATA_BYTES(AXIS_DATA_BYTES),
         .XGMII_DATA_WIDTH(XGMII_DATA_WIDTH),
-        .XGMII_DATA_BYTES(XGMII_DATA_BYTES)
+        .XGMII_DATA_BYTES(XGMII_DATA_BYTES),
+        .LOCAL_MAC(LOCAL_MAC),
+        .DEFAULT_PROMISCUOUS(DEFAULT_PROMISCUOUS)
     ) rx_mac_inst (
         .rx_clk(mac_clk),
         .rx_rst(mac_rst),
@@ -125,6 +127,19 @@ module mac #(
         
         .frame_valid(rx_mac_frame_valid),
         .frame_error(rx_mac_frame_error),
-        .crc_error(rx_mac_crc_error)
+        .crc_error(rx_mac_crc_error),
+        
+        .config_local_mac(config_local_mac),
+        .config_promiscuous(config_promiscuous),
+        .config_multicast_hash(config_multicast_hash),
+        .config_valid(config_valid),
+        .unicast_drop_count(rx_unicast_drop_count),
+        .multicast_drop_count(rx_multicast_drop_count),
+        
+        .stats_snapshot(stats_snapshot),
+        .stats_clear(stats_clear),
+        .stats_read_addr(stats_read_addr),
+        .stats_read_data(rx_stats_read_data)
     );
+
 endmodule
\ No newline at end of file
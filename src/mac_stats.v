@@ -0,0 +1,138 @@
+module mac_stats #(
+    parameter MIN_FRAME_SIZE = 64,
+    parameter MAX_FRAME_SIZE = 1518
+) (
+    input clk,
+    input rst,
+
+    // one clock per frame that ended on XGMII
+    input in_frame,
+    input [15:0] in_length,
+    input in_aborted,
+    input in_crc_error,
+
+    input snapshot,
+    input clear,
+    input [3:0] read_addr,
+    output reg [63:0] read_data
+);
+
+    // RMON style frame statistics (RFC 2819 etherStats) of one direction
+    // of a MAC. in_length is the frame from the destination address to
+    // the end of the FCS, or to wherever the frame was cut off. A frame is
+    // good if it was not aborted, has no CRC error and is MIN_FRAME_SIZE
+    // to MAX_FRAME_SIZE bytes long; every other frame is bad. Frames of
+    // MIN_FRAME_SIZE bytes or more, good or bad, go into one of the size
+    // buckets, shorter ones are counted as runts only. The 1024-1518 and
+    // 1519-max buckets split at MAX_FRAME_SIZE, like OVERSIZE. CRC_ERRORS
+    // follows etherStatsCRCAlignErrors and only counts frames that ended
+    // normally and are MIN_FRAME_SIZE bytes or more: an aborted frame or a
+    // runt has no FCS of its own to check, so it is only a bad frame.
+    //
+    // The counters are 64 bits wide and never wrap in practice. snapshot
+    // copies all of them to a second bank at once, read_addr selects one
+    // of the copies onto read_data a clock later. clear zeroes the live
+    // counters; together with snapshot nothing is lost in between, a
+    // frame counted in that clock goes to the new totals. A frame is in
+    // the live counters two clocks after its in_frame pulse.
+
+    localparam [3:0] GOOD_FRAMES = 4'd0;
+    localparam [3:0] GOOD_BYTES = 4'd1;
+    localparam [3:0] BAD_FRAMES = 4'd2;
+    localparam [3:0] BAD_BYTES = 4'd3;
+    localparam [3:0] CRC_ERRORS = 4'd4;
+    localparam [3:0] RUNTS = 4'd5;
+    localparam [3:0] OVERSIZE = 4'd6;
+    localparam [3:0] FRAMES_64 = 4'd7;
+    localparam [3:0] FRAMES_65_127 = 4'd8;
+    localparam [3:0] FRAMES_128_255 = 4'd9;
+    localparam [3:0] FRAMES_256_511 = 4'd10;
+    localparam [3:0] FRAMES_512_1023 = 4'd11;
+    localparam [3:0] FRAMES_1024_1518 = 4'd12;
+    localparam [3:0] FRAMES_1519_MAX = 4'd13;
+    localparam NUM_COUNTERS = 14;
+
+    localparam [15:0] MIN_LENGTH = MIN_FRAME_SIZE;
+    localparam [15:0] MAX_LENGTH = MAX_FRAME_SIZE;
+
+    reg frame;
+    reg [15:0] length;
+    reg aborted;
+    reg crc_error;
+
+    wire good = !aborted && !crc_error && length >= MIN_LENGTH && length <= MAX_LENGTH;
+
+    reg [63:0] counters [0:NUM_COUNTERS-1];
+    reg [63:0] snapshots [0:NUM_COUNTERS-1];
+    reg [15:0] increment [0:NUM_COUNTERS-1];
+
+    integer i;
+
+    always @(*) begin
+        for (i = 0; i < NUM_COUNTERS; i = i + 1) begin
+            increment[i] = 16'd0;
+        end
+        if (frame) begin
+            if (good) begin
+                increment[GOOD_FRAMES] = 16'd1;
+                increment[GOOD_BYTES] = length;
+            end else begin
+                increment[BAD_FRAMES] = 16'd1;
+                increment[BAD_BYTES] = length;
+            end
+            increment[CRC_ERRORS] = {15'd0, crc_error && !aborted && length >= MIN_LENGTH};
+            increment[OVERSIZE] = {15'd0, length > MAX_LENGTH};
+
+            if (length < MIN_LENGTH) begin
+                increment[RUNTS] = 16'd1;
+            end else if (length <= 16'd64) begin
+                increment[FRAMES_64] = 16'd1;
+            end else if (length <= 16'd127) begin
+                increment[FRAMES_65_127] = 16'd1;
+            end else if (length <= 16'd255) begin
+                increment[FRAMES_128_255] = 16'd1;
+            end else if (length <= 16'd511) begin
+                increment[FRAMES_256_511] = 16'd1;
+            end else if (length <= 16'd1023) begin
+                increment[FRAMES_512_1023] = 16'd1;
+            end else if (length <= MAX_LENGTH) begin
+                increment[FRAMES_1024_1518] = 16'd1;
+            end else begin
+                increment[FRAMES_1519_MAX] = 16'd1;
+            end
+        end
+    end
+
+    always @(posedge clk) begin
+        if (!rst) begin
+            frame <= 1'b0;
+            length <= 0;
+            aborted <= 1'b0;
+            crc_error <= 1'b0;
+            read_data <= 0;
+            for (i = 0; i < NUM_COUNTERS; i = i + 1) begin
+                counters[i] <= 0;
+                snapshots[i] <= 0;
+            end
+        end else begin
+            frame <= in_frame;
+            length <= in_length;
+            aborted <= in_aborted;
+            crc_error <= in_crc_error;
+
+            for (i = 0; i < NUM_COUNTERS; i = i + 1) begin
+                if (snapshot) begin
+                    snapshots[i] <= counters[i];
+                end
+                counters[i] <= (clear ? 64'd0 : counters[i]) + {48'd0, increment[i]};
+            end
+
+            if (read_addr < NUM_COUNTERS) begin
+                read_data <= snapshots[read_addr];
+            end else begin
+                read_data <= 0;
+            end
+        end
+    end
+
+endmodule
@@ -14,13 +14,16 @@ module pcs #(
     
     // ouput of pcs to gearbox
     output [PCS_DATA_WIDTH-1:0] tx_pcs_data,
+    output [1:0] tx_pcs_header,
     output tx_pcs_data_valid,
     input tx_pcs_ready,
     
-    // input from gearbox to pcs
+    // input from gearbox to pcs: 66 line bits per rx_pcs_valid, the first
+    // two in rx_pcs_header, in any alignment to the blocks
     input [PCS_DATA_WIDTH-1:0] rx_pcs_data,
     input [1:0] rx_pcs_header,
     input rx_pcs_valid,
+    output rx_block_lock,
     
     // output of pcs to rx mac
     output [XGMII_DATA_WIDTH-1:0] rx_xgmii_data,
@@ -47,12 +50,19 @@ module pcs #(
     wire [PCS_DATA_WIDTH-1:0] scrambled_data;
     wire scramber_out_data_valid;
 
+    // block sync signals
+    wire [PCS_DATA_WIDTH-1:0] block_sync_data;
+    wire [1:0] block_sync_header;
+    wire block_sync_valid;
+    wire block_sync_lock;
+
     // descrambler signals
     wire descrambler_clk;
     wire descrambler_rst;
     wire [PCS_DATA_WIDTH-1:0] descrambler_in_data;
     wire descrambler_in_data_valid;
     wire [PCS_DATA_WIDTH-1:0] descrambled_data;
+    wire descrambler_out_data_valid;
 
     // decoder signals
     wire decoder_clk;
@@ -83,25 +93,32 @@ module pcs #(
     // descrambler assignements
     assign descrambler_clk = pcs_clk;
     assign descrambler_rst = pcs_rst;
-    assign descrambler_in_data = rx_pcs_data;
-    assign descrambler_in_data_valid = rx_pcs_valid;
+    assign descrambler_in_data = block_sync_data;
+    assign descrambler_in_data_valid = block_sync_valid;
 
-    // decoder assignements
+    // decoder assignements, out of block lock with an invalid sync header
+    // so that the decoder sends /E/ and ends any frame in progress
     assign decoder_clk = pcs_clk;
     assign decoder_rst = pcs_rst;
     assign decoder_in_encoded_data = descrambled_data;
-    assign decoder_in_encoded_header = rx_pcs_header; 
-    assign decoder_in_encoded_valid = rx_pcs_valid;
+    assign decoder_in_encoded_header = block_sync_lock ? block_sync_header : 2'b00;
+    assign decoder_in_encoded_valid = descrambler_out_data_valid;
     assign decoder_xgmii_ready = rx_xgmii_ready;
 
     // pcs output assignements
     assign tx_pcs_data = scrambled_data;
+    assign tx_pcs_header = encoder_encoded_header;
     assign rx_xgmii_data = decoder_xgmii_data;
     assign rx_xgmii_ctl = decoder_xgmii_ctl;
     assign rx_xgmii_valid = decoder_xgmii_valid;
     assign tx_pcs_data_valid = scramber_out_data_valid;
+    assign rx_block_lock = block_sync_lock;
 
-    encoder encoder_inst (
+    encoder #(
+        .XGMII_DATA_WIDTH(XGMII_DATA_WIDTH),
+        .XGMII_DATA_BYTES(XGMII_DATA_BYTES),
+        .PCS_DATA_WIDTH(PCS_DATA_WIDTH)
+    ) encoder_inst (
         .clk(encoder_clk),
         .rst(encoder_rst),
         .in_xgmii_data(encoder_xgmii_data),
@@ -113,7 +130,9 @@ module pcs #(
         .out_encoded_valid(encoder_encoded_valid)
     );
     
-    scrambler scrambler_inst (
+    scrambler #(
+        .PCS_DATA_WIDTH(PCS_DATA_WIDTH)
+    ) scrambler_inst (
         .clk(scrambler_clk),
         .rst(scrambler_rst),
         .in_data(scrambler_in_data),
@@ -122,15 +141,36 @@ module pcs #(
         .out_data_valid(scramber_out_data_valid)
     );
     
-    descrambler descrambler_inst (
+    block_sync #(
+        .PCS_DATA_WIDTH(PCS_DATA_WIDTH)
+    ) block_sync_inst (
+        .clk(pcs_clk),
+        .rst(pcs_rst),
+        .in_data({rx_pcs_data, rx_pcs_header}),
+        .in_valid(rx_pcs_valid),
+        .out_data(block_sync_data),
+        .out_header(block_sync_header),
+        .out_valid(block_sync_valid),
+        .block_lock(block_sync_lock)
+    );
+    
+    descrambler #(
+        .PCS_DATA_WIDTH(PCS_DATA_WIDTH)
+    ) descrambler_inst (
         .clk(descrambler_clk),
         .rst(descrambler_rst),
         .in_data(descrambler_in_data),
         .in_data_valid(descrambler_in_data_valid),
-        .out_data(descrambled_data)
+        .out_data(descrambled_data),
+        .out_data_valid(descrambler_out_data_valid)
     );
+
     
-    decoder decoder_inst (
+    decoder #(
+        .XGMII_DATA_WIDTH(XGMII_DATA_WIDTH),
+        .XGMII_DATA_BYTES(XGMII_DATA_BYTES),
+        .PCS_DATA_WIDTH(PCS_DATA_WIDTH)
+    ) decoder_inst (
         .clk(decoder_clk),
         .rst(decoder_rst),
         .in_encoded_data(descrambled_data),
@@ -2,248 +2,545 @@ module rx_mac #(
     parameter AXIS_DATA_WIDTH = 32,
     parameter AXIS_DATA_BYTES = AXIS_DATA_WIDTH/8,
     parameter XGMII_DATA_WIDTH = 32,
-    parameter XGMII_DATA_BYTES = XGMII_DATA_WIDTH/8
+    parameter XGMII_DATA_BYTES = XGMII_DATA_WIDTH/8,
+    // address filter settings until the first config_valid
+    parameter [47:0] LOCAL_MAC = 48'hAA_BB_CC_DD_EE_FF,
+    parameter DEFAULT_PROMISCUOUS = 1
 ) (
     input rx_clk,
     input rx_rst,
-    
+
     input [XGMII_DATA_WIDTH-1:0] in_xgmii_data,
     input [XGMII_DATA_BYTES-1:0] in_xgmii_ctl,
     output reg out_xgmii_pcs_ready,
-    
-    output reg [AXIS_DATA_WIDTH-1:0] out_master_rx_tdata,
-    output reg [AXIS_DATA_BYTES-1:0] out_master_rx_tkeep,
-    output reg out_master_rx_tvalid,
+
+    output [AXIS_DATA_WIDTH-1:0] out_master_rx_tdata,
+    output [AXIS_DATA_BYTES-1:0] out_master_rx_tkeep,
+    output out_master_rx_tvalid,
     output out_master_rx_tlast,
     input in_master_rx_tready,
-    
+
     output reg frame_valid,
     output reg frame_error,
-    output reg crc_error
+    output reg crc_error,
+
+    // address filter, loaded while config_valid is high
+    input [47:0] config_local_mac,
+    input config_promiscuous,
+    input [63:0] config_multicast_hash,
+    input config_valid,
+
+    // frames dropped by the address filter
+    output reg [31:0] unicast_drop_count,
+    output reg [31:0] multicast_drop_count,
+
+    // frame statistics, see mac_stats
+    input stats_snapshot,
+    input stats_clear,
+    input [3:0] stats_read_addr,
+    output [63:0] stats_read_data
 );
 
-    localparam XGMII_IDLE = 8'h07;        
-    localparam XGMII_START = 8'hFB;     
-    localparam XGMII_TERMINATE = 8'hFD;   
-    localparam XGMII_ERROR = 8'hFE;      
-    localparam XGMII_SEQUENCE = 8'h9C;    
-    localparam XGMII_SIGNAL = 8'h5C;     
-    
-    localparam PREAMBLE_BYTE = 8'h55;    
-    localparam SFD_BYTE = 8'hD5;         
-    
-    localparam MIN_FRAME_SIZE = 64;       
-    localparam MAX_FRAME_SIZE = 1518;     
-    localparam MIN_PAYLOAD_SIZE = 46;     
-    localparam MAX_PAYLOAD_SIZE = 1500;  
-    localparam PREAMBLE_SFD_SIZE = 8;     
-    localparam MAC_HEADER_SIZE = 14;      
-    localparam FCS_SIZE = 4;              
-    
+    localparam XGMII_IDLE = 8'h07;
+    localparam XGMII_START = 8'hFB;
+    localparam XGMII_TERMINATE = 8'hFD;
+    localparam XGMII_ERROR = 8'hFE;
+    localparam XGMII_SEQUENCE = 8'h9C;
+    localparam XGMII_SIGNAL = 8'h5C;
+
+    localparam PREAMBLE_BYTE = 8'h55;
+    localparam SFD_BYTE = 8'hD5;
+
+    localparam MIN_FRAME_SIZE = 64;
+    localparam MAX_FRAME_SIZE = 1518;
+    localparam FCS_SIZE = 4;
+
+    // CRC32 over a frame including its own FCS, after the final inversion
+    localparam [31:0] CRC_RESIDUE = 32'h2144DF1C;
+
+    localparam LANE_WIDTH = $clog2(XGMII_DATA_BYTES) + 1;
+
+    // /S/, six preamble bytes and the SFD, one or two XGMII words
+    localparam [63:0] PREAMBLE_DATA = {SFD_BYTE, {6{PREAMBLE_BYTE}}, XGMII_START};
+    localparam [7:0] PREAMBLE_CTL = 8'b00000001;
+    localparam PREAMBLE_WORDS = 8 / XGMII_DATA_BYTES;
+    localparam [XGMII_DATA_WIDTH-1:0] START_WORD = PREAMBLE_DATA[XGMII_DATA_WIDTH-1:0];
+    localparam [XGMII_DATA_BYTES-1:0] START_CTL = PREAMBLE_CTL[XGMII_DATA_BYTES-1:0];
+    localparam [XGMII_DATA_WIDTH-1:0] SFD_WORD = PREAMBLE_DATA[64-XGMII_DATA_WIDTH+:XGMII_DATA_WIDTH];
+    localparam [XGMII_DATA_BYTES-1:0] SFD_CTL = PREAMBLE_CTL[8-XGMII_DATA_BYTES+:XGMII_DATA_BYTES];
+
+    // A 64 bit XGMII word can start a frame in lane 0 or lane 4. Frames
+    // starting in lane 4 are realigned to lane 0 by pairing the upper half
+    // of the previous word with the lower half of the current one.
+    localparam HALF_WIDTH = XGMII_DATA_WIDTH / 2;
+    localparam HALF_BYTES = XGMII_DATA_BYTES / 2;
+    localparam ALIGN_LANES = XGMII_DATA_BYTES == 8;
+
     localparam [3:0] IDLE_STATE = 4'd0;
     localparam [3:0] PREAMBLE_STATE = 4'd1;
-    localparam [3:0] MAC_HEADER_STATE = 4'd2;
     localparam [3:0] PAYLOAD_STATE = 4'd3;
-    localparam [3:0] ERROR_STATE = 4'd4;
-    localparam [3:0] DISCARD_STATE = 4'd5;
-    localparam [3:0] TERMINATE_STATE = 4'd6;
-    
+
+    // Everything between the SFD and the first control character is frame
+    // data, FCS included. The AXIS output trails the XGMII input by
+    // LAG_WORDS words so that the FCS can be stripped and tlast placed on
+    // the last data beat whichever lane the frame ends in. With 4 byte
+    // words data_d1 may still turn out to hold FCS bytes and data_d2 to be
+    // the last beat; with 8 byte words the FCS spans no more than data_d1
+    // and the word holding the end, which may still hold data itself. The
+    // frame ends on /T/, or is aborted on any other control character (/E/,
+    // idle, ...). Either way the tlast beat and the frame_valid/frame_error
+    // and crc_error status go to the output FIFO stage a clock after the
+    // end, while the state machine already looks for the next /S/: it can
+    // follow in the next word, or even in the upper half of the end word
+    // for 8 byte words. A frame of no more than FCS_SIZE bytes produces a
+    // status pulse only. Malformed starts are reported a clock late, so that their
+    // frame_error never lands on another frame's status pulse.
+
+    // Address filter: a frame goes out on AXIS if rx_mac is promiscuous,
+    // or its destination address is broadcast, the local MAC, or a
+    // multicast address whose hash bin is set in the multicast hash. The
+    // hash is the top six bits of the Ethernet CRC32 of the address, the
+    // FCS CRC over its six bytes. The address is complete before the first
+    // beat goes out; the filter decision is taken then and holds for the
+    // rest of the frame, whatever the config_* ports do meanwhile. A
+    // dropped frame gets no AXIS beats and no frame_valid, frame_error and
+    // crc_error pulse as usual. Frames shorter than an address pass.
+
+    // Statistics count every frame that got past the SFD, whatever the
+    // address filter made of it, with its length and CRC at the end.
+
+    // Output FIFO: the XGMII side cannot be stalled, so the AXIS beats go
+    // through a FIFO that the sink empties as tready allows. A beat takes
+    // two clocks through it. The status pulses come a clock after the
+    // tlast beat went into the FIFO, ahead of the beat itself on AXIS. A
+    // sink that holds tready low for long enough fills the FIFO, and from
+    // then on the beats of the frame coming in are dropped. The last FIFO
+    // entry is kept for the tlast beat, so a frame that got some of its
+    // beats in is cut short but still ends with tlast. A frame that got
+    // none in is dropped whole. Either way it gets frame_error instead of
+    // frame_valid. Statistics count it as it came in on XGMII.
+
+    localparam LAG_WORDS = (XGMII_DATA_BYTES > FCS_SIZE) ? 1 : 2;
+    // data bytes from the lagging beat on, minus the FCS, fit in this
+    localparam END_WIDTH = LANE_WIDTH + 1;
+    localparam LAG_BYTES = LAG_WORDS * XGMII_DATA_BYTES - FCS_SIZE;
+    localparam [END_WIDTH-1:0] END_BYTES = LAG_BYTES[END_WIDTH-1:0];
+    localparam [END_WIDTH-1:0] WORD_BYTES = XGMII_DATA_BYTES[END_WIDTH-1:0];
+
+    // a FIFO entry is {tlast, tkeep, tdata}
+    localparam FIFO_DATA_WIDTH = AXIS_DATA_WIDTH + AXIS_DATA_BYTES + 1;
+    localparam FIFO_DEPTH = 512;
+    localparam FIFO_ADDR_WIDTH = $clog2(FIFO_DEPTH);
+
     reg [3:0] current_state;
-    reg [11:0] byte_counter;
     reg [15:0] frame_byte_count;
-    
+
+    reg lane_shift;
+    reg [HALF_WIDTH-1:0] prev_data_hi;
+    reg [HALF_BYTES-1:0] prev_ctl_hi;
+    wire shift_active = lane_shift && current_state != IDLE_STATE;
+    wire [XGMII_DATA_WIDTH-1:0] xgmii_data = shift_active ?
+        {in_xgmii_data[HALF_WIDTH-1:0], prev_data_hi} : in_xgmii_data;
+    wire [XGMII_DATA_BYTES-1:0] xgmii_ctl = shift_active ?
+        {in_xgmii_ctl[HALF_BYTES-1:0], prev_ctl_hi} : in_xgmii_ctl;
+
+    wire start_lane0 = in_xgmii_data == START_WORD && in_xgmii_ctl == START_CTL;
+    wire start_lane4 = ALIGN_LANES &&
+        in_xgmii_data[XGMII_DATA_WIDTH-1:HALF_WIDTH] == START_WORD[HALF_WIDTH-1:0] &&
+        in_xgmii_ctl[XGMII_DATA_BYTES-1:HALF_BYTES] == START_CTL[HALF_BYTES-1:0];
+
+    reg [XGMII_DATA_WIDTH-1:0] data_d1;
+    reg [XGMII_DATA_WIDTH-1:0] data_d2;
+    reg valid_d1;
+    reg valid_d2;
+
+    // the beat LAG_WORDS behind the input and the one after it
+    wire [XGMII_DATA_WIDTH-1:0] lag_data = (LAG_WORDS == 2) ? data_d2 : data_d1;
+    wire lag_valid = (LAG_WORDS == 2) ? valid_d2 : valid_d1;
+    wire [XGMII_DATA_WIDTH-1:0] next_data = (LAG_WORDS == 2) ? data_d1 : xgmii_data;
+    wire next_valid = (LAG_WORDS == 2) ? valid_d1 : 1'b1;
+
+    // the last beat, sent with the status pulses the clock after the end
+    reg frame_end;
+    reg [XGMII_DATA_WIDTH-1:0] end_data;
+    reg end_valid;
+    reg [END_WIDTH-1:0] end_keep;
+    reg end_aborted;
+    reg end_accept;
+    reg end_multicast;
+    reg start_error;
+
+    // AXIS beats and status pulses on their way into the output FIFO
+    reg [AXIS_DATA_WIDTH-1:0] beat_data;
+    reg [AXIS_DATA_BYTES-1:0] beat_keep;
+    reg beat_valid;
+    reg beat_last;
+    reg status_valid;
+    reg status_error;
+    reg status_crc_error;
+
+    wire fifo_wr_en;
+    wire fifo_rd_en;
+    wire [FIFO_DATA_WIDTH-1:0] fifo_rd_data;
+    wire fifo_empty;
+    wire fifo_full;
+    wire fifo_almost_full;
+    // some beats of the frame coming in went into the FIFO, some did not
+    reg beats_written;
+    reg beats_dropped;
+    wire frame_cut = beats_dropped || (beat_valid && !fifo_wr_en);
+
+    reg [47:0] local_mac;
+    reg promiscuous;
+    reg [63:0] multicast_hash;
+
+    // destination address, first byte in the top bits as in LOCAL_MAC
+    reg [47:0] dest_addr;
+    reg addr_checked;
+    reg addr_accept;
+
+    // data bytes left from lag_data on when the frame ends
+    wire [END_WIDTH-1:0] end_bytes = {1'b0, data_lanes} + END_BYTES;
+
     wire [31:0] crc_out;
-    reg crc_reset;
-    reg [31:0] crc_data_in;
-    reg [3:0] crc_valid_in;
-    
-	reg [AXIS_DATA_WIDTH-1:0] received_data;
-	reg [AXIS_DATA_BYTES-1:0] received_ctl;
-	reg received_valid;
-    
-    reg frame_too_short;
-    reg frame_too_long;
-    
+    reg [XGMII_DATA_BYTES-1:0] crc_valid_in;
+
+    // data lanes in front of the first control character
+    reg [LANE_WIDTH-1:0] data_lanes;
+    reg [7:0] end_char;
+    wire any_ctl = |xgmii_ctl;
+
     integer i;
-    
-    assign out_master_rx_tlast = (in_xgmii_data[31:24] == XGMII_TERMINATE);
-    
+
+    always @(*) begin
+        data_lanes = XGMII_DATA_BYTES[LANE_WIDTH-1:0];
+        for (i = XGMII_DATA_BYTES - 1; i >= 0; i = i - 1) begin
+            if (xgmii_ctl[i]) begin
+                data_lanes = i[LANE_WIDTH-1:0];
+            end
+        end
+        end_char = xgmii_data[8*data_lanes[LANE_WIDTH-2:0]+:8];
+    end
+
+    always @(*) begin
+        crc_valid_in = {XGMII_DATA_BYTES{1'b0}};
+        if (current_state == PAYLOAD_STATE) begin
+            for (i = 0; i < XGMII_DATA_BYTES; i = i + 1) begin
+                if (i < data_lanes) begin
+                    crc_valid_in[i] = 1'b1;
+                end
+            end
+        end
+    end
+
+    function [5:0] address_hash(input [47:0] addr);
+        reg [31:0] crc;
+        integer b;
+        begin
+            crc = 32'hFFFFFFFF;
+            // bytes in wire order, each LSB first
+            for (b = 0; b < 48; b = b + 1) begin
+                if (crc[0] ^ addr[40 - 8*(b/8) + b%8]) begin
+                    crc = (crc >> 1) ^ 32'hEDB88320;
+                end else begin
+                    crc = crc >> 1;
+                end
+            end
+            crc = ~crc;
+            address_hash = crc[31:26];
+        end
+    endfunction
+
+    wire addr_multicast = dest_addr[40];
+    wire addr_broadcast = &dest_addr;
+    wire addr_match = promiscuous || addr_broadcast ||
+        (addr_multicast ? multicast_hash[address_hash(dest_addr)] : dest_addr == local_mac);
+    wire addr_ready = frame_byte_count >= 16'd6;
+    wire frame_accept = !addr_ready || (addr_checked ? addr_accept : addr_match);
+
+    wire crc_ok = (crc_out == CRC_RESIDUE);
+    wire length_ok = (frame_byte_count >= MIN_FRAME_SIZE) && (frame_byte_count <= MAX_FRAME_SIZE);
+
     always @(posedge rx_clk) begin
         if (!rx_rst) begin
             out_xgmii_pcs_ready <= 1'b0;
         end else begin
-            out_xgmii_pcs_ready <= 1'b1; 
+            out_xgmii_pcs_ready <= 1'b1;
         end
     end
-    
+
+    always @(posedge rx_clk) begin
+        prev_data_hi <= in_xgmii_data[XGMII_DATA_WIDTH-1:HALF_WIDTH];
+        prev_ctl_hi <= in_xgmii_ctl[XGMII_DATA_BYTES-1:HALF_BYTES];
+    end
+
+    always @(posedge rx_clk) begin
+        if (!rx_rst) begin
+            local_mac <= LOCAL_MAC;
+            promiscuous <= DEFAULT_PROMISCUOUS != 0;
+            multicast_hash <= 0;
+        end else if (config_valid) begin
+            local_mac <= config_local_mac;
+            promiscuous <= config_promiscuous;
+            multicast_hash <= config_multicast_hash;
+        end
+    end
+
+    // destination address capture and filter decision
+    integer j;
+
+    always @(posedge rx_clk) begin
+        if (!rx_rst) begin
+            dest_addr <= 0;
+            addr_checked <= 1'b0;
+            addr_accept <= 1'b0;
+            unicast_drop_count <= 0;
+            multicast_drop_count <= 0;
+        end else begin
+            if (current_state != PAYLOAD_STATE) begin
+                addr_checked <= 1'b0;
+            end else begin
+                for (i = 0; i < XGMII_DATA_BYTES; i = i + 1) begin
+                    for (j = 0; j < 6; j = j + 1) begin
+                        if (i < data_lanes && {16'd0, frame_byte_count} + i == j) begin
+                            dest_addr[40 - 8*j+:8] <= xgmii_data[8*i+:8];
+                        end
+                    end
+                end
+                if (addr_ready && !addr_checked) begin
+                    addr_checked <= 1'b1;
+                    addr_accept <= addr_match;
+                end
+            end
+
+            if (frame_end && !end_accept) begin
+                if (end_multicast) begin
+                    multicast_drop_count <= multicast_drop_count + 1'b1;
+                end else begin
+                    unicast_drop_count <= unicast_drop_count + 1'b1;
+                end
+            end
+        end
+    end
+
     always @(posedge rx_clk) begin
         if (!rx_rst) begin
             current_state <= IDLE_STATE;
-            byte_counter <= 0;
+            lane_shift <= 1'b0;
             frame_byte_count <= 0;
-            crc_reset <= 1'b0;
-            frame_too_short <= 1'b0;
-            frame_too_long <= 1'b0;
-            frame_valid <= 1'b0;
-            frame_error <= 1'b0;
-            crc_error <= 1'b0;
+            data_d1 <= 0;
+            data_d2 <= 0;
+            valid_d1 <= 1'b0;
+            valid_d2 <= 1'b0;
+            frame_end <= 1'b0;
+            end_data <= 0;
+            end_valid <= 1'b0;
+            end_keep <= 0;
+            end_aborted <= 1'b0;
+            end_accept <= 1'b0;
+            end_multicast <= 1'b0;
+            start_error <= 1'b0;
+            beat_data <= 0;
+            beat_keep <= 0;
+            beat_valid <= 1'b0;
+            beat_last <= 1'b0;
+            status_valid <= 1'b0;
+            status_error <= 1'b0;
+            status_crc_error <= 1'b0;
         end else begin
-            frame_too_short <= 1'b0;
-            frame_too_long <= 1'b0;
-            frame_valid <= 1'b0;
-            frame_error <= 1'b0;
-            crc_error <= 1'b0;
+            beat_valid <= 1'b0;
+            beat_last <= 1'b0;
+            status_valid <= 1'b0;
+            status_error <= start_error;
+            status_crc_error <= 1'b0;
+            frame_end <= 1'b0;
+            start_error <= 1'b0;
+
+            if (frame_end) begin
+                beat_data <= end_data;
+                for (i = 0; i < AXIS_DATA_BYTES; i = i + 1) begin
+                    beat_keep[i] <= (i < end_keep);
+                end
+                beat_valid <= end_valid;
+                beat_last <= end_valid;
+
+                if (!crc_ok) begin
+                    status_crc_error <= 1'b1;
+                end
+                if (crc_ok && length_ok && !end_aborted) begin
+                    status_valid <= end_accept;
+                end else begin
+                    status_error <= 1'b1;
+                end
+            end
+
             case (current_state)
                 IDLE_STATE: begin
-                    byte_counter <= 0;
                     frame_byte_count <= 0;
-                    crc_reset <= 1'b1;
-					
-					if(in_xgmii_ctl[0] && in_xgmii_data[7:0] == XGMII_START) begin
-						if(	(!in_xgmii_ctl[1] && in_xgmii_data[15:8] == PREAMBLE_BYTE) &&
-							(!in_xgmii_ctl[2] && in_xgmii_data[23:16] == PREAMBLE_BYTE) &&
-							(!in_xgmii_ctl[3] && in_xgmii_data[31:24] == PREAMBLE_BYTE)) begin 
-							current_state <= PREAMBLE_STATE;
-							frame_byte_count <= frame_byte_count + 4;
-						end else begin
-							frame_error <= 1'b1;
-						end
-					end else begin
-						current_state <= IDLE_STATE;
-						received_data <= 32'h00000000;
-						received_ctl <= 4'h0000;
-						received_valid <= 1'b0;
-					end
+                    valid_d1 <= 1'b0;
+                    valid_d2 <= 1'b0;
+
+                    if (in_xgmii_ctl[0] && in_xgmii_data[7:0] == XGMII_START) begin
+                        lane_shift <= 1'b0;
+                        if (start_lane0) begin
+                            // a 64 bit word holds the whole preamble
+                            current_state <= (PREAMBLE_WORDS == 1) ? PAYLOAD_STATE : PREAMBLE_STATE;
+                        end else begin
+                            start_error <= 1'b1;
+                        end
+                    end else if (start_lane4) begin
+                        lane_shift <= 1'b1;
+                        current_state <= PREAMBLE_STATE;
+                    end
                 end
-                
+
                 PREAMBLE_STATE: begin
-					
-					if(	(!in_xgmii_ctl[0] && in_xgmii_data[7:0] == PREAMBLE_BYTE) &&
-						(!in_xgmii_ctl[1] && in_xgmii_data[15:8] == PREAMBLE_BYTE) &&
-						(!in_xgmii_ctl[2] && in_xgmii_data[23:16] == PREAMBLE_BYTE) &&
-						(!in_xgmii_ctl[3] && in_xgmii_data[31:24] == SFD_BYTE)) begin 
-						current_state <= MAC_HEADER_STATE;
-						frame_byte_count = frame_byte_count + 4;
-					end else begin
-						frame_error <= 1'b1;
-					end
-                end
-                
-                MAC_HEADER_STATE: begin
-					case(byte_counter)
-						0: begin
-							crc_data_in <= in_xgmii_data;
-							crc_valid_in <= 4'b1111;
-							byte_counter <= byte_counter + 4;
-							frame_byte_count <= frame_byte_count + 4;
-						end 
-						4: begin
-							crc_data_in <= in_xgmii_data;
-							crc_valid_in <= 4'b1111;
-							byte_counter <= byte_counter + 4;
-							frame_byte_count <= frame_byte_count + 4;
-						end
-						8: begin
-							crc_data_in <= in_xgmii_data;
-							crc_valid_in <= 4'b1111;
-							byte_counter <= byte_counter + 4;
-							frame_byte_count <= frame_byte_count + 4;
-						end
-						12: begin
-							crc_data_in <= in_xgmii_data;
-							crc_valid_in <= 4'b0011;
-							byte_counter <= byte_counter + 2;
-							frame_byte_count <= frame_byte_count + 2;
-							current_state <= PAYLOAD_STATE;
-						end						
-					endcase 
+                    frame_byte_count <= 0;
+                    valid_d1 <= 1'b0;
+                    valid_d2 <= 1'b0;
+
+                    // the word ending in the SFD, realigned for a lane 4 start
+                    if (xgmii_data == SFD_WORD && xgmii_ctl == SFD_CTL) begin
+                        current_state <= PAYLOAD_STATE;
+                    end else begin
+                        // no SFD, drop the frame and hunt for the next /S/
+                        start_error <= 1'b1;
+                        current_state <= IDLE_STATE;
+                    end
                 end
-                
+
                 PAYLOAD_STATE: begin
-					if(received_valid) begin
-						if (in_xgmii_data[31:24] == XGMII_TERMINATE) begin
-							received_valid <= 1'b0;
-							received_data <= 32'h00000000;
-							received_ctl <= 4'h0000;
-							crc_data_in <= 32'h00000000;
-							crc_valid_in <= 4'b0000;
-							
-							if (received_data != crc_out) begin
-                                crc_error <= 1'b1;
-                                frame_error <= 1'b1;
-                                current_state <= ERROR_STATE;
-                            end else if (frame_byte_count > MAX_FRAME_SIZE) begin
-                                frame_error <= 1'b1;
-                                frame_too_long <= 1'b1;
-                                current_state <= ERROR_STATE;
-                            end else if (frame_byte_count < MIN_FRAME_SIZE) begin
-                                frame_error <= 1'b1;
-                                frame_too_short <= 1'b1;
-                                current_state <= ERROR_STATE;
-                            end else begin
-                                frame_valid <= 1'b1;         
-                                current_state <= TERMINATE_STATE;
-                            end 
-							
-						end else begin
-							 received_data <= in_xgmii_data;
-							 received_ctl <= in_xgmii_ctl;
-							 crc_data_in <= received_data;
-							 crc_valid_in <= 4'b1111;
-							 frame_byte_count <= frame_byte_count + 4;
-						end
-					end else begin 
-						received_data <= in_xgmii_data;
-						received_ctl <= in_xgmii_ctl;
-						received_valid <= 1'b1;
-						crc_valid_in <= 4'b0000;
-					end
-                end 
-                
-                ERROR_STATE: begin
-                    frame_error <= 1'b1;
-                    current_state <= IDLE_STATE;
-                end
-                
-                TERMINATE_STATE: begin
-                    current_state <= IDLE_STATE;
-                    frame_byte_count <= 0;
+                    // stop counting far past oversize, the count cannot
+                    // wrap and the statistics get the exact length of any
+                    // frame up to 32k bytes
+                    if (!frame_byte_count[15]) begin
+                        frame_byte_count <= frame_byte_count + {{(16-LANE_WIDTH){1'b0}}, data_lanes};
+                    end
+
+                    if (!any_ctl) begin
+                        beat_data <= lag_data;
+                        beat_keep <= {AXIS_DATA_BYTES{1'b1}};
+                        beat_valid <= lag_valid && frame_accept;
+                        data_d2 <= data_d1;
+                        valid_d2 <= valid_d1;
+                        data_d1 <= xgmii_data;
+                        valid_d1 <= 1'b1;
+                    end else begin
+                        // with more than a word of data left lag_data is
+                        // not the last beat
+                        if (end_bytes > WORD_BYTES) begin
+                            beat_data <= lag_data;
+                            beat_keep <= {AXIS_DATA_BYTES{1'b1}};
+                            beat_valid <= lag_valid && frame_accept;
+                            end_data <= next_data;
+                            end_valid <= next_valid && frame_accept;
+                            end_keep <= end_bytes - WORD_BYTES;
+                        end else begin
+                            end_data <= lag_data;
+                            end_valid <= lag_valid && frame_accept;
+                            end_keep <= end_bytes;
+                        end
+                        frame_end <= 1'b1;
+                        end_aborted <= (end_char != XGMII_TERMINATE);
+                        end_accept <= frame_accept;
+                        end_multicast <= addr_multicast;
+
+                        // realigned, the end may be in the previous word
+                        // and the next /S/ on lane 4 of this one
+                        if (start_lane4) begin
+                            lane_shift <= 1'b1;
+                            current_state <= PREAMBLE_STATE;
+                        end else begin
+                            current_state <= IDLE_STATE;
+                        end
+                    end
                 end
-                
+
                 default: current_state <= IDLE_STATE;
             endcase
         end
     end
-    
+
+    // A beat other than the last needs two free entries, one for itself
+    // and one for the tlast beat after it. The tlast beat goes in if an
+    // earlier beat of its frame did, or if there is room for it.
+    assign fifo_wr_en = beat_valid && (beat_last ? beats_written || (!beats_dropped && !fifo_full)
+                                                 : !beats_dropped && !fifo_almost_full);
+
     always @(posedge rx_clk) begin
         if (!rx_rst) begin
-            out_master_rx_tdata <= 0;
-            out_master_rx_tkeep <= 0;
-            out_master_rx_tvalid <= 1'b0;
+            beats_written <= 1'b0;
+            beats_dropped <= 1'b0;
+            frame_valid <= 1'b0;
+            frame_error <= 1'b0;
+            crc_error <= 1'b0;
         end else begin
-            if (received_valid && !(in_xgmii_data[31:24] == XGMII_TERMINATE)) begin
-                out_master_rx_tdata <= received_data;
-                out_master_rx_tkeep <= received_ctl;
-                out_master_rx_tvalid <= 1'b1;
-            end else begin
-                out_master_rx_tdata <= {4{XGMII_IDLE}};
-                out_master_rx_tkeep <= 4'b1111;
-                out_master_rx_tvalid <= 1'b0;
+            if (beat_valid && beat_last) begin
+                beats_written <= 1'b0;
+                beats_dropped <= 1'b0;
+            end else if (beat_valid) begin
+                beats_written <= beats_written || fifo_wr_en;
+                beats_dropped <= beats_dropped || !fifo_wr_en;
             end
+
+            // the status pulses come with the tlast beat, if any
+            frame_valid <= status_valid && !frame_cut;
+            frame_error <= status_error || (status_valid && frame_cut);
+            crc_error <= status_crc_error;
         end
     end
-    
+
+    assign fifo_rd_en = in_master_rx_tready;
+    assign out_master_rx_tvalid = !fifo_empty;
+    assign {out_master_rx_tlast, out_master_rx_tkeep, out_master_rx_tdata} = fifo_rd_data;
+
+    sync_fifo #(
+        .DATA_WIDTH(FIFO_DATA_WIDTH),
+        .ADDR_WIDTH(FIFO_ADDR_WIDTH),
+        .FWFT(1)
+    ) fifo (
+        .clk(rx_clk),
+        .rst(rx_rst),
+        .wr_en(fifo_wr_en),
+        .wr_data({beat_last, beat_keep, beat_data}),
+        .rd_en(fifo_rd_en),
+        .rd_data(fifo_rd_data),
+        .empty(fifo_empty),
+        .full(fifo_full),
+        .almost_empty(),
+        .almost_full(fifo_almost_full),
+        .occupancy()
+    );
+
     crc32 #(
-        .SLICE_LENGTH(4),
-        .INITIAL_CRC(32'hFFFFFFFF),    
-        .INVERT_OUTPUT(1),             
-        .REGISTER_OUTPUT(0)   
+        .SLICE_LENGTH(XGMII_DATA_BYTES),
+        .INITIAL_CRC(32'hFFFFFFFF),
+        .INVERT_OUTPUT(1),
+        .REGISTER_OUTPUT(1)
     ) crc (
         .clk(rx_clk),
-        .rst(crc_reset),
-        .in_data(crc_data_in),
+        .rst(rx_rst),
+        .in_data(xgmii_data),
         .in_valid(crc_valid_in),
-        .out_crc(crc_out)
+        .out_crc(crc_out),
+        .in_crc_reset(current_state != PAYLOAD_STATE)
     );
-    
-endmodule
\ No newline at end of file
+
+    mac_stats #(
+        .MIN_FRAME_SIZE(MIN_FRAME_SIZE),
+        .MAX_FRAME_SIZE(MAX_FRAME_SIZE)
+    ) stats (
+        .clk(rx_clk),
+        .rst(rx_rst),
+        .in_frame(frame_end),
+        .in_length(frame_byte_count),
+        .in_aborted(end_aborted),
+        .in_crc_error(!crc_ok),
+        .snapshot(stats_snapshot),
+        .clear(stats_clear),
+        .read_addr(stats_read_addr),
+        .read_data(stats_read_data)
+    );
+
+
+endmodule
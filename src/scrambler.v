@@ -1,33 +1,70 @@
 module scrambler #( 
-    parameter PCS_DATA_WIDTH = 64 
+    parameter PCS_DATA_WIDTH = 64,
+    parameter REGISTER_OUTPUT = 0
 )( 
     input clk, 
     input rst, 
     input [PCS_DATA_WIDTH-1:0] in_data, 
     input in_data_valid, 
     output [PCS_DATA_WIDTH-1:0] out_data,
-    output reg out_data_valid
+    output out_data_valid
 ); 
-    reg [127:0] data; 
-    wire [127:0] next_data;
+    // 10GBASE-R self-synchronizing scrambler, G(x) = 1 + x^39 + x^58, bit 0
+    // of in_data first on the line. Bit n of the line is
+    //   out[n] = in[n] ^ out[n-39] ^ out[n-58]
+    // so the state is the last 58 bits sent. Within a word the taps reach
+    // back into the same word, which the loop below unrolls into a chain:
+    // feedback[58 + i] is output bit i, feedback[57:0] the state. Any
+    // PCS_DATA_WIDTH works, e.g. 32 for a narrow gearbox or 128 for two
+    // blocks per clock.
+    //
+    // With REGISTER_OUTPUT=0 out_data is combinational and valid in the
+    // same clock as in_data. REGISTER_OUTPUT=1 registers out_data and
+    // out_data_valid, one clock of latency, so the XOR chain does not add
+    // to the path into whatever follows.
+    localparam STATE_WIDTH = 58;
+
+    reg [STATE_WIDTH-1:0] state; 
+    reg [PCS_DATA_WIDTH+STATE_WIDTH-1:0] feedback;
+    wire [PCS_DATA_WIDTH-1:0] scrambled = feedback[STATE_WIDTH +: PCS_DATA_WIDTH];
+
+    integer i;
+
+    always @(*) begin
+        feedback[STATE_WIDTH-1:0] = state;
+        for (i = 0; i < PCS_DATA_WIDTH; i = i + 1) begin
+            feedback[STATE_WIDTH + i] = in_data[i] ^ feedback[i + 19] ^ feedback[i];
+        end
+    end
     
     always @(posedge clk) begin
         if(!rst) begin
-            data <= {128{1'b1}};
+            state <= {STATE_WIDTH{1'b1}};
         end else if(in_data_valid) begin
-            data <= next_data;
-            out_data_valid <= 1'b1;
-        end else begin
-            out_data_valid <= 1'b0;
+            state <= feedback[PCS_DATA_WIDTH +: STATE_WIDTH];
         end
     end 
-        
-    assign next_data = {out_data, data[63:0]};
-    
-    genvar i;
-    generate 
-        for(i = 0; i < PCS_DATA_WIDTH; i = i + 1) begin
-            assign out_data[i] = in_data[i] ^ data[PCS_DATA_WIDTH + i - 39] ^ data[PCS_DATA_WIDTH + i - 58];
+
+    generate
+        if (REGISTER_OUTPUT) begin : gen_out_reg
+            reg [PCS_DATA_WIDTH-1:0] out_data_reg;
+            reg out_data_valid_reg;
+
+            always @(posedge clk) begin
+                if (!rst) begin
+                    out_data_reg <= 0;
+                    out_data_valid_reg <= 1'b0;
+                end else begin
+                    out_data_reg <= scrambled;
+                    out_data_valid_reg <= in_data_valid;
+                end
+            end
+
+            assign out_data = out_data_reg;
+            assign out_data_valid = out_data_valid_reg;
+        end else begin : gen_out_comb
+            assign out_data = scrambled;
+            assign out_data_valid = in_data_valid;
         end
     endgenerate
-endmodule
\ No newline at end of file
+endmodule
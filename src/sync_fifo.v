@@ -1,7 +1,15 @@
 module sync_fifo #(
 	parameter DATA_WIDTH = 36,
 	parameter ADDR_WIDTH = 2,
-	parameter FIFO_DEPTH = 1 << ADDR_WIDTH
+	parameter FIFO_DEPTH = 1 << ADDR_WIDTH,
+	// 0: rd_data is registered, valid the clock after rd_en
+	// 1: first word fall through, rd_data is the head word whenever
+	//    !empty and rd_en takes it
+	parameter FWFT = 0,
+	// almost_full at this occupancy or above, almost_empty at this
+	// occupancy or below
+	parameter ALMOST_FULL_THRESHOLD = FIFO_DEPTH - 1,
+	parameter ALMOST_EMPTY_THRESHOLD = 1
 	) (
 	input clk,
 	input rst,
@@ -10,39 +18,71 @@ module sync_fifo #(
 	input rd_en,
 	output reg [DATA_WIDTH-1:0] rd_data,
 	output empty,
-	output full
+	output full,
+	output almost_empty,
+	output almost_full,
+	output [ADDR_WIDTH:0] occupancy
 	);
 	
+	// With FWFT the memory is still read into the rd_data register, which
+	// is refilled in the same clock its word is taken, so reads and writes
+	// can both go on every clock without a gap. A write shows up on
+	// rd_data two clocks later. occupancy counts the word in rd_data too.
+	
+	localparam [ADDR_WIDTH:0] DEPTH = FIFO_DEPTH;
+	localparam [ADDR_WIDTH:0] ALMOST_FULL_COUNT = ALMOST_FULL_THRESHOLD[ADDR_WIDTH:0];
+	localparam [ADDR_WIDTH:0] ALMOST_EMPTY_COUNT = ALMOST_EMPTY_THRESHOLD[ADDR_WIDTH:0];
+	
 	reg [ADDR_WIDTH:0] count;
 	reg [DATA_WIDTH-1:0] mem [0:FIFO_DEPTH-1];
 	reg [ADDR_WIDTH-1:0] wr_ptr_reg;
 	reg [ADDR_WIDTH-1:0] rd_ptr_reg;
+	// FWFT: rd_data holds the head word
+	reg out_valid;
 	
-	assign empty = count == 0;
-	assign full = count == FIFO_DEPTH;
+	wire push = wr_en && !full;
+	wire pop = rd_en && !empty;
+	wire mem_empty = count == {{ADDR_WIDTH{1'b0}}, out_valid};
+	wire mem_read = FWFT ? !mem_empty && (!out_valid || pop) : pop;
 	
-	always @(posedge clk or negedge rst) begin
+	assign empty = FWFT ? !out_valid : count == 0;
+	assign full = count == DEPTH;
+	assign almost_empty = count <= ALMOST_EMPTY_COUNT;
+	assign almost_full = count >= ALMOST_FULL_COUNT;
+	assign occupancy = count;
+	
+	always @(posedge clk) begin
+		if(push) begin
+			mem[wr_ptr_reg] <= wr_data;
+		end
+	end
+	
+	always @(posedge clk) begin
 		if(!rst) begin
 			wr_ptr_reg <= 0;
 			rd_ptr_reg <= 0;
 			count <= 0;
 			rd_data <= 0;
+			out_valid <= 1'b0;
 		end else begin
-			if(wr_en && !full) begin
-				mem[wr_ptr_reg] <= wr_data;
-				wr_ptr_reg <= (wr_ptr_reg + 1) & (FIFO_DEPTH-1);
+			if(push) begin
+				wr_ptr_reg <= wr_ptr_reg + 1'b1;
 			end
 			
-			if(rd_en && !empty) begin 
+			if(mem_read) begin 
 				rd_data <= mem[rd_ptr_reg];
-				rd_ptr_reg <= (rd_ptr_reg + 1) & (FIFO_DEPTH - 1);
+				rd_ptr_reg <= rd_ptr_reg + 1'b1;
+			end
+			
+			if(FWFT) begin
+				out_valid <= mem_read || (out_valid && !pop);
 			end
 			
-			case ({wr_en && !full, rd_en && !empty})
-				2'b10: count <= count + 1;
-				2'b01: count <= count - 1; 
+			case ({push, pop})
+				2'b10: count <= count + 1'b1;
+				2'b01: count <= count - 1'b1; 
 				default: count <= count;   
 			endcase
 		end
 	end 
-endmodule
\ No newline at end of file
+endmodule
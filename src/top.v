@@ -1,13 +1,15 @@
 module top #(
     parameter AXIS_DATA_WIDTH = 32,
     parameter AXIS_DATA_BYTES = AXIS_DATA_WIDTH/8,
-    parameter XGMII_DATA_WIDTH = 32,
+    parameter XGMII_DATA_WIDTH = 32,  // 32 or 64, equal to AXIS_DATA_WIDTH; 64 for line rate
     parameter XGMII_DATA_BYTES = XGMII_DATA_WIDTH/8,
     parameter PCS_DATA_WIDTH = 64,
+    parameter TX_CUT_THROUGH = 0,     // 1: tx_mac starts frames before tlast is in
     
     parameter [47:0] LOCAL_MAC = 48'hAA_BB_CC_DD_EE_FF,
     parameter [47:0] DEFAULT_DEST_MAC = 48'h00_11_22_33_44_55,
     parameter [15:0] DEFAULT_ETHER_TYPE = 16'h0800, 
+    parameter DEFAULT_PROMISCUOUS = 1,  // rx address filter until config_valid
     parameter RESET_POLARITY = 1'b0  // 0 = active low, 1 = active high
 ) (
     input sys_clk,                  // 156.25 MHz for 10G
@@ -26,6 +28,7 @@ module top #(
     input user_rx_axis_tready,
     
     output [PCS_DATA_WIDTH-1:0] phy_tx_data,
+    output [1:0] phy_tx_header,
     output phy_tx_valid,
     input phy_tx_ready,
     
@@ -37,15 +40,25 @@ module top #(
     input [47:0] config_dest_mac,
     input [15:0] config_ether_type,
     input config_promiscuous,
+    input [63:0] config_multicast_hash,
     input config_valid,
     
+    // frame statistics, see mac_stats
+    input stats_snapshot,
+    input stats_clear,
+    input [3:0] stats_read_addr,
+    output [63:0] tx_stats_read_data,
+    output [63:0] rx_stats_read_data,
+    
     output link_up,
     output [3:0] link_speed,
     output tx_frame_valid,
     output tx_frame_error,
     output rx_frame_valid,
     output rx_frame_error,
-    output rx_crc_error
+    output rx_crc_error,
+    output [31:0] rx_unicast_drop_count,
+    output [31:0] rx_multicast_drop_count
 );
     
     wire [XGMII_DATA_WIDTH-1:0] xgmii_tx_data;
@@ -60,15 +73,21 @@ module top #(
     
     wire pcs_tx_ready;
     wire pcs_rx_ready;
+    wire rx_block_lock;
+    
+    // the receive side has block lock
+    assign link_up = rx_block_lock;
     
     mac #(
         .AXIS_DATA_WIDTH(AXIS_DATA_WIDTH),
         .AXIS_DATA_BYTES(AXIS_DATA_BYTES),
         .XGMII_DATA_WIDTH(XGMII_DATA_WIDTH),
         .XGMII_DATA_BYTES(XGMII_DATA_BYTES),
+        .TX_CUT_THROUGH(TX_CUT_THROUGH),
         .LOCAL_MAC(LOCAL_MAC),
         .DEFAULT_DEST_MAC(DEFAULT_DEST_MAC),
-        .DEFAULT_ETHER_TYPE(DEFAULT_ETHER_TYPE)
+        .DEFAULT_ETHER_TYPE(DEFAULT_ETHER_TYPE),
+        .DEFAULT_PROMISCUOUS(DEFAULT_PROMISCUOUS)
     ) mac_inst (
         .mac_clk(sys_clk),
         .mac_rst(sys_rst_n),
@@ -98,9 +117,22 @@ module top #(
         .tx_frame_error(tx_frame_error),
         .rx_frame_valid(rx_frame_valid),
         .rx_frame_error(rx_frame_error),
-        .rx_crc_error(rx_crc_error)
+        .rx_crc_error(rx_crc_error),
+        
+        .config_local_mac(config_local_mac),
+        .config_promiscuous(config_promiscuous),
+        .config_multicast_hash(config_multicast_hash),
+        .config_valid(config_valid),
+        .rx_unicast_drop_count(rx_unicast_drop_count),
+        .rx_multicast_drop_count(rx_multicast_drop_count),
+        
+        .stats_snapshot(stats_snapshot),
+        .stats_clear(stats_clear),
+        .stats_read_addr(stats_read_addr),
+        .tx_stats_read_data(tx_stats_read_data),
+        .rx_stats_read_data(rx_stats_read_data)
     );
-    
+
     pcs #(
         .XGMII_DATA_WIDTH(XGMII_DATA_WIDTH),
         .XGMII_DATA_BYTES(XGMII_DATA_BYTES),
@@ -112,15 +144,19 @@ module top #(
         .in_tx_xgmii_data(xgmii_tx_data),
         .in_tx_xgmii_ctl(xgmii_tx_ctrl),
         .in_tx_xgmii_valid(xgmii_tx_valid),
+        // encoder block phase, not backpressure: the MAC sends every clock
+        .out_tx_xgmii_ready(),
         
         .tx_pcs_data(phy_tx_data),
+        .tx_pcs_header(phy_tx_header),
         .tx_pcs_data_valid(phy_tx_valid),
         .tx_pcs_ready(phy_tx_ready),
         
         .rx_pcs_data(phy_rx_data),
         .rx_pcs_valid(phy_rx_valid),
         .rx_pcs_header(phy_rx_header),
-        
+        .rx_block_lock(rx_block_lock),
+
         .rx_xgmii_data(xgmii_rx_data),
         .rx_xgmii_ctl(xgmii_rx_ctrl),
         .rx_xgmii_valid(xgmii_rx_valid),
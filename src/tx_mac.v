@@ -2,373 +2,615 @@ module tx_mac #(
     parameter AXIS_DATA_WIDTH = 32,
     parameter AXIS_DATA_BYTES = AXIS_DATA_WIDTH/8,
     parameter XGMII_DATA_WIDTH = 32,
-    parameter XGMII_DATA_BYTES = XGMII_DATA_WIDTH/8
+    parameter XGMII_DATA_BYTES = XGMII_DATA_WIDTH/8,
+    // 0: store and forward, 1: cut-through, see below
+    parameter CUT_THROUGH = 0
 ) (
     input tx_clk,
     input tx_rst,
-    
+
     // AXIS
     input [AXIS_DATA_WIDTH-1:0] in_slave_tx_tdata,
     input [AXIS_DATA_BYTES-1:0] in_slave_tx_tkeep,
     input in_slave_tx_tvalid,
     input in_slave_tx_tlast,
     output out_slave_tx_tready,
-    
+
     // XGMII
     output reg [XGMII_DATA_WIDTH-1:0] out_xgmii_data,
     output reg [XGMII_DATA_BYTES-1:0] out_xgmii_ctl,
     output reg out_xgmii_valid,
     input in_xgmii_pcs_ready,
-    
+
     output reg frame_error,
-    output reg frame_valid
+    output reg frame_valid,
+
+    // frame statistics, see mac_stats
+    input stats_snapshot,
+    input stats_clear,
+    input [3:0] stats_read_addr,
+    output [63:0] stats_read_data
 );
 
-    localparam XGMII_IDLE = 8'h07;        
-    localparam XGMII_START = 8'hFB;       
-    localparam XGMII_TERMINATE = 8'hFD;  
-    localparam XGMII_ERROR = 8'hFE;       
-    localparam XGMII_SEQUENCE = 8'h9C;  
-    localparam XGMII_SIGNAL = 8'h5C;     
-    
+    localparam XGMII_IDLE = 8'h07;
+    localparam XGMII_START = 8'hFB;
+    localparam XGMII_TERMINATE = 8'hFD;
+    localparam XGMII_ERROR = 8'hFE;
+    localparam XGMII_SEQUENCE = 8'h9C;
+    localparam XGMII_SIGNAL = 8'h5C;
+
     localparam PREAMBLE_BYTE = 8'h55;
-    localparam SFD_BYTE = 8'hD5;         
-    
-    localparam MIN_FRAME_SIZE = 64;       
-    localparam MAX_FRAME_SIZE = 1518;     
-    localparam MIN_PAYLOAD_SIZE = 46;    
-    localparam MAX_PAYLOAD_SIZE = 1500;  
-    localparam PREAMBLE_SFD_SIZE = 8;    
-    localparam MAC_HEADER_SIZE = 14;     
-    localparam FCS_SIZE = 4;           
-    localparam IFG_SIZE = 12;            
-    
+    localparam SFD_BYTE = 8'hD5;
+
+    localparam MIN_FRAME_SIZE = 64;
+    localparam MAX_FRAME_SIZE = 1518;
+    localparam MIN_PAYLOAD_SIZE = 46;
+    localparam PREAMBLE_SFD_SIZE = 8;
+    localparam MAC_HEADER_SIZE = 14;
+    localparam FCS_SIZE = 4;
+    localparam IFG_SIZE = 12;
+
     localparam [47:0] DEST_MAC = 48'h00_11_22_33_44_55;
     localparam [47:0] SRC_MAC  = 48'hAA_BB_CC_DD_EE_FF;
-    localparam [15:0] ETHER_TYPE = 16'h0800; 
-    
-    localparam FIFO_DATA_WIDTH = AXIS_DATA_WIDTH + AXIS_DATA_BYTES; 
-    localparam FIFO_DEPTH = 512; 
+    localparam [15:0] ETHER_TYPE = 16'h0800;
+
+    // the MAC header is followed by two zero bytes so that the payload
+    // starts on a word boundary for 4 and 8 byte words
+    localparam HEADER_SIZE = MAC_HEADER_SIZE + 2;
+    // longest payload that fits in MAX_FRAME_SIZE after the alignment bytes
+    localparam [15:0] MAX_PAYLOAD_SIZE = MAX_FRAME_SIZE - HEADER_SIZE - FCS_SIZE;
+    localparam HEADER_WORDS = HEADER_SIZE / XGMII_DATA_BYTES;
+    localparam PREAMBLE_WORDS = PREAMBLE_SFD_SIZE / XGMII_DATA_BYTES;
+    // bytes between SFD and FCS of a minimum size frame; the two alignment
+    // bytes count towards the minimum payload
+    localparam [15:0] MIN_DATA_SIZE = MAC_HEADER_SIZE + MIN_PAYLOAD_SIZE;
+    // /S/ may go on any lane that is a multiple of this: lane 0 for 4 byte
+    // words, lane 0 or 4 for 8 byte words
+    localparam [7:0] START_ALIGN = 8'd4;
+    // from the end of the frame data to the earliest next /S/
+    localparam [7:0] END_GAP = FCS_SIZE + IFG_SIZE;
+    localparam [7:0] FCS_LENGTH = FCS_SIZE;
+
+    localparam LANE_WIDTH = $clog2(XGMII_DATA_BYTES) + 1;
+    localparam WORD_SHIFT = $clog2(XGMII_DATA_BYTES);
+    localparam COUNT_WIDTH = $clog2(AXIS_DATA_BYTES);
+    localparam [15:0] WORD_BYTES = XGMII_DATA_BYTES[15:0];
+    localparam [LANE_WIDTH-1:0] WORD_LANES = XGMII_DATA_BYTES[LANE_WIDTH-1:0];
+    localparam [3:0] LAST_PREAMBLE_WORD = PREAMBLE_WORDS[3:0] - 4'd1;
+    localparam [3:0] LAST_HEADER_WORD = HEADER_WORDS[3:0] - 4'd1;
+
+    // A FIFO entry is tdata plus AXIS_DATA_BYTES side bits, which carry
+    // tlast in the top bit and the number of valid bytes minus one in the
+    // bottom COUNT_WIDTH bits. tkeep must be LSB-aligned.
+    localparam FIFO_DATA_WIDTH = AXIS_DATA_WIDTH + AXIS_DATA_BYTES;
+    localparam FIFO_DEPTH = 512;
     localparam FIFO_ADDR_WIDTH = $clog2(FIFO_DEPTH);
-    
+
     localparam [3:0] IDLE_STATE = 4'd0;
     localparam [3:0] PREAMBLE_STATE = 4'd1;
     localparam [3:0] MAC_HEADER_STATE = 4'd2;
     localparam [3:0] PAYLOAD_STATE = 4'd3;
     localparam [3:0] PAD_STATE = 4'd4;
-    localparam [3:0] FCS_STATE = 4'd5;
-	localparam [3:0] TERMINATE_STATE = 4'd6;
     localparam [3:0] IFG_STATE = 4'd7;
-    localparam [3:0] ERROR_STATE = 4'd8;
-    
+
+    // /S/, preamble and SFD, lane 0 in the LSB
+    localparam [63:0] PREAMBLE_DATA = {SFD_BYTE, {6{PREAMBLE_BYTE}}, XGMII_START};
+    localparam [7:0] PREAMBLE_CTL = 8'b0000_0001;
+
+    // Frames are stored whole and sent from the FIFO in three stages:
+    //
+    //  - gen_*: one word per clock of the frame as it is aligned to its
+    //    own /S/ on lane 0: preamble, header, payload and padding, then
+    //    idles. The CRC is fed from here.
+    //  - d1_*: the same word a clock later, when out_crc includes it. The
+    //    last data word gets the FCS appended right after its last byte,
+    //    then /T/ and idles; what does not fit spills into the idle words
+    //    behind it.
+    //  - out_xgmii_*: the merged word moved up by the frame's start lane
+    //    offset, so that frames can start on lane 4 of 8 byte words.
+    //
+    // The gap to the next /S/ is IFG_SIZE bytes from /T/, rounded to a
+    // START_ALIGN lane with a deficit idle count (IEEE 802.3 clause 46): a
+    // gap is rounded down while the idles taken off that way add up to no
+    // more than three bytes, and up otherwise, which pays the deficit back.
+    // Gaps are 9 to 15 bytes and average IFG_SIZE.
+    //
+    // With CUT_THROUGH=0 a frame is started once its tlast beat is in the
+    // FIFO, or once it fills the FIFO without one, as a frame longer than
+    // the FIFO never gets its tlast beat in. With CUT_THROUGH=1 it is
+    // started as soon as its first beat is. A frame started before its
+    // tlast beat has to keep up with the XGMII side from then on: a
+    // payload word that is not in the FIFO when it is due (underrun) aborts
+    // the frame: it ends with /E/ in place of the FCS, then /T/ as usual,
+    // frame_error pulses and the rest of the frame is dropped from the FIFO
+    // as it comes in.
+    //
+    // Statistics count every frame as it ends on XGMII, with its length
+    // from the destination address to the FCS, or to the /E/ of an aborted
+    // frame. A payload over MAX_PAYLOAD_SIZE makes a frame longer than
+    // MAX_FRAME_SIZE: frame_error pulses as its tlast beat is written, and
+    // the frame still goes out and counts as oversize.
+
     reg [3:0] current_state;
-    reg [11:0] byte_counter;
-    reg [15:0] frame_byte_count;
-    
-    reg fifo_wr_en;
-    reg fifo_rd_en;
+    reg [3:0] word_count;
+    reg [15:0] data_count;
+    reg [15:0] payload_length;
+    reg [7:0] ifg_count;
+    reg [1:0] deficit_idle_count;
+    reg [LANE_WIDTH-1:0] frame_offset;
+    reg [LANE_WIDTH-1:0] next_offset;
+    // frames in the FIFO that have not been started yet: complete frames,
+    // or with CUT_THROUGH frames whose first beat is in
+    reg [FIFO_ADDR_WIDTH:0] fifo_frames;
+    // CUT_THROUGH: the AXIS side is within a frame
+    reg in_frame;
+    // reading out the rest of an aborted frame
+    reg drop_frame;
+    // CUT_THROUGH=0: the frame on the AXIS side was started because it
+    // filled the FIFO, its tlast beat does not add to fifo_frames
+    reg started_full;
+
+    wire advance = in_xgmii_pcs_ready;
+
+    wire fifo_wr_en;
+    wire fifo_rd_en;
     wire [FIFO_DATA_WIDTH-1:0] fifo_rd_data;
-    reg [FIFO_DATA_WIDTH-1:0] fifo_wr_data;
+    wire [FIFO_DATA_WIDTH-1:0] fifo_wr_data;
     wire fifo_empty;
     wire fifo_full;
     wire [AXIS_DATA_WIDTH-1:0] fifo_tdata;
-    wire [AXIS_DATA_BYTES-1:0] fifo_tkeep;
-    
+    wire fifo_last;
+    wire [LANE_WIDTH-1:0] fifo_bytes;
+
+    reg [LANE_WIDTH-1:0] in_bytes;
+    wire [COUNT_WIDTH-1:0] in_count;
+
+    assign in_count = in_bytes[COUNT_WIDTH-1:0] - 1'b1;
+    assign fifo_wr_data = {in_slave_tx_tlast, {(AXIS_DATA_BYTES-1-COUNT_WIDTH){1'b0}}, in_count, in_slave_tx_tdata};
+    assign fifo_wr_en = in_slave_tx_tvalid && out_slave_tx_tready;
+    assign out_slave_tx_tready = !fifo_full;
+
     assign fifo_tdata = fifo_rd_data[AXIS_DATA_WIDTH-1:0];
-    assign fifo_tkeep = fifo_rd_data[FIFO_DATA_WIDTH-1:AXIS_DATA_WIDTH];
-    assign out_slave_tx_tready = !fifo_full && !tlast_internal; 
-    
-    reg [15:0] payload_length;
-    reg [7:0] pad_bytes_required;
-    
-    reg [AXIS_DATA_WIDTH-1:0] current_data;
-    reg [AXIS_DATA_BYTES-1:0] current_keep;
-    reg current_valid;
-    reg data_valid;
-    reg last_word;
-    
+    assign fifo_last = fifo_rd_data[FIFO_DATA_WIDTH-1];
+    assign fifo_bytes = {1'b0, fifo_rd_data[AXIS_DATA_WIDTH+:COUNT_WIDTH]} + 1'b1;
+
+    reg [XGMII_DATA_WIDTH-1:0] gen_data;
+    reg [XGMII_DATA_BYTES-1:0] gen_ctl;
+    reg [XGMII_DATA_BYTES-1:0] gen_keep;
+    reg [LANE_WIDTH-1:0] gen_bytes;
+    reg gen_last;
+    reg gen_abort;
+    reg gen_start;
+    reg [LANE_WIDTH-1:0] gen_offset;
+
+    reg [XGMII_DATA_WIDTH-1:0] d1_data;
+    reg [XGMII_DATA_BYTES-1:0] d1_ctl;
+    reg [LANE_WIDTH-1:0] d1_bytes;
+    reg d1_last;
+    reg d1_abort;
+    reg d1_start;
+    reg [LANE_WIDTH-1:0] d1_offset;
+    // frame data bytes up to the end of d1_data, MAC header included
+    reg [15:0] d1_length;
+
+    // FCS and /T/ bytes still to go out after the last data word
+    reg [2*XGMII_DATA_WIDTH-1:0] spill_data;
+    reg [2*XGMII_DATA_BYTES-1:0] spill_ctl;
+    reg [1:0] spill_words;
+
+    reg [XGMII_DATA_WIDTH-1:0] merged_data;
+    reg [XGMII_DATA_BYTES-1:0] merged_ctl;
+    reg [XGMII_DATA_WIDTH-1:0] prev_data;
+    reg [XGMII_DATA_BYTES-1:0] prev_ctl;
+    reg [LANE_WIDTH-1:0] out_offset;
+
     wire [31:0] crc_out;
-    reg crc_reset;
-    reg [31:0] crc_data_in;
-    reg [3:0] crc_valid_in;
-    
-    reg compute_padding;
-
-    reg tlast_internal;
-    
+
+    // payload bytes outside tkeep go out as zeros, which doubles as padding
+    reg [AXIS_DATA_WIDTH-1:0] fifo_tdata_masked;
+
     wire [7:0] mac_header [0:MAC_HEADER_SIZE-1];
 
-    assign mac_header[0]  = DEST_MAC[47:40]; 
-    assign mac_header[1]  = DEST_MAC[39:32]; 
-    assign mac_header[2]  = DEST_MAC[31:24]; 
-    assign mac_header[3]  = DEST_MAC[23:16]; 
-    assign mac_header[4]  = DEST_MAC[15:8];  
-    assign mac_header[5]  = DEST_MAC[7:0];   
-    assign mac_header[6]  = SRC_MAC[47:40];  
-    assign mac_header[7]  = SRC_MAC[39:32];  
-    assign mac_header[8]  = SRC_MAC[31:24];  
-    assign mac_header[9]  = SRC_MAC[23:16];  
-    assign mac_header[10] = SRC_MAC[15:8];  
-    assign mac_header[11] = SRC_MAC[7:0];   
-    assign mac_header[12] = ETHER_TYPE[15:8]; 
-    assign mac_header[13] = ETHER_TYPE[7:0];  
-    
-    integer i, j;
-    
+    assign mac_header[0]  = DEST_MAC[47:40];
+    assign mac_header[1]  = DEST_MAC[39:32];
+    assign mac_header[2]  = DEST_MAC[31:24];
+    assign mac_header[3]  = DEST_MAC[23:16];
+    assign mac_header[4]  = DEST_MAC[15:8];
+    assign mac_header[5]  = DEST_MAC[7:0];
+    assign mac_header[6]  = SRC_MAC[47:40];
+    assign mac_header[7]  = SRC_MAC[39:32];
+    assign mac_header[8]  = SRC_MAC[31:24];
+    assign mac_header[9]  = SRC_MAC[23:16];
+    assign mac_header[10] = SRC_MAC[15:8];
+    assign mac_header[11] = SRC_MAC[7:0];
+    assign mac_header[12] = ETHER_TYPE[15:8];
+    assign mac_header[13] = ETHER_TYPE[7:0];
+
+    wire [8*HEADER_SIZE-1:0] header_data = {
+        8'h00, 8'h00,
+        mac_header[13], mac_header[12], mac_header[11], mac_header[10],
+        mac_header[9], mac_header[8], mac_header[7], mac_header[6],
+        mac_header[5], mac_header[4], mac_header[3], mac_header[2],
+        mac_header[1], mac_header[0]
+    };
+
+    integer i;
+
+    always @(*) begin
+        in_bytes = 0;
+        for (i = 0; i < AXIS_DATA_BYTES; i = i + 1) begin
+            if (in_slave_tx_tkeep[i]) begin
+                in_bytes = i[LANE_WIDTH-1:0] + 1'b1;
+            end
+        end
+    end
+
+    always @(*) begin
+        for (i = 0; i < AXIS_DATA_BYTES; i = i + 1) begin
+            fifo_tdata_masked[8*i+:8] = (i < fifo_bytes) ? fifo_tdata[8*i+:8] : 8'h00;
+        end
+    end
+
+    // the last data word of a frame, bytes_left of which are frame data
+    wire [15:0] bytes_left = MIN_DATA_SIZE - data_count;
+    wire pad_after = bytes_left > WORD_BYTES && !bytes_left[15];
+
+    function [XGMII_DATA_BYTES-1:0] keep_mask(input [LANE_WIDTH-1:0] bytes);
+        keep_mask = ~({XGMII_DATA_BYTES{1'b1}} << bytes);
+    endfunction
+
+    // Bytes from the start of the last data word (gen_*) to the next /S/,
+    // on the XGMII side of the lane offset. Next frame's /S/ word follows
+    // start_gap/XGMII_DATA_BYTES - 1 idle words and starts on lane
+    // start_gap % XGMII_DATA_BYTES.
+    wire [7:0] end_pos = {{(8-LANE_WIDTH){1'b0}}, gen_bytes} + {{(8-LANE_WIDTH){1'b0}}, frame_offset} + END_GAP;
+    // idle bytes the gap is over a START_ALIGN lane, and the deficit if
+    // they were taken off
+    wire [2:0] deficit_sum = {1'b0, deficit_idle_count} + {1'b0, end_pos[1:0]};
+    wire gap_round_down = deficit_sum < 3'd4;
+    wire [7:0] start_gap = gap_round_down ? end_pos & ~(START_ALIGN - 8'd1)
+                                          : (end_pos + START_ALIGN - 8'd1) & ~(START_ALIGN - 8'd1);
+    wire [7:0] start_words = start_gap >> WORD_SHIFT;
+
+    // The FIFO is first word fall through: fifo_rd_data is the next
+    // payload word whenever the FIFO is not empty, and reading takes it.
+    // A stored frame is all in the FIFO, only a frame started before its
+    // tlast beat can run out of payload words.
+    wire underrun_abort = advance && current_state == PAYLOAD_STATE && fifo_empty;
+    wire drop_read = drop_frame && !fifo_empty;
+
+    assign fifo_rd_en = drop_read || (advance && current_state == PAYLOAD_STATE && !fifo_empty);
+    // nothing can be written into a full FIFO, so no frame is stored in
+    // the clock a frame is started this way
+    wire full_start = !CUT_THROUGH && fifo_full && fifo_frames == 0;
+    wire frame_ready = (fifo_frames != 0 || full_start) && !drop_frame;
+    wire frame_start = advance && current_state == IDLE_STATE && frame_ready;
+    wire frame_taken = frame_start && !full_start;
+    wire frame_stored = fifo_wr_en && (CUT_THROUGH ? !in_frame : in_slave_tx_tlast && !started_full);
+
     // Write data to FIFO, aka receive from AXIS
     always @(posedge tx_clk) begin
-        if (!tx_rst) begin 
-            fifo_wr_en <= 1'b0;
-            fifo_wr_data <= 0;
+        if (!tx_rst) begin
             payload_length <= 0;
-            pad_bytes_required <= 0;
-            compute_padding <= 0;
-        end else begin 
-            fifo_wr_en <= 1'b0;
-
-            // compute padding requirement
-            if(compute_padding) begin
-                if (payload_length < MIN_PAYLOAD_SIZE) begin
-                    pad_bytes_required <= MIN_PAYLOAD_SIZE - payload_length[7:0];
-                end else if (payload_length > MAX_PAYLOAD_SIZE) begin
-                    frame_error <= 1'b1; 
+            frame_error <= 1'b0;
+            fifo_frames <= 0;
+            in_frame <= 1'b0;
+            started_full <= 1'b0;
+        end else begin
+            frame_error <= underrun_abort;
+
+            if (fifo_wr_en) begin
+                in_frame <= !in_slave_tx_tlast;
+                if (in_slave_tx_tlast) begin
+                    if (payload_length + {{(16-LANE_WIDTH){1'b0}}, in_bytes} > MAX_PAYLOAD_SIZE) begin
+                        frame_error <= 1'b1;
+                    end
+                    payload_length <= 0;
                 end else begin
-                    pad_bytes_required <= 0;
+                    payload_length <= payload_length + {{(16-LANE_WIDTH){1'b0}}, in_bytes};
                 end
-                compute_padding <= 0;
-                payload_length <= 0;
             end
 
-            // start transmit data to FIFO
-            if (out_slave_tx_tready && in_slave_tx_tvalid) begin
-                fifo_wr_en <= 1'b1;
-                fifo_wr_data <= {in_slave_tx_tkeep, in_slave_tx_tdata};
-				
-                case(in_slave_tx_tkeep)
-                    4'b1111: payload_length <= payload_length + 4;
-                    4'b1110: payload_length <= payload_length + 3;
-                    4'b1100: payload_length <= payload_length + 2;
-                    4'b1000: payload_length <= payload_length + 1;
-                    default: payload_length <= payload_length;
-                endcase
-				
-                if (in_slave_tx_tlast) begin
-                    compute_padding <= 1;
-                end
+            if (frame_stored && !frame_taken) begin
+                fifo_frames <= fifo_frames + 1'b1;
+            end else if (frame_taken && !frame_stored) begin
+                fifo_frames <= fifo_frames - 1'b1;
+            end
+
+            if (frame_start && full_start) begin
+                started_full <= 1'b1;
+            end else if (fifo_wr_en && in_slave_tx_tlast) begin
+                started_full <= 1'b0;
             end
         end
     end
-    
+
+    // The drop of aborted frames, up to and including their tlast beat
     always @(posedge tx_clk) begin
-        if (!tx_rst) begin 
+        if (!tx_rst) begin
+            drop_frame <= 1'b0;
+        end else begin
+            if (underrun_abort) begin
+                drop_frame <= 1'b1;
+            end else if (drop_read && fifo_last) begin
+                drop_frame <= 1'b0;
+            end
+        end
+    end
+
+    // Frame words, aligned to their own /S/
+    always @(posedge tx_clk) begin
+        if (!tx_rst) begin
             current_state <= IDLE_STATE;
-            byte_counter <= 0;
-            frame_byte_count <= 0;
-            out_xgmii_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
-            out_xgmii_ctl <= {XGMII_DATA_BYTES{1'b1}};
-            fifo_rd_en <= 1'b0;
-            crc_reset <= 1'b0;
-            current_data <= 0;
-            current_keep <= 0;
-            data_valid <= 1'b0;
-            last_word <= 1'b0;
-            tlast_internal <= 0;
-            crc_reset <= 0;
-            out_xgmii_valid <= 1'b0;
-        end else begin 
-            if (in_xgmii_pcs_ready) begin
-                case (current_state)
-                    IDLE_STATE: begin
-                        out_xgmii_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
-                        out_xgmii_ctl <= {XGMII_DATA_BYTES{1'b1}};
-                        byte_counter <= 0;
-                        frame_byte_count <= 0;
-                        crc_reset <= 1'b1;
-                        data_valid <= 1'b0;
-                        fifo_rd_en <= 1'b0;
-                        out_xgmii_valid <= 1'b0;
-                        if (in_slave_tx_tvalid && out_slave_tx_tready) begin		
-                            current_state <= PREAMBLE_STATE;
-                            out_xgmii_valid <= 1'b1;
-                        end
-                    end
-                    
-                    PREAMBLE_STATE: begin
-                        case (byte_counter)
-                            0: begin
-                                out_xgmii_data <= {{3{PREAMBLE_BYTE}}, XGMII_START};
-                                out_xgmii_ctl <= 4'b0001; 
-                                byte_counter <= byte_counter + 4;
-                            end
-                            4: begin
-                                out_xgmii_data <= {SFD_BYTE, {3{PREAMBLE_BYTE}}};
-                                out_xgmii_ctl <= 4'b0000; 
-                                byte_counter <= 0;
-                                current_state <= MAC_HEADER_STATE;
-                            end
-                        endcase
+            word_count <= 0;
+            data_count <= 0;
+            ifg_count <= 0;
+            deficit_idle_count <= 0;
+            frame_offset <= 0;
+            next_offset <= 0;
+            gen_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
+            gen_ctl <= {XGMII_DATA_BYTES{1'b1}};
+            gen_keep <= 0;
+            gen_bytes <= 0;
+            gen_last <= 1'b0;
+            gen_abort <= 1'b0;
+            gen_start <= 1'b0;
+            gen_offset <= 0;
+        end else if (advance) begin
+            gen_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
+            gen_ctl <= {XGMII_DATA_BYTES{1'b1}};
+            gen_keep <= 0;
+            gen_last <= 1'b0;
+            gen_abort <= 1'b0;
+            gen_start <= 1'b0;
+
+            case (current_state)
+                IDLE_STATE: begin
+                    if (frame_ready) begin
+                        gen_data <= PREAMBLE_DATA[0+:XGMII_DATA_WIDTH];
+                        gen_ctl <= PREAMBLE_CTL[0+:XGMII_DATA_BYTES];
+                        gen_start <= 1'b1;
+                        gen_offset <= next_offset;
+                        frame_offset <= next_offset;
+                        data_count <= 0;
+                        word_count <= (PREAMBLE_WORDS > 1) ? 4'd1 : 4'd0;
+                        current_state <= (PREAMBLE_WORDS > 1) ? PREAMBLE_STATE : MAC_HEADER_STATE;
                     end
-                    
-                    MAC_HEADER_STATE: begin
-                        out_xgmii_ctl <= 4'b0000;
-                        
-                        case (byte_counter)
-                            0: begin
-                                out_xgmii_data <= {mac_header[3], mac_header[2], mac_header[1], mac_header[0]};
-                                crc_data_in <= {mac_header[3], mac_header[2], mac_header[1], mac_header[0]};
-                                crc_valid_in <= 4'b1111;
-                                byte_counter <= byte_counter + 4;
-                                frame_byte_count <= frame_byte_count + 4;
-                            end 
-                            4: begin
-                                out_xgmii_data <= {mac_header[7], mac_header[6], mac_header[5], mac_header[4]};
-                                crc_data_in <= {mac_header[7], mac_header[6], mac_header[5], mac_header[4]};
-                                crc_valid_in <= 4'b1111;
-                                byte_counter <= byte_counter + 4;
-                                frame_byte_count <= frame_byte_count + 4;
-                            end
-                            8: begin
-                                out_xgmii_data <= {mac_header[11], mac_header[10], mac_header[9], mac_header[8]};
-                                crc_data_in <= {mac_header[11], mac_header[10], mac_header[9], mac_header[8]};
-                                crc_valid_in <= 4'b1111;
-                                byte_counter <= byte_counter + 4;
-                                frame_byte_count <= frame_byte_count + 4;
-                                
-                                if(!fifo_empty) begin
-                                    fifo_rd_en <= 1'b1;
-                                end
-                            end
-                            12: begin
-                                out_xgmii_data <= {8'h00, 8'h00,  mac_header[13], mac_header[12]};
-                                crc_data_in <= {8'h00, 8'h00,  mac_header[13], mac_header[12]};
-                                crc_valid_in <= 4'b0011;
-                                byte_counter <= 0;
-                                frame_byte_count <= frame_byte_count + 2;
-                                
-                                if (fifo_rd_en) begin 			
-                                    fifo_rd_en <= !fifo_empty;
-                                    current_state <= PAYLOAD_STATE;
-                                    data_valid <= 1'b1;
-                                end
-                            end
-                        endcase
+                end
+
+                PREAMBLE_STATE: begin
+                    gen_data <= PREAMBLE_DATA[XGMII_DATA_WIDTH*word_count+:XGMII_DATA_WIDTH];
+                    gen_ctl <= PREAMBLE_CTL[XGMII_DATA_BYTES*word_count+:XGMII_DATA_BYTES];
+                    if (word_count == LAST_PREAMBLE_WORD) begin
+                        word_count <= 0;
+                        current_state <= MAC_HEADER_STATE;
+                    end else begin
+                        word_count <= word_count + 1'b1;
                     end
-                    
-                    PAYLOAD_STATE: begin
-                        out_xgmii_ctl <= 4'b0000;
-                        if(in_slave_tx_tlast) begin
-                            tlast_internal <= 1;
-                        end
-                        if (data_valid) begin
-                            out_xgmii_data <= fifo_tdata;
-                            crc_data_in <= fifo_tdata;
-                            crc_valid_in <= fifo_tkeep;
-                               
-                            if (!fifo_empty) begin
-                                fifo_rd_en <= 1'b1;
-							end else begin
-							    fifo_rd_en <= 1'b0; 
-							    data_valid <= 1'b0; 
-                                if (pad_bytes_required > 0) begin
-                                    current_state <= PAD_STATE;
-                                end else begin
-                                    current_state <= FCS_STATE;
-                                end
-							end
-                        end
-                        frame_byte_count <= frame_byte_count + 4;
+                end
+
+                MAC_HEADER_STATE: begin
+                    gen_data <= header_data[XGMII_DATA_WIDTH*word_count+:XGMII_DATA_WIDTH];
+                    gen_ctl <= 0;
+                    gen_keep <= {XGMII_DATA_BYTES{1'b1}};
+                    data_count <= data_count + WORD_BYTES;
+                    if (word_count == LAST_HEADER_WORD) begin
+                        word_count <= 0;
+                        current_state <= PAYLOAD_STATE;
+                    end else begin
+                        word_count <= word_count + 1'b1;
                     end
-                    
-                    PAD_STATE: begin
-                        out_xgmii_ctl <= 4'b0000;
-                        out_xgmii_data <= 32'h00000000;
-                        crc_data_in <= 32'h00000000;
-                        tlast_internal <= 0;
-                        crc_reset <= 1'b1;
-                        if (byte_counter + 4 >= pad_bytes_required) begin
-                            case (pad_bytes_required - byte_counter)
-                                1: crc_valid_in <= 4'b0001;
-                                2: crc_valid_in <= 4'b0011;
-                                3: crc_valid_in <= 4'b0111;
-                                default: crc_valid_in <= 4'b1111;
-                            endcase
-                            current_state <= FCS_STATE;
-                            byte_counter <= 0;
+                end
+
+                PAYLOAD_STATE: begin
+                    gen_data <= fifo_tdata_masked;
+                    gen_ctl <= 0;
+                    gen_keep <= {XGMII_DATA_BYTES{1'b1}};
+                    data_count <= data_count + WORD_BYTES;
+                    if (underrun_abort) begin
+                        // an empty last word, d1_* puts /E/ where the FCS goes
+                        gen_data <= 0;
+                        gen_keep <= 0;
+                        gen_bytes <= 0;
+                        gen_last <= 1'b1;
+                        gen_abort <= 1'b1;
+                        current_state <= IFG_STATE;
+                    end else if (fifo_last) begin
+                        if (pad_after) begin
+                            current_state <= PAD_STATE;
                         end else begin
-                            crc_valid_in <= 4'b1111;
-                            byte_counter <= byte_counter + 4;
+                            // short payloads are padded within the last word
+                            if (bytes_left[15] || bytes_left[LANE_WIDTH-1:0] < fifo_bytes) begin
+                                gen_bytes <= fifo_bytes;
+                                gen_keep <= keep_mask(fifo_bytes);
+                            end else begin
+                                gen_bytes <= bytes_left[LANE_WIDTH-1:0];
+                                gen_keep <= keep_mask(bytes_left[LANE_WIDTH-1:0]);
+                            end
+                            gen_last <= 1'b1;
+                            current_state <= IFG_STATE;
                         end
-                        frame_byte_count <= frame_byte_count + 4;
                     end
-                    
-                    FCS_STATE: begin
-                        out_xgmii_data <= {crc_out[7:0], crc_out[15:8], crc_out[23:16], crc_out[31:24]};		
-                        out_xgmii_ctl <= 4'b0000;
-                        byte_counter <= 0;
-                        frame_byte_count <= frame_byte_count + 4;
-                        current_state <= TERMINATE_STATE;
-                        crc_valid_in <= 4'b0000;
-                        tlast_internal <= 0;
-                        crc_reset <= 1'b1;
+                end
+
+                PAD_STATE: begin
+                    gen_data <= 0;
+                    gen_ctl <= 0;
+                    gen_keep <= {XGMII_DATA_BYTES{1'b1}};
+                    data_count <= data_count + WORD_BYTES;
+                    if (!pad_after) begin
+                        gen_bytes <= bytes_left[LANE_WIDTH-1:0];
+                        gen_keep <= keep_mask(bytes_left[LANE_WIDTH-1:0]);
+                        gen_last <= 1'b1;
+                        current_state <= IFG_STATE;
                     end
-                    
-					TERMINATE_STATE: begin
-						out_xgmii_data <= {{3{XGMII_IDLE}}, XGMII_TERMINATE};
-						out_xgmii_ctl <= 4'b1111;
-						frame_valid <= 1'b1;
-						current_state <= IFG_STATE;
-                        crc_reset <= 1'b0;
-                        out_xgmii_valid <= 1'b0;
-					end
-					
-                    IFG_STATE: begin
-                        out_xgmii_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
-                        out_xgmii_ctl <= {XGMII_DATA_BYTES{1'b1}};
-                        
-                        if (byte_counter >= IFG_SIZE - 4) begin
+                end
+
+                IFG_STATE: begin
+                    // entered with the last data word in gen_*, which is
+                    // followed by start_words - 1 idle words
+                    if (gen_last) begin
+                        next_offset <= {1'b0, start_gap[LANE_WIDTH-2:0]};
+                        deficit_idle_count <= deficit_sum[1:0];
+                        if (start_words <= 8'd2) begin
                             current_state <= IDLE_STATE;
-                            byte_counter <= 0;
                         end else begin
-                            byte_counter <= byte_counter + 4;
+                            ifg_count <= start_words - 8'd3;
                         end
-                    end
-                    
-                    ERROR_STATE: begin
-                        out_xgmii_data <= {{3{XGMII_IDLE}}, XGMII_ERROR};
-                        out_xgmii_ctl <= 4'b1001;
-                    end
-                    
-                    default: 
+                    end else if (ifg_count == 0) begin
                         current_state <= IDLE_STATE;
-                endcase
-            end 
+                    end else begin
+                        ifg_count <= ifg_count - 1'b1;
+                    end
+                end
+
+                default:
+                    current_state <= IDLE_STATE;
+            endcase
         end
-    end 
-    
-    // 4 tkeep bits + 32 tdata bits
-    fifo_generator_0 fifo (
+    end
+
+    // The last data word with FCS, /T/ and idles appended, three words wide
+    reg [3*XGMII_DATA_WIDTH-1:0] end_data;
+    reg [3*XGMII_DATA_BYTES-1:0] end_ctl;
+    // words after the last data word that hold FCS bytes or /T/
+    wire [7:0] term_pos = {{(8-LANE_WIDTH){1'b0}}, d1_bytes} + FCS_LENGTH;
+    wire [7:0] end_words = term_pos >> WORD_SHIFT;
+
+    // a new lane offset takes effect with the /S/ word, the lanes in front
+    // of it are idle either way
+    wire [LANE_WIDTH-1:0] lane_offset = d1_start ? d1_offset : out_offset;
+    wire [LANE_WIDTH-1:0] lane_shift = WORD_LANES - lane_offset;
+    wire [2*XGMII_DATA_WIDTH-1:0] shifted_data = {merged_data, prev_data} >> (8*lane_shift);
+    wire [2*XGMII_DATA_BYTES-1:0] shifted_ctl = {merged_ctl, prev_ctl} >> lane_shift;
+
+    // an aborted frame has /E/ control characters instead of an FCS
+    wire [31:0] fcs_data = d1_abort ? {4{XGMII_ERROR}} : crc_out;
+    wire [7:0] ctl_start = {{(8-LANE_WIDTH){1'b0}}, d1_bytes} + (d1_abort ? 8'd0 : FCS_LENGTH);
+
+    always @(*) begin
+        end_data = {{(2*XGMII_DATA_WIDTH){1'b0}}, d1_data}
+                 | ({{(3*XGMII_DATA_WIDTH-32){1'b0}}, fcs_data} << (8*d1_bytes))
+                 | ({{(3*XGMII_DATA_WIDTH-8){1'b0}}, XGMII_TERMINATE} << (8*(d1_bytes + FCS_SIZE)))
+                 | ({(3*XGMII_DATA_BYTES){XGMII_IDLE}} << (8*(d1_bytes + FCS_SIZE + 1)));
+        end_ctl = {(3*XGMII_DATA_BYTES){1'b1}} << ctl_start;
+
+        if (d1_last) begin
+            merged_data = end_data[0+:XGMII_DATA_WIDTH];
+            merged_ctl = end_ctl[0+:XGMII_DATA_BYTES];
+        end else if (spill_words != 0) begin
+            merged_data = spill_data[0+:XGMII_DATA_WIDTH];
+            merged_ctl = spill_ctl[0+:XGMII_DATA_BYTES];
+        end else begin
+            merged_data = d1_data;
+            merged_ctl = d1_ctl;
+        end
+    end
+
+    always @(posedge tx_clk) begin
+        if (!tx_rst) begin
+            d1_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
+            d1_ctl <= {XGMII_DATA_BYTES{1'b1}};
+            d1_bytes <= 0;
+            d1_last <= 1'b0;
+            d1_abort <= 1'b0;
+            d1_start <= 1'b0;
+            d1_offset <= 0;
+            d1_length <= 0;
+            spill_data <= 0;
+            spill_ctl <= 0;
+            spill_words <= 0;
+            prev_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
+            prev_ctl <= {XGMII_DATA_BYTES{1'b1}};
+            out_offset <= 0;
+            out_xgmii_data <= {XGMII_DATA_BYTES{XGMII_IDLE}};
+            out_xgmii_ctl <= {XGMII_DATA_BYTES{1'b1}};
+            out_xgmii_valid <= 1'b0;
+            frame_valid <= 1'b0;
+        end else begin
+            frame_valid <= 1'b0;
+            if (advance) begin
+                // XGMII is a continuous stream, idles included
+                out_xgmii_valid <= 1'b1;
+
+                d1_data <= gen_data;
+                d1_ctl <= gen_ctl;
+                d1_bytes <= gen_bytes;
+                d1_last <= gen_last;
+                d1_abort <= gen_abort;
+                d1_start <= gen_start;
+                d1_offset <= gen_offset;
+                // data_count already takes in all of gen_data
+                d1_length <= data_count - WORD_BYTES + {{(16-LANE_WIDTH){1'b0}}, gen_bytes};
+
+                if (d1_last) begin
+                    spill_data <= end_data[XGMII_DATA_WIDTH+:2*XGMII_DATA_WIDTH];
+                    spill_ctl <= end_ctl[XGMII_DATA_BYTES+:2*XGMII_DATA_BYTES];
+                    spill_words <= end_words[1:0];
+                    frame_valid <= !d1_abort;
+                end else if (spill_words != 0) begin
+                    spill_data <= spill_data >> XGMII_DATA_WIDTH;
+                    spill_ctl <= spill_ctl >> XGMII_DATA_BYTES;
+                    spill_words <= spill_words - 1'b1;
+                end
+
+                prev_data <= merged_data;
+                prev_ctl <= merged_ctl;
+                out_offset <= lane_offset;
+                out_xgmii_data <= shifted_data[XGMII_DATA_WIDTH-1:0];
+                out_xgmii_ctl <= shifted_ctl[XGMII_DATA_BYTES-1:0];
+            end
+        end
+    end
+
+    sync_fifo #(
+        .DATA_WIDTH(FIFO_DATA_WIDTH),
+        .ADDR_WIDTH(FIFO_ADDR_WIDTH),
+        .FWFT(1)
+    ) fifo (
         .clk(tx_clk),
-        .srst(!tx_rst),
-        .din(fifo_wr_data),
+        .rst(tx_rst),
         .wr_en(fifo_wr_en),
-        .dout(fifo_rd_data),
+        .wr_data(fifo_wr_data),
         .rd_en(fifo_rd_en),
+        .rd_data(fifo_rd_data),
+        .empty(fifo_empty),
         .full(fifo_full),
-        .empty(fifo_empty)
+        .almost_empty(),
+        .almost_full(),
+        .occupancy()
     );
-    
+
+
     crc32 #(
-        .SLICE_LENGTH(4),
-        .INITIAL_CRC(32'hFFFFFFFF),    
-        .INVERT_OUTPUT(1),             
-        .REGISTER_OUTPUT(0)           
+        .SLICE_LENGTH(XGMII_DATA_BYTES),
+        .INITIAL_CRC(32'hFFFFFFFF),
+        .INVERT_OUTPUT(1),
+        .REGISTER_OUTPUT(1)
     ) crc (
         .clk(tx_clk),
-        .rst(crc_reset),
-        .in_data(crc_data_in),
-        .in_valid(crc_valid_in),
+        .rst(tx_rst),
+        .in_data(gen_data),
+        .in_valid(advance ? gen_keep : {XGMII_DATA_BYTES{1'b0}}),
         .out_crc(crc_out),
-        .in_crc_reset(crc_reset)
+        .in_crc_reset(advance && gen_start)
     );
-    
-endmodule
\ No newline at end of file
+
+    mac_stats #(
+        .MIN_FRAME_SIZE(MIN_FRAME_SIZE),
+        .MAX_FRAME_SIZE(MAX_FRAME_SIZE)
+    ) stats (
+        .clk(tx_clk),
+        .rst(tx_rst),
+        .in_frame(advance && d1_last),
+        .in_length(d1_abort ? d1_length : d1_length + FCS_SIZE),
+        .in_aborted(d1_abort),
+        .in_crc_error(1'b0),
+        .snapshot(stats_snapshot),
+        .clear(stats_clear),
+        .read_addr(stats_read_addr),
+        .read_data(stats_read_data)
+    );
+
+
+endmodule
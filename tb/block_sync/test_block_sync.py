@@ -0,0 +1,189 @@
+"""
+block_sync tests: clause 49 block lock on an unaligned 66-bit stream.
+
+    make [LOCK_TRIALS=32] [SEED=1]
+
+test_lock_acquisition starts from LOCK_TRIALS random bit offsets and logs
+the distribution of the cycles to block_lock.
+"""
+import os
+import random
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+
+from common.encoder_ref import SYNC_CTRL, SYNC_DATA
+from common.latency import LatencyHistogram
+
+LOCK_TRIALS = int(os.environ.get("LOCK_TRIALS", "32"))
+SEED = int(os.environ.get("SEED", "1"))
+
+BLOCK_BITS = 66
+# 64 valid headers, plus slips from the worst offset with a wide margin
+MAX_LOCK_CYCLES = 64 + 8 * BLOCK_BITS
+# headers checked after lock
+CHECK_BLOCKS = 200
+
+
+def random_blocks(rng, num_blocks, bad_every=0):
+    """
+    66-bit blocks as ints, sync header in bits [1:0] and the first on the
+    line. With bad_every=n every nth block has an invalid header.
+    """
+    blocks = []
+    for i in range(num_blocks):
+        header = rng.choice([SYNC_DATA, SYNC_CTRL])
+        if bad_every and i % bad_every == bad_every - 1:
+            header = rng.choice([0b00, 0b11])
+        blocks.append(header | rng.getrandbits(64) << 2)
+    return blocks
+
+
+def line_words(blocks, offset):
+    """The blocks as a bit stream, the first offset bits dropped, cut into 66-bit words."""
+    stream = 0
+    for i, block in enumerate(blocks):
+        stream |= block << (BLOCK_BITS * i)
+    stream >>= offset
+    num_words = (BLOCK_BITS * len(blocks) - offset) // BLOCK_BITS
+    mask = (1 << BLOCK_BITS) - 1
+    return [(stream >> (BLOCK_BITS * i)) & mask for i in range(num_words)]
+
+
+class BlockSyncTestbench:
+    def __init__(self, dut):
+        self.dut = dut
+        # per word driven: block_lock and the aligned block out, if any,
+        # as seen after the clock that took the word in
+        self.locks = []
+        self.blocks = []
+
+    async def reset(self):
+        self.dut.rst.value = 0
+        self.dut.in_data.value = 0
+        self.dut.in_valid.value = 0
+
+        await ClockCycles(self.dut.clk, 5)
+        self.dut.rst.value = 1
+        await ClockCycles(self.dut.clk, 5)
+
+    async def send_words(self, words):
+        dut = self.dut
+        self.locks = []
+        self.blocks = []
+        for word in words:
+            await RisingEdge(dut.clk)
+            dut.in_data.value = word
+            dut.in_valid.value = 1
+            await ReadOnly()
+            self.sample()
+        await RisingEdge(dut.clk)
+        dut.in_valid.value = 0
+        await ReadOnly()
+        self.sample()
+        await RisingEdge(dut.clk)
+
+    def sample(self):
+        dut = self.dut
+        self.locks.append(int(dut.block_lock.value))
+        if int(dut.out_valid.value):
+            self.blocks.append(int(dut.out_header.value) | int(dut.out_data.value) << 2)
+        else:
+            self.blocks.append(None)
+
+    def lock_cycles(self):
+        """Words taken in until block_lock, None if it never came."""
+        # locks[i] follows word i - 1
+        return next((i for i, lock in enumerate(self.locks) if lock), None)
+
+    def check_aligned(self, blocks, start):
+        """The blocks out from word start on are consecutive blocks of the stream."""
+        out = [b for b in self.blocks[start:] if b is not None]
+        assert out, "no blocks out after lock"
+        assert out[0] in blocks, f"block {out[0]:#x} out after lock is not on a block boundary"
+        first = blocks.index(out[0])
+        expected = blocks[first : first + len(out)]
+        assert out[: len(expected)] == expected, f"blocks out of order after block {first}"
+        return len(expected)
+
+
+@cocotb.test()
+async def test_aligned(dut):
+    """An aligned stream locks on its 64th header without a slip"""
+    tb = BlockSyncTestbench(dut)
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    blocks = random_blocks(random.Random(SEED), 100)
+    await tb.send_words(line_words(blocks, 0))
+
+    cycles = tb.lock_cycles()
+    assert cycles == 64, f"block_lock after {cycles} words"
+    # an aligned word is its own block, out a clock later
+    assert tb.blocks[1:] == blocks
+
+
+@cocotb.test()
+async def test_lock_acquisition(dut):
+    """
+    Lock from LOCK_TRIALS random bit offsets, every one of 0..65 for 66 or
+    more trials: cycles to block_lock, then the blocks out must be the
+    stream's own.
+    """
+    tb = BlockSyncTestbench(dut)
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+
+    rng = random.Random(SEED)
+    offsets = list(range(BLOCK_BITS)) * (LOCK_TRIALS // BLOCK_BITS)
+    offsets += rng.sample(range(BLOCK_BITS), LOCK_TRIALS % BLOCK_BITS)
+    hist = LatencyHistogram("lock_acquisition")
+    for offset in offsets:
+        await tb.reset()
+        blocks = random_blocks(rng, MAX_LOCK_CYCLES + CHECK_BLOCKS)
+        await tb.send_words(line_words(blocks, offset))
+
+        cycles = tb.lock_cycles()
+        assert cycles is not None and cycles <= MAX_LOCK_CYCLES, f"offset {offset}: no lock in {MAX_LOCK_CYCLES} words"
+        assert all(tb.locks[cycles:]), f"offset {offset}: lost lock on a clean stream"
+        tb.check_aligned(blocks, cycles)
+        hist.add(cycles)
+
+    cycles = hist.summary()["cycles"]
+    dut._log.info(f"words to block_lock from {hist.count} offsets: " + ", ".join(f"{k}={v}" for k, v in cycles.items()))
+
+
+@cocotb.test()
+async def test_lock_loss(dut):
+    """
+    In lock, an invalid header in every fifth block (at most 13 of 64) is
+    tolerated, one in every fourth (16 of any 64) drops lock. Clean blocks
+    then lock again.
+    """
+    tb = BlockSyncTestbench(dut)
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    rng = random.Random(SEED)
+    clean = random_blocks(rng, MAX_LOCK_CYCLES)
+    tolerated = random_blocks(rng, 640, bad_every=5)
+    too_many = random_blocks(rng, 128, bad_every=4)
+    relock = random_blocks(rng, MAX_LOCK_CYCLES)
+
+    offset = rng.randrange(BLOCK_BITS)
+    await tb.send_words(line_words(clean + tolerated + too_many + relock, offset))
+    locks = tb.locks
+
+    lock = tb.lock_cycles()
+    assert lock is not None and lock < len(clean), f"no lock on the clean blocks ({lock})"
+    bad_start = len(clean) - 1
+    assert all(locks[lock : bad_start + len(tolerated)]), "lost lock with 13 invalid headers in 64"
+    lost = next((i for i in range(bad_start + len(tolerated), len(locks)) if not locks[i]), None)
+    assert lost is not None and lost < bad_start + len(tolerated) + len(too_many), "kept lock with 16 invalid headers in 64"
+    relocked = next((i for i in range(bad_start + len(tolerated) + len(too_many), len(locks)) if locks[i]), None)
+    assert relocked is not None, "no lock again on clean blocks"
+    assert all(locks[relocked:]), "lost lock again on clean blocks"
+    dut._log.info(
+        f"lock after {lock} words, lost {lost - bad_start - len(tolerated)} words into the bad stretch, "
+        f"locked again {relocked - bad_start - len(tolerated) - len(too_many)} words into the clean one"
+    )
@@ -0,0 +1,52 @@
+module bulk_control #(
+    parameter CLOCK_PERIOD = 10,
+    // clocks to keep recording once every player is done
+    parameter DRAIN_CYCLES = 1024
+) (
+    output reg clk,
+    input rst,
+
+    input start,
+    input stim_done,
+
+    output reg run,
+    output reg dump,
+    output reg done
+);
+
+    // Clock and sequencing of a bulk wrapper. The clock is generated here
+    // so that a run needs nothing from the testbench between start and
+    // done: start loads the players and runs them, DRAIN_CYCLES after the
+    // last one is done the recorders dump and done goes high.
+
+    reg [31:0] drain_count;
+
+    initial clk = 1'b0;
+    always #(CLOCK_PERIOD / 2) clk = ~clk;
+
+    always @(posedge clk) begin
+        if (!rst) begin
+            run <= 1'b0;
+            dump <= 1'b0;
+            done <= 1'b0;
+            drain_count <= 0;
+        end else begin
+            dump <= 1'b0;
+            if (start) begin
+                run <= 1'b1;
+                done <= 1'b0;
+                drain_count <= 0;
+            end else if (run && stim_done) begin
+                drain_count <= drain_count + 1;
+                if (drain_count == DRAIN_CYCLES - 1) begin
+                    run <= 1'b0;
+                    dump <= 1'b1;
+                end
+            end
+            if (dump) begin
+                done <= 1'b1;
+            end
+        end
+    end
+
+endmodule
@@ -0,0 +1,133 @@
+module bulk_pcs #(
+    parameter DATA_WIDTH = 32,
+    parameter DEPTH = 1 << 20,
+    parameter DRAIN_CYCLES = 1024
+) (
+    output clk,
+    input rst,
+    input [8*256-1:0] bulk_dir,
+    input start,
+    input [31:0] tx_xgmii_entries,
+    output done,
+    output rx_block_lock,
+    output [31:0] rx_xgmii_count,
+    output rx_xgmii_overflow
+);
+
+    // pcs with its PHY side looped back through one register, between a
+    // bulk player and a recorder, see common/bulk.py.
+    //
+    //   tx_xgmii.hex  player: {ctl, data} per clock, like a MAC sends;
+    //                 idles when no entry is valid
+    //   rx_xgmii.hex  recorder: {ctl, data} for every word out of the
+    //                 receive path
+    //
+    // Nothing is decoded until block lock, so stimulus should start with
+    // enough idles for it. DATA_WIDTH is 32 or 64.
+
+    localparam DATA_BYTES = DATA_WIDTH / 8;
+    localparam XGMII_BITS = DATA_BYTES + DATA_WIDTH;
+    localparam PCS_DATA_WIDTH = 64;
+
+    wire run;
+    wire dump;
+
+    wire [XGMII_BITS-1:0] tx_entry;
+    wire tx_valid;
+    wire tx_done;
+
+    wire [PCS_DATA_WIDTH-1:0] tx_pcs_data;
+    wire [1:0] tx_pcs_header;
+    wire tx_pcs_valid;
+
+    reg [PCS_DATA_WIDTH-1:0] rx_pcs_data;
+    reg [1:0] rx_pcs_header;
+    reg rx_pcs_valid;
+
+    wire [DATA_WIDTH-1:0] rx_xgmii_data;
+    wire [DATA_BYTES-1:0] rx_xgmii_ctl;
+    wire rx_xgmii_valid;
+
+    bulk_control #(
+        .DRAIN_CYCLES(DRAIN_CYCLES)
+    ) control (
+        .clk(clk),
+        .rst(rst),
+        .start(start),
+        .stim_done(tx_done),
+        .run(run),
+        .dump(dump),
+        .done(done)
+    );
+
+    bulk_player #(
+        .WIDTH(XGMII_BITS),
+        .DEPTH(DEPTH),
+        .FILE("/tx_xgmii.hex")
+    ) tx_player (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .num_entries(tx_xgmii_entries),
+        .out_data(tx_entry),
+        .out_valid(tx_valid),
+        .in_ready(1'b1),
+        .done(tx_done)
+    );
+
+    // loopback, one register like a PMA would add at least
+    always @(posedge clk) begin
+        rx_pcs_data <= tx_pcs_data;
+        rx_pcs_header <= tx_pcs_header;
+        if (!rst) begin
+            rx_pcs_valid <= 1'b0;
+        end else begin
+            rx_pcs_valid <= tx_pcs_valid;
+        end
+    end
+
+    pcs #(
+        .XGMII_DATA_WIDTH(DATA_WIDTH),
+        .PCS_DATA_WIDTH(PCS_DATA_WIDTH)
+    ) dut (
+        .pcs_clk(clk),
+        .pcs_rst(rst),
+        .in_tx_xgmii_data(tx_valid ? tx_entry[DATA_WIDTH-1:0] : {DATA_BYTES{8'h07}}),
+        .in_tx_xgmii_ctl(tx_valid ? tx_entry[DATA_WIDTH+:DATA_BYTES] : {DATA_BYTES{1'b1}}),
+        // the MAC sends every clock
+        .in_tx_xgmii_valid(1'b1),
+        .out_tx_xgmii_ready(),
+        .tx_pcs_data(tx_pcs_data),
+        .tx_pcs_header(tx_pcs_header),
+        .tx_pcs_data_valid(tx_pcs_valid),
+        .tx_pcs_ready(1'b1),
+        .rx_pcs_data(rx_pcs_data),
+        .rx_pcs_header(rx_pcs_header),
+        .rx_pcs_valid(rx_pcs_valid),
+        .rx_block_lock(rx_block_lock),
+        .rx_xgmii_data(rx_xgmii_data),
+        .rx_xgmii_ctl(rx_xgmii_ctl),
+        .rx_xgmii_valid(rx_xgmii_valid),
+        .rx_xgmii_ready(1'b1)
+    );
+
+    bulk_recorder #(
+        .WIDTH(XGMII_BITS),
+        .DEPTH(DEPTH),
+        .FILE("/rx_xgmii.hex")
+    ) rx_recorder (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .dump(dump),
+        .in_data({rx_xgmii_ctl, rx_xgmii_data}),
+        .in_valid(rx_xgmii_valid),
+        .count(rx_xgmii_count),
+        .overflow(rx_xgmii_overflow)
+    );
+
+endmodule
@@ -0,0 +1,51 @@
+module bulk_player #(
+    // payload bits per entry, a multiple of 4
+    parameter WIDTH = 36,
+    parameter DEPTH = 1 << 20,
+    // file name under bulk_dir
+    parameter FILE = "/player.hex"
+) (
+    input clk,
+    input rst,
+    input [8*256-1:0] bulk_dir,
+
+    // load the image and play it from entry 0 while run is high
+    input start,
+    input run,
+    input [31:0] num_entries,
+
+    output [WIDTH-1:0] out_data,
+    output out_valid,
+    input in_ready,
+    output done
+);
+
+    // Plays a $readmemh image of num_entries entries, one hex line each:
+    // a valid nibble, then the payload. A valid entry is held on
+    // out_data until in_ready takes it, an entry with valid 0 is one
+    // clock without out_valid. For per-clock inputs that are not
+    // handshaked tie in_ready high, then entry n is clock n.
+
+    reg [WIDTH+3:0] mem [0:DEPTH-1];
+    reg [31:0] ptr;
+
+    wire [WIDTH+3:0] entry = mem[ptr[$clog2(DEPTH)-1:0]];
+
+    assign done = ptr >= num_entries;
+    assign out_valid = run && !done && entry[WIDTH];
+    assign out_data = entry[WIDTH-1:0];
+
+    always @(posedge clk) begin
+        if (!rst) begin
+            ptr <= 0;
+        end else if (start) begin
+            if (num_entries != 0) begin
+                $readmemh({bulk_dir, FILE}, mem, 0, num_entries - 1);
+            end
+            ptr <= 0;
+        end else if (run && !done && (!entry[WIDTH] || in_ready)) begin
+            ptr <= ptr + 1;
+        end
+    end
+
+endmodule
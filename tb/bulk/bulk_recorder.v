@@ -0,0 +1,54 @@
+module bulk_recorder #(
+    // bits per entry, a multiple of 4
+    parameter WIDTH = 36,
+    parameter DEPTH = 1 << 20,
+    // file name under bulk_dir
+    parameter FILE = "/recorder.hex"
+) (
+    input clk,
+    input rst,
+    input [8*256-1:0] bulk_dir,
+
+    // start clears the memory, in_data is recorded while run is high,
+    // dump writes what was recorded
+    input start,
+    input run,
+    input dump,
+
+    input [WIDTH-1:0] in_data,
+    input in_valid,
+
+    output reg [31:0] count,
+    output reg overflow
+);
+
+    // Records in_data on every clock with in_valid into a memory that
+    // dump writes out with $writememh, one hex line per entry. Entries
+    // past DEPTH are dropped and set overflow. Nothing is written when
+    // nothing was recorded; count says how many lines to read.
+
+    reg [WIDTH-1:0] mem [0:DEPTH-1];
+
+    always @(posedge clk) begin
+        if (!rst) begin
+            count <= 0;
+            overflow <= 1'b0;
+        end else if (start) begin
+            count <= 0;
+            overflow <= 1'b0;
+        end else begin
+            if (run && in_valid) begin
+                if (count < DEPTH) begin
+                    mem[count[$clog2(DEPTH)-1:0]] <= in_data;
+                    count <= count + 1;
+                end else begin
+                    overflow <= 1'b1;
+                end
+            end
+            if (dump && count != 0) begin
+                $writememh({bulk_dir, FILE}, mem, 0, count - 1);
+            end
+        end
+    end
+
+endmodule
@@ -0,0 +1,166 @@
+module bulk_rx_mac #(
+    parameter DATA_WIDTH = 32,
+    parameter DEPTH = 1 << 20,
+    parameter DRAIN_CYCLES = 1024
+) (
+    output clk,
+    input rst,
+    input [8*256-1:0] bulk_dir,
+    input start,
+    input [31:0] xgmii_entries,
+    input [31:0] ready_entries,
+    output done,
+    output [31:0] axis_count,
+    output axis_overflow,
+    output [31:0] status_count,
+    output status_overflow
+);
+
+    // rx_mac between bulk players and recorders, see common/bulk.py.
+    //
+    //   xgmii.hex   player: {ctl, data} per word, held while rx_mac is
+    //               not ready; idles when no entry is valid
+    //   ready.hex   player: in_master_rx_tready per clock, high once it
+    //               runs out
+    //   axis.hex    recorder: {last, keep, tdata} for every beat taken
+    //   status.hex  recorder: {crc_error, frame_error, frame_valid} for
+    //               every clock with a pulse on one of them
+    //
+    // The address filter keeps its defaults (promiscuous) and the
+    // statistics are not read. DATA_WIDTH is 32 or 64.
+
+    localparam DATA_BYTES = DATA_WIDTH / 8;
+    localparam XGMII_BITS = DATA_BYTES + DATA_WIDTH;
+    localparam AXIS_BITS = 4 + DATA_BYTES + DATA_WIDTH;
+
+    wire run;
+    wire dump;
+
+    wire [XGMII_BITS-1:0] xgmii_entry;
+    wire xgmii_valid;
+    wire xgmii_ready;
+    wire xgmii_done;
+
+    wire [3:0] ready_entry;
+    wire ready_valid;
+    wire ready_done;
+    wire axis_ready = ready_valid ? ready_entry[0] : 1'b1;
+
+    wire [DATA_WIDTH-1:0] axis_data;
+    wire [DATA_BYTES-1:0] axis_keep;
+    wire axis_valid;
+    wire axis_last;
+    wire frame_valid;
+    wire frame_error;
+    wire crc_error;
+
+    bulk_control #(
+        .DRAIN_CYCLES(DRAIN_CYCLES)
+    ) control (
+        .clk(clk),
+        .rst(rst),
+        .start(start),
+        .stim_done(xgmii_done && ready_done),
+        .run(run),
+        .dump(dump),
+        .done(done)
+    );
+
+    bulk_player #(
+        .WIDTH(XGMII_BITS),
+        .DEPTH(DEPTH),
+        .FILE("/xgmii.hex")
+    ) xgmii_player (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .num_entries(xgmii_entries),
+        .out_data(xgmii_entry),
+        .out_valid(xgmii_valid),
+        .in_ready(xgmii_ready),
+        .done(xgmii_done)
+    );
+
+    bulk_player #(
+        .WIDTH(4),
+        .DEPTH(DEPTH),
+        .FILE("/ready.hex")
+    ) ready_player (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .num_entries(ready_entries),
+        .out_data(ready_entry),
+        .out_valid(ready_valid),
+        .in_ready(1'b1),
+        .done(ready_done)
+    );
+
+    rx_mac #(
+        .AXIS_DATA_WIDTH(DATA_WIDTH),
+        .XGMII_DATA_WIDTH(DATA_WIDTH)
+    ) dut (
+        .rx_clk(clk),
+        .rx_rst(rst),
+        .in_xgmii_data(xgmii_valid ? xgmii_entry[DATA_WIDTH-1:0] : {DATA_BYTES{8'h07}}),
+        .in_xgmii_ctl(xgmii_valid ? xgmii_entry[DATA_WIDTH+:DATA_BYTES] : {DATA_BYTES{1'b1}}),
+        .out_xgmii_pcs_ready(xgmii_ready),
+        .out_master_rx_tdata(axis_data),
+        .out_master_rx_tkeep(axis_keep),
+        .out_master_rx_tvalid(axis_valid),
+        .out_master_rx_tlast(axis_last),
+        .in_master_rx_tready(axis_ready),
+        .frame_valid(frame_valid),
+        .frame_error(frame_error),
+        .crc_error(crc_error),
+        .config_local_mac(48'd0),
+        .config_promiscuous(1'b0),
+        .config_multicast_hash(64'd0),
+        .config_valid(1'b0),
+        .unicast_drop_count(),
+        .multicast_drop_count(),
+        .stats_snapshot(1'b0),
+        .stats_clear(1'b0),
+        .stats_read_addr(4'd0),
+        .stats_read_data()
+    );
+
+    bulk_recorder #(
+        .WIDTH(AXIS_BITS),
+        .DEPTH(DEPTH),
+        .FILE("/axis.hex")
+    ) axis_recorder (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .dump(dump),
+        .in_data({3'b000, axis_last, axis_keep, axis_data}),
+        .in_valid(axis_valid && axis_ready),
+        .count(axis_count),
+        .overflow(axis_overflow)
+    );
+
+    bulk_recorder #(
+        .WIDTH(4),
+        .DEPTH(DEPTH),
+        .FILE("/status.hex")
+    ) status_recorder (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .dump(dump),
+        .in_data({1'b0, crc_error, frame_error, frame_valid}),
+        .in_valid(crc_error || frame_error || frame_valid),
+        .count(status_count),
+        .overflow(status_overflow)
+    );
+
+endmodule
@@ -0,0 +1,142 @@
+module bulk_tx_mac #(
+    parameter DATA_WIDTH = 32,
+    parameter CUT_THROUGH = 0,
+    parameter DEPTH = 1 << 20,
+    parameter DRAIN_CYCLES = 1024
+) (
+    output clk,
+    input rst,
+    input [8*256-1:0] bulk_dir,
+    input start,
+    input [31:0] axis_entries,
+    input [31:0] ready_entries,
+    output done,
+    output [31:0] xgmii_count,
+    output xgmii_overflow
+);
+
+    // tx_mac between bulk players and a recorder, see common/bulk.py.
+    //
+    //   axis.hex   player: {last, keep, tdata}, one entry per beat or
+    //              idle clock, held until tready
+    //   ready.hex  player: in_xgmii_pcs_ready per clock, high once it
+    //              runs out
+    //   xgmii.hex  recorder: {word, frame_error, frame_valid, ctl, data}
+    //              for every clock with an XGMII word taken (word set) or
+    //              a frame_valid or frame_error pulse
+    //
+    // Every field is padded to whole hex digits; tkeep and ctl already
+    // are, DATA_WIDTH is 32 or 64.
+
+    localparam DATA_BYTES = DATA_WIDTH / 8;
+    localparam AXIS_BITS = 4 + DATA_BYTES + DATA_WIDTH;
+    localparam XGMII_BITS = 4 + DATA_BYTES + DATA_WIDTH;
+
+    wire run;
+    wire dump;
+
+    wire [AXIS_BITS-1:0] axis_entry;
+    wire axis_valid;
+    wire axis_ready;
+    wire axis_done;
+
+    wire [3:0] ready_entry;
+    wire ready_valid;
+    wire ready_done;
+    wire pcs_ready = ready_valid ? ready_entry[0] : 1'b1;
+
+    wire [DATA_WIDTH-1:0] xgmii_data;
+    wire [DATA_BYTES-1:0] xgmii_ctl;
+    wire xgmii_valid;
+    wire frame_error;
+    wire frame_valid;
+    wire xgmii_word = xgmii_valid && pcs_ready;
+
+    bulk_control #(
+        .DRAIN_CYCLES(DRAIN_CYCLES)
+    ) control (
+        .clk(clk),
+        .rst(rst),
+        .start(start),
+        .stim_done(axis_done && ready_done),
+        .run(run),
+        .dump(dump),
+        .done(done)
+    );
+
+    bulk_player #(
+        .WIDTH(AXIS_BITS),
+        .DEPTH(DEPTH),
+        .FILE("/axis.hex")
+    ) axis_player (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .num_entries(axis_entries),
+        .out_data(axis_entry),
+        .out_valid(axis_valid),
+        .in_ready(axis_ready),
+        .done(axis_done)
+    );
+
+    bulk_player #(
+        .WIDTH(4),
+        .DEPTH(DEPTH),
+        .FILE("/ready.hex")
+    ) ready_player (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .num_entries(ready_entries),
+        .out_data(ready_entry),
+        .out_valid(ready_valid),
+        .in_ready(1'b1),
+        .done(ready_done)
+    );
+
+    tx_mac #(
+        .AXIS_DATA_WIDTH(DATA_WIDTH),
+        .XGMII_DATA_WIDTH(DATA_WIDTH),
+        .CUT_THROUGH(CUT_THROUGH)
+    ) dut (
+        .tx_clk(clk),
+        .tx_rst(rst),
+        .in_slave_tx_tdata(axis_entry[DATA_WIDTH-1:0]),
+        .in_slave_tx_tkeep(axis_entry[DATA_WIDTH+:DATA_BYTES]),
+        .in_slave_tx_tvalid(axis_valid),
+        .in_slave_tx_tlast(axis_entry[AXIS_BITS-4]),
+        .out_slave_tx_tready(axis_ready),
+        .out_xgmii_data(xgmii_data),
+        .out_xgmii_ctl(xgmii_ctl),
+        .out_xgmii_valid(xgmii_valid),
+        .in_xgmii_pcs_ready(pcs_ready),
+        .frame_error(frame_error),
+        .frame_valid(frame_valid),
+        .stats_snapshot(1'b0),
+        .stats_clear(1'b0),
+        .stats_read_addr(4'd0),
+        .stats_read_data()
+    );
+
+    bulk_recorder #(
+        .WIDTH(XGMII_BITS),
+        .DEPTH(DEPTH),
+        .FILE("/xgmii.hex")
+    ) xgmii_recorder (
+        .clk(clk),
+        .rst(rst),
+        .bulk_dir(bulk_dir),
+        .start(start),
+        .run(run),
+        .dump(dump),
+        .in_data({1'b0, xgmii_word, frame_error, frame_valid, xgmii_ctl, xgmii_data}),
+        .in_valid(xgmii_word || frame_error || frame_valid),
+        .count(xgmii_count),
+        .overflow(xgmii_overflow)
+    );
+
+endmodule
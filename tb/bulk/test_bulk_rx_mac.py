@@ -0,0 +1,94 @@
+"""
+rx_mac in bulk mode: a whole run of frames from one $readmemh image.
+
+    make DUT=rx_mac [DATA_WIDTH=32] [NUM_FRAMES=2000] [SEED=1]
+
+Random frames, some with a bad FCS, go in as XGMII words with random idle
+clocks between them (and a lane 4 start now and then at 64 bits). Every
+frame must come out on AXIS without its FCS, with one status pulse:
+frame_valid, or frame_error and crc_error for a bad FCS. tready stays high,
+so the output FIFO never fills and no frame is cut short.
+"""
+import os
+import random
+
+import cocotb
+import numpy as np
+
+from common.bulk import BulkRun
+from common.codec import frame_to_xgmii, unpack_words
+from common.crc_ref import crc32
+from common.traffic import random_frames
+
+DATA_WIDTH = int(os.environ.get("DATA_WIDTH", "32"))
+NUM_FRAMES = int(os.environ.get("NUM_FRAMES", "2000"))
+SEED = int(os.environ.get("SEED", "1"))
+BAD_FCS_PROB = float(os.environ.get("BAD_FCS_PROB", "0.1"))
+
+DATA_BYTES = DATA_WIDTH // 8
+KEEP_WIDTH = -(-DATA_BYTES // 4) * 4
+
+# status recorder digit: {crc_error, frame_error, frame_valid}
+STATUS_VALID = 0b001
+STATUS_CRC_ERROR = 0b110
+
+
+def xgmii_image(frames, rng):
+    """(valid, ctl, data) entries for frames, FCS included, with idle clocks."""
+    valid, ctl, data = [], [], []
+    for frame in frames:
+        start_lane = 4 if DATA_BYTES == 8 and rng.random() < 0.5 else 0
+        words, word_ctl = frame_to_xgmii(frame, DATA_BYTES, start_lane=start_lane)
+        # valid 0 entries are idles too, see bulk_rx_mac.v
+        gap = rng.randint(0, 4)
+        valid.append(np.concatenate((np.zeros(gap, dtype=np.uint64), np.ones(len(words), dtype=np.uint64))))
+        ctl.append(np.concatenate((np.zeros(gap, dtype=np.uint64), word_ctl)))
+        data.append(np.concatenate((np.zeros(gap, dtype=np.uint64), words)))
+    return [np.concatenate(column) for column in (valid, ctl, data)]
+
+
+def axis_frames(last, keep, data):
+    """Split recorded AXIS beats into frames at tlast."""
+    stream = unpack_words(data, keep, DATA_BYTES)
+    beat_bytes = np.unpackbits(keep.astype(np.uint8)[:, None], axis=1).sum(axis=1)
+    ends = np.cumsum(beat_bytes)[np.flatnonzero(last)].tolist()
+    return [stream[begin:end] for begin, end in zip([0] + ends[:-1], ends)]
+
+
+@cocotb.test()
+async def test_random_frames(dut):
+    rng = random.Random(SEED)
+    frames = []
+    expected_status = []
+    for frame in random_frames(SEED, NUM_FRAMES, min_len=60, max_len=1514):
+        fcs = crc32(frame)
+        if rng.random() < BAD_FCS_PROB:
+            fcs ^= 1 << rng.randrange(32)
+            expected_status.append(STATUS_CRC_ERROR)
+        else:
+            expected_status.append(STATUS_VALID)
+        frames.append(frame + fcs.to_bytes(4, "little"))
+
+    run = BulkRun(dut)
+    valid, ctl, data = xgmii_image(frames, rng)
+    num_words = run.play("xgmii", [(ctl, KEEP_WIDTH), (data, DATA_WIDTH)], valid=valid)
+    dut._log.info(f"{NUM_FRAMES} frames, {num_words} XGMII entries")
+
+    await run.run(timeout_cycles=2 * num_words + 100000)
+    last, keep, axis_data = run.record("axis", [4, KEEP_WIDTH, DATA_WIDTH])
+    (status,) = run.record("status", [4])
+    run.close()
+
+    assert list(status) == expected_status, (
+        f"{len(status)} status pulses, {int((status != np.array(expected_status[: len(status)])).sum())} wrong"
+    )
+    received = axis_frames(last, keep, axis_data)
+    assert len(received) == NUM_FRAMES, f"{len(received)} AXIS frames, expected {NUM_FRAMES}"
+    errors = 0
+    for n, (got, frame) in enumerate(zip(received, frames)):
+        if got != frame[:-4]:
+            if errors < 10:
+                dut._log.error(f"frame {n}: {len(got)} bytes, expected {len(frame) - 4}")
+            errors += 1
+    assert errors == 0, f"{errors} of {NUM_FRAMES} frames wrong"
+    dut._log.info(f"{NUM_FRAMES} frames in {run.cycles} cycles")
@@ -0,0 +1,102 @@
+"""
+tx_mac in bulk mode: a whole run of frames from one $readmemh image.
+
+    make DUT=tx_mac [DATA_WIDTH=32] [CUT_THROUGH=0] [NUM_FRAMES=2000] [SEED=1]
+
+Random payloads go in as AXIS beats with idle clocks between frames (and,
+store and forward only, inside them), while in_xgmii_pcs_ready drops at
+random. Every frame on XGMII must be the preamble, the MAC header
+tx_mac adds, the payload padded to the minimum size and a correct FCS,
+and every frame must come with one frame_valid pulse.
+"""
+import os
+import random
+
+import cocotb
+import numpy as np
+
+from common.bulk import BulkRun
+from common.codec import pack_words, xgmii_frames
+from common.crc_ref import crc32_bulk
+from common.traffic import random_frames
+from common.xgmii import PREAMBLE_BYTE, SFD_BYTE
+
+DATA_WIDTH = int(os.environ.get("DATA_WIDTH", "32"))
+CUT_THROUGH = int(os.environ.get("CUT_THROUGH", "0"))
+NUM_FRAMES = int(os.environ.get("NUM_FRAMES", "2000"))
+SEED = int(os.environ.get("SEED", "1"))
+
+DATA_BYTES = DATA_WIDTH // 8
+KEEP_WIDTH = -(-DATA_BYTES // 4) * 4
+
+HEADER = bytes.fromhex("001122334455" "AABBCCDDEEFF" "0800") + bytes(2)
+# tx_mac's two alignment bytes count towards the minimum payload
+MIN_TX_PAYLOAD = 46 - 2
+MAX_TX_PAYLOAD = 1498
+PREAMBLE = bytes([PREAMBLE_BYTE] * 6 + [SFD_BYTE])
+
+# recorder flags digit
+WORD = 4
+FRAME_ERROR = 2
+FRAME_VALID = 1
+
+
+def axis_image(payloads, rng, gap_prob):
+    """(valid, last, keep, data) entries for payloads, with idle clocks."""
+    valid, last, keep, data = [], [], [], []
+    for payload in payloads:
+        words, word_keep = pack_words(payload, DATA_BYTES)
+        num = len(words)
+        # idle clocks before the frame and, with gap_prob, before its beats
+        gaps = [rng.randint(0, 8)] + [int(rng.random() < gap_prob) for _ in range(num - 1)]
+        slots = num + sum(gaps)
+        beats = np.cumsum(np.array(gaps) + 1) - 1
+        frame_valid = np.zeros(slots, dtype=np.uint64)
+        frame_valid[beats] = 1
+        frame_data = np.zeros(slots, dtype=np.uint64)
+        frame_data[beats] = words
+        frame_keep = np.zeros(slots, dtype=np.uint64)
+        frame_keep[beats] = word_keep
+        frame_last = np.zeros(slots, dtype=np.uint64)
+        frame_last[beats[-1]] = 1
+        valid.append(frame_valid)
+        last.append(frame_last)
+        keep.append(frame_keep)
+        data.append(frame_data)
+    return [np.concatenate(column) for column in (valid, last, keep, data)]
+
+
+@cocotb.test()
+async def test_random_frames(dut):
+    rng = random.Random(SEED)
+    payloads = list(random_frames(SEED, NUM_FRAMES, min_len=1, max_len=MAX_TX_PAYLOAD))
+
+    run = BulkRun(dut)
+    # an underrun aborts a cut-through frame, so no gaps inside frames there
+    valid, last, keep, data = axis_image(payloads, rng, 0.0 if CUT_THROUGH else 0.1)
+    num_beats = run.play("axis", [(last, 4), (keep, KEEP_WIDTH), (data, DATA_WIDTH)], valid=valid)
+    num_ready = run.play("ready", [(np.random.default_rng(SEED).random(num_beats) >= 0.1, 4)])
+    dut._log.info(f"{NUM_FRAMES} frames, {num_beats} AXIS entries, {num_ready} ready entries")
+
+    await run.run(timeout_cycles=4 * num_beats + 100000)
+    flags, ctl, xgmii_data = run.record("xgmii", [4, KEEP_WIDTH, DATA_WIDTH])
+    run.close()
+
+    word = (flags & WORD) != 0
+    assert not (flags & FRAME_ERROR).any(), f"{int(((flags & FRAME_ERROR) != 0).sum())} frame_error pulses"
+    num_valid = int(((flags & FRAME_VALID) != 0).sum())
+    assert num_valid == NUM_FRAMES, f"{num_valid} frame_valid pulses, expected {NUM_FRAMES}"
+
+    frames = xgmii_frames(xgmii_data[word], ctl[word], DATA_BYTES)
+    assert len(frames) == NUM_FRAMES, f"{len(frames)} frames on XGMII, expected {NUM_FRAMES}"
+
+    expected = [HEADER + payload.ljust(MIN_TX_PAYLOAD, b"\0") for payload in payloads]
+    fcs = crc32_bulk(expected)
+    errors = 0
+    for n, ((_, _, body), frame) in enumerate(zip(frames, expected)):
+        if body != PREAMBLE + frame + int(fcs[n]).to_bytes(4, "little"):
+            if errors < 10:
+                dut._log.error(f"frame {n}: {len(body)} bytes, expected {len(PREAMBLE) + len(frame) + 4}")
+            errors += 1
+    assert errors == 0, f"{errors} of {NUM_FRAMES} frames wrong"
+    dut._log.info(f"{NUM_FRAMES} frames in {run.cycles} cycles")
@@ -0,0 +1,299 @@
+import random
+from collections import deque
+
+import cocotb
+from cocotb.triggers import Event, ReadOnly, RisingEdge
+from cocotb.utils import get_sim_time
+
+from .codec import pack_words, unpack_words
+
+# Transaction-level AXI-Stream source and sink. Frames are bytes; the
+# per-beat packing goes through codec.pack_words()/unpack_words(), so
+# tdata is little-endian and tkeep LSB-aligned, as in tx_mac and rx_mac.
+#
+# Both sample the handshake in the ReadOnly phase before each rising edge,
+# which is what the DUT sees at that edge, on Icarus and Verilator alike.
+#
+# Backpressure patterns are endless iterators of bools, one value per
+# clock, True meaning tready is high. The source takes the same patterns
+# for tvalid, to starve the slave between beats.
+
+
+def always_ready():
+    while True:
+        yield True
+
+
+def random_ready(percent, seed=None):
+    """Ready on each clock with probability percent/100."""
+    rng = random.Random(seed)
+    while True:
+        yield rng.random() * 100 < percent
+
+
+def bursty_ready(on, off, seed=None):
+    """
+    Bursts of `on` ready clocks followed by `off` stalled clocks. With a
+    seed the lengths are drawn uniformly from 1..on and 1..off instead.
+    """
+    rng = random.Random(seed) if seed is not None else None
+    while True:
+        for _ in range(rng.randint(1, on) if rng else on):
+            yield True
+        for _ in range(rng.randint(1, off) if rng else off):
+            yield False
+
+
+def ready_pattern(spec, seed=None):
+    """
+    Pattern from a short spec, handy for env variables and TestFactory
+    options: "always", "random:<percent>" or "bursty:<on>:<off>".
+    """
+    name, *args = spec.split(":")
+    if name == "always":
+        return always_ready()
+    if name == "random":
+        return random_ready(float(args[0]), seed)
+    if name == "bursty":
+        return bursty_ready(int(args[0]), int(args[1]), seed)
+    raise ValueError(f"unknown ready pattern {spec!r}")
+
+
+class AxisSource:
+    """
+    Drives queued frames into an AXI-Stream slave port. Frames go out back
+    to back: once a frame is queued, tvalid stays high until the queue runs
+    dry, so the only idle beats are the ones the DUT asks for with tready.
+    A `valid` pattern (default always valid) drops tvalid on the clocks it
+    yields False, ahead of any beat; it can be swapped between frames.
+    tkeep may be None for ports without one. An optional TraceRecorder with
+    (time_ns, tdata, tkeep, tlast) fields gets every transferred beat.
+    history bounds start_times/end_times for long runs.
+    """
+
+    def __init__(
+        self,
+        clock,
+        tdata,
+        tkeep,
+        tvalid,
+        tlast,
+        tready,
+        bytes_per_word=None,
+        trace=None,
+        history=None,
+        valid=None,
+    ):
+        self.clock = clock
+        self.tdata = tdata
+        self.tkeep = tkeep
+        self.tvalid = tvalid
+        self.tlast = tlast
+        self.tready = tready
+        self.bytes_per_word = bytes_per_word or len(tdata) // 8
+        self.trace = trace
+        self.valid = valid if valid is not None else always_ready()
+
+        self.queue = deque()
+        self._wake = Event()
+        self._idle = Event()
+        self._idle.set()
+
+        self.frames_sent = 0
+        self.beats_sent = 0
+        self.bytes_sent = 0
+        self.stall_cycles = 0
+        # sim time (ns) of the edges that transferred each frame's first and
+        # last beat, for the newest `history` frames (all if None)
+        self.start_times = deque(maxlen=history)
+        self.end_times = deque(maxlen=history)
+
+        self.tvalid.value = 0
+        self.tlast.value = 0
+        self._task = cocotb.start_soon(self._run())
+
+    def send(self, frame):
+        frame = bytes(frame)
+        if not frame:
+            raise ValueError("AXI-Stream frames need at least one byte")
+        self.queue.append(frame)
+        self._idle.clear()
+        self._wake.set()
+
+    async def wait(self):
+        """Wait until every queued frame has been transferred."""
+        await self._idle.wait()
+
+    def idle(self):
+        return self._idle.is_set()
+
+    def kill(self):
+        self._task.kill()
+
+    async def _run(self):
+        bpw = self.bytes_per_word
+        while True:
+            if not self.queue:
+                self.tvalid.value = 0
+                self.tlast.value = 0
+                self._idle.set()
+                self._wake.clear()
+                await self._wake.wait()
+                await RisingEdge(self.clock)
+
+            frame = self.queue.popleft()
+            words, keeps = pack_words(frame, bpw)
+            last = len(words) - 1
+            for i, (word, keep) in enumerate(zip(words.tolist(), keeps.tolist())):
+                while not next(self.valid):
+                    self.tvalid.value = 0
+                    await RisingEdge(self.clock)
+                self.tdata.value = word
+                if self.tkeep is not None:
+                    self.tkeep.value = keep
+                self.tlast.value = int(i == last)
+                self.tvalid.value = 1
+                while True:
+                    await ReadOnly()
+                    accepted = bool(self.tready.value)
+                    await RisingEdge(self.clock)
+                    if accepted:
+                        break
+                    self.stall_cycles += 1
+                now = get_sim_time("ns")
+                if self.trace is not None:
+                    self.trace.record(now, word, keep, int(i == last))
+                if i == 0:
+                    self.start_times.append(now)
+                self.beats_sent += 1
+            self.end_times.append(now)
+            self.frames_sent += 1
+            self.bytes_sent += len(frame)
+
+
+class AxisSink:
+    """
+    Collects frames from an AXI-Stream master port into a queue of bytes.
+    tready follows `ready`, a backpressure pattern (default always ready).
+    A beat that changes or drops tvalid while stalled is an AXI-Stream
+    protocol violation and is counted in protocol_errors.
+
+    use_tkeep=False keeps every byte of every beat, for masters that do not
+    drive tkeep meaningfully. tkeep may be None for ports without one. An
+    optional TraceRecorder with (time_ns, tdata, tkeep, tlast) fields gets
+    every transferred beat. history bounds start_times/end_times for long
+    runs.
+    """
+
+    def __init__(
+        self,
+        clock,
+        tdata,
+        tkeep,
+        tvalid,
+        tlast,
+        tready,
+        ready=None,
+        bytes_per_word=None,
+        use_tkeep=True,
+        trace=None,
+        history=None,
+    ):
+        self.clock = clock
+        self.tdata = tdata
+        self.tkeep = tkeep if use_tkeep else None
+        self.tvalid = tvalid
+        self.tlast = tlast
+        self.tready = tready
+        self.ready = ready if ready is not None else always_ready()
+        self.bytes_per_word = bytes_per_word or len(tdata) // 8
+        self.trace = trace
+
+        self.queue = deque()
+        # first beat time of every frame in queue
+        self._queue_times = deque()
+        self._frame_ready = Event()
+
+        self.frames_received = 0
+        self.beats_received = 0
+        self.bytes_received = 0
+        self.stall_cycles = 0
+        self.protocol_errors = 0
+        # sim time (ns) of the edges that transferred each frame's first and
+        # last beat, for the newest `history` frames (all if None)
+        self.start_times = deque(maxlen=history)
+        self.end_times = deque(maxlen=history)
+
+        self._task = cocotb.start_soon(self._run())
+
+    async def recv(self):
+        """Next complete frame, waiting for it if need be."""
+        return (await self.recv_timed())[1]
+
+    async def recv_timed(self):
+        """Next complete frame as (sim time (ns) of its first beat, frame)."""
+        while not self.queue:
+            self._frame_ready.clear()
+            await self._frame_ready.wait()
+        return self._queue_times.popleft(), self.queue.popleft()
+
+    def empty(self):
+        return not self.queue
+
+    def kill(self):
+        self._task.kill()
+
+    async def _run(self):
+        full_keep = (1 << self.bytes_per_word) - 1
+        words = []
+        keeps = []
+        first_time = None
+        stalled = None
+
+        ready = next(self.ready)
+        self.tready.value = int(ready)
+        while True:
+            await ReadOnly()
+            valid = self.tvalid.value
+            if valid.is_resolvable and int(valid):
+                beat = (
+                    int(self.tdata.value),
+                    int(self.tkeep.value) if self.tkeep is not None else full_keep,
+                    int(self.tlast.value),
+                )
+                if stalled is not None and beat != stalled:
+                    self.protocol_errors += 1
+                stalled = None if ready else beat
+            else:
+                if stalled is not None:
+                    self.protocol_errors += 1
+                beat = stalled = None
+
+            await RisingEdge(self.clock)
+
+            if beat is not None:
+                if ready:
+                    now = get_sim_time("ns")
+                    if self.trace is not None:
+                        self.trace.record(now, *beat)
+                    if not words:
+                        self.start_times.append(now)
+                        first_time = now
+                    words.append(beat[0])
+                    keeps.append(beat[1])
+                    self.beats_received += 1
+                    if beat[2]:
+                        frame = unpack_words(words, keeps, self.bytes_per_word)
+                        words = []
+                        keeps = []
+                        self.queue.append(frame)
+                        self._queue_times.append(first_time)
+                        self.frames_received += 1
+                        self.bytes_received += len(frame)
+                        self.end_times.append(now)
+                        self._frame_ready.set()
+                else:
+                    self.stall_cycles += 1
+
+            ready = next(self.ready)
+            self.tready.value = int(ready)
@@ -0,0 +1,158 @@
+"""
+Bulk stimulus and response files for the tb/bulk wrappers.
+
+A bulk wrapper puts a DUT between bulk_player instances, which play
+$readmemh images, and bulk_recorder instances, which $writememh what came
+out. The wrapper makes its own clock, so once a run is started the
+simulator does not call into Python again until done goes high: the whole
+test is a file write, one run and a file read.
+
+Files are one hex line per entry, the fields of an entry MSB first, each
+a whole number of hex digits. A player entry starts with a valid digit
+(bulk_player.v). Fields are at most 64 bits and are converted between
+hex text and NumPy arrays without a Python loop per entry.
+
+    run = BulkRun(dut)
+    run.play("axis", [(last, 4), (keep, 4), (data, 32)], valid=valid)
+    await run.run()
+    flags, ctl, data = run.record("xgmii", [4, 4, 32])
+    run.close()
+
+play(name) writes <name>.hex and sets the wrapper's <name>_entries port,
+record(name) reads <name>.hex, <name>_count lines, and fails on
+<name>_overflow. Set BULK_KEEP=1 to keep the files after close().
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from cocotb.triggers import ClockCycles, RisingEdge, with_timeout
+from cocotb.utils import get_sim_time
+
+BULK_KEEP = int(os.environ.get("BULK_KEEP", "0"))
+
+# bulk_dir port width in bytes
+DIR_BYTES = 256
+# bulk_control.v CLOCK_PERIOD, in simulator time units (ns)
+CLOCK_PERIOD = 10
+
+_HEX_CHARS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_HEX_VALUES = np.full(256, 0xFF, dtype=np.uint8)
+_HEX_VALUES[_HEX_CHARS] = np.arange(16)
+_HEX_VALUES[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+
+
+def _digits(width):
+    assert width % 4 == 0 and 0 < width <= 64, f"field width {width}"
+    return width // 4
+
+
+def write_memh(path, columns):
+    """
+    Write (values, width) columns, MSB first, as a $readmemh image. Scalar
+    values are repeated to the length of the array columns.
+    """
+    num = max((np.size(values) for values, _ in columns if np.ndim(values)), default=1)
+    nibbles = []
+    for values, width in columns:
+        values = np.broadcast_to(np.asarray(values, dtype=np.uint64), (num,))
+        shifts = np.arange(4 * (_digits(width) - 1), -1, -4, dtype=np.uint64)
+        nibbles.append((values[:, None] >> shifts) & np.uint64(0xF))
+    text = _HEX_CHARS[np.hstack(nibbles + [np.zeros((num, 1), dtype=np.uint64)])]
+    text[:, -1] = ord("\n")
+    with open(path, "wb") as f:
+        f.write(text.tobytes())
+    return num
+
+
+def read_memh(path, widths, num_entries=None):
+    """
+    Read a $writememh file into one uint64 array per field width, MSB
+    first. Comment and address lines are skipped; num_entries, when given,
+    must match the number of entries.
+    """
+    digits = [_digits(width) for width in widths]
+    if num_entries == 0:
+        return [np.zeros(0, dtype=np.uint64) for _ in widths]
+    with open(path, "rb") as f:
+        lines = [line for line in f.read().split() if not line.startswith((b"//", b"@"))]
+    if num_entries is not None:
+        assert len(lines) == num_entries, f"{path}: {len(lines)} entries, expected {num_entries}"
+
+    line_digits = sum(digits)
+    assert all(len(line) == line_digits for line in lines), f"{path}: entries are not {line_digits} digits"
+    nibbles = _HEX_VALUES[np.frombuffer(b"".join(lines), dtype=np.uint8)].reshape(len(lines), line_digits)
+    assert not (nibbles == 0xFF).any(), f"{path}: x, z or other non-hex digits"
+
+    fields = []
+    first = 0
+    for n in digits:
+        value = np.zeros(len(lines), dtype=np.uint64)
+        for i in range(first, first + n):
+            value = (value << np.uint64(4)) | nibbles[:, i]
+        fields.append(value)
+        first += n
+    return fields
+
+
+class BulkRun:
+    def __init__(self, dut):
+        self.dut = dut
+        # a directory per run: regress.py runs the bulk wrappers in parallel
+        # from the same working directory
+        self.dir = tempfile.mkdtemp(prefix="run_", dir=os.getcwd())
+        path = self.dir.encode()
+        assert len(path) + 16 < DIR_BYTES, f"{self.dir} too long for bulk_dir"
+        self.dir_value = int.from_bytes(path, "big")
+        self.cycles = 0
+        self.seconds = 0.0
+        # players without an image play nothing
+        for handle in dut:
+            if handle._name.endswith("_entries"):
+                handle.value = 0
+
+    def path(self, name):
+        return os.path.join(self.dir, f"{name}.hex")
+
+    def play(self, name, columns, valid=1):
+        """Write the image of player name; valid 0 entries are idle clocks."""
+        num = write_memh(self.path(name), [(valid, 4)] + list(columns))
+        getattr(self.dut, f"{name}_entries").value = num
+        return num
+
+    async def run(self, timeout_cycles=None):
+        """Reset the wrapper, start it and wait for done."""
+        dut = self.dut
+        dut.bulk_dir.value = self.dir_value
+        dut.start.value = 0
+        dut.rst.value = 0
+        await ClockCycles(dut.clk, 4)
+        dut.rst.value = 1
+        await RisingEdge(dut.clk)
+
+        start_time = get_sim_time("ns")
+        wall = time.perf_counter()
+        dut.start.value = 1
+        await RisingEdge(dut.clk)
+        dut.start.value = 0
+        done = RisingEdge(dut.done)
+        if timeout_cycles is None:
+            await done
+        else:
+            await with_timeout(done, timeout_cycles * CLOCK_PERIOD, "ns")
+        self.seconds = time.perf_counter() - wall
+        self.cycles = round((get_sim_time("ns") - start_time) / CLOCK_PERIOD)
+        dut._log.info(
+            f"{self.cycles} cycles in {self.seconds:.2f} s, {self.cycles / max(self.seconds, 1e-9):.0f} cycles/s"
+        )
+
+    def record(self, name, widths):
+        """Read the file of recorder name as one array per field."""
+        assert not int(getattr(self.dut, f"{name}_overflow").value), f"{name} recorder overflow"
+        return read_memh(self.path(name), widths, int(getattr(self.dut, f"{name}_count").value))
+
+    def close(self):
+        if not BULK_KEEP:
+            shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,153 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .xgmii import (
+    IFG_SIZE,
+    PREAMBLE_BYTE,
+    SFD_BYTE,
+    XGMII_ERROR,
+    XGMII_IDLE,
+    XGMII_START,
+    XGMII_TERMINATE,
+)
+
+# Bulk conversion between frames (bytes, bytearray, memoryview or a list of
+# ints) and the word/mask arrays seen on the AXIS and XGMII ports. Words are
+# little-endian: byte/lane 0 is the LSB, as in tx_mac and rx_mac. All of the
+# work is done on NumPy views, never byte by byte in Python.
+
+_WORD_DTYPE = {1: np.dtype("<u1"), 2: np.dtype("<u2"), 4: np.dtype("<u4"), 8: np.dtype("<u8")}
+
+
+def _as_bytes(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return data
+    return bytes(data)
+
+
+def pack_words(data, bytes_per_word=4):
+    """
+    Frame -> (words, keep). The last word is zero padded and its keep mask
+    is LSB-aligned, e.g. 0x3 for two valid bytes.
+    """
+    dtype = _WORD_DTYPE[bytes_per_word]
+    buf = np.frombuffer(_as_bytes(data), dtype=np.uint8)
+    num_words = -(-len(buf) // bytes_per_word)
+
+    padded = np.zeros(num_words * bytes_per_word, dtype=np.uint8)
+    padded[: len(buf)] = buf
+    words = padded.view(dtype)
+
+    keep = np.full(num_words, (1 << bytes_per_word) - 1, dtype=np.uint16)
+    rem = len(buf) % bytes_per_word
+    if rem:
+        keep[-1] = (1 << rem) - 1
+    return words, keep
+
+
+def unpack_words(words, keep=None, bytes_per_word=4):
+    """(words, keep) -> bytes. With keep=None every byte of every word is kept."""
+    dtype = _WORD_DTYPE[bytes_per_word]
+    lanes = np.ascontiguousarray(words, dtype=dtype).view(np.uint8).reshape(-1, bytes_per_word)
+    if keep is None:
+        return lanes.tobytes()
+    mask = (np.asarray(keep, dtype=np.uint16)[:, None] >> np.arange(bytes_per_word)) & 1
+    return lanes[mask.astype(bool)].tobytes()
+
+
+def xgmii_to_lanes(data, ctl, bytes_per_word=4):
+    """XGMII (data, ctl) word arrays -> flat per-lane byte and control arrays."""
+    lanes = np.frombuffer(unpack_words(data, None, bytes_per_word), dtype=np.uint8)
+    ctl_bits = (np.asarray(ctl, dtype=np.uint16)[:, None] >> np.arange(bytes_per_word)) & 1
+    return lanes, ctl_bits.astype(bool).reshape(-1)
+
+
+def lanes_to_xgmii(lanes, ctl, bytes_per_word=4):
+    """Inverse of xgmii_to_lanes(); the lane count must fill whole words."""
+    data, _ = pack_words(np.asarray(lanes, dtype=np.uint8).tobytes(), bytes_per_word)
+    weights = 1 << np.arange(bytes_per_word, dtype=np.uint16)
+    ctl_words = (np.asarray(ctl, dtype=np.uint16).reshape(-1, bytes_per_word) * weights).sum(axis=1)
+    return data, ctl_words.astype(np.uint16)
+
+
+def frame_to_xgmii(frame, bytes_per_word=4, ifg=IFG_SIZE, sfd=SFD_BYTE, error_at=None, start_lane=0):
+    """
+    One frame (the bytes between SFD and /T/, FCS included) as XGMII (data,
+    ctl) word arrays: start_lane idles, /S/, preamble, sfd, frame, /T/, then
+    at least ifg idles up to a whole word, the same layout as
+    xgmii.xgmii_lanes(). start_lane=4 gives the lane 4 start of 8 byte
+    words. error_at replaces that byte of the frame with an /E/ control
+    character.
+    """
+    body = np.frombuffer(_as_bytes(frame), dtype=np.uint8)
+    begin = start_lane
+    end = begin + 8 + len(body)
+    total = end + 1 + ifg
+    total += -total % bytes_per_word
+
+    lanes = np.full(total, XGMII_IDLE, dtype=np.uint8)
+    ctl = np.ones(total, dtype=bool)
+    lanes[begin] = XGMII_START
+    lanes[begin + 1 : begin + 7] = PREAMBLE_BYTE
+    lanes[begin + 7] = sfd
+    lanes[begin + 8 : end] = body
+    ctl[begin + 1 : end] = False
+    lanes[end] = XGMII_TERMINATE
+    if error_at is not None:
+        lanes[begin + 8 + error_at] = XGMII_ERROR
+        ctl[begin + 8 + error_at] = True
+    return lanes_to_xgmii(lanes, ctl, bytes_per_word)
+
+
+def extract_xgmii_frame(data, ctl, bytes_per_word=4):
+    """
+    Data lanes between the first /S/ and the following /T/ (preamble, SFD,
+    frame and FCS), or None if there is no /S/. A missing /T/ returns
+    everything after /S/.
+    """
+    lanes, is_ctl = xgmii_to_lanes(data, ctl, bytes_per_word)
+    starts = np.flatnonzero(is_ctl & (lanes == XGMII_START))
+    if not len(starts):
+        return None
+
+    start = starts[0] + 1
+    terms = np.flatnonzero(is_ctl[start:] & (lanes[start:] == XGMII_TERMINATE))
+    end = start + terms[0] if len(terms) else len(lanes)
+    return lanes[start:end][~is_ctl[start:end]].tobytes()
+
+
+@lru_cache(maxsize=4096)
+def find_control(data, ctl, char, bytes_per_word=4):
+    """
+    Lane of the first control character char in one XGMII word, or -1. The
+    handful of distinct idle/start/terminate words hit the cache, so this
+    is cheap enough to call every clock.
+    """
+    if not ctl:
+        return -1
+    for lane in range(bytes_per_word):
+        if (ctl >> lane) & 1 and ((data >> (8 * lane)) & 0xFF) == char:
+            return lane
+    return -1
+
+
+def xgmii_frames(data, ctl, bytes_per_word=4):
+    """
+    Every frame of an XGMII word stream that ends in /T/, as (start, term,
+    frame) with the flat lane indexes of /S/ and /T/ and the data lanes in
+    between (preamble, SFD, frame and FCS). start % bytes_per_word is the
+    start lane, the next start minus term the inter-packet gap.
+    """
+    lanes, is_ctl = xgmii_to_lanes(data, ctl, bytes_per_word)
+    starts = np.flatnonzero(is_ctl & (lanes == XGMII_START))
+    terms = np.flatnonzero(is_ctl & (lanes == XGMII_TERMINATE))
+    frames = []
+    for start in starts:
+        later = terms[np.searchsorted(terms, start) :]
+        if not len(later):
+            break
+        term = later[0]
+        body = slice(start + 1, term)
+        frames.append((int(start), int(term), lanes[body][~is_ctl[body]].tobytes()))
+    return frames
@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+
+# Table-driven CRC32 reference that mirrors src/crc32.v. It reads the same
+# slicing tables from src/crc_tables.mem, so a stale or wrong table file
+# shows up in software as well as in the RTL.
+#
+# Per clock the RTL takes SLICE_LENGTH bytes and an in_valid mask:
+#   n        = index of the highest valid byte + 1
+#   lookup_i = in_data[i] ^ prev_crc[i]       (i < 4, else in_data[i])
+#   crc_calc = XOR(valid i) tables[n - i - 1][lookup_i] ^ (prev_crc >> 8n)
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src")
+CRC_TABLES_MEM = os.path.normpath(os.path.join(SRC_DIR, "crc_tables.mem"))
+
+CRC_MASK = 0xFFFFFFFF
+
+# crc32() of any frame followed by its own correct FCS
+CRC_RESIDUE = 0x2144DF1C
+
+_tables_cache = {}
+
+
+def load_crc_tables(path=CRC_TABLES_MEM):
+    """Parse a $readmemh table file into a (MAX_SLICE_LENGTH, 256) uint32 array."""
+    path = os.path.abspath(path)
+    if path not in _tables_cache:
+        with open(path) as f:
+            words = [int(v, 16) for line in f for v in line.split("//")[0].split()]
+        if len(words) % 256:
+            raise ValueError(f"{path}: {len(words)} entries is not a whole number of tables")
+        _tables_cache[path] = np.array(words, dtype=np.uint32).reshape(-1, 256)
+    return _tables_cache[path]
+
+
+class Crc32Ref:
+    def __init__(self, slice_length=4, initial_crc=0xFFFFFFFF, invert_output=True, tables=None):
+        self.tables_np = load_crc_tables() if tables is None else np.asarray(tables, dtype=np.uint32)
+        if slice_length > len(self.tables_np):
+            raise ValueError(
+                f"slice_length {slice_length} needs {slice_length} tables, only {len(self.tables_np)} loaded"
+            )
+        self.tables = self.tables_np.tolist()
+        self.slice_length = slice_length
+        self.initial_crc = initial_crc
+        self.invert_output = invert_output
+        self.crc = initial_crc
+
+    def reset(self):
+        self.crc = self.initial_crc
+        return self
+
+    @property
+    def value(self):
+        return self.crc ^ CRC_MASK if self.invert_output else self.crc
+
+    def update(self, chunk, valid_mask=None):
+        """
+        One RTL clock: chunk is the in_data word (int, LSB = byte 0) or up to
+        slice_length bytes, valid_mask is in_valid. A zero mask holds the CRC.
+        """
+        if not isinstance(chunk, int):
+            chunk = int.from_bytes(bytes(chunk), "little")
+        if valid_mask is None:
+            valid_mask = (1 << self.slice_length) - 1
+        if not valid_mask:
+            return self
+
+        n = valid_mask.bit_length()
+        x = chunk ^ self.crc
+        acc = self.crc >> (8 * n)
+        tables = self.tables
+        for i in range(n):
+            if (valid_mask >> i) & 1:
+                acc ^= tables[n - i - 1][(x >> (8 * i)) & 0xFF]
+        self.crc = acc
+        return self
+
+    def update_bytes(self, data):
+        data = bytes(data)
+        n = self.slice_length
+        full = len(data) - len(data) % n
+        for k in range(0, full, n):
+            self.update(int.from_bytes(data[k:k + n], "little"))
+        if full < len(data):
+            self.update(int.from_bytes(data[full:], "little"), (1 << (len(data) - full)) - 1)
+        return self
+
+    def checksum(self, data):
+        return self.reset().update_bytes(data).value
+
+
+def crc32(data, slice_length=4):
+    """Ethernet FCS of data (bytes or list of ints)."""
+    return Crc32Ref(slice_length).checksum(data)
+
+
+def address_hash(addr):
+    """Multicast hash bin (0-63) of a MAC address, as rx_mac: top six bits of its CRC32."""
+    return crc32(addr) >> 26
+
+
+def crc32_bulk(frames, slice_length=4, initial_crc=0xFFFFFFFF, invert_output=True, tables=None):
+    """
+    CRC of many frames at once. All frames advance in lockstep, one
+    slice_length-byte slice per step, with each frame's final partial slice
+    handled through the same valid-mask path as the RTL. Returns a uint32
+    array in the order of frames.
+    """
+    tables = load_crc_tables() if tables is None else np.asarray(tables, dtype=np.uint32)
+    n = slice_length
+    frames = [bytes(f) for f in frames]
+    num = len(frames)
+    if num == 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    lengths = np.fromiter((len(f) for f in frames), dtype=np.int64, count=num)
+    width = -(-int(lengths.max()) // n) * n
+
+    # pack into a zero-padded (num, width) byte matrix without a per-byte loop
+    flat = np.frombuffer(b"".join(frames), dtype=np.uint8)
+    data = np.zeros((num, width), dtype=np.uint8)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    row = np.repeat(np.arange(num), lengths)
+    col = np.arange(len(flat)) - np.repeat(starts, lengths)
+    data[row, col] = flat
+
+    crc = np.full(num, initial_crc, dtype=np.uint64)
+    for k in range(0, width, n):
+        nb = np.clip(lengths - k, 0, n)
+        active = nb > 0
+        acc = np.where(nb < 4, crc >> (8 * np.minimum(nb, 3)).astype(np.uint64), 0).astype(np.uint64)
+        for i in range(n):
+            lookup = data[:, k + i].astype(np.uint64)
+            if i < 4:
+                lookup ^= (crc >> np.uint64(8 * i)) & np.uint64(0xFF)
+            t = tables[np.maximum(nb - i - 1, 0), lookup.astype(np.intp)]
+            acc ^= np.where(nb > i, t, 0).astype(np.uint64)
+        crc = np.where(active, acc, crc)
+
+    if invert_output:
+        crc ^= np.uint64(CRC_MASK)
+    return crc.astype(np.uint32)
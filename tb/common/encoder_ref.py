@@ -0,0 +1,108 @@
+from .xgmii import XGMII_ERROR, XGMII_IDLE, XGMII_START, XGMII_TERMINATE
+
+# Reference 64b/66b block coding matching src/encoder.v and src/decoder.v.
+# A block is one 64-bit XGMII word, or two 32-bit words with the first in
+# lanes 0-3.
+# Control blocks carry the block type in bits [63:56] as in the RTL.
+
+SYNC_DATA = 0b01
+SYNC_CTRL = 0b10
+
+BLOCK_TYPE_C0 = 0x1E
+BLOCK_TYPE_S4 = 0x33
+BLOCK_TYPE_S0 = 0x78
+BLOCK_TYPE_T0 = 0x87
+
+# T1..T7: block type and XGMII control mask, indexed by the /T/ lane
+BLOCK_TYPE_T = {
+    1: (0x99, 0xFE),
+    2: (0xAA, 0xFC),
+    3: (0xB4, 0xF8),
+    4: (0xCC, 0xF0),
+    5: (0xD2, 0xE0),
+    6: (0xE1, 0xC0),
+    7: (0xFF, 0x80),
+}
+# every /S/ and /T/ lane, for checking a stream covers them all
+FRAME_BLOCK_TYPES = (BLOCK_TYPE_S0, BLOCK_TYPE_S4, BLOCK_TYPE_T0) + tuple(t for t, _ in BLOCK_TYPE_T.values())
+_T_BY_CTRL = {ctrl: (lane, btype) for lane, (btype, ctrl) in BLOCK_TYPE_T.items()}
+_T_BY_TYPE = {btype: (lane, ctrl) for lane, (btype, ctrl) in BLOCK_TYPE_T.items()}
+
+
+def _rep(byte, n):
+    return int.from_bytes(bytes([byte]) * n, "little")
+
+
+def encode_block(data, ctrl):
+    """One 64-bit XGMII block and its 8-bit control mask -> (header, block)."""
+    if ctrl == 0x00:
+        return SYNC_DATA, data
+
+    if ctrl == 0xFF:
+        btype = BLOCK_TYPE_T0 if (data & 0xFF) == XGMII_TERMINATE else BLOCK_TYPE_C0
+        return SYNC_CTRL, (btype << 56) | _rep(XGMII_IDLE, 7)
+    if ctrl == 0x1F:
+        low = (data >> 8) & 0xFFFFFF
+        return SYNC_CTRL, (BLOCK_TYPE_S4 << 56) | (low << 32) | (data >> 32)
+    if ctrl == 0x01:
+        return SYNC_CTRL, (BLOCK_TYPE_S0 << 56) | (data >> 8)
+    if ctrl in _T_BY_CTRL:
+        lane, btype = _T_BY_CTRL[ctrl]
+        payload = data & ((1 << (8 * lane)) - 1)
+        idle = 7 - lane
+        return SYNC_CTRL, (btype << 56) | (payload << (8 * idle)) | _rep(XGMII_IDLE, idle)
+
+    return SYNC_CTRL, (BLOCK_TYPE_C0 << 56) | _rep(XGMII_ERROR, 7)
+
+
+def decode_block(header, block):
+    """(header, block) -> one 64-bit XGMII block and its 8-bit control mask."""
+    if header == SYNC_DATA:
+        return block, 0x00
+    if header != SYNC_CTRL:
+        return _rep(XGMII_ERROR, 8), 0xFF
+
+    btype = block >> 56
+    body = block & ((1 << 56) - 1)
+    if btype == BLOCK_TYPE_C0:
+        return (_rep(XGMII_IDLE, 7) << 8) | (body >> 48), 0xFF
+    if btype == BLOCK_TYPE_S0:
+        return (body << 8) | XGMII_START, 0x01
+    if btype == BLOCK_TYPE_S4:
+        return ((block & 0xFFFFFFFF) << 32) | (((body >> 32) & 0xFFFFFF) << 8) | XGMII_IDLE, 0x1F
+    if btype == BLOCK_TYPE_T0:
+        return (_rep(XGMII_IDLE, 7) << 8) | XGMII_TERMINATE, 0xFF
+    if btype in _T_BY_TYPE:
+        lane, ctrl = _T_BY_TYPE[btype]
+        idle = 7 - lane
+        payload = body >> (8 * idle)
+        tail = (_rep(XGMII_IDLE, idle) << 8) | XGMII_TERMINATE
+        return (tail << (8 * lane)) | payload, ctrl
+
+    return _rep(XGMII_ERROR, 8), 0xFF
+
+
+def encode_stream(words, width=32):
+    """
+    Generator: iterable of width-bit (data, ctl) XGMII words -> (header,
+    block) per 64 bits. Runs in constant memory, so it can sit between a
+    traffic generator and a scoreboard without materialising the stream.
+    """
+    if width == 64:
+        for data, ctl in words:
+            yield encode_block(data, ctl)
+        return
+    it = iter(words)
+    for (d0, c0), (d1, c1) in zip(it, it):
+        yield encode_block(d0 | (d1 << 32), c0 | (c1 << 4))
+
+
+def decode_stream(blocks, width=32):
+    """Generator: iterable of (header, block) -> 64 / width (data, ctl) XGMII words each."""
+    for header, block in blocks:
+        data, ctrl = decode_block(header, block)
+        if width == 64:
+            yield data, ctrl
+        else:
+            yield data & 0xFFFFFFFF, ctrl & 0xF
+            yield data >> 32, ctrl >> 4
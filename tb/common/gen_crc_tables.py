@@ -0,0 +1,49 @@
+"""
+Generate the slicing-by-N CRC32 lookup tables read by src/crc32.v.
+
+    python gen_crc_tables.py [-n MAX_SLICE_LENGTH] [-o crc_tables.mem]
+
+Table k holds the CRC contribution of a byte followed by k zero bytes, one
+table per line as 256 hex words, which is the layout $readmemh expects for
+crc_tables[0:MAX_SLICE_LENGTH-1][0:255].
+"""
+import argparse
+import os
+
+# Reflected IEEE 802.3 polynomial
+CRC32_POLY = 0xEDB88320
+
+
+def make_crc_tables(max_slice_length=16, poly=CRC32_POLY):
+    table0 = []
+    for b in range(256):
+        crc = b
+        for _ in range(8):
+            crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+        table0.append(crc)
+
+    tables = [table0]
+    for _ in range(1, max_slice_length):
+        prev = tables[-1]
+        tables.append([(v >> 8) ^ table0[v & 0xFF] for v in prev])
+    return tables
+
+
+def format_mem(tables):
+    return "".join(" ".join(f"{v:08x}" for v in t) + "\n" for t in tables)
+
+
+def write_mem(path, max_slice_length=16):
+    # never let a running simulator read a half-written file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(format_mem(make_crc_tables(max_slice_length)))
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--max-slice-length", type=int, default=16)
+    parser.add_argument("-o", "--output", default="crc_tables.mem")
+    args = parser.parse_args()
+    write_mem(args.output, args.max_slice_length)
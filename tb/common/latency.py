@@ -0,0 +1,272 @@
+"""
+Frame latency distributions.
+
+A FrameTimestamps monitor stamps the clock cycle of frame boundary events on
+the buses of one clock domain: the first and last (tlast) beat transferred
+on an AXI-Stream port, /S/ and /T/ on an XGMII port. Each latency() pairs
+one point with a later one, frame by frame in order, into a
+LatencyHistogram. Pairing assumes every frame passes both points, so keep
+dropped or merged frames out of latency runs.
+
+Histograms count samples per cycle value, so memory depends on the spread
+of the latencies, not on the number of frames. Reports are JSON with fixed
+keys and can be compared between runs:
+
+    cd tb && python -m common.latency old.json new.json [--tolerance 0]
+
+prints every statistic that changed and exits non-zero when one got worse
+by more than --tolerance cycles.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter, deque
+
+import cocotb
+from cocotb.triggers import ReadOnly, RisingEdge
+
+from .xgmii import XGMII_START, XGMII_TERMINATE
+
+PERCENTILES = (50, 99, 99.9)
+
+STATS = ("min", "p50", "p99", "p99_9", "max")
+
+
+def _stat_name(p):
+    return "p" + f"{p:g}".replace(".", "_")
+
+
+class LatencyHistogram:
+    def __init__(self, name, period_ns=None):
+        self.name = name
+        self.period_ns = period_ns
+        self.counts = Counter()
+        self.count = 0
+
+    def add(self, cycles):
+        self.counts[cycles] += 1
+        self.count += 1
+
+    def percentile(self, p):
+        """Nearest-rank percentile in cycles, None if empty."""
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen >= rank:
+                return value
+        return value
+
+    def summary(self):
+        """count, then min/p50/p99/p99_9/max in cycles and, with a period, ns."""
+        result = {"count": self.count}
+        if not self.count:
+            return result
+        cycles = {"min": min(self.counts), "max": max(self.counts)}
+        for p in PERCENTILES:
+            cycles[_stat_name(p)] = self.percentile(p)
+        result["cycles"] = {k: cycles[k] for k in STATS}
+        if self.period_ns is not None:
+            result["ns"] = {k: v * self.period_ns for k, v in result["cycles"].items()}
+        result["histogram"] = {str(k): self.counts[k] for k in sorted(self.counts)}
+        return result
+
+    def describe(self):
+        if not self.count:
+            return f"{self.name}: no samples"
+        s = self.summary()
+        text = ", ".join(f"{k}={v}" for k, v in s["cycles"].items())
+        if "ns" in s:
+            text += " cycles (" + ", ".join(f"{k}={v:g}" for k, v in s["ns"].items()) + " ns)"
+        return f"{self.name}: {self.count} frames, {text}"
+
+
+class FrameTimestamps:
+    """
+    Stamps frame boundary events on `clock`, sampling in the ReadOnly phase
+    after each rising edge. Register the buses with axis()/xgmii() and the
+    latencies with latency() before start().
+    """
+
+    def __init__(self, clock, period_ns=None):
+        self.clock = clock
+        self.period_ns = period_ns
+        self.cycle = 0
+        self.histograms = {}
+
+        self._probes = []
+        self._starts = {}
+        self._ends = {}
+        self._latencies = {}
+        self._task = None
+
+    def axis(self, prefix, tvalid, tready, tlast):
+        """Points <prefix>_first and <prefix>_last: beats transferred."""
+        self._probes.append(_AxisProbe(prefix, tvalid, tready, tlast))
+
+    def xgmii(self, prefix, data, ctl, bytes_per_word=None, valid=None):
+        """Points <prefix>_start and <prefix>_term: /S/ and /T/ seen."""
+        bpw = bytes_per_word or len(ctl)
+        self._probes.append(_XgmiiProbe(prefix, data, ctl, bpw, valid))
+
+    def latency(self, name, start, end):
+        """Histogram of the cycles from point `start` to point `end`, per frame."""
+        hist = LatencyHistogram(name, self.period_ns)
+        pending = deque()
+        self.histograms[name] = hist
+        self._starts.setdefault(start, []).append(pending)
+        self._ends.setdefault(end, []).append((pending, hist))
+        self._latencies[name] = (start, end, pending)
+        return hist
+
+    def stop(self, name):
+        """Stop adding to latency `name`; its histogram stays in the report."""
+        start, end, pending = self._latencies.pop(name)
+        self._starts[start].remove(pending)
+        self._ends[end] = [entry for entry in self._ends[end] if entry[0] is not pending]
+
+    def start(self):
+        self._task = cocotb.start_soon(self._run())
+
+    def kill(self):
+        if self._task is not None:
+            self._task.kill()
+
+    async def _run(self):
+        while True:
+            await RisingEdge(self.clock)
+            await ReadOnly()
+            self.cycle += 1
+            points = []
+            for probe in self._probes:
+                points.extend(probe.sample())
+            # all starts of this cycle before any end, so that a frame
+            # passing both points in one cycle pairs up with itself
+            for point in points:
+                for pending in self._starts.get(point, ()):
+                    pending.append(self.cycle)
+            for point in points:
+                for pending, hist in self._ends.get(point, ()):
+                    if pending:
+                        hist.add(self.cycle - pending.popleft())
+
+    def report(self):
+        return {name: hist.summary() for name, hist in self.histograms.items()}
+
+    def describe(self):
+        return [hist.describe() for hist in self.histograms.values()]
+
+
+def _high(signal):
+    value = signal.value
+    return value.is_resolvable and bool(int(value))
+
+
+class _AxisProbe:
+    def __init__(self, prefix, tvalid, tready, tlast):
+        self.first = prefix + "_first"
+        self.last = prefix + "_last"
+        self.tvalid = tvalid
+        self.tready = tready
+        self.tlast = tlast
+        self.in_frame = False
+
+    def sample(self):
+        # the beat is transferred at the next edge, stamps are on the
+        # cycle it is presented with tready high
+        if not (_high(self.tvalid) and _high(self.tready)):
+            return ()
+        points = []
+        if not self.in_frame:
+            points.append(self.first)
+            self.in_frame = True
+        if _high(self.tlast):
+            points.append(self.last)
+            self.in_frame = False
+        return points
+
+
+class _XgmiiProbe:
+    def __init__(self, prefix, data, ctl, bytes_per_word, valid):
+        self.start = prefix + "_start"
+        self.term = prefix + "_term"
+        self.data = data
+        self.ctl = ctl
+        self.bytes_per_word = bytes_per_word
+        self.valid = valid
+
+    def sample(self):
+        if self.valid is not None and not _high(self.valid):
+            return ()
+        ctl = self.ctl.value
+        if not ctl.is_resolvable or not int(ctl):
+            return ()
+        ctl = int(ctl)
+        data = int(self.data.value)
+        points = []
+        for lane in range(self.bytes_per_word):
+            if ctl >> lane & 1:
+                char = data >> (8 * lane) & 0xFF
+                if char == XGMII_START:
+                    points.append(self.start)
+                elif char == XGMII_TERMINATE:
+                    points.append(self.term)
+        return points
+
+
+def write_report(path, dut, timestamps, **info):
+    """Write the histograms of a FrameTimestamps plus `info` as JSON."""
+    report = {"dut": dut, "clock_period_ns": timestamps.period_ns, **info, "latency": timestamps.report()}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+    return report
+
+
+def compare_reports(old, new, tolerance=0):
+    """
+    Changed statistics between two reports as (latency, stat, old, new)
+    cycle values, and whether any of them got worse by more than
+    tolerance cycles. Latencies present in only one report are skipped.
+    """
+    changes = []
+    worse = False
+    for name, new_summary in new["latency"].items():
+        old_summary = old["latency"].get(name)
+        if not old_summary or "cycles" not in old_summary or "cycles" not in new_summary:
+            continue
+        for stat in STATS:
+            a = old_summary["cycles"][stat]
+            b = new_summary["cycles"][stat]
+            if a != b:
+                changes.append((name, stat, a, b))
+                worse |= b - a > tolerance
+    return changes, worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two latency reports")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--tolerance", type=int, default=0, help="allowed increase in cycles")
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    changes, worse = compare_reports(old, new, args.tolerance)
+    for name, stat, a, b in changes:
+        print(f"{name} {stat}: {a} -> {b} cycles ({b - a:+d})")
+    if not changes:
+        print("no latency changes")
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
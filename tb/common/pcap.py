@@ -0,0 +1,282 @@
+"""
+pcap and pcapng files for replaying captured traffic and for looking at
+what a testbench saw in Wireshark.
+
+PcapReader memory-maps the file and yields one Packet at a time, so a
+capture of any size streams through a test in constant memory:
+
+    with PcapReader("field.pcapng") as reader:
+        for packet in reader:
+            send(packet.frame)
+
+Both the classic format (microsecond and nanosecond, either byte order)
+and pcapng (section header, interface description, enhanced and simple
+packet blocks) are read. Only Ethernet captures are accepted. Times are
+integer nanoseconds; simple packet blocks have none and get the time of
+the packet before. Packet.frame strips the FCS when the capture says it
+holds one (pcapng if_fcslen, or the FCS bits of a classic link type).
+
+PcapWriter writes nanosecond timestamps, classic pcap or pcapng by file
+name extension:
+
+    with PcapWriter("tx_mac_xgmii.pcap", fcs_len=4) as writer:
+        writer.write(frame, get_sim_time("ns"))
+
+write_line_rate_capture() makes a capture out of generated frames, for
+tests that replay a capture when none is given.
+"""
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+LINKTYPE_ETHERNET = 1
+
+_PCAP_MAGIC_US = 0xA1B2C3D4
+_PCAP_MAGIC_NS = 0xA1B23C4D
+# classic link type field: FCS length present, in 16 bit words
+_PCAP_FCS_PRESENT = 0x10000000
+_PCAP_FCS_SHIFT = 29
+
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_IDB = 0x00000001
+_PCAPNG_PB = 0x00000002
+_PCAPNG_SPB = 0x00000003
+_PCAPNG_EPB = 0x00000006
+_PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_OPT_ENDOFOPT = 0
+_OPT_IF_TSRESOL = 9
+_OPT_IF_FCSLEN = 13
+
+
+class Packet(namedtuple("Packet", "time_ns data fcs_len")):
+    """One captured packet: data as captured, fcs_len bytes of FCS at its end."""
+
+    __slots__ = ()
+
+    @property
+    def frame(self):
+        return self.data[: len(self.data) - self.fcs_len]
+
+
+def _tsresol_ns(tsresol):
+    """pcapng if_tsresol -> function of a timestamp giving nanoseconds."""
+    exponent = tsresol & 0x7F
+    if tsresol & 0x80:
+        return lambda ts: (ts * 1_000_000_000) >> exponent
+    if exponent <= 9:
+        scale = 10 ** (9 - exponent)
+        return lambda ts: ts * scale
+    scale = 10 ** (exponent - 9)
+    return lambda ts: ts // scale
+
+
+class PcapReader:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self._file.close()
+            raise ValueError(f"{path}: empty file") from None
+        magic = self._map[:4]
+        if struct.unpack("<I", magic)[0] == _PCAPNG_SHB:
+            self.format = "pcapng"
+        elif magic in (b"\xd4\xc3\xb2\xa1", b"\xa1\xb2\xc3\xd4", b"\x4d\x3c\xb2\xa1", b"\xa1\xb2\x3c\x4d"):
+            self.format = "pcap"
+        else:
+            self.close()
+            raise ValueError(f"{path}: not a pcap or pcapng file")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._file.close()
+
+    def __iter__(self):
+        return self._pcap() if self.format == "pcap" else self._pcapng()
+
+    def _error(self, offset, message):
+        return ValueError(f"{self.path}: {message} at offset {offset}")
+
+    def _pcap(self):
+        buf = self._map
+        magic = struct.unpack_from("<I", buf, 0)[0]
+        endian = "<" if magic in (_PCAP_MAGIC_US, _PCAP_MAGIC_NS) else ">"
+        nanoseconds = struct.unpack_from(endian + "I", buf, 0)[0] == _PCAP_MAGIC_NS
+        linktype = struct.unpack_from(endian + "I", buf, 20)[0]
+        if linktype & 0xFFFF != LINKTYPE_ETHERNET:
+            raise self._error(20, f"link type {linktype & 0xFFFF}, not Ethernet")
+        fcs_len = 2 * (linktype >> _PCAP_FCS_SHIFT) if linktype & _PCAP_FCS_PRESENT else 0
+        record = struct.Struct(endian + "IIII")
+        scale = 1 if nanoseconds else 1000
+
+        offset = 24
+        end = len(buf)
+        while offset + record.size <= end:
+            seconds, fraction, caplen, _ = record.unpack_from(buf, offset)
+            offset += record.size
+            if offset + caplen > end:
+                raise self._error(offset, "truncated packet")
+            yield Packet(seconds * 1_000_000_000 + fraction * scale, buf[offset : offset + caplen], fcs_len)
+            offset += caplen
+
+    def _pcapng(self):
+        buf = self._map
+        end = len(buf)
+        offset = 0
+        endian = "<"
+        interfaces = []
+        time_ns = 0
+        while offset + 12 <= end:
+            block_type = struct.unpack_from(endian + "I", buf, offset)[0]
+            if block_type == _PCAPNG_SHB:
+                # the byte order magic says how to read this section
+                bom = buf[offset + 8 : offset + 12]
+                endian = "<" if struct.unpack("<I", bom)[0] == _PCAPNG_BYTE_ORDER_MAGIC else ">"
+                interfaces = []
+            block_len = struct.unpack_from(endian + "I", buf, offset + 4)[0]
+            if block_len < 12 or block_len % 4 or offset + block_len > end:
+                raise self._error(offset, f"bad block length {block_len}")
+            body = offset + 8
+            body_end = offset + block_len - 4
+
+            if block_type == _PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + "H", buf, body)[0]
+                options = self._options(buf, body + 8, body_end, endian)
+                tsresol = options.get(_OPT_IF_TSRESOL, b"\x06")[0]
+                fcs_len = options.get(_OPT_IF_FCSLEN, b"\x00")[0]
+                interfaces.append((linktype, _tsresol_ns(tsresol), fcs_len))
+            elif block_type in (_PCAPNG_EPB, _PCAPNG_PB):
+                if block_type == _PCAPNG_EPB:
+                    interface, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", buf, body)
+                else:
+                    interface, _, ts_high, ts_low, caplen = struct.unpack_from(endian + "HHIII", buf, body)
+                linktype, to_ns, fcs_len = self._interface(interfaces, interface, offset)
+                time_ns = to_ns((ts_high << 32) | ts_low)
+                data = body + 20
+                yield Packet(time_ns, buf[data : data + caplen], fcs_len)
+            elif block_type == _PCAPNG_SPB:
+                linktype, _, fcs_len = self._interface(interfaces, 0, offset)
+                # no captured length: whatever fits in the block, up to the
+                # original length
+                orig_len = struct.unpack_from(endian + "I", buf, body)[0]
+                data = body + 4
+                yield Packet(time_ns, buf[data : min(data + orig_len, body_end)], fcs_len)
+            offset += block_len
+
+    def _interface(self, interfaces, index, offset):
+        if index >= len(interfaces):
+            raise self._error(offset, f"packet on undeclared interface {index}")
+        interface = interfaces[index]
+        if interface[0] != LINKTYPE_ETHERNET:
+            raise self._error(offset, f"link type {interface[0]}, not Ethernet")
+        return interface
+
+    @staticmethod
+    def _options(buf, offset, end, endian):
+        options = {}
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", buf, offset)
+            if code == _OPT_ENDOFOPT:
+                break
+            options[code] = buf[offset + 4 : offset + 4 + length]
+            offset += 4 + length + (-length % 4)
+        return options
+
+
+def read_frames(path, limit=None):
+    """(time_ns, frame) of the first limit packets of a capture, FCS stripped."""
+    with PcapReader(path) as reader:
+        for n, packet in enumerate(reader):
+            if limit is not None and n >= limit:
+                break
+            yield packet.time_ns, packet.frame
+
+
+class PcapWriter:
+    """
+    Ethernet capture with nanosecond timestamps. A path ending in .pcapng
+    gives pcapng, anything else classic pcap. fcs_len is the number of FCS
+    bytes at the end of every frame written (0 or 4).
+    """
+
+    def __init__(self, path, fcs_len=0, snaplen=65535):
+        self.path = path
+        self.pcapng = path.endswith(".pcapng")
+        self.fcs_len = fcs_len
+        self.snaplen = snaplen
+        self.packets = 0
+        self._file = open(path, "wb")
+        if self.pcapng:
+            self._file.write(self._block(_PCAPNG_SHB, struct.pack("<IHHq", _PCAPNG_BYTE_ORDER_MAGIC, 1, 0, -1)))
+            options = self._option(_OPT_IF_TSRESOL, b"\x09")
+            if fcs_len:
+                options += self._option(_OPT_IF_FCSLEN, bytes([fcs_len]))
+            options += self._option(_OPT_ENDOFOPT, b"")
+            self._file.write(self._block(_PCAPNG_IDB, struct.pack("<HHI", LINKTYPE_ETHERNET, 0, snaplen) + options))
+        else:
+            linktype = LINKTYPE_ETHERNET
+            if fcs_len:
+                linktype |= _PCAP_FCS_PRESENT | (fcs_len // 2) << _PCAP_FCS_SHIFT
+            self._file.write(struct.pack("<IHHiIII", _PCAP_MAGIC_NS, 2, 4, 0, 0, snaplen, linktype))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def _option(code, value):
+        return struct.pack("<HH", code, len(value)) + value + bytes(-len(value) % 4)
+
+    @staticmethod
+    def _block(block_type, body):
+        body += bytes(-len(body) % 4)
+        length = len(body) + 12
+        return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+    def write(self, data, time_ns):
+        data = bytes(data)
+        # get_sim_time() gives floats
+        time_ns = round(time_ns)
+        caplen = min(len(data), self.snaplen)
+        if self.pcapng:
+            header = struct.pack("<IIIII", 0, time_ns >> 32, time_ns & 0xFFFFFFFF, caplen, len(data))
+            self._file.write(self._block(_PCAPNG_EPB, header + data[:caplen]))
+        else:
+            seconds, nanoseconds = divmod(time_ns, 1_000_000_000)
+            self._file.write(struct.pack("<IIII", seconds, nanoseconds, caplen, len(data)) + data[:caplen])
+        self.packets += 1
+
+
+def write_line_rate_capture(path, frames, rate_bps=10e9, start_ns=0):
+    """
+    Capture of frames (no FCS) as a link at rate_bps would carry them back
+    to back: every timestamp one frame, FCS, preamble and minimum IPG
+    after the one before. Stands in for field captures in tests.
+    """
+    # never let another test read a half-written capture; the temporary
+    # name keeps the extension, which selects the format
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.{os.getpid()}.tmp{ext}"
+    time_ns = float(start_ns)
+    with PcapWriter(tmp) as writer:
+        for frame in frames:
+            writer.write(frame, int(time_ns))
+            time_ns += (len(frame) + 4 + 8 + 12) * 8 * 1e9 / rate_bps
+    os.replace(tmp, path)
+    return writer.packets
@@ -0,0 +1,70 @@
+import logging
+from collections import deque
+
+# In-order streaming scoreboard. The stimulus side queues what the DUT
+# should produce with expect(), the monitor side hands over every item the
+# DUT produces with check(), which compares it against the oldest
+# expectation straight away. Memory is bounded by how far the stimulus runs
+# ahead of the DUT, not by the length of the run, and only the first
+# max_reports mismatches are logged in full. on_error, if set, is called
+# with the report of every mismatch, e.g. to open a waves.Waves window.
+
+
+def describe_mismatch(expected, got):
+    if isinstance(expected, (bytes, bytearray)) and isinstance(got, (bytes, bytearray)):
+        diff = next((i for i, (a, b) in enumerate(zip(expected, got)) if a != b), min(len(expected), len(got)))
+        return (
+            f"{len(got)} bytes, expected {len(expected)}, first difference at byte {diff}: "
+            f"got {bytes(got[diff:diff + 8]).hex()}, expected {bytes(expected[diff:diff + 8]).hex()}"
+        )
+    return f"got {got!r}, expected {expected!r}"
+
+
+class Scoreboard:
+    def __init__(self, name, log=None, max_reports=10):
+        self.name = name
+        self.log = (log or logging.getLogger("cocotb.tb")).getChild(name)
+        self.max_reports = max_reports
+        self.on_error = None
+
+        self.pending = deque()
+        self.matched = 0
+        self.mismatched = 0
+        self.unexpected = 0
+
+    def expect(self, item, tag=None):
+        """Queue the next item the DUT should produce; tag names it in reports."""
+        self.pending.append((item, tag))
+
+    def check(self, got):
+        if not self.pending:
+            self.unexpected += 1
+            self._report(f"unexpected {got!r}")
+            return False
+        expected, tag = self.pending.popleft()
+        if got == expected:
+            self.matched += 1
+            return True
+        self.mismatched += 1
+        self._report(f"{tag}: {describe_mismatch(expected, got)}")
+        return False
+
+    def _report(self, message):
+        if self.on_error is not None:
+            self.on_error(message)
+        errors = self.mismatched + self.unexpected
+        if errors <= self.max_reports:
+            self.log.error(message)
+        elif errors == self.max_reports + 1:
+            self.log.error("further mismatches not reported")
+
+    @property
+    def errors(self):
+        return self.mismatched + self.unexpected + len(self.pending)
+
+    def summary(self):
+        missing = f", {len(self.pending)} missing (first: {self.pending[0][1]})" if self.pending else ""
+        return (
+            f"{self.name}: {self.matched} matched, {self.mismatched} mismatched, "
+            f"{self.unexpected} unexpected{missing}"
+        )
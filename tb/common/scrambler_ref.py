@@ -0,0 +1,96 @@
+# Reference 10GBASE-R scrambler and descrambler (IEEE 802.3 49.2.6)
+# Polynomial: 1 + x^39 + x^58, for words of any width
+#
+# Words are LSB first on the line. In line bit order
+#   scramble:   out[n] = in[n] ^ out[n-39] ^ out[n-58]
+#   descramble: out[n] = in[n] ^ in[n-39]  ^ in[n-58]
+# and the state is the last 58 line bits, the oldest in bit 0, as in the
+# RTL. Both reset to all ones.
+#
+# Everything runs on Python ints. The scrambler feeds back 39 bits at a
+# time, the furthest its own output can reach into the bits still to
+# come; the descrambler has no feedback, so descramble() does a whole
+# stream as one big integer with a handful of shifts.
+#
+# scramble() and descramble() take a list of ints, or a NumPy array of
+# unsigned words (uint64 for up to 64 bits) and give an array of the same
+# dtype back.
+import numpy as np
+
+STATE_BITS = 58
+TAP = 39
+STATE_MASK = (1 << STATE_BITS) - 1
+STATE_ONES = STATE_MASK
+
+
+class ScramblerRef:
+    def __init__(self, width=64, state=STATE_ONES):
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.state = state & STATE_MASK
+
+    def step(self, in_word: int) -> int:
+        return self.scramble([in_word])[0]
+
+    def scramble(self, words):
+        """Scramble a sequence of words, returning a list of ints or an array like words."""
+        if isinstance(words, np.ndarray):
+            return np.array(self.scramble(words.tolist()), dtype=words.dtype)
+        width = self.width
+        chunks = [(a, (1 << min(TAP, width - a)) - 1) for a in range(0, width, TAP)]
+        out = []
+        append = out.append
+        state = self.state
+        for w in words:
+            # x[k] is line bit k - 58 relative to this word
+            x = state
+            for a, mask in chunks:
+                x |= (((w >> a) ^ (x >> (a + STATE_BITS - TAP)) ^ (x >> a)) & mask) << (STATE_BITS + a)
+            append(x >> STATE_BITS)
+            state = (x >> width) & STATE_MASK
+        self.state = state
+        return out
+
+
+class DescramblerRef:
+    def __init__(self, width=64, state=STATE_ONES):
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.state = state & STATE_MASK
+
+    def step(self, in_word: int) -> int:
+        x = self.state | ((in_word & self.mask) << STATE_BITS)
+        self.state = (x >> self.width) & STATE_MASK
+        return (x ^ (x >> STATE_BITS) ^ (x >> (STATE_BITS - TAP))) & self.mask
+
+    def descramble(self, words):
+        """Descramble a sequence of words, returning a list of ints or an array like words."""
+        width = self.width
+        num_bits = width * len(words)
+        array = isinstance(words, np.ndarray)
+        if not num_bits:
+            return words.copy() if array else []
+
+        mask = self.mask
+        if array and words.dtype.itemsize * 8 == width:
+            # the array's bytes are the stream already
+            stream = int.from_bytes(words.astype(words.dtype.newbyteorder("<")).tobytes(), "little")
+        elif array:
+            return np.array(self.descramble(words.tolist()), dtype=words.dtype)
+        elif width % 8:
+            stream = sum((w & mask) << (width * i) for i, w in enumerate(words))
+        else:
+            nbytes = width // 8
+            stream = int.from_bytes(b"".join((w & mask).to_bytes(nbytes, "little") for w in words), "little")
+
+        x = self.state | (stream << STATE_BITS)
+        plain = (stream ^ x ^ (x >> (STATE_BITS - TAP))) & ((1 << num_bits) - 1)
+        self.state = (x >> num_bits) & STATE_MASK
+
+        if array:
+            out = np.frombuffer(plain.to_bytes(num_bits // 8, "little"), dtype=words.dtype.newbyteorder("<"))
+            return out.astype(words.dtype)
+        if width % 8:
+            return [(plain >> (width * i)) & mask for i in range(len(words))]
+        raw = plain.to_bytes(num_bits // 8, "little")
+        return [int.from_bytes(raw[i:i + nbytes], "little") for i in range(0, len(raw), nbytes)]
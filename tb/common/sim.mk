@@ -0,0 +1,43 @@
+# Shared simulator setup for the testbench Makefiles. Include it after
+# TOPLEVEL, VERILOG_SOURCES and any parameter COMPILE_ARGS, right before
+# cocotb's Makefile.sim.
+
+SRC_DIR := $(abspath $(PWD)/../../src)
+
+# crc32.v reads the slicing tables from src/ whatever directory the
+# simulator runs in
+COMPILE_ARGS += -DCRC_TABLES_FILE=\"$(SRC_DIR)/crc_tables.mem\"
+
+# WAVES=1 builds common/waves.v into the model: a waveform dump that stays
+# off until a test opens a window with common/waves.py, into
+# <toplevel>_waves.fst (WAVES_FORMAT=vcd for VCD) next to the Makefile.
+WAVES_FORMAT ?= fst
+ifeq ($(WAVES),1)
+WAVES_FILE ?= $(abspath $(PWD))/$(TOPLEVEL)_waves.$(WAVES_FORMAT)
+export WAVES_FILE
+VERILOG_SOURCES += $(abspath $(PWD)/../common/waves.v)
+COMPILE_ARGS += -DWAVES_TOP=$(TOPLEVEL) -DWAVES_FILE=\"$(WAVES_FILE)\"
+ifeq ($(SIM),verilator)
+VERILOG_SOURCES += $(abspath $(PWD)/../common/waves_dpi.cpp)
+COMPILE_ARGS += $(if $(filter vcd,$(WAVES_FORMAT)),--trace,--trace-fst)
+else
+COMPILE_ARGS += -s waves
+ifeq ($(WAVES_FORMAT),fst)
+PLUSARGS += -fst
+endif
+# waves.v does the dumping, not the whole-run dump of cocotb's Makefile.icarus
+override WAVES := 0
+endif
+endif
+
+ifeq ($(SIM),verilator)
+# lint warnings stay fatal, the RTL is expected to be clean
+BUILD_ARGS += -j $(shell nproc 2>/dev/null || echo 1)
+endif
+
+# Compiled models are cached under tb/sim_cache/, one directory per hash
+# of simulator, toplevel, compile arguments (RTL parameters included) and
+# source contents. Rerunning with the same RTL and parameters reuses the
+# model instead of compiling it again.
+MODEL_HASH := $(shell { echo '$(SIM) $(TOPLEVEL) $(COMPILE_ARGS) $(EXTRA_ARGS)'; cat $(VERILOG_SOURCES); } | sha1sum | cut -c1-16)
+SIM_BUILD ?= $(abspath $(PWD)/../sim_cache/$(TOPLEVEL)-$(SIM)-$(MODEL_HASH))
@@ -0,0 +1,104 @@
+from cocotb.triggers import ReadOnly, RisingEdge
+
+# Model and readout of mac_stats, the frame statistics block in tx_mac and
+# rx_mac. COUNTERS is in read_addr order. The model takes the same per
+# frame view as the RTL, the frame from the destination address to the end
+# of the FCS (or as far as it got), so tests can record what they send or
+# expect and compare the totals with a snapshot read back from the DUT.
+
+COUNTERS = (
+    "good_frames",
+    "good_bytes",
+    "bad_frames",
+    "bad_bytes",
+    "crc_errors",
+    "runts",
+    "oversize",
+    "frames_64",
+    "frames_65_127",
+    "frames_128_255",
+    "frames_256_511",
+    "frames_512_1023",
+    "frames_1024_1518",
+    "frames_1519_max",
+)
+
+# upper ends of the size buckets; frames_1024_1518 ends at max_frame_size
+# and frames_1519_max takes the rest
+SIZE_BUCKETS = ((64, "frames_64"), (127, "frames_65_127"), (255, "frames_128_255"), (511, "frames_256_511"),
+                (1023, "frames_512_1023"))
+
+
+class StatsModel:
+    def __init__(self, min_frame_size=64, max_frame_size=1518):
+        self.min_frame_size = min_frame_size
+        self.max_frame_size = max_frame_size
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def frame(self, length, aborted=False, crc_error=False):
+        """Count one frame of length bytes."""
+        c = self.counters
+        good = not aborted and not crc_error and self.min_frame_size <= length <= self.max_frame_size
+        kind = "good" if good else "bad"
+        c[f"{kind}_frames"] += 1
+        c[f"{kind}_bytes"] += length
+        # CRC align errors: aborted frames and runts have no FCS to check
+        c["crc_errors"] += int(crc_error and not aborted and length >= self.min_frame_size)
+        c["oversize"] += int(length > self.max_frame_size)
+        if length < self.min_frame_size:
+            c["runts"] += 1
+        else:
+            buckets = SIZE_BUCKETS + ((self.max_frame_size, "frames_1024_1518"),)
+            c[next((name for top, name in buckets if length <= top), "frames_1519_max")] += 1
+
+    def clear(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def compare(self, counters):
+        """Mismatching counters as "name: got n, expected m" strings."""
+        return [
+            f"{name}: got {counters[name]}, expected {self.counters[name]}"
+            for name in COUNTERS
+            if counters[name] != self.counters[name]
+        ]
+
+
+class StatsReader:
+    """
+    Snapshot and read-out over the stats_* ports. read_data is one or more
+    read data buses behind the same snapshot, clear and read_addr, e.g.
+    top's tx_stats_read_data and rx_stats_read_data; read() returns a
+    {counter: value} dict for each, in that order.
+    """
+
+    def __init__(self, clk, snapshot, clear, read_addr, *read_data):
+        self.clk = clk
+        self.snapshot = snapshot
+        self.clear = clear
+        self.read_addr = read_addr
+        self.read_data = read_data
+
+    def reset(self):
+        """Inputs idle; call before releasing the DUT's reset."""
+        self.snapshot.value = 0
+        self.clear.value = 0
+        self.read_addr.value = 0
+
+    async def read(self, clear=False):
+        """Snapshot the counters, clearing them with clear=True, and read the snapshot."""
+        await RisingEdge(self.clk)
+        self.snapshot.value = 1
+        self.clear.value = int(clear)
+        await RisingEdge(self.clk)
+        self.snapshot.value = 0
+        self.clear.value = 0
+
+        values = [{} for _ in self.read_data]
+        for addr, name in enumerate(COUNTERS):
+            self.read_addr.value = addr
+            await RisingEdge(self.clk)
+            await ReadOnly()
+            for bus, counters in zip(self.read_data, values):
+                counters[name] = int(bus.value)
+            await RisingEdge(self.clk)
+        return values
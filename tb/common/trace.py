@@ -0,0 +1,122 @@
+import functools
+import logging
+import os
+
+# Low-overhead per-cycle tracing for the cocotb testbenches.
+#
+# A TraceRecorder keeps the last `depth` samples of raw ints in a
+# preallocated ring and formats nothing until asked to. Each recorder has a
+# verbosity taken from TB_TRACE, e.g. TB_TRACE="xgmii=log,crc=off":
+#   off    - record nothing
+#   record - ring buffer only, dumped when the test fails (default)
+#   log    - also log every sample as it arrives (the old behaviour)
+# TB_TRACE_DEPTH sets the default ring depth.
+#
+# Tests wrapped with @traced dump every recorder created during the test
+# when it fails, newest samples last.
+
+OFF = 0
+RECORD = 1
+LOG = 2
+
+_LEVELS = {"off": OFF, "record": RECORD, "log": LOG}
+
+DEFAULT_DEPTH = int(os.environ.get("TB_TRACE_DEPTH", "64"))
+
+_recorders = []
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = _LEVELS[level.strip().lower()]
+    return levels
+
+
+_env_levels = _parse_levels(os.environ.get("TB_TRACE", ""))
+
+
+def trace_level(name):
+    return _env_levels.get(name, _env_levels.get("default", RECORD))
+
+
+class TraceRecorder:
+    """
+    fields is a sequence of (name, format spec) pairs, e.g.
+    (("cycle", "d"), ("data", "08x")). record() takes one raw value per
+    field; None is kept as-is and shown as "unresolved".
+    """
+
+    def __init__(self, name, fields, log=None, depth=None, level=None):
+        self.name = name
+        self.fields = tuple(fields)
+        self.depth = depth or DEFAULT_DEPTH
+        self.level = trace_level(name) if level is None else level
+        self.log = (log or logging.getLogger("cocotb.tb")).getChild(name)
+        self.count = 0
+
+        self._buf = [None] * self.depth
+        self._pos = 0
+
+        if self.level == OFF:
+            self.record = self._record_off
+        elif self.level == LOG:
+            self.record = self._record_log
+        _recorders.append(self)
+
+    def record(self, *values):
+        self._buf[self._pos] = values
+        self._pos = self._pos + 1 if self._pos + 1 < self.depth else 0
+        self.count += 1
+
+    def _record_off(self, *values):
+        pass
+
+    def _record_log(self, *values):
+        TraceRecorder.record(self, *values)
+        self.log.info(self.format(values))
+
+    def format(self, values):
+        parts = []
+        for (name, spec), v in zip(self.fields, values):
+            parts.append(f"{name}=unresolved" if v is None else f"{name}={v:{spec}}")
+        return " ".join(parts)
+
+    def samples(self, last=None):
+        """Recorded samples, oldest first, limited to the newest `last`."""
+        n = min(self.count, self.depth)
+        if last is not None:
+            n = min(n, last)
+        start = (self._pos - n) % self.depth
+        return [self._buf[(start + i) % self.depth] for i in range(n)]
+
+    def dump(self, last=None, log=None):
+        log = log or self.log
+        samples = self.samples(last)
+        log.info(f"--- trace {self.name}: last {len(samples)} of {self.count} samples ---")
+        for values in samples:
+            log.info(self.format(values))
+
+
+def dump_all(last=None):
+    for rec in _recorders:
+        if rec.level != OFF and rec.count:
+            rec.dump(last)
+
+
+def traced(test_fn):
+    """Dump every recorder created by the test if it fails or is aborted."""
+
+    @functools.wraps(test_fn)
+    async def wrapper(*args, **kwargs):
+        _recorders.clear()
+        try:
+            return await test_fn(*args, **kwargs)
+        except BaseException:
+            dump_all()
+            raise
+        finally:
+            _recorders.clear()
+
+    return wrapper
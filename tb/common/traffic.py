@@ -0,0 +1,117 @@
+import random
+
+from .crc_ref import crc32
+from .xgmii import PREAMBLE_BYTE, SFD_BYTE
+
+
+def random_frames(seed, num_frames=None, min_len=60, max_len=1514):
+    """
+    Seeded generator of random frames (bytes, no FCS). Runs forever when
+    num_frames is None, so callers can islice() it to any length.
+    """
+    rng = random.Random(seed)
+    count = 0
+    while num_frames is None or count < num_frames:
+        yield rng.randbytes(rng.randint(min_len, max_len))
+        count += 1
+
+
+# receive-side error injections, see rx_stress_cases()
+RX_ERROR_KINDS = ("bad_fcs", "truncated", "xgmii_error", "no_sfd")
+
+
+def parse_error_rates(spec):
+    """Parse "bad_fcs=0.05,no_sfd=0.01" into {kind: probability}."""
+    rates = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        kind, _, rate = item.partition("=")
+        kind = kind.strip()
+        if kind not in RX_ERROR_KINDS:
+            raise ValueError(f"unknown error kind {kind!r}, expected one of {', '.join(RX_ERROR_KINDS)}")
+        rates[kind] = float(rate)
+    if sum(rates.values()) > 1:
+        raise ValueError(f"error rates {spec!r} add up to more than 1")
+    return rates
+
+
+class RxCase:
+    """
+    One frame of receive stress traffic. data is every byte between the SFD
+    and /T/ (frame and FCS, damaged according to kind), sfd is the byte sent
+    in place of the SFD and error_at the offset in data sent as /E/, if any.
+    """
+
+    __slots__ = ("index", "kind", "data", "sfd", "error_at")
+
+    def __init__(self, index, kind, data, sfd=SFD_BYTE, error_at=None):
+        self.index = index
+        self.kind = kind
+        self.data = data
+        self.sfd = sfd
+        self.error_at = error_at
+
+    def __repr__(self):
+        return f"frame {self.index} ({self.kind}, {len(self.data)} bytes)"
+
+
+def rx_stress_cases(seed, error_rates=None, num_frames=None, min_len=60, max_len=1514):
+    """
+    Seeded generator of RxCase for receive stress tests: random frames of
+    min_len..max_len bytes plus a correct FCS, of which a fraction is damaged
+    with probability error_rates[kind] per kind:
+      bad_fcs     - FCS with random bits flipped
+      truncated   - cut off at a random byte, then /T/
+      xgmii_error - one random byte replaced by /E/
+      no_sfd      - preamble byte where the SFD should be
+    Runs forever when num_frames is None; nothing is kept between frames.
+    """
+    rng = random.Random(seed)
+    rates = [(kind, (error_rates or {}).get(kind, 0.0)) for kind in RX_ERROR_KINDS]
+    index = 0
+    while num_frames is None or index < num_frames:
+        frame = rng.randbytes(rng.randint(min_len, max_len))
+        fcs = crc32(frame)
+
+        kind = "good"
+        pick = rng.random()
+        for name, rate in rates:
+            if pick < rate:
+                kind = name
+                break
+            pick -= rate
+
+        case = RxCase(index, kind, frame + fcs.to_bytes(4, "little"))
+        if kind == "bad_fcs":
+            case.data = frame + (fcs ^ rng.randint(1, 0xFFFFFFFF)).to_bytes(4, "little")
+        elif kind == "truncated":
+            case.data = case.data[: rng.randint(1, len(case.data) - 1)]
+        elif kind == "xgmii_error":
+            case.error_at = rng.randrange(len(case.data))
+        elif kind == "no_sfd":
+            case.sfd = PREAMBLE_BYTE
+        yield case
+        index += 1
+
+
+# Ethernet frame sizes (header + payload + FCS) for fixed-size benchmarks
+FRAME_SIZES = [64, 128, 256, 512, 1024, 1280, 1518]
+
+# (frame size, weight) mixes
+IMIX = {
+    # 7:4:1 "simple IMIX"
+    "imix_simple": [(64, 7), (594, 4), (1518, 1)],
+    # RFC 6985 genome "abcdefg", each size once
+    "imix_rfc6985": [(64, 1), (128, 1), (256, 1), (512, 1), (1024, 1), (1280, 1), (1518, 1)],
+}
+
+
+def imix_sizes(mix, seed, num_frames):
+    """Seeded sequence of frame sizes drawn from an IMIX in its exact ratio."""
+    pattern = [size for size, weight in IMIX[mix] for _ in range(weight)]
+    rng = random.Random(seed)
+    out = []
+    while len(out) < num_frames:
+        block = list(pattern)
+        rng.shuffle(block)
+        out.extend(block)
+    return out[:num_frames]
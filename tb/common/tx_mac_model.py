@@ -0,0 +1,446 @@
+"""
+Cycle-level Python model of tx_mac, for scoreboarding the RTL clock by
+clock and for traffic studies far faster than simulation.
+
+TxMacModel mirrors tx_mac.v register for register: the FWFT FIFO, the
+frame generator (IDLE, PREAMBLE, MAC_HEADER, PAYLOAD, PAD, IFG) and the
+two output stages. tx_mac has no FCS or TERMINATE state: the FCS, /T/ and
+the idles after them are appended to the last data word a clock later
+(d1_*) and spill into the words behind it, and the model does the same.
+Each clock() takes what the RTL samples at a rising edge and leaves the
+registered outputs as they are after it:
+
+    model = TxMacModel(bytes_per_word=8, cut_through=True)
+    ready = model.tready
+    model.clock(tvalid, tdata, tkeep, tlast, pcs_ready)
+    model.out_xgmii_data, model.out_xgmii_ctl, model.frame_valid
+
+line_schedule() and xgmii_stream() skip the clocks altogether. With the
+next frame always ready by the time the last one is out (any cut-through
+run the source keeps up with, store and forward with the FIFO ahead), the
+/S/ of every frame follows from the one before with the deficit idle
+count, so millions of frames take seconds:
+
+    python -m common.tx_mac_model --width 64 --mix imix_simple --frames 1000000
+"""
+import argparse
+import sys
+import zlib
+from collections import deque
+
+import numpy as np
+
+from .codec import lanes_to_xgmii
+from .traffic import IMIX, imix_sizes, random_frames
+from .xgmii import IFG_SIZE, PREAMBLE_SFD, XGMII_ERROR, XGMII_IDLE, XGMII_START, XGMII_TERMINATE
+
+DEST_MAC = bytes.fromhex("001122334455")
+SRC_MAC = bytes.fromhex("AABBCCDDEEFF")
+ETHER_TYPE = bytes.fromhex("0800")
+# the MAC header and the two zero bytes tx_mac puts after it
+HEADER = DEST_MAC + SRC_MAC + ETHER_TYPE + bytes(2)
+# frame data (header to padding) of a minimum size frame; the two zero
+# bytes count towards the minimum payload
+MIN_DATA_SIZE = 14 + 46
+FCS_SIZE = 4
+MAX_FRAME_SIZE = 1518
+# longest payload that fits in MAX_FRAME_SIZE after the two zero bytes
+MAX_PAYLOAD_SIZE = MAX_FRAME_SIZE - len(HEADER) - FCS_SIZE
+# from the end of the frame data to the earliest next /S/
+END_GAP = FCS_SIZE + IFG_SIZE
+FIFO_DEPTH = 512
+# tx_mac frame bytes, FCS included, that are not payload
+FRAME_OVERHEAD = len(HEADER) + FCS_SIZE
+
+IDLE, PREAMBLE, MAC_HEADER, PAYLOAD, PAD, IFG = 0, 1, 2, 3, 4, 7
+STATE_NAMES = {IDLE: "IDLE", PREAMBLE: "PREAMBLE", MAC_HEADER: "MAC_HEADER", PAYLOAD: "PAYLOAD", PAD: "PAD", IFG: "IFG"}
+
+
+def frame_data(payload):
+    """What tx_mac sends between SFD and FCS for payload: header, payload, padding."""
+    return HEADER + bytes(payload).ljust(MIN_DATA_SIZE - len(HEADER), b"\0")
+
+
+class TxMacModel:
+    """
+    tx_mac with AXIS and XGMII words of bytes_per_word bytes, store and
+    forward or cut-through. Starts out as the RTL leaves reset; reset()
+    goes back there.
+    """
+
+    def __init__(self, bytes_per_word=4, cut_through=False, fifo_depth=FIFO_DEPTH):
+        if bytes_per_word not in (4, 8):
+            raise ValueError(f"tx_mac has 4 or 8 byte words, not {bytes_per_word}")
+        self.bytes_per_word = bytes_per_word
+        self.cut_through = bool(cut_through)
+        self.fifo_depth = fifo_depth
+
+        w = bytes_per_word
+        self._word_shift = w.bit_length() - 1
+        self._word_mask = (1 << 8 * w) - 1
+        self._all_ctl = (1 << w) - 1
+        self._idle_word = int.from_bytes(bytes([XGMII_IDLE]) * w, "little")
+        self._idle_end = int.from_bytes(bytes([XGMII_IDLE]) * 3 * w, "little")
+        self._end_mask = (1 << 24 * w) - 1
+        self._end_ctl = (1 << 3 * w) - 1
+        preamble = bytes([XGMII_START]) + PREAMBLE_SFD
+        self._preamble = [
+            (int.from_bytes(preamble[i : i + w], "little"), 1 if i == 0 else 0) for i in range(0, len(preamble), w)
+        ]
+        self._header = [int.from_bytes(HEADER[i : i + w], "little") for i in range(0, len(HEADER), w)]
+        self.reset()
+
+    def reset(self):
+        w = self.bytes_per_word
+        # sync_fifo: entries behind rd_data, and rd_data itself
+        self._fifo = deque()
+        self._rd_valid = False
+        self._rd_data = (0, False, w)
+
+        self.payload_length = 0
+        self.fifo_frames = 0
+        self.in_frame = False
+        self.drop_frame = False
+        self.started_full = False
+
+        self.state = IDLE
+        self.word_count = 0
+        self.data_count = 0
+        self.ifg_count = 0
+        self.deficit_idle_count = 0
+        self.frame_offset = 0
+        self.next_offset = 0
+        self._gen = (self._idle_word, self._all_ctl, 0, 0, False, False, False, 0)
+        # frame bytes the CRC has taken in, up to and including d1_data
+        self._crc_data = bytearray()
+
+        self._d1 = (self._idle_word, self._all_ctl, 0, False, False, False, 0)
+        self.d1_length = 0
+        self._spill_data = 0
+        self._spill_ctl = 0
+        self._spill_words = 0
+        self._prev_data = self._idle_word
+        self._prev_ctl = self._all_ctl
+        self._out_offset = 0
+
+        self.out_xgmii_data = self._idle_word
+        self.out_xgmii_ctl = self._all_ctl
+        self.out_xgmii_valid = False
+        self.frame_valid = False
+        self.frame_error = False
+        # (length, aborted) of the frame mac_stats counts at the last clock
+        self.stats_frame = None
+
+    @property
+    def tready(self):
+        return len(self._fifo) + self._rd_valid < self.fifo_depth
+
+    @property
+    def fifo_count(self):
+        return len(self._fifo) + self._rd_valid
+
+    def clock(self, tvalid=False, tdata=0, tkeep=0, tlast=False, pcs_ready=True):
+        """One rising edge with these inputs."""
+        w = self.bytes_per_word
+        cut_through = self.cut_through
+        advance = bool(pcs_ready)
+        state = self.state
+
+        fifo_empty = not self._rd_valid
+        fifo_tdata, fifo_last, fifo_bytes = self._rd_data
+        wr_en = bool(tvalid) and self.tready
+        in_bytes = (tkeep & self._all_ctl).bit_length()
+
+        underrun_abort = advance and state == PAYLOAD and fifo_empty
+        drop_read = self.drop_frame and not fifo_empty
+        rd_en = drop_read or (advance and state == PAYLOAD and not fifo_empty)
+        full_start = not cut_through and not self.tready and self.fifo_frames == 0
+        frame_ready = (self.fifo_frames != 0 or full_start) and not self.drop_frame
+        frame_start = advance and state == IDLE and frame_ready
+        frame_taken = frame_start and not full_start
+        frame_stored = wr_en and (not self.in_frame if cut_through else bool(tlast) and not self.started_full)
+
+        self.frame_valid = False
+        self.stats_frame = None
+        if advance:
+            self._output_stage()
+            self._generate(state, frame_ready, underrun_abort, fifo_tdata, fifo_last, fifo_bytes)
+
+        # AXIS side
+        self.frame_error = underrun_abort
+        if wr_en:
+            self.in_frame = not tlast
+            if tlast:
+                if self.payload_length + in_bytes > MAX_PAYLOAD_SIZE:
+                    self.frame_error = True
+                self.payload_length = 0
+            else:
+                self.payload_length = (self.payload_length + in_bytes) & 0xFFFF
+        if frame_stored and not frame_taken:
+            self.fifo_frames += 1
+        elif frame_taken and not frame_stored:
+            self.fifo_frames -= 1
+        if frame_start and full_start:
+            self.started_full = True
+        elif wr_en and tlast:
+            self.started_full = False
+
+        if underrun_abort:
+            self.drop_frame = True
+        elif drop_read and fifo_last:
+            self.drop_frame = False
+
+        # FWFT FIFO: a word written now is in rd_data two clocks later
+        pop = rd_en and self._rd_valid
+        fifo = self._fifo
+        if fifo and (not self._rd_valid or pop):
+            self._rd_data = fifo.popleft()
+            self._rd_valid = True
+        elif pop:
+            self._rd_valid = False
+        if wr_en:
+            # the FIFO keeps tkeep as a byte count of 1 to bytes_per_word
+            fifo.append((tdata & self._word_mask, bool(tlast), ((in_bytes - 1) & (w - 1)) + 1))
+
+    def _output_stage(self):
+        """d1_* with the FCS and /T/ merged in, moved up by the lane offset."""
+        w = self.bytes_per_word
+        d1_data, d1_ctl, d1_bytes, d1_last, d1_abort, d1_start, d1_offset = self._d1
+        gen_data, gen_ctl, gen_keep, gen_bytes, gen_last, gen_abort, gen_start, gen_offset = self._gen
+
+        if d1_last:
+            fcs = int.from_bytes(bytes([XGMII_ERROR]) * 4, "little") if d1_abort else zlib.crc32(self._crc_data)
+            end_data = (
+                d1_data
+                | fcs << 8 * d1_bytes
+                | XGMII_TERMINATE << 8 * (d1_bytes + FCS_SIZE)
+                | self._idle_end << 8 * (d1_bytes + FCS_SIZE + 1)
+            ) & self._end_mask
+            end_ctl = (self._end_ctl << (d1_bytes + (0 if d1_abort else FCS_SIZE))) & self._end_ctl
+            merged_data = end_data & self._word_mask
+            merged_ctl = end_ctl & self._all_ctl
+            self._spill_data = end_data >> 8 * w
+            self._spill_ctl = end_ctl >> w
+            self._spill_words = ((d1_bytes + FCS_SIZE) >> self._word_shift) & 3
+            self.frame_valid = not d1_abort
+            # mac_stats counts the frame to its FCS, or to the /E/
+            self.stats_frame = (self.d1_length if d1_abort else self.d1_length + FCS_SIZE, d1_abort)
+        elif self._spill_words:
+            merged_data = self._spill_data & self._word_mask
+            merged_ctl = self._spill_ctl & self._all_ctl
+            self._spill_data >>= 8 * w
+            self._spill_ctl >>= w
+            self._spill_words -= 1
+        else:
+            merged_data = d1_data
+            merged_ctl = d1_ctl
+
+        lane_offset = d1_offset if d1_start else self._out_offset
+        lane_shift = w - lane_offset
+        self.out_xgmii_data = ((merged_data << 8 * w | self._prev_data) >> 8 * lane_shift) & self._word_mask
+        self.out_xgmii_ctl = ((merged_ctl << w | self._prev_ctl) >> lane_shift) & self._all_ctl
+        self.out_xgmii_valid = True
+        self._prev_data = merged_data
+        self._prev_ctl = merged_ctl
+        self._out_offset = lane_offset
+
+        # the CRC takes in gen_data as it moves to d1_data
+        if gen_start:
+            self._crc_data = bytearray()
+        if gen_keep:
+            self._crc_data += gen_data.to_bytes(w, "little")[: gen_keep.bit_length()]
+        self._d1 = (gen_data, gen_ctl, gen_bytes, gen_last, gen_abort, gen_start, gen_offset)
+        self.d1_length = (self.data_count - w + gen_bytes) & 0xFFFF
+
+    def _generate(self, state, frame_ready, underrun_abort, fifo_tdata, fifo_last, fifo_bytes):
+        """The frame generator on an advancing clock."""
+        w = self.bytes_per_word
+        all_ctl = self._all_ctl
+        gen_bytes = self._gen[3]
+        data = self._idle_word
+        ctl = all_ctl
+        keep = 0
+        last = abort = start = False
+        offset = self._gen[7]
+
+        if state == IDLE:
+            if frame_ready:
+                data, ctl = self._preamble[0]
+                start = True
+                offset = self.frame_offset = self.next_offset
+                self.data_count = 0
+                if len(self._preamble) > 1:
+                    self.word_count = 1
+                    self.state = PREAMBLE
+                else:
+                    self.word_count = 0
+                    self.state = MAC_HEADER
+        elif state == PREAMBLE:
+            data, ctl = self._preamble[self.word_count]
+            if self.word_count == len(self._preamble) - 1:
+                self.word_count = 0
+                self.state = MAC_HEADER
+            else:
+                self.word_count += 1
+        elif state == MAC_HEADER:
+            data = self._header[self.word_count]
+            ctl = 0
+            keep = all_ctl
+            self.data_count = (self.data_count + w) & 0xFFFF
+            if self.word_count == len(self._header) - 1:
+                self.word_count = 0
+                self.state = PAYLOAD
+            else:
+                self.word_count += 1
+        elif state == PAYLOAD:
+            bytes_left = (MIN_DATA_SIZE - self.data_count) & 0xFFFF
+            data = fifo_tdata & ((1 << 8 * fifo_bytes) - 1)
+            ctl = 0
+            keep = all_ctl
+            self.data_count = (self.data_count + w) & 0xFFFF
+            if underrun_abort:
+                data = keep = gen_bytes = 0
+                last = abort = True
+                self.state = IFG
+            elif fifo_last:
+                if bytes_left > w and not bytes_left & 0x8000:
+                    self.state = PAD
+                else:
+                    # short payloads are padded within the last word
+                    lane_bytes = bytes_left & (2 * w - 1)
+                    gen_bytes = fifo_bytes if bytes_left & 0x8000 or lane_bytes < fifo_bytes else lane_bytes
+                    keep = (1 << gen_bytes) - 1
+                    last = True
+                    self.state = IFG
+        elif state == PAD:
+            bytes_left = (MIN_DATA_SIZE - self.data_count) & 0xFFFF
+            data = 0
+            ctl = 0
+            keep = all_ctl
+            self.data_count = (self.data_count + w) & 0xFFFF
+            if not (bytes_left > w and not bytes_left & 0x8000):
+                gen_bytes = bytes_left & (2 * w - 1)
+                keep = (1 << gen_bytes) - 1
+                last = True
+                self.state = IFG
+        elif state == IFG:
+            if self._gen[4]:
+                start_gap, self.deficit_idle_count = _start_gap(gen_bytes + self.frame_offset, self.deficit_idle_count)
+                self.next_offset = start_gap & (w - 1)
+                start_words = start_gap >> self._word_shift
+                if start_words <= 2:
+                    self.state = IDLE
+                else:
+                    self.ifg_count = start_words - 3
+            elif self.ifg_count == 0:
+                self.state = IDLE
+            else:
+                self.ifg_count -= 1
+        else:
+            self.state = IDLE
+
+        self._gen = (data, ctl, keep, gen_bytes, last, abort, start, offset)
+
+
+def _start_gap(end, deficit):
+    """
+    Bytes from the start of a frame's last data word to the next /S/, for
+    a frame ending end bytes into that word on the XGMII side, and the new
+    deficit idle count.
+    """
+    end_pos = (end + END_GAP) & 0xFF
+    deficit_sum = deficit + (end_pos & 3)
+    if deficit_sum < 4:
+        return end_pos & ~3, deficit_sum & 3
+    return (end_pos + 3) & ~3 & 0xFF, deficit_sum & 3
+
+
+def line_schedule(payload_lengths, bytes_per_word=4):
+    """
+    (start, term) arrays with the flat lane indexes of every frame's /S/
+    and /T/, counted from the first /S/, for payloads of these lengths
+    sent back to back: every frame ready when tx_mac goes back to IDLE, no
+    underruns, in_xgmii_pcs_ready high. Same lanes as codec.xgmii_frames()
+    gives for the RTL's output, less the lane of its first /S/.
+    """
+    w = bytes_per_word
+    # /S/, preamble and SFD
+    preamble_words = (1 + len(PREAMBLE_SFD)) // w
+    lengths = np.asarray(payload_lengths, dtype=np.int64)
+    # frame data, header to padding, and the bytes of it in the last word
+    data = len(HEADER) + np.maximum(lengths, MIN_DATA_SIZE - len(HEADER))
+    data_words = -(-data // w)
+    last_bytes = (data - (data_words - 1) * w).tolist()
+    to_last = (preamble_words + data_words - 1).tolist()
+
+    start = np.empty(len(lengths), dtype=np.int64)
+    term = np.empty(len(lengths), dtype=np.int64)
+    word = offset = deficit = 0
+    for n in range(len(lengths)):
+        start[n] = word * w + offset
+        last_word = word + to_last[n]
+        end = last_bytes[n] + offset
+        term[n] = last_word * w + end + FCS_SIZE
+        start_gap, deficit = _start_gap(end, deficit)
+        word = last_word + start_gap // w
+        offset = start_gap % w
+    return start, term
+
+
+def xgmii_stream(payloads, bytes_per_word=4):
+    """
+    XGMII (data, ctl) words tx_mac sends for payloads back to back, as
+    line_schedule() has them: from the word of the first /S/ to the word
+    after the last /T/ that has no frame bytes.
+    """
+    payloads = [bytes(payload) for payload in payloads]
+    start, term = line_schedule([len(payload) for payload in payloads], bytes_per_word)
+    total = int(term[-1]) + 1 if len(payloads) else 0
+    total += -total % bytes_per_word
+    lanes = np.full(total, XGMII_IDLE, dtype=np.uint8)
+    ctl = np.ones(total, dtype=bool)
+    for s, t, payload in zip(start.tolist(), term.tolist(), payloads):
+        data = frame_data(payload)
+        body = PREAMBLE_SFD + data + zlib.crc32(data).to_bytes(4, "little")
+        lanes[s] = XGMII_START
+        lanes[s + 1 : t] = np.frombuffer(body, dtype=np.uint8)
+        ctl[s + 1 : t] = False
+        lanes[t] = XGMII_TERMINATE
+    return lanes_to_xgmii(lanes, ctl, bytes_per_word)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="tx_mac line rate for a frame mix, from the model")
+    parser.add_argument("--width", type=int, choices=(32, 64), default=32, help="XGMII data width")
+    parser.add_argument("--mix", default="imix_simple", help=f"{', '.join(IMIX)}, random or a frame size")
+    parser.add_argument("--frames", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.mix in IMIX:
+        sizes = imix_sizes(args.mix, args.seed, args.frames)
+    elif args.mix == "random":
+        sizes = [len(frame) + FCS_SIZE for frame in random_frames(args.seed, args.frames, max_len=1514)]
+    else:
+        sizes = [int(args.mix)] * args.frames
+    sizes = np.array(sizes, dtype=np.int64)
+    # frame sizes are destination address to FCS, as in traffic.FRAME_SIZES
+    payloads = np.maximum(sizes - FRAME_OVERHEAD, 1)
+
+    bytes_per_word = args.width // 8
+    start, term = line_schedule(payloads, bytes_per_word)
+    frame_bytes = np.maximum(payloads, MIN_DATA_SIZE - len(HEADER)) + FRAME_OVERHEAD
+    # lanes up to the /S/ a frame after the last would get
+    lanes = int(term[-1]) + 1 + IFG_SIZE
+    gaps = start[1:] - term[:-1]
+    clocks = -(-lanes // bytes_per_word)
+    print(f"{len(sizes)} frames ({args.mix}), {args.width} bit XGMII: {clocks} clocks")
+    print(f"gap /T/ to /S/: {gaps.min()} to {gaps.max()} lanes, mean {gaps.mean():.3f}")
+    print(f"frame bytes per clock: {frame_bytes.sum() / clocks:.4f} of {bytes_per_word}")
+    print(f"payload bytes per clock: {payloads.sum() / clocks:.4f}")
+    print(f"at 10 Gb/s: {len(sizes) / (lanes * 8 / 10e9) / 1e6:.3f} Mframes/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
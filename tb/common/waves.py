@@ -0,0 +1,223 @@
+"""
+Waveforms of the clocks around whatever went wrong, instead of whole runs.
+
+A testbench makes one Waves for its DUT and calls trigger() wherever
+something interesting happens; watch() does that for every mismatch of a
+Scoreboard and watch_pulses() for status outputs such as frame_error:
+
+    waves = Waves(dut, CLOCK_PERIOD_NS)
+    waves.watch(scoreboard)
+    waves.watch_pulses(dut.frame_error)
+
+Models are built without any waveform support unless WAVES=1 (see
+common/sim.mk), so an ordinary run only notes the trigger times. Tests
+wrapped with @windowed save them to <toplevel>_waves.json when they fail
+and log the rerun that dumps the waveforms:
+
+    make WAVES=1 TESTCASE=test_cycle_model RANDOM_SEED=1234 [same parameters]
+
+A WAVES=1 run dumps WAVES_BEFORE clocks before to WAVES_AFTER clocks
+after every trigger saved for the test, and WAVES_AFTER clocks after
+every trigger of its own. The tests are deterministic for a given seed, so
+the rerun triggers where the failing run did. Trigger times count from
+when the Waves was made, so the rerun may run the test alone. start() and
+stop() open and close a window by hand, in WAVES=1 runs.
+"""
+import functools
+import json
+import logging
+import os
+
+import cocotb
+from cocotb import simulator
+from cocotb.handle import SimHandle
+from cocotb.triggers import NextTimeStep, RisingEdge, Timer
+from cocotb.utils import get_sim_time
+
+WAVES_BEFORE = int(os.environ.get("WAVES_BEFORE", "200"))
+WAVES_AFTER = int(os.environ.get("WAVES_AFTER", "50"))
+# triggers kept per Waves, the first ones of the test that do not fall in
+# the window of the one before
+WAVES_MAX_WINDOWS = int(os.environ.get("WAVES_MAX_WINDOWS", "16"))
+WAVES_WINDOWS = os.environ.get("WAVES_WINDOWS", "")
+# set by common/sim.mk for WAVES=1 models only
+WAVES_FILE = os.environ.get("WAVES_FILE", "")
+
+_current_test = None
+_controllers = []
+
+
+def _dump_on(dut):
+    """waves.v's dump_on in a WAVES=1 model, or None."""
+    if not WAVES_FILE:
+        return None
+    # bound into the toplevel with Verilator, a root module of its own
+    # otherwise
+    if hasattr(dut, "waves"):
+        return dut.waves.dump_on
+    handle = simulator.get_root_handle("waves")
+    return SimHandle(handle).dump_on if handle is not None else None
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class Waves:
+    def __init__(self, dut, period_ns, before=WAVES_BEFORE, after=WAVES_AFTER, path=None):
+        self.period_ns = period_ns
+        self.before = before
+        self.after = after
+        self.path = path or WAVES_WINDOWS or f"{os.environ.get('TOPLEVEL', dut._name)}_waves.json"
+        self.log = logging.getLogger("cocotb.tb").getChild("waves")
+        self.test = _current_test
+        self.origin = get_sim_time("ns")
+        # (ns from origin, reason)
+        self.triggers = []
+        self.dropped = 0
+
+        self._dump_on = _dump_on(dut)
+        self._open = 0
+        self._tasks = []
+        self._index = len(_controllers)
+        _controllers.append(self)
+
+        if self.enabled and self.test:
+            saved = _load(self.path).get(self.test, [])
+            if self._index < len(saved):
+                for offset, _ in saved[self._index]["triggers"]:
+                    start = max(offset - before * period_ns, 0)
+                    self._open_window(start, offset + after * period_ns - start)
+
+    @property
+    def enabled(self):
+        """True in WAVES=1 runs, which can dump waveforms."""
+        return self._dump_on is not None
+
+    def trigger(self, reason):
+        """Something worth a look happened at this clock."""
+        offset = round(get_sim_time("ns") - self.origin)
+        # one window covers a run of mismatches, the next one starts after it
+        covered = self.triggers and offset < self.triggers[-1][0] + self.after * self.period_ns
+        if covered or len(self.triggers) >= WAVES_MAX_WINDOWS:
+            self.dropped += 1
+            return
+        self.triggers.append((offset, reason))
+        if self.enabled:
+            self._open_window(offset, self.after * self.period_ns)
+
+    def watch(self, scoreboard):
+        """A trigger for every mismatch scoreboard reports."""
+        scoreboard.on_error = lambda message: self.trigger(f"{scoreboard.name}: {message}")
+
+    def watch_pulses(self, *signals):
+        """A trigger for every rising edge of each signal."""
+        for signal in signals:
+            self._tasks.append(cocotb.start_soon(self._pulses(signal)))
+
+    async def _pulses(self, signal):
+        while True:
+            await RisingEdge(signal)
+            self.trigger(signal._name)
+
+    def start(self):
+        """Dump from now on, until stop()."""
+        if self.enabled:
+            self._tasks.append(cocotb.start_soon(self._change(1)))
+
+    def stop(self):
+        if self.enabled:
+            self._tasks.append(cocotb.start_soon(self._change(-1)))
+
+    def _open_window(self, start, length):
+        self._tasks.append(cocotb.start_soon(self._window(self.origin + start, length)))
+
+    async def _window(self, start_ns, length_ns):
+        delay = round(start_ns - get_sim_time("ns"))
+        if delay > 0:
+            await Timer(delay, "ns")
+        await self._change(1)
+        await Timer(max(round(length_ns), 1), "ns")
+        await self._change(-1)
+
+    async def _change(self, windows):
+        # triggers come from monitors in the read-only phase, which must
+        # not write
+        await NextTimeStep()
+        was_open = self._open > 0
+        self._open += windows
+        if (self._open > 0) != was_open:
+            self._dump_on.value = int(self._open > 0)
+
+    def close(self):
+        """Ends every window; the next test starts with dumping off."""
+        for task in self._tasks:
+            task.kill()
+        self._tasks.clear()
+        if self.enabled and self._open > 0:
+            self._open = 0
+            self._dump_on.setimmediatevalue(0)
+
+    def entry(self):
+        return {"period_ns": self.period_ns, "triggers": self.triggers}
+
+    def report(self):
+        if not self.triggers:
+            return
+        dropped = f" ({self.dropped} more not kept)" if self.dropped else ""
+        if self.enabled:
+            self.log.info(f"{self.test}: waveforms around {len(self.triggers)} triggers{dropped} in {WAVES_FILE}")
+        else:
+            self.log.info(
+                f"{self.test}: {len(self.triggers)} triggers{dropped} saved to {self.path}, for their "
+                f"waveforms rerun with the same parameters and "
+                f"make WAVES=1 TESTCASE={self.test} RANDOM_SEED={cocotb.RANDOM_SEED}"
+            )
+        for offset, reason in self.triggers[:4]:
+            self.log.info(f"  {offset} ns: {reason}")
+
+
+def _save(test, controllers, failed):
+    """Keeps the triggers of a failed test, forgets those of a passing one."""
+    if not controllers:
+        return
+    path = controllers[0].path
+    windows = _load(path)
+    entries = [waves.entry() for waves in controllers]
+    if failed and any(entry["triggers"] for entry in entries):
+        windows[test] = entries
+    elif windows.pop(test, None) is None:
+        return
+    with open(path, "w") as f:
+        json.dump(windows, f, indent=1)
+
+
+def windowed(test_fn):
+    """
+    Saves the triggers of every Waves the test makes if it fails, for a
+    WAVES=1 rerun, and closes their windows when it ends.
+    """
+
+    @functools.wraps(test_fn)
+    async def wrapper(*args, **kwargs):
+        global _current_test
+        _controllers.clear()
+        _current_test = test_fn.__name__
+        failed = True
+        try:
+            result = await test_fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            for waves in _controllers:
+                waves.close()
+                if failed:
+                    waves.report()
+            _save(_current_test, _controllers, failed)
+            _controllers.clear()
+            _current_test = None
+
+    return wrapper
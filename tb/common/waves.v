@@ -0,0 +1,43 @@
+// Waveform dump for common/waves.py to switch on and off, built in with
+// WAVES=1 (see common/sim.mk). Nothing is dumped while dump_on is low.
+module waves;
+
+    reg dump_on = 1'b0;
+
+`ifdef VERILATOR
+    // $dumpoff and $dumpon compile to nothing in Verilator, so
+    // waves_dpi.cpp pauses and resumes the $dumpvars dumper instead
+    import "DPI-C" context function void waves_dump(input bit on);
+
+    initial begin
+        $dumpfile(`WAVES_FILE);
+        $dumpvars;
+        waves_dump(1'b0);
+    end
+
+    always @(dump_on) waves_dump(dump_on);
+
+    final waves_dump(1'b0);
+`else
+    initial begin
+        $dumpfile(`WAVES_FILE);
+        $dumpvars(0, `WAVES_TOP);
+        $dumpoff;
+    end
+
+    always @(dump_on) begin
+        if (dump_on) begin
+            $dumpon;
+        end else begin
+            $dumpoff;
+        end
+    end
+`endif
+
+endmodule
+
+`ifdef VERILATOR
+// one toplevel only with Verilator, so waves goes inside it, where cocotb
+// finds it as dut.waves
+bind `WAVES_TOP waves waves ();
+`endif
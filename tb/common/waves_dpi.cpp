@@ -0,0 +1,28 @@
+// The Verilator side of common/waves.v: dumping on and off for the model
+// cocotb builds, which is always prefixed Vtop.
+
+#include "Vtop__Syms.h"
+#include "svdpi.h"
+#include "verilated.h"
+
+namespace {
+
+// $dumpvars needs tracing allowed before time 0; cocotb's main only does
+// that for its own whole-run --trace
+struct TraceEverOn {
+    TraceEverOn() { Verilated::traceEverOn(true); }
+} trace_ever_on;
+
+}  // namespace
+
+extern "C" void waves_dump(svBit on) {
+    const VerilatedScope* scope = static_cast<const VerilatedScope*>(svGetScope());
+    Vtop__Syms* syms = static_cast<Vtop__Syms*>(scope->symsp());
+    const VerilatedLockGuard lock{syms->__Vm_dumperMutex};
+    syms->__Vm_dumping = on && syms->__Vm_dumperp;
+    // cocotb may end the process without closing the dump, so every
+    // window is on disk when it closes
+    if (!on && syms->__Vm_dumperp) {
+        syms->__Vm_dumperp->flush();
+    }
+}
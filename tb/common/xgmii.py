@@ -0,0 +1,49 @@
+XGMII_IDLE = 0x07
+XGMII_START = 0xFB
+XGMII_TERMINATE = 0xFD
+XGMII_ERROR = 0xFE
+
+PREAMBLE_BYTE = 0x55
+SFD_BYTE = 0xD5
+PREAMBLE_SFD = bytes([PREAMBLE_BYTE] * 6 + [SFD_BYTE])
+
+IFG_SIZE = 12
+
+
+def xgmii_lanes(frames, ifg=IFG_SIZE, lanes=4):
+    """
+    Lazily turn an iterable of frames (bytes, without preamble) into a stream
+    of (byte, ctl) XGMII lanes: /S/, preamble, SFD, frame, /T/, then at least
+    ifg idles so that the next /S/ lands on a multiple of lanes bytes (lane
+    0 or lane 4 of a 64-bit word with lanes=4).
+    """
+    pos = 0
+    for frame in frames:
+        yield XGMII_START, 1
+        for b in PREAMBLE_SFD:
+            yield b, 0
+        for b in frame:
+            yield b, 0
+        yield XGMII_TERMINATE, 1
+        pos += 1 + len(PREAMBLE_SFD) + len(frame) + 1
+        idle = ifg + (-(pos + ifg) % lanes)
+        for _ in range(idle):
+            yield XGMII_IDLE, 1
+        pos += idle
+
+
+def xgmii_stream(frames, ifg=IFG_SIZE, lanes=4, word_bytes=None):
+    """
+    Group xgmii_lanes() into (data, ctl) words of word_bytes lanes (lanes
+    by default), lane 0 in the LSB.
+    """
+    word_bytes = word_bytes or lanes
+    data = ctl = 0
+    k = 0
+    for b, c in xgmii_lanes(frames, ifg, lanes):
+        data |= b << (8 * k)
+        ctl |= c << k
+        k += 1
+        if k == word_bytes:
+            yield data, ctl
+            data = ctl = k = 0
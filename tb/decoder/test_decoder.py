@@ -0,0 +1,143 @@
+"""
+decoder tests.
+
+    make [XGMII_DATA_WIDTH=32] [NUM_FRAMES=200] [NUM_BLOCKS=2000] [SEED=1]
+
+Blocks of random frames, /S/ on lane 0 and lane 4 and /T/ on every lane,
+and random blocks of any header and type, against common.encoder_ref.
+"""
+import os
+import random
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import RisingEdge, ClockCycles
+
+from common.encoder_ref import (
+    BLOCK_TYPE_C0,
+    BLOCK_TYPE_S0,
+    BLOCK_TYPE_S4,
+    BLOCK_TYPE_T,
+    BLOCK_TYPE_T0,
+    FRAME_BLOCK_TYPES,
+    SYNC_CTRL,
+    decode_stream,
+    encode_stream,
+)
+from common.traffic import random_frames
+from common.xgmii import xgmii_stream
+
+NUM_FRAMES = int(os.environ.get("NUM_FRAMES", "200"))
+NUM_BLOCKS = int(os.environ.get("NUM_BLOCKS", "2000"))
+SEED = int(os.environ.get("SEED", "1"))
+XGMII_DATA_WIDTH = int(os.environ.get("XGMII_DATA_WIDTH", "32"))
+
+KNOWN_TYPES = [BLOCK_TYPE_C0, BLOCK_TYPE_S0, BLOCK_TYPE_S4, BLOCK_TYPE_T0] + [
+    t for t, _ in BLOCK_TYPE_T.values()
+]
+
+
+def random_blocks(seed, num_blocks):
+    # any header, known and unknown block types, random payloads
+    rng = random.Random(seed)
+    for _ in range(num_blocks):
+        header = rng.choice([0b00, 0b01, 0b10, 0b10, 0b10, 0b11])
+        btype = rng.choice(KNOWN_TYPES) if rng.random() < 0.8 else rng.randrange(256)
+        yield header, (btype << 56) | rng.getrandbits(56)
+
+
+class DecoderTestbench:
+    def __init__(self, dut):
+        self.dut = dut
+        self.bytes_per_word = len(dut.out_xgmii_ctl)
+        self.words_per_block = 8 // self.bytes_per_word
+        self.blocks_sent = 0
+        self.words_checked = 0
+
+    async def reset(self):
+        self.dut.rst.value = 0
+        self.dut.in_encoded_data.value = 0
+        self.dut.in_encoded_header.value = 0
+        self.dut.in_encoded_valid.value = 0
+        self.dut.in_xgmii_ready.value = 1
+
+        await ClockCycles(self.dut.clk, 5)
+        self.dut.rst.value = 1
+        await ClockCycles(self.dut.clk, 5)
+
+    async def send_blocks(self, blocks):
+        # the decoder emits one XGMII word per clock, so one block every
+        # words_per_block clocks keeps its output busy on every cycle
+        for header, block in blocks:
+            await RisingEdge(self.dut.clk)
+            self.dut.in_encoded_header.value = header
+            self.dut.in_encoded_data.value = block
+            self.dut.in_encoded_valid.value = 1
+            if self.words_per_block > 1:
+                await RisingEdge(self.dut.clk)
+                self.dut.in_encoded_valid.value = 0
+            self.blocks_sent += 1
+        await RisingEdge(self.dut.clk)
+        self.dut.in_encoded_valid.value = 0
+
+    async def check_xgmii(self, expected):
+        expected = iter(expected)
+        while True:
+            await RisingEdge(self.dut.clk)
+            if not self.dut.out_xgmii_valid.value:
+                continue
+
+            data = int(self.dut.out_xgmii_data.value)
+            ctl = int(self.dut.out_xgmii_ctl.value)
+            exp_data, exp_ctl = next(expected)
+
+            assert (data, ctl) == (exp_data, exp_ctl), (
+                f"Word {self.words_checked}: got data=0x{data:0{2 * self.bytes_per_word}x} ctl=0x{ctl:x}, "
+                f"expected data=0x{exp_data:0{2 * self.bytes_per_word}x} ctl=0x{exp_ctl:x}"
+            )
+            self.words_checked += 1
+
+    async def run(self, stimulus, expected):
+        check_task = cocotb.start_soon(self.check_xgmii(expected))
+        await self.send_blocks(stimulus)
+        await ClockCycles(self.dut.clk, 5)
+        check_task.kill()
+
+        self.dut._log.info(f"Checked {self.words_checked} XGMII words from {self.blocks_sent} blocks")
+        assert self.words_checked == self.words_per_block * self.blocks_sent, (
+            f"Decoder produced {self.words_checked} words for {self.blocks_sent} blocks"
+        )
+
+
+@cocotb.test()
+async def test_decoder_stream(dut):
+    tb = DecoderTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    block_types = set()
+
+    def blocks():
+        # /S/ on any 4-byte boundary, lane 0 or lane 4 of a block
+        return encode_stream(xgmii_stream(random_frames(SEED, NUM_FRAMES)))
+
+    def tally(blocks):
+        for header, block in blocks:
+            if header == SYNC_CTRL:
+                block_types.add(block >> 56)
+            yield header, block
+
+    await tb.run(tally(blocks()), decode_stream(blocks(), XGMII_DATA_WIDTH))
+    missing = [f"{t:02x}" for t in FRAME_BLOCK_TYPES if t not in block_types]
+    assert not missing, f"no blocks of type {', '.join(missing)}"
+
+
+@cocotb.test()
+async def test_decoder_random_blocks(dut):
+    tb = DecoderTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    await tb.run(random_blocks(SEED, NUM_BLOCKS), decode_stream(random_blocks(SEED, NUM_BLOCKS), XGMII_DATA_WIDTH))
@@ -0,0 +1,151 @@
+"""
+descrambler tests: random words through common.scrambler_ref and back.
+
+    make [PCS_DATA_WIDTH=64] [REGISTER_OUTPUT=0] [NUM_WORDS=20000] [SEED=1]
+
+test_random_stream checks every word of NUM_WORDS with random gaps in
+in_data_valid; out_data_valid must follow in_data_valid REGISTER_OUTPUT
+clocks later. test_self_sync starts the scrambler from a random state.
+test_numpy_words takes the expected words from the uint64 array form of
+DescramblerRef.descramble().
+"""
+import os
+import random
+from collections import deque
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+
+from common.scoreboard import Scoreboard
+from common.scrambler_ref import STATE_BITS, DescramblerRef, ScramblerRef
+from common.trace import TraceRecorder, traced
+
+PCS_DATA_WIDTH = int(os.environ.get("PCS_DATA_WIDTH", "64"))
+REGISTER_OUTPUT = int(os.environ.get("REGISTER_OUTPUT", "0"))
+NUM_WORDS = int(os.environ.get("NUM_WORDS", "20000"))
+SEED = int(os.environ.get("SEED", "1"))
+
+HEX_DIGITS = f"0{(PCS_DATA_WIDTH + 3) // 4}x"
+# words until the descrambler state holds nothing but received bits
+SYNC_WORDS = -(-STATE_BITS // PCS_DATA_WIDTH)
+
+
+class DescramblerTestbench:
+    def __init__(self, dut):
+        self.dut = dut
+        self.out_trace = TraceRecorder("descrambler.out", (("cycle", "d"), ("out", HEX_DIGITS)), dut._log)
+        self.scoreboard = Scoreboard("descrambler", dut._log)
+        # in_data_valid of the last REGISTER_OUTPUT + 1 clocks, newest last
+        self.valid_history = deque([0] * (REGISTER_OUTPUT + 1), maxlen=REGISTER_OUTPUT + 1)
+        self.valid_errors = 0
+        self.cycle = 0
+        # output words not to compare
+        self.skip = 0
+
+    async def reset(self):
+        self.dut.rst.value = 0
+        self.dut.in_data.value = 0
+        self.dut.in_data_valid.value = 0
+        await ClockCycles(self.dut.clk, 4)
+        self.dut.rst.value = 1
+        await ClockCycles(self.dut.clk, 2)
+        cocotb.start_soon(self.monitor())
+
+    async def monitor(self):
+        dut = self.dut
+        while True:
+            await RisingEdge(dut.clk)
+            await ReadOnly()
+            self.cycle += 1
+            self.valid_history.append(int(dut.in_data_valid.value))
+            out_valid = int(dut.out_data_valid.value)
+            if out_valid != self.valid_history[0]:
+                self.valid_errors += 1
+            if out_valid:
+                out = int(dut.out_data.value)
+                self.out_trace.record(self.cycle, out)
+                if self.skip:
+                    self.skip -= 1
+                else:
+                    self.scoreboard.check(out)
+
+    async def send(self, plain, scrambler, rng, idle_prob=0.25, skip=0):
+        """
+        Scramble plain with scrambler and drive it, expecting plain back.
+        The first skip words are not compared.
+        """
+        dut = self.dut
+        self.skip = skip
+        for n, (expected, word) in enumerate(zip(plain, scrambler.scramble(plain))):
+            # NumPy words too
+            expected, word = int(expected), int(word)
+            if n >= skip:
+                self.scoreboard.expect(expected, f"word {n}")
+            while rng.random() < idle_prob:
+                await RisingEdge(dut.clk)
+                dut.in_data.value = rng.getrandbits(PCS_DATA_WIDTH)
+                dut.in_data_valid.value = 0
+            await RisingEdge(dut.clk)
+            dut.in_data.value = word
+            dut.in_data_valid.value = 1
+        await RisingEdge(dut.clk)
+        dut.in_data_valid.value = 0
+        await ClockCycles(dut.clk, REGISTER_OUTPUT + 2)
+
+    def check(self):
+        self.dut._log.info(self.scoreboard.summary())
+        assert self.scoreboard.errors == 0, self.scoreboard.summary()
+        assert self.valid_errors == 0, f"out_data_valid off in {self.valid_errors} clocks"
+
+
+@cocotb.test()
+@traced
+async def test_random_stream(dut):
+    tb = DescramblerTestbench(dut)
+    rng = random.Random(SEED)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    plain = [rng.getrandbits(PCS_DATA_WIDTH) for _ in range(NUM_WORDS)]
+    await tb.send(plain, ScramblerRef(PCS_DATA_WIDTH), rng)
+    tb.check()
+
+
+@cocotb.test()
+@traced
+async def test_self_sync(dut):
+    tb = DescramblerTestbench(dut)
+    rng = random.Random(SEED + 1)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    # the descrambler does not know the scrambler state, it is right once
+    # 58 bits have come in
+    plain = [rng.getrandbits(PCS_DATA_WIDTH) for _ in range(1000)]
+    scrambler = ScramblerRef(PCS_DATA_WIDTH, state=rng.getrandbits(STATE_BITS))
+    await tb.send(plain, scrambler, rng, skip=SYNC_WORDS)
+    tb.check()
+
+
+@cocotb.test(skip=PCS_DATA_WIDTH > 64)
+@traced
+async def test_numpy_words(dut):
+    tb = DescramblerTestbench(dut)
+    rng = random.Random(SEED + 2)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    plain = np.random.default_rng(SEED).integers(0, 1 << PCS_DATA_WIDTH, size=1000, dtype=np.uint64)
+    scrambled = ScramblerRef(PCS_DATA_WIDTH).scramble(plain)
+    descrambled = DescramblerRef(PCS_DATA_WIDTH).descramble(scrambled)
+    assert isinstance(descrambled, np.ndarray) and descrambled.dtype == np.uint64, type(descrambled)
+    assert np.array_equal(descrambled, plain), "DescramblerRef does not undo ScramblerRef"
+
+    # what the RTL hands back is checked against the array
+    await tb.send(descrambled, ScramblerRef(PCS_DATA_WIDTH), rng)
+    tb.check()
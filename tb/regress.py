@@ -0,0 +1,293 @@
+"""
+Run every cocotb testbench under tb/ in parallel and merge the results.
+
+    python tb/regress.py [-j N] [--sim verilator] [--compare icarus]
+                         [--only crc32,rx_mac] [VAR=value ...]
+
+Each tb/<name>/Makefile is one testbench. Testbenches listed in SWEEPS are
+expanded into one job per parameter combination. Every job has its own
+results file and log under --build-dir. Compiled models live in
+tb/sim_cache/, keyed by a hash of sources and parameters (see
+common/sim.mk), so each parameter set builds its own model once and later
+runs reuse it. Trailing VAR=value arguments go to every make call.
+
+--compare runs every job a second time on another simulator and reports
+the speedup per testbench, both for test run time (compilation excluded)
+and for wall time.
+
+The merged report is written as JUnit (regress.xml) and JSON (regress.json)
+into --build-dir. Jobs are started longest first, using the wall times
+from the previous regress.json when there is one.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+TB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# testbench -> {make variable: values}; every combination is one job
+SWEEPS = {
+    "crc32": {"SLICE_LENGTH": list(range(1, 17)), "PIPELINE": [0, 1]},
+    "scrambler": {"PCS_DATA_WIDTH": [32, 64, 128], "REGISTER_OUTPUT": [0, 1]},
+    "descrambler": {"PCS_DATA_WIDTH": [32, 64, 128], "REGISTER_OUTPUT": [0, 1]},
+    "encoder": {"XGMII_DATA_WIDTH": [32, 64]},
+    "decoder": {"XGMII_DATA_WIDTH": [32, 64]},
+    "sync_fifo": {"FWFT": [0, 1]},
+    "tx_mac": {"DATA_WIDTH": [32, 64], "CUT_THROUGH": [0, 1]},
+    "rx_mac": {"DATA_WIDTH": [32, 64]},
+    "top": {"DATA_WIDTH": [32, 64]},
+    "bulk": {"DUT": ["tx_mac", "rx_mac", "pcs"], "DATA_WIDTH": [32, 64]},
+}
+
+
+def discover(tb_dir=TB_DIR):
+    """Testbench directories, i.e. those holding a cocotb Makefile."""
+    names = []
+    for name in sorted(os.listdir(tb_dir)):
+        makefile = os.path.join(tb_dir, name, "Makefile")
+        if os.path.isfile(makefile):
+            with open(makefile) as f:
+                if re.search(r"^\s*MODULE\s*\??=", f.read(), re.M):
+                    names.append(name)
+    return names
+
+
+def expand_jobs(names, sweeps=SWEEPS):
+    jobs = []
+    for name in names:
+        sweep = sweeps.get(name, {})
+        keys = list(sweep)
+        for values in itertools.product(*(sweep[k] for k in keys)):
+            params = dict(zip(keys, values))
+            label = ",".join(f"{k}={v}" for k, v in params.items())
+            jobs.append({"id": f"{name}[{label}]" if label else name, "tb": name, "params": params})
+    return jobs
+
+
+def _job_dir(build_dir, job_id):
+    # no "=" in the path: cocotb re-invokes make with the results file as a
+    # target, and make would read it as a variable assignment
+    return os.path.join(build_dir, re.sub(r"[^\w.-]+", "_", job_id).strip("_"))
+
+
+def parse_results(path):
+    """Test cases from a cocotb results.xml."""
+    tests = []
+    for case in ET.parse(path).getroot().iter("testcase"):
+        status = "passed"
+        message = ""
+        for tag in ("failure", "error", "skipped"):
+            node = case.find(tag)
+            if node is not None:
+                status = "skipped" if tag == "skipped" else "failed"
+                message = node.get("message", "") or (node.text or "")
+                break
+        tests.append({
+            "name": case.get("name"),
+            "classname": case.get("classname"),
+            "status": status,
+            "message": message,
+            "time": float(case.get("time", 0)),
+            "sim_time_ns": float(case.get("sim_time_ns", 0)),
+        })
+    return tests
+
+
+def run_job(job, sim, build_dir, make_args):
+    job_dir = _job_dir(build_dir, f"{sim}-{job['id']}")
+    os.makedirs(job_dir, exist_ok=True)
+    results = os.path.join(job_dir, "results.xml")
+    log_path = os.path.join(job_dir, "make.log")
+    if os.path.exists(results):
+        os.remove(results)
+
+    tb_path = os.path.join(TB_DIR, job["tb"])
+    cmd = [
+        "make",
+        f"SIM={sim}",
+        f"COCOTB_RESULTS_FILE={results}",
+    ]
+    cmd += [f"{k}={v}" for k, v in job["params"].items()]
+    cmd += make_args
+
+    start = time.monotonic()
+    with open(log_path, "w") as log:
+        # the Makefiles locate sources through $(PWD), which make -C leaves alone
+        proc = subprocess.run(
+            cmd, cwd=tb_path, env=dict(os.environ, PWD=tb_path), stdout=log, stderr=subprocess.STDOUT
+        )
+    wall = time.monotonic() - start
+
+    result = dict(job, sim=sim, returncode=proc.returncode, wall_time=wall, log=log_path, tests=[])
+    if os.path.exists(results):
+        result["tests"] = parse_results(results)
+    if proc.returncode != 0 and not any(t["status"] == "failed" for t in result["tests"]):
+        # build or simulator failure, no test got to report it
+        result["tests"].append({
+            "name": "make",
+            "classname": job["tb"],
+            "status": "failed",
+            "message": f"make exited with {proc.returncode}, see {log_path}",
+            "time": wall,
+            "sim_time_ns": 0.0,
+        })
+    return result
+
+
+def write_junit(results, path, wall_time):
+    root = ET.Element("testsuites", name="regress", time=f"{wall_time:.3f}")
+    for res in results:
+        tests = res["tests"]
+        suite = ET.SubElement(
+            root, "testsuite",
+            name=res["id"],
+            tests=str(len(tests)),
+            failures=str(sum(t["status"] == "failed" for t in tests)),
+            skipped=str(sum(t["status"] == "skipped" for t in tests)),
+            time=f"{res['wall_time']:.3f}",
+        )
+        if res["params"]:
+            props = ET.SubElement(suite, "properties")
+            for key, value in res["params"].items():
+                ET.SubElement(props, "property", name=key, value=str(value))
+        for t in tests:
+            case = ET.SubElement(
+                suite, "testcase",
+                name=t["name"],
+                classname=f"{res['id']}.{t['classname']}",
+                time=f"{t['time']:.3f}",
+                sim_time_ns=f"{t['sim_time_ns']:.3f}",
+            )
+            if t["status"] == "failed":
+                ET.SubElement(case, "failure", message=t["message"])
+            elif t["status"] == "skipped":
+                ET.SubElement(case, "skipped")
+    ET.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def speedups(results, baseline):
+    """Per testbench speedup of results over baseline, summed over its jobs."""
+    totals = {}
+    for res in results:
+        base = baseline.get(res["id"])
+        if base is None or any(x["status"] == "failed" for x in res["tests"] + base["tests"]):
+            continue
+        t = totals.setdefault(res["tb"], [0.0, 0.0, 0.0, 0.0])
+        t[0] += sum(x["time"] for x in res["tests"])
+        t[1] += sum(x["time"] for x in base["tests"])
+        t[2] += res["wall_time"]
+        t[3] += base["wall_time"]
+    return {
+        tb: {
+            "test_time": test,
+            "baseline_test_time": base_test,
+            "test_speedup": base_test / test if test else None,
+            "wall_time": wall,
+            "baseline_wall_time": base_wall,
+            "wall_speedup": base_wall / wall if wall else None,
+        }
+        for tb, (test, base_test, wall, base_wall) in totals.items()
+    }
+
+
+def previous_wall_times(path):
+    try:
+        with open(path) as f:
+            return {r["id"]: r["wall_time"] for r in json.load(f)["jobs"]}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--sim", default=os.environ.get("SIM", "verilator"))
+    parser.add_argument("--compare", metavar="SIM", help="also run on SIM and report the speedup")
+    parser.add_argument("--only", help="comma separated testbench names")
+    parser.add_argument("--no-sweep", action="store_true", help="run each testbench with its defaults only")
+    parser.add_argument("--build-dir", default=os.path.join(TB_DIR, "regress_build"))
+    parser.add_argument("make_args", nargs="*", metavar="VAR=value")
+    args = parser.parse_args(argv)
+
+    names = discover()
+    if args.only:
+        wanted = args.only.split(",")
+        unknown = set(wanted) - set(names)
+        if unknown:
+            parser.error(f"unknown testbench: {', '.join(sorted(unknown))}")
+        names = [n for n in names if n in wanted]
+
+    build_dir = os.path.abspath(args.build_dir)
+    os.makedirs(build_dir, exist_ok=True)
+    json_path = os.path.join(build_dir, "regress.json")
+    xml_path = os.path.join(build_dir, "regress.xml")
+
+    jobs = expand_jobs(names, {} if args.no_sweep else SWEEPS)
+    last = previous_wall_times(json_path)
+    jobs.sort(key=lambda j: -last.get(j["id"], float("inf")))
+
+    sims = [args.sim] + ([args.compare] if args.compare else [])
+    print(f"{len(jobs)} jobs from {len(names)} testbenches on {args.jobs} workers ({', '.join(sims)})")
+    start = time.monotonic()
+    results = []
+    baseline = {}
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [
+            pool.submit(run_job, job, sim, build_dir, args.make_args) for sim in sims for job in jobs
+        ]
+        for future in as_completed(futures):
+            res = future.result()
+            if res["sim"] == args.sim:
+                results.append(res)
+            else:
+                baseline[res["id"]] = res
+            failed = [t["name"] for t in res["tests"] if t["status"] == "failed"]
+            status = f"FAIL ({', '.join(failed)})" if failed else "ok"
+            print(f"  {res['sim']:<10} {res['id']:<32} {res['wall_time']:7.1f}s  {status}", flush=True)
+    wall = time.monotonic() - start
+
+    results.sort(key=lambda r: r["id"])
+    summary = {
+        "sim": args.sim,
+        "wall_time": wall,
+        "serial_time": sum(r["wall_time"] for r in results),
+        "tests": sum(len(r["tests"]) for r in results),
+        "failed": sum(t["status"] == "failed" for r in results for t in r["tests"]),
+        "skipped": sum(t["status"] == "skipped" for r in results for t in r["tests"]),
+    }
+    tmp = json_path + ".tmp"
+    with open(tmp, "w") as f:
+        report = {"summary": summary, "jobs": results}
+        if args.compare:
+            report["compare"] = {
+                "sim": args.compare,
+                "jobs": [baseline[r["id"]] for r in results if r["id"] in baseline],
+                "speedup": speedups(results, baseline),
+            }
+        json.dump(report, f, indent=2)
+    os.replace(tmp, json_path)
+    write_junit(results, xml_path, wall)
+
+    print(
+        f"{summary['tests']} tests, {summary['failed']} failed, {summary['skipped']} skipped "
+        f"in {wall:.1f}s (serial {summary['serial_time']:.1f}s)"
+    )
+    if args.compare:
+        sp_all = speedups(results, baseline)
+        print(f"speedup of {args.sim} over {args.compare}:" + ("" if sp_all else " no testbench passed on both"))
+        for tb, sp in sorted(sp_all.items()):
+            test = f"{sp['test_speedup']:6.1f}x" if sp["test_speedup"] else "     -"
+            print(f"  {tb:<16} tests {test}   wall {sp['wall_speedup']:6.1f}x")
+    print(f"reports: {xml_path} {json_path}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
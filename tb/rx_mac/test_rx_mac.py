@@ -1,178 +1,299 @@
+"""
+rx_mac tests.
+
+    make [DATA_WIDTH=32] [NUM_FRAMES=200] [SEED=1] [RX_ERRORS=bad_fcs=0.05,...]
+         [PCAP_IN=capture.pcapng] [PCAP_FRAMES=0] [PCAP_TIMING=0] [PCAP_OUT=rx_mac_32_axis.pcap]
+
+Files the tests write are named after DATA_WIDTH by default, rx_mac_<width>_*,
+so that the regress.py jobs of the sweep do not write over each other.
+
+test_pcap_replay sends the frames of PCAP_IN (the first PCAP_FRAMES, 0 for
+all), or of a generated capture without it, and writes what comes out on
+AXIS to PCAP_OUT with simulation timestamps.
+
+test_stress, test_address_filter and test_pcap_replay note the time of
+every scoreboard mismatch (and of every crc_error pulse in
+test_pcap_replay, whose frames all have a good FCS). When they fail they
+log a rerun with WAVES=1 that dumps rx_mac_waves.fst around just those
+clocks, see common/waves.py.
+"""
+import itertools
+import os
+
 import cocotb
 from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge, ClockCycles
-from crc import Calculator, Crc32
+from cocotb.triggers import RisingEdge, ClockCycles, ReadOnly, with_timeout
+from cocotb.result import SimTimeoutError
+from cocotb.utils import get_sim_time
+from common.axis import AxisSink, always_ready, bursty_ready
+from common.codec import frame_to_xgmii
+from common.crc_ref import CRC_RESIDUE, address_hash, crc32
+from common.latency import FrameTimestamps, write_report
+from common.pcap import PcapWriter, read_frames, write_line_rate_capture
+from common.scoreboard import Scoreboard
+from common.stats import StatsModel, StatsReader
+from common.trace import TraceRecorder, traced
+from common.traffic import RxCase, parse_error_rates, random_frames, rx_stress_cases
+from common.waves import Waves, windowed
 
-crc_calculator = Calculator(Crc32.CRC32)
+NUM_FRAMES = int(os.environ.get("NUM_FRAMES", "200"))
+SEED = int(os.environ.get("SEED", "1"))
+RX_ERRORS = os.environ.get("RX_ERRORS", "bad_fcs=0.05,truncated=0.05,xgmii_error=0.05,no_sfd=0.05")
+LATENCY_FRAMES = int(os.environ.get("LATENCY_FRAMES", "1000"))
+# set by the Makefile, which passes the same value to the RTL
+DATA_WIDTH = int(os.environ.get("DATA_WIDTH", "32"))
+# prefix of the files this configuration writes
+OUT_PREFIX = f"rx_mac_{DATA_WIDTH}"
+LATENCY_RESULTS = os.environ.get("LATENCY_RESULTS", f"{OUT_PREFIX}_latency.json")
+PCAP_IN = os.environ.get("PCAP_IN", "")
+PCAP_FRAMES = int(os.environ.get("PCAP_FRAMES", "0"))
+# 1: send every frame no earlier than its capture time says, 0: back to back
+PCAP_TIMING = int(os.environ.get("PCAP_TIMING", "0"))
+PCAP_OUT = os.environ.get("PCAP_OUT", f"{OUT_PREFIX}_axis.pcap")
+
+# entries in rx_mac's output FIFO
+FIFO_DEPTH = 512
+
+# (frame_valid, frame_error, crc_error) pulses
+STATUS_VALID = (1, 0, 0)
+STATUS_ERROR = (0, 1, 0)
+STATUS_CRC_ERROR = (0, 1, 1)
 
 class RxMacTestbench:
-    def __init__(self, dut):
+    def __init__(self, dut, ready=None, history=None):
         self.dut = dut
-        
-        self.AXIS_DATA_WIDTH = 32
-        self.AXIS_DATA_BYTES = 4
-        self.XGMII_DATA_WIDTH = 32
-        self.XGMII_DATA_BYTES = 4
-        
+
+        self.AXIS_DATA_BYTES = len(dut.out_master_rx_tkeep)
+        self.AXIS_DATA_WIDTH = 8 * self.AXIS_DATA_BYTES
+        self.XGMII_DATA_BYTES = len(dut.in_xgmii_ctl)
+        self.XGMII_DATA_WIDTH = 8 * self.XGMII_DATA_BYTES
+
         self.XGMII_IDLE = 0x07
-        self.XGMII_START = 0xFB  
-        self.XGMII_TERMINATE = 0xFD 
-        self.XGMII_ERROR = 0xFE   
-        
-        self.PREAMBLE_BYTE = 0x55 
-        self.SFD_BYTE = 0xD5     
-    
-        self.MIN_FRAME_SIZE = 64       
-        self.MAX_FRAME_SIZE = 1518     
-        self.MIN_PAYLOAD_SIZE = 46     
-        self.MAX_PAYLOAD_SIZE = 1500  
-    
+        self.XGMII_START = 0xFB
+        self.XGMII_TERMINATE = 0xFD
+        self.XGMII_ERROR = 0xFE
+
+        self.PREAMBLE_BYTE = 0x55
+        self.SFD_BYTE = 0xD5
+
+        self.MIN_FRAME_SIZE = 64
+        self.MAX_FRAME_SIZE = 1518
+        self.MIN_PAYLOAD_SIZE = 46
+        self.MAX_PAYLOAD_SIZE = 1500
+        self.FCS_SIZE = 4
+
+        self.CLOCK_PERIOD_NS = 10
+
+        self.axis_trace = TraceRecorder(
+            "axis",
+            (("time_ns", "g"), ("tdata", f"0{2 * self.AXIS_DATA_BYTES}x"), ("tkeep", "x"), ("tlast", "d")),
+            dut._log,
+        )
+        self.sink = AxisSink(
+            dut.rx_clk,
+            dut.out_master_rx_tdata,
+            dut.out_master_rx_tkeep,
+            dut.out_master_rx_tvalid,
+            dut.out_master_rx_tlast,
+            dut.in_master_rx_tready,
+            ready=ready,
+            trace=self.axis_trace,
+            history=history,
+        )
+        self.stats = StatsReader(
+            dut.rx_clk, dut.stats_snapshot, dut.stats_clear, dut.stats_read_addr, dut.stats_read_data
+        )
+        self.stats_model = StatsModel(self.MIN_FRAME_SIZE, self.MAX_FRAME_SIZE)
+
     async def reset(self):
         self.dut.rx_rst.value = 0
-        self.dut.in_xgmii_data.value = (self.XGMII_IDLE << 24) | (self.XGMII_IDLE << 16) | (self.XGMII_IDLE << 8) | self.XGMII_IDLE
-        self.dut.in_xgmii_ctl.value = 0xF
-        self.dut.in_master_rx_tready.value = 1
-        
+        self.dut.in_xgmii_data.value = int.from_bytes(bytes([self.XGMII_IDLE]) * self.XGMII_DATA_BYTES, "little")
+        self.dut.in_xgmii_ctl.value = (1 << self.XGMII_DATA_BYTES) - 1
+        self.dut.config_local_mac.value = 0
+        self.dut.config_promiscuous.value = 0
+        self.dut.config_multicast_hash.value = 0
+        self.dut.config_valid.value = 0
+        self.stats.reset()
+
         await ClockCycles(self.dut.rx_clk, 5)
         self.dut.rx_rst.value = 1
         await ClockCycles(self.dut.rx_clk, 5)
-    
-    async def send_xgmii_frame(self, payload_data, crc_value):
-        for i in range(5):
-            await RisingEdge(self.dut.rx_clk)
-            idle_data = (self.XGMII_IDLE << 24) | (self.XGMII_IDLE << 16) | (self.XGMII_IDLE << 8) | self.XGMII_IDLE
-            self.dut.in_xgmii_data.value = idle_data
-            self.dut.in_xgmii_ctl.value = 0xF
-        
-        await RisingEdge(self.dut.rx_clk)
-        start_data = (self.PREAMBLE_BYTE << 24) | (self.PREAMBLE_BYTE << 16) | (self.PREAMBLE_BYTE << 8) | self.XGMII_START
-        self.dut.in_xgmii_data.value = start_data
-        self.dut.in_xgmii_ctl.value = 0x1
-        
-        await RisingEdge(self.dut.rx_clk)
-        sfd_data = (self.SFD_BYTE << 24) | (self.PREAMBLE_BYTE << 16) | (self.PREAMBLE_BYTE << 8) | self.PREAMBLE_BYTE
-        self.dut.in_xgmii_data.value = sfd_data
-        self.dut.in_xgmii_ctl.value = 0x0
-        
-        for i, data in enumerate(payload_data):
+
+    def start_lanes(self):
+        """Lanes /S/ may be on: 0, and 4 as well for 8 byte words."""
+        return list(range(0, self.XGMII_DATA_BYTES, 4))
+
+    async def send_case(self, case, start_lane=0):
+        """Drive one RxCase, followed by its inter-frame gap."""
+        data, ctl = frame_to_xgmii(
+            case.data, self.XGMII_DATA_BYTES, sfd=case.sfd, error_at=case.error_at, start_lane=start_lane
+        )
+        for word, word_ctl in zip(data.tolist(), ctl.tolist()):
             await RisingEdge(self.dut.rx_clk)
-            self.dut.in_xgmii_data.value = data
-            self.dut.in_xgmii_ctl.value = 0x0
-        
-        await RisingEdge(self.dut.rx_clk)
-        self.dut.in_xgmii_data.value = crc_value
-        self.dut.in_xgmii_ctl.value = 0x0
-        
+            self.dut.in_xgmii_data.value = word
+            self.dut.in_xgmii_ctl.value = word_ctl
+
+    async def send_xgmii_frame(self, frame, fcs=None, start_lane=0):
+        """Drive frame with its FCS (computed unless given) after a few idles."""
+        if fcs is None:
+            fcs = crc32(frame)
+        await ClockCycles(self.dut.rx_clk, 5)
+        case = RxCase(0, "directed", bytes(frame) + fcs.to_bytes(4, "little"))
+        self.count_stats(case)
+        await self.send_case(case, start_lane)
+
+    def expected(self, case):
+        """
+        What rx_mac makes of a case: (AXIS frame or None, status pulse). A
+        frame ends at its first control character. Everything before it
+        except the last FCS_SIZE bytes goes out on AXIS, error or not, and
+        the status pulse comes with its tlast beat.
+        """
+        if case.sfd != self.SFD_BYTE:
+            return None, STATUS_ERROR
+        data = case.data if case.error_at is None else case.data[: case.error_at]
+        crc_ok = crc32(data) == CRC_RESIDUE
+        good = crc_ok and case.error_at is None and self.MIN_FRAME_SIZE <= len(data) <= self.MAX_FRAME_SIZE
+        axis = data[: -self.FCS_SIZE] if len(data) > self.FCS_SIZE else None
+        return axis, (STATUS_VALID if good else STATUS_CRC_ERROR if not crc_ok else STATUS_ERROR)
+
+    def count_stats(self, case):
+        """Add a case to the statistics model: every frame that gets past the SFD."""
+        if case.sfd != self.SFD_BYTE:
+            return
+        data = case.data if case.error_at is None else case.data[: case.error_at]
+        self.stats_model.frame(len(data), case.error_at is not None, crc32(data) != CRC_RESIDUE)
+
+    async def check_stats(self, clear=False):
+        """Read the statistics back and compare them with the model, then clear both."""
+        counters, = await self.stats.read(clear)
+        errors = self.stats_model.compare(counters)
+        assert not errors, "statistics: " + ", ".join(errors)
+        if clear:
+            self.stats_model.clear()
+        self.dut._log.info(f"statistics: {counters['good_frames']} good, {counters['bad_frames']} bad frames")
+
+    def frame_timestamps(self):
+        """Latency monitor over the XGMII input and the AXIS output."""
+        dut = self.dut
+        ts = FrameTimestamps(dut.rx_clk, self.CLOCK_PERIOD_NS)
+        ts.xgmii("xgmii", dut.in_xgmii_data, dut.in_xgmii_ctl, self.XGMII_DATA_BYTES)
+        ts.axis("axis", dut.out_master_rx_tvalid, dut.in_master_rx_tready, dut.out_master_rx_tlast)
+        ts.latency("start_to_first", "xgmii_start", "axis_first")
+        ts.latency("term_to_last", "xgmii_term", "axis_last")
+        return ts
+
+    async def configure(self, local_mac, promiscuous=False, multicast=()):
+        """Load the address filter; multicast is a list of addresses to accept."""
+        hash_bins = 0
+        for addr in multicast:
+            hash_bins |= 1 << address_hash(addr)
+        self.dut.config_local_mac.value = int.from_bytes(local_mac, "big")
+        self.dut.config_promiscuous.value = int(promiscuous)
+        self.dut.config_multicast_hash.value = hash_bins
+        self.dut.config_valid.value = 1
         await RisingEdge(self.dut.rx_clk)
-        terminate_data = (self.XGMII_TERMINATE << 24) | (self.XGMII_IDLE << 16) | (self.XGMII_IDLE << 8) | self.XGMII_IDLE
-        self.dut.in_xgmii_data.value = terminate_data
-        self.dut.in_xgmii_ctl.value = 0xF
-        
-        for i in range(10):
-            await RisingEdge(self.dut.rx_clk)
-            idle_data = (self.XGMII_IDLE << 24) | (self.XGMII_IDLE << 16) | (self.XGMII_IDLE << 8) | self.XGMII_IDLE
-            self.dut.in_xgmii_data.value = idle_data
-            self.dut.in_xgmii_ctl.value = 0xF
-    
+        self.dut.config_valid.value = 0
+
+    async def monitor_status(self, scoreboard):
+        dut = self.dut
+        while True:
+            await RisingEdge(dut.rx_clk)
+            await ReadOnly()
+            status = (int(dut.frame_valid.value), int(dut.frame_error.value), int(dut.crc_error.value))
+            if any(status):
+                scoreboard.check(status)
+
+    async def monitor_axis(self, scoreboard, writer=None):
+        """AXIS frames into scoreboard, and into writer stamped with their first beat."""
+        while True:
+            time_ns, frame = await self.sink.recv_timed()
+            scoreboard.check(frame)
+            if writer is not None:
+                writer.write(frame, time_ns)
+
+    async def capture_status(self, timeout_cycles=200):
+        """Next status pulse, or None."""
+        dut = self.dut
+        for _ in range(timeout_cycles):
+            await RisingEdge(dut.rx_clk)
+            await ReadOnly()
+            status = (int(dut.frame_valid.value), int(dut.frame_error.value), int(dut.crc_error.value))
+            if any(status):
+                return status
+        return None
+
     async def capture_axis_frame(self, timeout_cycles=200):
-        frame_data = []
-        cycle_count = 0
-        frame_started = False
-        
         self.dut._log.info("Starting AXI Stream capture")
-        
-        while cycle_count < timeout_cycles:
-            await RisingEdge(self.dut.rx_clk)
-            cycle_count += 1
-            
-            tvalid = int(self.dut.out_master_rx_tvalid.value)
-            tready = int(self.dut.in_master_rx_tready.value)
-            
-            if tvalid and tready:
-                if not frame_started:
-                    self.dut._log.info(f"AXI Stream frame started at cycle {cycle_count}")
-                    frame_started = True
-                
-                tdata = int(self.dut.out_master_rx_tdata.value)
-                tkeep = int(self.dut.out_master_rx_tkeep.value)
-                tlast = int(self.dut.out_master_rx_tlast.value)
-                
-                self.dut._log.info(f"AXI: tdata=0x{tdata:08x}, tkeep=0x{tkeep:x}, tlast={tlast}")
-                if tdata != 0x07070707: 
-                    for i in range(4):
-                        byte_val = (tdata >> (i * 8)) & 0xFF
-                        frame_data.append(byte_val)
-                    self.dut._log.info(f"  Extracted 4 bytes: {[hex(b) for b in frame_data[-4:]]}")
-                else:
-                    self.dut._log.info(f"  Skipped idle data: 0x{tdata:08x}")
-                
-                if tlast:
-                    self.dut._log.info(f"AXI Stream frame completed, total bytes: {len(frame_data)}")
-                    return frame_data
-        
-        if frame_started:
-            self.dut._log.warning(f"Frame started but didn't complete, captured {len(frame_data)} bytes")
-            return frame_data
-        else:
+
+        try:
+            frame = await with_timeout(self.sink.recv(), timeout_cycles * self.CLOCK_PERIOD_NS, "ns")
+        except SimTimeoutError:
             self.dut._log.warning("No AXI Stream frame detected")
             return []
-    
+
+        frame_data = list(frame)
+        self.dut._log.info(f"AXI Stream frame completed, total bytes: {len(frame_data)}")
+        return frame_data
+
     def parse_ethernet_frame(self, axis_data):
         frame_bytes = axis_data
-        
+
         self.dut._log.info(f"Received frame: {len(frame_bytes)} bytes")
         self.dut._log.info(f"All bytes: {[hex(b) for b in frame_bytes]}")
-        
+
         if len(frame_bytes) < 14:
             self.dut._log.error(f"Frame too short: {len(frame_bytes)} bytes")
             return None
-        
+
         dest_mac = frame_bytes[0:6]
-        src_mac = frame_bytes[6:12] 
+        src_mac = frame_bytes[6:12]
         ether_type = frame_bytes[12:14]
-        payload = frame_bytes[14:-4] if len(frame_bytes) > 18 else []
-        fcs = frame_bytes[-4:] if len(frame_bytes) >= 4 else []
-        
+        payload = frame_bytes[14:]
+
         self.dut._log.info(f"Dest MAC: {[hex(b) for b in dest_mac]}")
         self.dut._log.info(f"Src MAC: {[hex(b) for b in src_mac]}")
         self.dut._log.info(f"EtherType: {[hex(b) for b in ether_type]}")
         self.dut._log.info(f"Payload length: {len(payload)}")
-        self.dut._log.info(f"FCS: {[hex(b) for b in fcs]}")
-        
+
         return {
             'dest_mac': dest_mac,
             'src_mac': src_mac,
             'ether_type': ether_type,
             'payload': payload,
-            'fcs': fcs,
             'total_length': len(frame_bytes)
         }
-    
-    def calculate_crc32(self, data: bytes) -> int:
-        return crc_calculator.checksum(data)
-    
-    def verify_frame(self, captured_frame, expected_payload_data):
-        parsed = self.parse_ethernet_frame(captured_frame)
-        
-        if parsed is None:
-            return None
-        
-        self.dut._log.info("Frame received and parsed successfully")
-        return parsed
 
-@cocotb.test()
-async def test_basic_frame(dut):
+async def run_directed(dut, payload_data, fcs=None, start_lane=0):
+    """Send the frame held in payload_data words; (captured bytes, status pulse)."""
     tb = RxMacTestbench(dut)
-    
+
     cocotb.start_soon(Clock(dut.rx_clk, 10, units="ns").start())
     await tb.reset()
-    
+
+    frame = b"".join(word.to_bytes(4, "little") for word in payload_data)
+    send_task = cocotb.start_soon(tb.send_xgmii_frame(frame, fcs, start_lane))
+    capture_task = cocotb.start_soon(tb.capture_axis_frame())
+    status_task = cocotb.start_soon(tb.capture_status())
+
+    await send_task
+    captured_frame = await capture_task
+    status = await status_task
+
+    assert bytes(captured_frame) == frame, f"Got {bytes(captured_frame).hex()}, expected {frame.hex()}"
+    tb.parse_ethernet_frame(captured_frame)
+    await tb.check_stats()
+    return captured_frame, status
+
+@cocotb.test()
+@traced
+async def test_basic_frame(dut):
     payload_data = [
-        0x33221100,  
-        0xBBAA5544,  
-        0xFFEEDDCC, 
-        0x00000008, 
-        0xA1B2C3D4, 
+        0x33221100,
+        0xBBAA5544,
+        0xFFEEDDCC,
+        0x00000008,
+        0xA1B2C3D4,
         0x12345678,
         0xDEADBEEF,
         0x87654321,
@@ -183,93 +304,350 @@ async def test_basic_frame(dut):
         0xCAFEBABE,
         0x6789ABCD,
         0xF0E1D2C3,
-        0x3E5F7A9B  
+        0x3E5F7A9B
     ]
-    
-    crc_value = 0x713b28b2
-    
-    send_task = cocotb.start_soon(tb.send_xgmii_frame(payload_data, crc_value))
-    capture_task = cocotb.start_soon(tb.capture_axis_frame())
-    
-    await send_task
-    captured_frame = await capture_task
-    
-    if captured_frame and len(captured_frame) > 0:
-        parsed = tb.verify_frame(captured_frame, payload_data)
-        dut._log.info("Basic frame test passed")
-    else:
-        dut._log.error("No valid frame received")
+
+    captured_frame, status = await run_directed(dut, payload_data)
+    assert status == STATUS_VALID, f"Status {status}, expected frame_valid"
+    dut._log.info("Basic frame test passed")
 
 @cocotb.test()
+@traced
 async def test_simple_frame(dut):
-    tb = RxMacTestbench(dut)
-    
-    cocotb.start_soon(Clock(dut.rx_clk, 10, units="ns").start())
-    await tb.reset()
-    
+    # 24 bytes with a wrong FCS: forwarded, flagged as a CRC error
     payload_data = [
-        0x33221100, 
-        0xBBAA5544,   
-        0xFFEEDDCC, 
-        0x00000008,  
-        0xAABBCCDD, 
-        0x11223344  
+        0x33221100,
+        0xBBAA5544,
+        0xFFEEDDCC,
+        0x00000008,
+        0xAABBCCDD,
+        0x11223344
     ]
-    crc_value = 0x12345678
-    
-    send_task = cocotb.start_soon(tb.send_xgmii_frame(payload_data, crc_value))
-    capture_task = cocotb.start_soon(tb.capture_axis_frame())
-    
-    await send_task
-    captured_frame = await capture_task
-    
-    if captured_frame and len(captured_frame) > 0:
-        parsed = tb.parse_ethernet_frame(captured_frame)
-        dut._log.info("Simple frame test passed")
-    else:
-        dut._log.error("No valid frame received")
+
+    captured_frame, status = await run_directed(dut, payload_data, fcs=0x12345678)
+    assert status == STATUS_CRC_ERROR, f"Status {status}, expected frame_error and crc_error"
+    dut._log.info("Simple frame test passed")
 
 @cocotb.test()
+@traced
 async def test_minimum_frame(dut):
+    payload_data = [
+        0x33221100,
+        0xBBAA5544,
+        0xFFEEDDCC,
+        0x00080000,
+        0x01020304,
+        0x05060708,
+        0x090A0B0C,
+        0x0D0E0F10,
+        0x11121314,
+        0x15161718,
+        0x191A1B1C,
+        0x1D1E1F20,
+        0x21222324,
+        0x25262728,
+        0x292A2B2C,
+        0x2D2E0000
+    ]
+
+    # 60 bytes + FCS, the shortest valid frame
+    captured_frame, status = await run_directed(dut, payload_data[:15])
+    assert status == STATUS_VALID, f"Status {status}, expected frame_valid"
+    dut._log.info(f"Minimum frame test passed - total frame length: {len(captured_frame) + 4} bytes")
+
+@cocotb.test()
+@traced
+async def test_start_lanes(dut):
+    """Frames ending on every lane, starting on each lane /S/ may use"""
     tb = RxMacTestbench(dut)
-    
+
     cocotb.start_soon(Clock(dut.rx_clk, 10, units="ns").start())
     await tb.reset()
-    
-    payload_data = [
-        0x33221100,  
-        0xBBAA5544,  
-        0xFFEEDDCC,  
-        0x00080000,  
-        0x01020304,  
-        0x05060708, 
-        0x090A0B0C,  
-        0x0D0E0F10, 
-        0x11121314,  
-        0x15161718,  
-        0x191A1B1C,  
-        0x1D1E1F20,  
-        0x21222324, 
-        0x25262728,  
-        0x292A2B2C,  
-        0x2D2E0000   
-    ]
-    
-    crc_value = 0x713b28b2
-    
-    send_task = cocotb.start_soon(tb.send_xgmii_frame(payload_data, crc_value))
+
+    for start_lane in tb.start_lanes():
+        for length in range(tb.MIN_FRAME_SIZE - tb.FCS_SIZE, tb.MIN_FRAME_SIZE - tb.FCS_SIZE + tb.XGMII_DATA_BYTES):
+            frame = bytes((length + i) & 0xFF for i in range(length))
+            send_task = cocotb.start_soon(tb.send_xgmii_frame(frame, start_lane=start_lane))
+            capture_task = cocotb.start_soon(tb.capture_axis_frame())
+            status_task = cocotb.start_soon(tb.capture_status())
+
+            await send_task
+            captured_frame = await capture_task
+            status = await status_task
+
+            assert bytes(captured_frame) == frame, f"lane {start_lane}, {length} bytes: got {bytes(captured_frame).hex()}"
+            assert status == STATUS_VALID, f"lane {start_lane}, {length} bytes: status {status}"
+    await tb.check_stats()
+    dut._log.info(f"start lanes {tb.start_lanes()} passed")
+
+@cocotb.test()
+@traced
+@windowed
+async def test_stress(dut):
+    """
+    NUM_FRAMES seeded random frames back to back, with RX_ERRORS rates of
+    damaged ones, every AXIS frame and status pulse checked as it comes out.
+    Nothing is kept per frame, so NUM_FRAMES=1000000 runs in constant memory.
+    """
+    tb = RxMacTestbench(dut, history=16)
+
+    cocotb.start_soon(Clock(dut.rx_clk, 10, units="ns").start())
+    await tb.reset()
+
+    axis_sb = Scoreboard("axis_sb", dut._log)
+    status_sb = Scoreboard("status_sb", dut._log)
+    waves = Waves(dut, tb.CLOCK_PERIOD_NS)
+    waves.watch(axis_sb)
+    waves.watch(status_sb)
+    cocotb.start_soon(tb.monitor_axis(axis_sb))
+    cocotb.start_soon(tb.monitor_status(status_sb))
+
+    kinds = {}
+    start_lanes = tb.start_lanes()
+    for case in rx_stress_cases(SEED, parse_error_rates(RX_ERRORS), NUM_FRAMES):
+        axis, status = tb.expected(case)
+        if axis is not None:
+            axis_sb.expect(axis, case)
+        status_sb.expect(status, case)
+        kinds[case.kind] = kinds.get(case.kind, 0) + 1
+        tb.count_stats(case)
+        await tb.send_case(case, start_lanes[case.index % len(start_lanes)])
+
+    await ClockCycles(dut.rx_clk, 10)
+
+    dut._log.info(f"{NUM_FRAMES} frames (seed {SEED}): " + ", ".join(f"{k}={n}" for k, n in sorted(kinds.items())))
+    dut._log.info(axis_sb.summary())
+    dut._log.info(status_sb.summary())
+    assert axis_sb.errors == 0, axis_sb.summary()
+    assert status_sb.errors == 0, status_sb.summary()
+    await tb.check_stats()
+
+@cocotb.test()
+@traced
+async def test_latency_under_load(dut):
+    """
+    LATENCY_FRAMES good random frames back to back, latency distributions
+    written to LATENCY_RESULTS for comparison with python -m common.latency.
+    """
+    tb = RxMacTestbench(dut, history=16)
+
+    cocotb.start_soon(Clock(dut.rx_clk, tb.CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    ts = tb.frame_timestamps()
+    ts.start()
+
+    for case in rx_stress_cases(SEED, num_frames=LATENCY_FRAMES):
+        tb.count_stats(case)
+        await tb.send_case(case)
+    await ClockCycles(dut.rx_clk, 10)
+    ts.kill()
+
+    write_report(LATENCY_RESULTS, "rx_mac", ts, frames=LATENCY_FRAMES, seed=SEED)
+    for line in ts.describe():
+        dut._log.info(line)
+    for name, hist in ts.histograms.items():
+        assert hist.count == LATENCY_FRAMES, f"{name}: {hist.count} of {LATENCY_FRAMES} frames"
+    await tb.check_stats()
+
+@cocotb.test()
+@traced
+@windowed
+async def test_address_filter(dut):
+    """
+    Unicast, broadcast and multicast destinations through the address
+    filter, then the same again in promiscuous mode: dropped frames never
+    reach AXIS or frame_valid and are counted by kind.
+    """
+    tb = RxMacTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.rx_clk, tb.CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    local = bytes.fromhex("020000000001")
+    other = bytes.fromhex("020000000002")
+    broadcast = bytes(b"\xff" * 6)
+    joined = bytes.fromhex("01005e000001")
+    # a multicast address in another hash bin
+    left = next(
+        bytes.fromhex(f"01005e0000{n:02x}") for n in range(2, 256)
+        if address_hash(bytes.fromhex(f"01005e0000{n:02x}")) != address_hash(joined)
+    )
+    destinations = [local, other, broadcast, joined, left]
+
+    frames = Scoreboard("axis", dut._log)
+    status = Scoreboard("status", dut._log)
+    waves = Waves(dut, tb.CLOCK_PERIOD_NS)
+    waves.watch(frames)
+    waves.watch(status)
+    cocotb.start_soon(tb.monitor_axis(frames))
+    cocotb.start_soon(tb.monitor_status(status))
+
+    drops = {"unicast": 0, "multicast": 0}
+    for promiscuous in (False, True):
+        await tb.configure(local, promiscuous, multicast=[joined])
+        for n, dest in enumerate(destinations):
+            frame = dest + bytes.fromhex("020000000099") + bytes.fromhex("0800") + bytes(range(n, n + 50))
+            accepted = promiscuous or dest in (local, broadcast, joined)
+            if accepted:
+                frames.expect(frame, f"{dest.hex()} promiscuous={promiscuous}")
+                status.expect(STATUS_VALID)
+            else:
+                drops["multicast" if dest[0] & 1 else "unicast"] += 1
+            await tb.send_xgmii_frame(frame, start_lane=tb.start_lanes()[n % len(tb.start_lanes())])
+        # dropped frames are counted all the same
+        await ClockCycles(dut.rx_clk, 20)
+        await tb.check_stats(clear=True)
+
+    await ClockCycles(dut.rx_clk, 20)
+    assert frames.errors == 0, frames.summary()
+    assert status.errors == 0, status.summary()
+    counts = {"unicast": int(dut.unicast_drop_count.value), "multicast": int(dut.multicast_drop_count.value)}
+    assert counts == drops, f"drop counters {counts}, expected {drops}"
+    dut._log.info(f"{frames.summary()}, drops {counts}")
+
+
+@cocotb.test()
+@traced
+@windowed
+async def test_pcap_replay(dut):
+    """
+    The frames of a capture through rx_mac with a correct FCS, captured
+    runts included. Every AXIS frame and status pulse is checked as it
+    comes out and the AXIS frames are written to PCAP_OUT.
+    """
+    tb = RxMacTestbench(dut, history=16)
+    path = PCAP_IN
+    if not path:
+        path = f"{OUT_PREFIX}_replay.pcap"
+        write_line_rate_capture(path, random_frames(SEED, PCAP_FRAMES or NUM_FRAMES))
+
+    cocotb.start_soon(Clock(dut.rx_clk, tb.CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    axis_sb = Scoreboard("axis_sb", dut._log)
+    status_sb = Scoreboard("status_sb", dut._log)
+    waves = Waves(dut, tb.CLOCK_PERIOD_NS)
+    waves.watch(axis_sb)
+    waves.watch(status_sb)
+    waves.watch_pulses(dut.crc_error)
+    writer = PcapWriter(PCAP_OUT)
+    cocotb.start_soon(tb.monitor_axis(axis_sb, writer))
+    cocotb.start_soon(tb.monitor_status(status_sb))
+
+    start_ns = get_sim_time("ns")
+    first_ns = None
+    start_lanes = tb.start_lanes()
+    sent = 0
+    for time_ns, frame in read_frames(path, PCAP_FRAMES or None):
+        case = RxCase(sent, "pcap", bytes(frame) + crc32(frame).to_bytes(4, "little"))
+        axis, status = tb.expected(case)
+        if axis is not None:
+            axis_sb.expect(axis, case)
+        status_sb.expect(status, case)
+        tb.count_stats(case)
+
+        if first_ns is None:
+            first_ns = time_ns
+        while PCAP_TIMING and get_sim_time("ns") < start_ns + time_ns - first_ns:
+            await RisingEdge(dut.rx_clk)
+        await tb.send_case(case, start_lanes[sent % len(start_lanes)])
+        sent += 1
+
+    await ClockCycles(dut.rx_clk, 10)
+    writer.close()
+
+    elapsed_ns = get_sim_time("ns") - start_ns
+    dut._log.info(
+        f"{sent} frames from {path}, {tb.sink.bytes_received} bytes out in {elapsed_ns:.0f} ns "
+        f"({tb.sink.bytes_received * 8 / elapsed_ns:.3f} Gb/s), {writer.packets} frames written to {PCAP_OUT}"
+    )
+    dut._log.info(axis_sb.summary())
+    dut._log.info(status_sb.summary())
+    assert axis_sb.errors == 0, axis_sb.summary()
+    assert status_sb.errors == 0, status_sb.summary()
+    await tb.check_stats()
+
+
+@cocotb.test()
+@traced
+async def test_backpressure(dut):
+    tb = RxMacTestbench(dut, ready=bursty_ready(2, 3))
+
+    cocotb.start_soon(Clock(dut.rx_clk, 10, units="ns").start())
+    await tb.reset()
+
+    frame = bytes(range(64))
+    send_task = cocotb.start_soon(tb.send_xgmii_frame(frame))
     capture_task = cocotb.start_soon(tb.capture_axis_frame())
-    
+    status_task = cocotb.start_soon(tb.capture_status())
+
     await send_task
     captured_frame = await capture_task
-    
-    if captured_frame and len(captured_frame) > 0:
-        parsed = tb.parse_ethernet_frame(captured_frame)
-        if parsed:
-            actual_payload_length = len([b for b in parsed["payload"] if b != 0])
-            dut._log.info(f"Non-zero payload bytes: {actual_payload_length}")
-            dut._log.info(f"Minimum frame test passed - total frame length: {len(captured_frame)} bytes")
+    status = await status_task
+
+    dut._log.info(
+        f"{len(captured_frame)} bytes with {tb.sink.stall_cycles} stalled beats, "
+        f"{tb.sink.protocol_errors} protocol errors"
+    )
+    assert tb.sink.protocol_errors == 0, f"{tb.sink.protocol_errors} beats changed while stalled"
+    assert bytes(captured_frame) == frame, f"Got {len(captured_frame)} bytes under backpressure, expected 64"
+    assert status == STATUS_VALID, f"Status {status}, expected frame_valid"
+    await tb.check_stats()
+
+
+@cocotb.test()
+@traced
+async def test_output_overflow(dut):
+    """
+    tready low while four maximum size frames come in: the output FIFO
+    takes whole frames while they fit, cuts the next one short and drops
+    the rest, and the frames that lost beats get frame_error. Once tready
+    is back what was kept comes out, and the next frame goes through whole.
+    """
+    stalled_clocks = 3000
+    tb = RxMacTestbench(dut, ready=itertools.chain(itertools.repeat(False, stalled_clocks), always_ready()))
+
+    cocotb.start_soon(Clock(dut.rx_clk, tb.CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+    status_sb = Scoreboard("status_sb", dut._log)
+    cocotb.start_soon(tb.monitor_status(status_sb))
+
+    # non-last beats go in while they leave an entry for the tlast beat
+    word = tb.AXIS_DATA_BYTES
+    entries = 0
+    expected = []
+    frames = [bytes((n + i) & 0xFF for i in range(tb.MAX_FRAME_SIZE - tb.FCS_SIZE)) for n in range(4)]
+    for frame in frames:
+        beats = -(-len(frame) // word)
+        body = min(beats - 1, max(0, FIFO_DEPTH - 1 - entries))
+        if body == beats - 1:
+            expected.append(frame)
+            status_sb.expect(STATUS_VALID)
+            entries += beats
+        elif body:
+            expected.append(frame[: body * word] + frame[(beats - 1) * word :])
+            status_sb.expect(STATUS_ERROR)
+            entries += body + 1
         else:
-            dut._log.error("Failed to parse minimum frame")
-    else:
-        dut._log.error("No valid frame received")
+            status_sb.expect(STATUS_ERROR)
+
+    for frame in frames:
+        await tb.send_xgmii_frame(frame)
+    assert tb.sink.frames_received == 0, "frames out while tready was low"
+
+    for n, frame in enumerate(expected):
+        got = await with_timeout(tb.sink.recv(), stalled_clocks * tb.CLOCK_PERIOD_NS, "ns")
+        assert bytes(got) == frame, f"frame {n}: {len(got)} bytes, expected {len(frame)}"
+    dut._log.info(f"{len(expected)} of {len(frames)} frames out, {entries} FIFO entries")
+
+    status_sb.expect(STATUS_VALID)
+    send_task = cocotb.start_soon(tb.send_xgmii_frame(frames[0]))
+    captured_frame = await tb.capture_axis_frame(timeout_cycles=1000)
+    await send_task
+    await ClockCycles(dut.rx_clk, 10)
+    assert bytes(captured_frame) == frames[0], f"Got {len(captured_frame)} bytes after the overflow"
+    assert tb.sink.protocol_errors == 0, f"{tb.sink.protocol_errors} beats changed while stalled"
+    dut._log.info(status_sb.summary())
+    assert status_sb.errors == 0, status_sb.summary()
+    await tb.check_stats()
@@ -0,0 +1,88 @@
+"""
+Throughput of the scrambler reference models, in words per second.
+
+    python bench_scrambler_ref.py [num_words] [width]
+
+Compares a bit-serial 1 + x^39 + x^58 LFSR against the word models in
+common.scrambler_ref, and checks they agree bit for bit. Up to 64 bits the
+uint64 array forms of scramble() and descramble() are timed as well.
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from common.scrambler_ref import STATE_BITS, TAP, DescramblerRef, ScramblerRef
+
+
+class SerialScramblerRef:
+    # One line bit at a time, kept as the baseline
+    def __init__(self, width=64):
+        self.width = width
+        self.state = [1] * STATE_BITS
+
+    def step(self, in_word: int) -> int:
+        out_word = 0
+        for i in range(self.width):
+            bit = (in_word >> i) & 1 ^ self.state[STATE_BITS - TAP] ^ self.state[0]
+            self.state = self.state[1:] + [bit]
+            out_word |= bit << i
+        return out_word
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(num_words=1_000_000, width=64):
+    rng = random.Random(1)
+    words = [rng.getrandbits(width) for _ in range(num_words)]
+
+    # the serial model is far slower, only run it on a prefix
+    num_serial = min(num_words, 20_000)
+    serial_ref = SerialScramblerRef(width)
+    serial_out, t_serial = timed(lambda: [serial_ref.step(w) for w in words[:num_serial]])
+
+    step_ref = ScramblerRef(width)
+    step_out, t_step = timed(lambda: [step_ref.step(w) for w in words])
+
+    batch_out, t_batch = timed(lambda: ScramblerRef(width).scramble(words))
+    plain, t_desc = timed(lambda: DescramblerRef(width).descramble(batch_out))
+
+    assert serial_out == step_out[:num_serial], "word model diverges from the serial LFSR"
+    assert step_out == batch_out, "scramble() diverges from step()"
+    assert plain == words, "descramble is not the inverse of scramble"
+
+    rows = [
+        ("serial step()", num_serial, t_serial),
+        ("word step()", num_words, t_step),
+        ("scramble()", num_words, t_batch),
+        ("descramble()", num_words, t_desc),
+    ]
+
+    if width <= 64:
+        array = np.array(words, dtype=np.uint64)
+        array_out, t_array = timed(lambda: ScramblerRef(width).scramble(array))
+        array_plain, t_array_desc = timed(lambda: DescramblerRef(width).descramble(array_out))
+        assert array_out.dtype == np.uint64 and array_out.tolist() == batch_out, "scramble() of an array diverges"
+        assert array_plain.dtype == np.uint64 and array_plain.tolist() == words, "descramble() of an array diverges"
+        rows += [
+            ("scramble(uint64)", num_words, t_array),
+            ("descramble(uint64)", num_words, t_array_desc),
+        ]
+    base = num_serial / t_serial
+    print(f"{width}-bit words")
+    print(f"{'model':<22}{'words':>10}{'words/s':>16}{'speedup':>10}")
+    for name, n, t in rows:
+        rate = n / t
+        print(f"{name:<22}{n:>10}{rate:>16,.0f}{rate / base:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
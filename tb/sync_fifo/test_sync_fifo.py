@@ -0,0 +1,218 @@
+"""
+sync_fifo tests against a cycle by cycle model of its ports.
+
+    make [FWFT=1] [ADDR_WIDTH=4] [ALMOST_FULL_THRESHOLD=12] [ALMOST_EMPTY_THRESHOLD=3]
+         [NUM_WORDS=5000] [SEED=1] [RESULTS=sync_fifo_throughput.json]
+
+Every clock the monitor checks occupancy, the flags and the read data:
+with FWFT=1 rd_data must be the head word whenever the FIFO is not
+empty, with FWFT=0 the word read must be on rd_data a clock after rd_en.
+test_sustained writes and reads every clock and writes the read rate to a
+JSON file; there must be no clock without a read once the first word is
+out.
+"""
+import json
+import os
+import random
+from collections import deque
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+
+FWFT = int(os.environ.get("FWFT", "1"))
+ADDR_WIDTH = int(os.environ.get("ADDR_WIDTH", "4"))
+ALMOST_FULL_THRESHOLD = int(os.environ.get("ALMOST_FULL_THRESHOLD", "12"))
+ALMOST_EMPTY_THRESHOLD = int(os.environ.get("ALMOST_EMPTY_THRESHOLD", "3"))
+NUM_WORDS = int(os.environ.get("NUM_WORDS", "5000"))
+SEED = int(os.environ.get("SEED", "1"))
+RESULTS = os.environ.get("RESULTS", "sync_fifo_throughput.json")
+
+FIFO_DEPTH = 1 << ADDR_WIDTH
+# clocks from a write into an empty FIFO to the word on rd_data
+FALL_THROUGH_LATENCY = 2
+
+
+class SyncFifoTestbench:
+    def __init__(self, dut):
+        self.dut = dut
+        self.width = len(dut.wr_data)
+        self.words = deque()
+        # FWFT=0: the word read in the last clock, due on rd_data now
+        self.read_word = None
+        self.cycle = 0
+        # clock of every word read, in order
+        self.read_cycles = []
+        self.errors = []
+
+    async def reset(self):
+        dut = self.dut
+        dut.rst.value = 0
+        dut.wr_en.value = 0
+        dut.wr_data.value = 0
+        dut.rd_en.value = 0
+        await ClockCycles(dut.clk, 4)
+        dut.rst.value = 1
+        await ClockCycles(dut.clk, 2)
+        cocotb.start_soon(self.monitor())
+
+    def error(self, message):
+        if len(self.errors) < 10:
+            self.dut._log.error(f"cycle {self.cycle}: {message}")
+        self.errors.append(message)
+
+    async def monitor(self):
+        dut = self.dut
+        while True:
+            await RisingEdge(dut.clk)
+            await ReadOnly()
+            self.cycle += 1
+            self.check_clock()
+
+    def check_clock(self):
+        dut = self.dut
+        count = len(self.words)
+        empty = int(dut.empty.value)
+        full = int(dut.full.value)
+        rd_data = int(dut.rd_data.value)
+
+        expected_flags = {
+            "occupancy": count,
+            "full": int(count == FIFO_DEPTH),
+            "almost_full": int(count >= ALMOST_FULL_THRESHOLD),
+            "almost_empty": int(count <= ALMOST_EMPTY_THRESHOLD),
+        }
+        for name, expected in expected_flags.items():
+            got = int(getattr(dut, name).value)
+            if got != expected:
+                self.error(f"{name} {got}, expected {expected}")
+
+        if FWFT:
+            # the head word may still be on its way to rd_data
+            if not count and not empty:
+                self.error("not empty with nothing written")
+            if not empty and rd_data != self.words[0]:
+                self.error(f"rd_data {rd_data:x}, head word {self.words[0]:x}")
+        else:
+            if empty != int(not count):
+                self.error(f"empty {empty} with {count} words")
+            if self.read_word is not None and rd_data != self.read_word:
+                self.error(f"rd_data {rd_data:x}, word read {self.read_word:x}")
+
+        self.read_word = None
+        if int(dut.rd_en.value) and not empty:
+            self.read_word = self.words.popleft()
+            self.read_cycles.append(self.cycle)
+        if int(dut.wr_en.value) and not full:
+            self.words.append(int(dut.wr_data.value))
+
+    async def run(self, num_cycles, wr_prob, rd_prob, rng):
+        """Random wr_en and rd_en, writes and reads tried whatever the flags."""
+        dut = self.dut
+        for _ in range(num_cycles):
+            await RisingEdge(dut.clk)
+            dut.wr_en.value = int(rng.random() < wr_prob)
+            dut.wr_data.value = rng.getrandbits(self.width)
+            dut.rd_en.value = int(rng.random() < rd_prob)
+
+    async def drain(self):
+        dut = self.dut
+        await RisingEdge(dut.clk)
+        dut.wr_en.value = 0
+        dut.rd_en.value = 1
+        await ClockCycles(dut.clk, FIFO_DEPTH + FALL_THROUGH_LATENCY + 1)
+        dut.rd_en.value = 0
+        await ClockCycles(dut.clk, 2)
+
+    def check(self):
+        assert not self.words, f"{len(self.words)} words left in the FIFO"
+        assert not self.errors, f"{len(self.errors)} errors, first: {self.errors[0]}"
+
+
+@cocotb.test()
+async def test_random(dut):
+    tb = SyncFifoTestbench(dut)
+    rng = random.Random(SEED)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    # filling up, draining and balanced, each through full and empty
+    for wr_prob, rd_prob in ((0.9, 0.3), (0.3, 0.9), (0.7, 0.7), (0.5, 0.5)):
+        await tb.run(NUM_WORDS // 2, wr_prob, rd_prob, rng)
+    await tb.drain()
+    dut._log.info(f"{len(tb.read_cycles)} words read")
+    tb.check()
+
+
+@cocotb.test()
+async def test_fall_through(dut):
+    tb = SyncFifoTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    await RisingEdge(dut.clk)
+    dut.wr_en.value = 1
+    dut.wr_data.value = 0x5A
+    await RisingEdge(dut.clk)
+    dut.wr_en.value = 0
+
+    if FWFT:
+        # no rd_en, the word shows up on its own; the clock that wrote it
+        # was the first
+        clocks = 1
+        await ReadOnly()
+        while int(dut.empty.value) and clocks <= FALL_THROUGH_LATENCY:
+            await RisingEdge(dut.clk)
+            await ReadOnly()
+            clocks += 1
+        assert clocks == FALL_THROUGH_LATENCY, f"word on rd_data {clocks} clocks after the write"
+        assert int(dut.rd_data.value) == 0x5A
+    await RisingEdge(dut.clk)
+    dut.rd_en.value = 1
+    await RisingEdge(dut.clk)
+    dut.rd_en.value = 0
+    await ClockCycles(dut.clk, 2)
+    await ReadOnly()
+    assert tb.read_cycles, "word not read"
+    assert int(dut.empty.value)
+    tb.check()
+
+
+@cocotb.test()
+async def test_sustained(dut):
+    tb = SyncFifoTestbench(dut)
+    rng = random.Random(SEED)
+
+    cocotb.start_soon(Clock(dut.clk, 10, units="ns").start())
+    await tb.reset()
+
+    # write every clock, read every clock; rd_en on an empty FIFO is ignored
+    await RisingEdge(dut.clk)
+    dut.wr_en.value = 1
+    dut.rd_en.value = 1
+    for _ in range(NUM_WORDS):
+        dut.wr_data.value = rng.getrandbits(tb.width)
+        await RisingEdge(dut.clk)
+    dut.wr_en.value = 0
+    await ClockCycles(dut.clk, FALL_THROUGH_LATENCY + 2)
+    dut.rd_en.value = 0
+    await RisingEdge(dut.clk)
+
+    reads = tb.read_cycles
+    span = reads[-1] - reads[0] + 1
+    bubbles = span - len(reads)
+    result = {
+        "words": len(reads),
+        "read_cycles": span,
+        "bubbles": bubbles,
+        "words_per_cycle": len(reads) / span,
+    }
+    dut._log.info(f"FWFT={FWFT}: {result}")
+    with open(RESULTS, "w") as f:
+        json.dump({"dut": "sync_fifo", "cases": {f"fwft_{FWFT}": result}}, f, indent=2)
+
+    tb.check()
+    assert len(reads) == NUM_WORDS
+    assert bubbles == 0, f"{bubbles} clocks without a read in a sustained stream"
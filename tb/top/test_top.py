@@ -0,0 +1,428 @@
+"""
+End-to-end test of top: user AXIS -> tx_mac -> PCS tx -> channel -> PCS rx
+-> rx_mac -> user AXIS, with the PHY side looped back.
+
+    make [DATA_WIDTH=32] [NUM_FRAMES=100] [SEED=1] [CHANNEL_DELAY=1] [RESULTS=top_32_throughput.json]
+         [PCAP_IN=capture.pcapng] [PCAP_FRAMES=0] [PCAP_TIMING=0] [PCAP_OUT=top_32_axis.pcap]
+
+Files the tests write are named after DATA_WIDTH by default, top_<width>_*,
+so that the regress.py jobs of the sweep do not write over each other.
+
+The channel model copies phy_tx_* onto phy_rx_* CHANNEL_DELAY clocks later.
+Every payload must come back out of user_rx_axis_* framed the way tx_mac
+builds it, with one rx_frame_valid pulse per frame. Goodput and
+user-to-user latency are logged and written to a JSON file.
+
+With DATA_WIDTH=64 the MAC moves 8 bytes per sys_clk and the link has to
+run at line rate; at 32 bits it carries half of 10G.
+
+test_pcap_replay sends the frames of PCAP_IN (the first PCAP_FRAMES, 0 for
+all), or of a generated capture without it, and writes what comes out of
+user_rx_axis_* to PCAP_OUT with simulation timestamps.
+"""
+import json
+import os
+from collections import deque
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+from cocotb.utils import get_sim_time
+
+from common.axis import AxisSink, AxisSource
+from common.pcap import PcapWriter, read_frames, write_line_rate_capture
+from common.scoreboard import Scoreboard
+from common.stats import StatsModel, StatsReader
+from common.traffic import random_frames
+
+NUM_FRAMES = int(os.environ.get("NUM_FRAMES", "100"))
+SEED = int(os.environ.get("SEED", "1"))
+CHANNEL_DELAY = int(os.environ.get("CHANNEL_DELAY", "1"))
+# set by the Makefile, which passes the same value to the RTL
+DATA_WIDTH = int(os.environ.get("DATA_WIDTH", "32"))
+# prefix of the files this configuration writes
+OUT_PREFIX = f"top_{DATA_WIDTH}"
+RESULTS = os.environ.get("RESULTS", f"{OUT_PREFIX}_throughput.json")
+PCAP_IN = os.environ.get("PCAP_IN", "")
+PCAP_FRAMES = int(os.environ.get("PCAP_FRAMES", "0"))
+# 1: send every frame no earlier than its capture time says, 0: back to back
+PCAP_TIMING = int(os.environ.get("PCAP_TIMING", "0"))
+PCAP_OUT = os.environ.get("PCAP_OUT", f"{OUT_PREFIX}_axis.pcap")
+
+# sys_clk is the 156.25 MHz 10GBASE-R clock
+CLOCK_PERIOD_NS = 6.4
+LINE_RATE_BPS = 10e9
+# the 64 bit datapath must keep the line this busy
+MIN_LINE_UTILIZATION = 0.97
+
+DEST_MAC = bytes.fromhex("001122334455")
+SRC_MAC = bytes.fromhex("AABBCCDDEEFF")
+ETHER_TYPE = bytes.fromhex("0800")
+MIN_PAYLOAD_SIZE = 46
+# tx_mac's two alignment bytes count towards the minimum payload
+MIN_TX_PAYLOAD = MIN_PAYLOAD_SIZE - 2
+# preamble/SFD, MAC header and its two alignment bytes, FCS, minimum IPG
+FRAME_OVERHEAD = 8 + 16 + 4 + 12
+
+MIN_LEN = 1
+# largest payload whose frame, with tx_mac's two alignment bytes, still
+# fits in 1518 bytes
+MAX_LEN = 1498
+
+
+def expected_rx_frame(payload):
+    """
+    What rx_mac hands back for a payload sent through tx_mac: the MAC header,
+    two zero bytes to word-align the payload and the payload, zero-padded
+    to a minimum size frame.
+    """
+    return DEST_MAC + SRC_MAC + ETHER_TYPE + bytes(2) + payload.ljust(MIN_TX_PAYLOAD, b"\0")
+
+
+def frame_size(payload):
+    """Frame length from DA to FCS: header, alignment bytes, padded payload and FCS."""
+    return 14 + 2 + max(len(payload), MIN_TX_PAYLOAD) + 4
+
+
+def wire_bytes(payload):
+    """Bytes a frame occupies on the line, minimum IPG included."""
+    return max(len(payload), MIN_TX_PAYLOAD) + FRAME_OVERHEAD
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(p / 100 * len(ordered)), len(ordered) - 1)]
+
+
+class LoopbackChannel:
+    """Copies phy_tx_* to phy_rx_* with a fixed delay of at least one clock."""
+
+    def __init__(self, dut, delay=1):
+        if delay < 1:
+            raise ValueError("channel delay must be at least one clock")
+        self.dut = dut
+        self.line = deque([(0, 0, 0)] * delay)
+        self.blocks = 0
+
+        dut.phy_rx_valid.value = 0
+        dut.phy_rx_data.value = 0
+        dut.phy_rx_header.value = 0
+        self._task = cocotb.start_soon(self._run())
+
+    def kill(self):
+        self._task.kill()
+
+    async def _run(self):
+        dut = self.dut
+        while True:
+            await RisingEdge(dut.sys_clk)
+            valid, data, header = self.line.popleft()
+            dut.phy_rx_valid.value = valid
+            dut.phy_rx_data.value = data
+            dut.phy_rx_header.value = header
+
+            await ReadOnly()
+            valid = dut.phy_tx_valid.value
+            if valid.is_resolvable and int(valid):
+                self.line.append((1, int(dut.phy_tx_data.value), int(dut.phy_tx_header.value)))
+                self.blocks += 1
+            else:
+                self.line.append((0, 0, 0))
+
+
+class TopTestbench:
+    def __init__(self, dut):
+        self.dut = dut
+        self.bytes_per_word = len(dut.user_tx_axis_tkeep)
+
+        self.source = AxisSource(
+            dut.sys_clk,
+            dut.user_tx_axis_tdata,
+            dut.user_tx_axis_tkeep,
+            dut.user_tx_axis_tvalid,
+            dut.user_tx_axis_tlast,
+            dut.user_tx_axis_tready,
+        )
+        self.sink = AxisSink(
+            dut.sys_clk,
+            dut.user_rx_axis_tdata,
+            dut.user_rx_axis_tkeep,
+            dut.user_rx_axis_tvalid,
+            dut.user_rx_axis_tlast,
+            dut.user_rx_axis_tready,
+        )
+        self.channel = None
+        self.scoreboard = Scoreboard("rx", dut._log)
+        self.stats = StatsReader(
+            dut.sys_clk, dut.stats_snapshot, dut.stats_clear, dut.stats_read_addr,
+            dut.tx_stats_read_data, dut.rx_stats_read_data,
+        )
+        # every frame sent comes back, so both directions count the same
+        self.stats_model = StatsModel()
+
+        self.tx_frames = 0
+        self.tx_errors = 0
+        self.rx_frames = 0
+        self.rx_errors = 0
+        self.rx_crc_errors = 0
+
+    async def reset(self):
+        dut = self.dut
+        dut.sys_rst_n.value = 0
+        dut.phy_tx_ready.value = 1
+        dut.config_local_mac.value = 0
+        dut.config_dest_mac.value = 0
+        dut.config_ether_type.value = 0
+        dut.config_promiscuous.value = 0
+        dut.config_multicast_hash.value = 0
+        dut.config_valid.value = 0
+        self.stats.reset()
+
+        await ClockCycles(dut.sys_clk, 5)
+        dut.sys_rst_n.value = 1
+        await ClockCycles(dut.sys_clk, 5)
+
+    async def wait_link(self, timeout_cycles=1000):
+        """Wait for link_up, the PCS block lock on the looped back line."""
+        for _ in range(timeout_cycles):
+            await RisingEdge(self.dut.sys_clk)
+            if int(self.dut.link_up.value):
+                return
+        assert False, f"no link_up in {timeout_cycles} clocks"
+
+    async def configure(self, local_mac, promiscuous=False):
+        dut = self.dut
+        dut.config_local_mac.value = int.from_bytes(local_mac, "big")
+        dut.config_promiscuous.value = int(promiscuous)
+        dut.config_valid.value = 1
+        await RisingEdge(dut.sys_clk)
+        dut.config_valid.value = 0
+
+    async def monitor_status(self):
+        dut = self.dut
+        while True:
+            await RisingEdge(dut.sys_clk)
+            await ReadOnly()
+            self.tx_frames += int(dut.tx_frame_valid.value)
+            self.tx_errors += int(dut.tx_frame_error.value)
+            self.rx_frames += int(dut.rx_frame_valid.value)
+            self.rx_errors += int(dut.rx_frame_error.value)
+            self.rx_crc_errors += int(dut.rx_crc_error.value)
+
+    async def check_stats(self):
+        """Read both directions' statistics back and compare them with the model."""
+        for direction, counters in zip(("tx", "rx"), await self.stats.read()):
+            errors = self.stats_model.compare(counters)
+            assert not errors, f"{direction} statistics: " + ", ".join(errors)
+
+    async def check_rx(self, num_frames):
+        for _ in range(num_frames):
+            self.scoreboard.check(await self.sink.recv())
+
+    async def monitor_rx(self, writer):
+        """Received frames into the scoreboard, and into writer stamped with their first beat."""
+        while True:
+            time_ns, frame = await self.sink.recv_timed()
+            self.scoreboard.check(frame)
+            writer.write(frame, time_ns)
+
+    def report(self, payloads):
+        source = self.source
+        sink = self.sink
+        frames = min(source.frames_sent, sink.frames_received)
+
+        # first beat in to first beat out, last beat in to last beat out
+        first = [sink.start_times[i] - source.start_times[i] for i in range(frames)]
+        last = [sink.end_times[i] - source.end_times[i] for i in range(frames)]
+        result = {
+            "frames_sent": source.frames_sent,
+            "frames_received": sink.frames_received,
+            "clock_period_ns": CLOCK_PERIOD_NS,
+            "data_width": 8 * self.bytes_per_word,
+            "channel_delay_cycles": CHANNEL_DELAY,
+        }
+        if not frames:
+            return result
+
+        elapsed_ns = sink.end_times[frames - 1] - source.start_times[0]
+        goodput_bps = sum(len(p) for p in payloads[:frames]) * 8 / (elapsed_ns * 1e-9)
+        line_bps = sum(wire_bytes(p) for p in payloads[:frames]) * 8 / (elapsed_ns * 1e-9)
+        for name, values in (("latency_first_ns", first), ("latency_last_ns", last)):
+            result[name] = {
+                "min": min(values),
+                "mean": sum(values) / len(values),
+                "p99": percentile(values, 99),
+                "max": max(values),
+            }
+        result.update({
+            "elapsed_ns": elapsed_ns,
+            "goodput_gbps": goodput_bps / 1e9,
+            "goodput_line_rate": goodput_bps / LINE_RATE_BPS,
+            "line_utilization": line_bps / LINE_RATE_BPS,
+            "axis_stall_cycles": source.stall_cycles,
+        })
+        return result
+
+
+def format_result(result):
+    def fmt(v):
+        if isinstance(v, dict):
+            return "/".join(fmt(x) for x in v.values())
+        return f"{v:.3f}" if isinstance(v, float) else str(v)
+
+    return ", ".join(f"{k}={fmt(v)}" for k, v in result.items())
+
+
+def write_results(result, path=RESULTS):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"dut": "top", "cases": {"loopback": result}}, f, indent=2)
+    os.replace(tmp, path)
+
+
+@cocotb.test()
+async def test_loopback(dut):
+    """Random payloads back to back through the whole stack"""
+    tb = TopTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.sys_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+    tb.channel = LoopbackChannel(dut, CHANNEL_DELAY)
+    await tb.wait_link()
+    cocotb.start_soon(tb.monitor_status())
+
+    payloads = list(random_frames(SEED, NUM_FRAMES, MIN_LEN, MAX_LEN))
+    for i, payload in enumerate(payloads):
+        tb.scoreboard.expect(expected_rx_frame(payload), f"frame {i} ({len(payload)} bytes)")
+        tb.stats_model.frame(frame_size(payload))
+        tb.source.send(payload)
+
+    check_task = cocotb.start_soon(tb.check_rx(NUM_FRAMES))
+
+    # drain: give up once nothing has come out for a while
+    idle_since = get_sim_time("ns")
+    seen = 0
+    while tb.sink.frames_received < NUM_FRAMES:
+        await RisingEdge(dut.sys_clk)
+        if tb.sink.frames_received != seen:
+            seen = tb.sink.frames_received
+            idle_since = get_sim_time("ns")
+        elif get_sim_time("ns") - idle_since > 4096 * CLOCK_PERIOD_NS:
+            break
+    await ClockCycles(dut.sys_clk, 8)
+    check_task.kill()
+
+    result = tb.report(payloads)
+    write_results(result)
+    dut._log.info(f"loopback: {format_result(result)} (latencies min/mean/p99/max)")
+    dut._log.info(tb.scoreboard.summary())
+    dut._log.info(
+        f"status: tx_frame_valid={tb.tx_frames} tx_frame_error={tb.tx_errors} "
+        f"rx_frame_valid={tb.rx_frames} rx_frame_error={tb.rx_errors} rx_crc_error={tb.rx_crc_errors}"
+    )
+
+    assert tb.scoreboard.errors == 0, tb.scoreboard.summary()
+    assert tb.rx_frames == NUM_FRAMES, f"{tb.rx_frames} rx_frame_valid pulses for {NUM_FRAMES} frames"
+    assert tb.rx_errors == 0 and tb.rx_crc_errors == 0, "rx_mac flagged errors"
+    assert tb.tx_frames == NUM_FRAMES, f"{tb.tx_frames} tx_frame_valid pulses for {NUM_FRAMES} frames"
+    if tb.bytes_per_word == 8:
+        assert result["line_utilization"] >= MIN_LINE_UTILIZATION, (
+            f"line utilization {result['line_utilization']:.3f} below {MIN_LINE_UTILIZATION}"
+        )
+    await tb.check_stats()
+
+
+@cocotb.test()
+async def test_address_filter(dut):
+    """tx_mac's frames are delivered with its DA as local MAC and dropped otherwise"""
+    tb = TopTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.sys_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+    tb.channel = LoopbackChannel(dut, CHANNEL_DELAY)
+    await tb.wait_link()
+    cocotb.start_soon(tb.monitor_status())
+    check_task = cocotb.start_soon(tb.check_rx(4))
+
+    payloads = list(random_frames(SEED, 8, MIN_LEN, 200))
+    for local_mac, batch in ((DEST_MAC, payloads[:4]), (SRC_MAC, payloads[4:])):
+        await tb.configure(local_mac)
+        for payload in batch:
+            if local_mac == DEST_MAC:
+                tb.scoreboard.expect(expected_rx_frame(payload))
+            # the rx statistics count dropped frames too
+            tb.stats_model.frame(frame_size(payload))
+            tb.source.send(payload)
+        await tb.source.wait()
+        await ClockCycles(dut.sys_clk, 200)
+    check_task.kill()
+
+    dropped = int(dut.rx_unicast_drop_count.value)
+    dut._log.info(f"{tb.scoreboard.summary()}, {dropped} dropped")
+    assert tb.scoreboard.errors == 0, tb.scoreboard.summary()
+    assert tb.sink.frames_received == 4, f"{tb.sink.frames_received} frames delivered"
+    assert tb.rx_frames == 4 and dropped == 4, f"rx_frame_valid {tb.rx_frames}, {dropped} dropped"
+    assert int(dut.rx_multicast_drop_count.value) == 0
+    await tb.check_stats()
+
+
+@cocotb.test()
+async def test_pcap_replay(dut):
+    """
+    The frames of a capture through the whole stack. tx_mac puts its own
+    MAC header on every frame, so what goes in is each captured frame
+    after its MAC header, cut to MAX_LEN. Every received frame is checked
+    as it comes out and written to PCAP_OUT.
+    """
+    tb = TopTestbench(dut)
+    path = PCAP_IN
+    if not path:
+        path = f"{OUT_PREFIX}_replay.pcapng"
+        write_line_rate_capture(path, random_frames(SEED, PCAP_FRAMES or NUM_FRAMES))
+
+    cocotb.start_soon(Clock(dut.sys_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+    tb.channel = LoopbackChannel(dut, CHANNEL_DELAY)
+    await tb.wait_link()
+    cocotb.start_soon(tb.monitor_status())
+    writer = PcapWriter(PCAP_OUT)
+    monitor = cocotb.start_soon(tb.monitor_rx(writer))
+
+    start_ns = get_sim_time("ns")
+    first_ns = None
+    sent = 0
+    payload_bytes = 0
+    for time_ns, frame in read_frames(path, PCAP_FRAMES or None):
+        payload = bytes(frame[14 : 14 + MAX_LEN]) or bytes(frame[:1])
+        tb.scoreboard.expect(expected_rx_frame(payload), f"frame {sent} ({len(frame)} bytes)")
+        tb.stats_model.frame(frame_size(payload))
+
+        if first_ns is None:
+            first_ns = time_ns
+        # a short queue keeps memory flat however long the capture is
+        while len(tb.source.queue) > 8 or (
+            PCAP_TIMING and get_sim_time("ns") < start_ns + time_ns - first_ns
+        ):
+            await RisingEdge(dut.sys_clk)
+        tb.source.send(payload)
+        sent += 1
+        payload_bytes += len(payload)
+
+    await tb.source.wait()
+    for _ in range(4096):
+        if not tb.scoreboard.pending:
+            break
+        await RisingEdge(dut.sys_clk)
+    await ClockCycles(dut.sys_clk, 8)
+    monitor.kill()
+    writer.close()
+
+    elapsed_ns = get_sim_time("ns") - start_ns
+    dut._log.info(
+        f"{sent} frames from {path}, {payload_bytes} payload bytes in {elapsed_ns:.0f} ns "
+        f"({payload_bytes * 8 / elapsed_ns:.3f} Gb/s), {writer.packets} frames written to {PCAP_OUT}"
+    )
+    dut._log.info(tb.scoreboard.summary())
+    assert tb.scoreboard.errors == 0, tb.scoreboard.summary()
+    assert tb.rx_frames == sent and tb.rx_errors == 0, f"rx_frame_valid {tb.rx_frames}, rx_frame_error {tb.rx_errors}"
+    await tb.check_stats()
@@ -0,0 +1,212 @@
+"""
+tx_mac line-rate throughput benchmark.
+
+    make MODULE=bench_tx_mac [BENCH_FRAMES=200] [BENCH_RESULTS=tx_mac_throughput.json]
+
+Pushes back-to-back AXIS traffic, holding tvalid high between frames, for
+each fixed frame size and IMIX mix. The XGMII output is observed on every
+clock. Results go to a JSON file, one entry per case, so runs can be diffed
+between RTL changes.
+"""
+import json
+import os
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.regression import TestFactory
+from cocotb.triggers import ClockCycles, ReadOnly, RisingEdge
+
+from common.axis import AxisSource
+from common.codec import find_control
+from common.traffic import FRAME_SIZES, IMIX, imix_sizes
+from common.xgmii import XGMII_START, XGMII_TERMINATE
+
+BENCH_FRAMES = int(os.environ.get("BENCH_FRAMES", "100"))
+BENCH_RESULTS = os.environ.get("BENCH_RESULTS", "tx_mac_throughput.json")
+SEED = int(os.environ.get("SEED", "1"))
+
+CLOCK_PERIOD_NS = 10
+LINE_RATE_BPS = 10e9
+
+MAC_HEADER_SIZE = 14
+FCS_SIZE = 4
+# tx_mac adds two bytes after the MAC header, part of the frame size
+ALIGN_SIZE = 2
+# fixed size back-to-back traffic has to reach the theoretical packet rate
+MIN_FIXED_EFFICIENCY = 0.999
+# preamble + SFD + minimum IFG carried on the wire for every frame
+WIRE_OVERHEAD = 8 + 12
+
+CASES = [f"fixed_{size}" for size in FRAME_SIZES] + list(IMIX)
+
+_results = {}
+
+
+def case_sizes(case):
+    if case.startswith("fixed_"):
+        return [int(case[len("fixed_"):])] * BENCH_FRAMES
+    return imix_sizes(case, SEED, BENCH_FRAMES)
+
+
+def write_results(path=BENCH_RESULTS):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"dut": "tx_mac", "clock_period_ns": CLOCK_PERIOD_NS, "cases": _results}, f, indent=2)
+    os.replace(tmp, path)
+
+
+class TxMacBench:
+    def __init__(self, dut):
+        self.dut = dut
+        self.bytes_per_word = len(dut.out_xgmii_ctl)
+        self.cycle = 0
+
+        self.source = AxisSource(
+            dut.tx_clk,
+            dut.in_slave_tx_tdata,
+            dut.in_slave_tx_tkeep,
+            dut.in_slave_tx_tvalid,
+            dut.in_slave_tx_tlast,
+            dut.out_slave_tx_tready,
+        )
+
+        # cycle of every /S/ and /T/, and the idle lane count at each /S/
+        self.starts = []
+        self.terms = []
+        self.idle_at_start = []
+        self.idle_lanes = 0
+
+    async def reset(self):
+        self.dut.tx_rst.value = 0
+        self.dut.in_slave_tx_tvalid.value = 0
+        self.dut.in_slave_tx_tlast.value = 0
+        self.dut.in_slave_tx_tdata.value = 0
+        self.dut.in_slave_tx_tkeep.value = 0
+        self.dut.in_xgmii_pcs_ready.value = 1
+
+        await ClockCycles(self.dut.tx_clk, 5)
+        self.dut.tx_rst.value = 1
+        await ClockCycles(self.dut.tx_clk, 5)
+
+    async def count_cycles(self):
+        while True:
+            await RisingEdge(self.dut.tx_clk)
+            self.cycle += 1
+
+    async def send_frames(self, payloads):
+        # back to back, one beat per clock while tready is high
+        for payload in payloads:
+            self.source.send(payload)
+        await self.source.wait()
+
+    async def monitor_xgmii(self):
+        dut = self.dut
+        lanes = self.bytes_per_word
+        while True:
+            await RisingEdge(dut.tx_clk)
+            await ReadOnly()
+            if not dut.in_xgmii_pcs_ready.value:
+                continue
+
+            ctl = int(dut.out_xgmii_ctl.value)
+            if not ctl:
+                continue
+
+            data = int(dut.out_xgmii_data.value)
+            idle = ctl.bit_count()
+            if find_control(data, ctl, XGMII_START, lanes) >= 0:
+                self.starts.append(self.cycle)
+                self.idle_at_start.append(self.idle_lanes)
+                idle -= 1
+            if find_control(data, ctl, XGMII_TERMINATE, lanes) >= 0:
+                self.terms.append(self.cycle)
+                idle -= 1
+            self.idle_lanes += idle
+
+    def report(self, sizes):
+        bpw = self.bytes_per_word
+        frames_out = min(len(self.starts), len(self.terms))
+        result = {
+            "frames_sent": len(sizes),
+            "frames_out": frames_out,
+            "mean_frame_size": sum(sizes) / len(sizes),
+        }
+        if frames_out < 2:
+            return result
+
+        # steady state window: from the first /S/ to the last one, which
+        # covers frames_out - 1 whole frames with their gaps
+        window = self.starts[frames_out - 1] - self.starts[0]
+        idle = self.idle_at_start[frames_out - 1] - self.idle_at_start[0]
+        source = self.source
+        axis_cycles = (source.end_times[-1] - source.start_times[0]) / CLOCK_PERIOD_NS + 1
+
+        frames_per_cycle = (frames_out - 1) / window
+        wire_bytes = sum(s + WIRE_OVERHEAD for s in sizes[: frames_out - 1]) / (frames_out - 1)
+        ideal_frames_per_cycle = bpw / wire_bytes
+        line_clock_hz = LINE_RATE_BPS / (8 * bpw)
+
+        result.update({
+            "window_cycles": window,
+            "axis_bytes_per_cycle": source.bytes_sent / axis_cycles,
+            "axis_stall_cycles": source.stall_cycles,
+            "xgmii_utilization": 1 - idle / (window * bpw),
+            "ifg_bytes_mean": idle / (frames_out - 1),
+            "ifg_overhead": idle / (window * bpw),
+            "cycles_per_frame": 1 / frames_per_cycle,
+            "mpps": frames_per_cycle * line_clock_hz / 1e6,
+            "mpps_theoretical": ideal_frames_per_cycle * line_clock_hz / 1e6,
+            "line_rate_efficiency": frames_per_cycle / ideal_frames_per_cycle,
+        })
+        return result
+
+
+async def run_throughput(dut, case):
+    tb = TxMacBench(dut)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    sizes = case_sizes(case)
+    payloads = [
+        bytes((i + n) & 0xFF for n in range(max(size - MAC_HEADER_SIZE - ALIGN_SIZE - FCS_SIZE, 1)))
+        for i, size in enumerate(sizes)
+    ]
+
+    cocotb.start_soon(tb.count_cycles())
+    monitor_task = cocotb.start_soon(tb.monitor_xgmii())
+    await tb.send_frames(payloads)
+
+    # drain: stop once every frame is out or the link has gone quiet for
+    # longer than two of the largest frames take
+    quiet_cycles = 2 * (max(sizes) + WIRE_OVERHEAD) // tb.bytes_per_word
+    idle_since = tb.cycle
+    seen = len(tb.terms)
+    while len(tb.terms) < len(sizes) and tb.cycle - idle_since < quiet_cycles:
+        await RisingEdge(dut.tx_clk)
+        if len(tb.terms) != seen:
+            seen = len(tb.terms)
+            idle_since = tb.cycle
+    await ClockCycles(dut.tx_clk, 4)
+    monitor_task.kill()
+
+    result = tb.report(sizes)
+    _results[case] = result
+    write_results()
+
+    dut._log.info(
+        f"{case}: "
+        + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items())
+    )
+    assert result["frames_out"] == len(sizes), (
+        f"{case}: {result['frames_out']} of {len(sizes)} frames left tx_mac"
+    )
+    if case.startswith("fixed_"):
+        assert result["line_rate_efficiency"] >= MIN_FIXED_EFFICIENCY, (
+            f"{case}: {result['mpps']:.3f} Mpps of {result['mpps_theoretical']:.3f}"
+        )
+
+
+factory = TestFactory(run_throughput)
+factory.add_option("case", CASES)
+factory.generate_tests()
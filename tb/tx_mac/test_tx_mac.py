@@ -1,15 +1,76 @@
+"""
+tx_mac tests.
+
+    make [DATA_WIDTH=32] [CUT_THROUGH=0] [LATENCY_FRAMES=1000] [SEED=1]
+         [PCAP_IN=capture.pcapng] [PCAP_FRAMES=0] [PCAP_TIMING=0]
+         [PCAP_OUT=tx_mac_32_store_and_forward_xgmii.pcap]
+
+Files the tests write are named after DATA_WIDTH and the mode selected by
+CUT_THROUGH by default, tx_mac_<width>_<mode>_*, so that the regress.py
+jobs of the sweep do not write over each other.
+
+test_latency_by_frame_size writes tx_mac_<width>_<mode>_size_latency.json.
+Run it in both modes and compare them frame size by frame size with
+
+    cd tb && python -m common.latency tx_mac/tx_mac_32_store_and_forward_size_latency.json \
+        tx_mac/tx_mac_32_cut_through_size_latency.json
+
+test_pcap_replay sends the frames of PCAP_IN (the first PCAP_FRAMES, 0 for
+all), or of a generated capture without it, and writes what comes out on
+XGMII to PCAP_OUT with simulation timestamps.
+
+test_cycle_model runs common.tx_mac_model.TxMacModel next to the RTL and
+compares them on every clock; test_line_schedule checks the model's
+clockless back to back schedule against what the RTL sends.
+
+test_cycle_model and test_pcap_replay note the time of every mismatch (and
+of every frame_error pulse in test_pcap_replay). When they fail they log a
+rerun with WAVES=1 that dumps tx_mac_waves.fst around just those clocks,
+see common/waves.py.
+"""
+import itertools
+import os
+
 import cocotb
 from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge, ClockCycles
+from cocotb.triggers import RisingEdge, ClockCycles, ReadOnly
+from cocotb.utils import get_sim_time
 from cocotb.result import TestFailure
-from crc import Calculator, Crc32
-
-ethernet_crc32_calc = Calculator(Crc32.CRC32)
+from common.axis import AxisSource, always_ready, random_ready
+from common.codec import extract_xgmii_frame, find_control, xgmii_frames, xgmii_to_lanes
+from common.crc_ref import crc32
+from common.latency import FrameTimestamps, write_report
+from common.pcap import PcapWriter, read_frames, write_line_rate_capture
+from common.scoreboard import Scoreboard
+from common.stats import StatsModel, StatsReader
+from common.trace import TraceRecorder, traced
+from common.traffic import FRAME_SIZES, random_frames
+from common.tx_mac_model import FIFO_DEPTH, STATE_NAMES, TxMacModel, xgmii_stream
+from common.waves import Waves, windowed
+
+LATENCY_FRAMES = int(os.environ.get("LATENCY_FRAMES", "1000"))
+SEED = int(os.environ.get("SEED", "1"))
+# set by the Makefile, which passes the same values to the RTL
+DATA_WIDTH = int(os.environ.get("DATA_WIDTH", "32"))
+CUT_THROUGH = int(os.environ.get("CUT_THROUGH", "0"))
+MODE = "cut_through" if CUT_THROUGH else "store_and_forward"
+# prefix of the files this configuration writes
+OUT_PREFIX = f"tx_mac_{DATA_WIDTH}_{MODE}"
+LATENCY_RESULTS = os.environ.get("LATENCY_RESULTS", f"{OUT_PREFIX}_latency.json")
+SIZE_RESULTS = os.environ.get("SIZE_RESULTS", f"{OUT_PREFIX}_size_latency.json")
+PCAP_IN = os.environ.get("PCAP_IN", "")
+PCAP_FRAMES = int(os.environ.get("PCAP_FRAMES", "0"))
+# 1: send every frame no earlier than its capture time says, 0: back to back
+PCAP_TIMING = int(os.environ.get("PCAP_TIMING", "0"))
+PCAP_OUT = os.environ.get("PCAP_OUT", f"{OUT_PREFIX}_xgmii.pcap")
+
+CLOCK_PERIOD_NS = 10
 
 
 class TxMacTestbench:
     def __init__(self, dut):
         self.dut = dut
+        self.bytes_per_word = len(dut.out_xgmii_ctl)
 
         self.XGMII_IDLE = 0x07
         self.XGMII_START = 0xFB
@@ -26,8 +87,33 @@ class TxMacTestbench:
         self.MIN_FRAME_SIZE = 64
         self.MAX_FRAME_SIZE = 1518
         self.MIN_PAYLOAD_SIZE = 46
-        self.MAX_PAYLOAD_SIZE = 1500
         self.IFG_SIZE = 12
+        self.MAC_HEADER_SIZE = 14
+        self.FCS_SIZE = 4
+        # tx_mac's two bytes after the MAC header, which count towards the
+        # minimum payload
+        self.ALIGN_SIZE = 2
+        # longest payload that fits in MAX_FRAME_SIZE after the alignment bytes
+        self.MAX_PAYLOAD_SIZE = self.MAX_FRAME_SIZE - self.MAC_HEADER_SIZE - self.ALIGN_SIZE - self.FCS_SIZE
+
+        self.xgmii_trace = TraceRecorder(
+            "xgmii",
+            (("cycle", "d"), ("data", f"0{2 * self.bytes_per_word}x"), ("ctl", f"0{self.bytes_per_word}b")),
+            dut._log,
+        )
+
+        self.source = AxisSource(
+            dut.tx_clk,
+            dut.in_slave_tx_tdata,
+            dut.in_slave_tx_tkeep,
+            dut.in_slave_tx_tvalid,
+            dut.in_slave_tx_tlast,
+            dut.out_slave_tx_tready,
+        )
+        self.stats = StatsReader(
+            dut.tx_clk, dut.stats_snapshot, dut.stats_clear, dut.stats_read_addr, dut.stats_read_data
+        )
+        self.stats_model = StatsModel(self.MIN_FRAME_SIZE, self.MAX_FRAME_SIZE)
 
     async def reset(self):
         self.dut.tx_rst.value = 0
@@ -36,50 +122,19 @@ class TxMacTestbench:
         self.dut.in_slave_tx_tdata.value = 0
         self.dut.in_slave_tx_tkeep.value = 0
         self.dut.in_xgmii_pcs_ready.value = 1
+        self.stats.reset()
 
         await ClockCycles(self.dut.tx_clk, 5)
         self.dut.tx_rst.value = 1
         await ClockCycles(self.dut.tx_clk, 5)
 
     async def send_axis_frame(self, payload_data):
-        while not self.dut.out_slave_tx_tready.value:
-            await RisingEdge(self.dut.tx_clk)
-
-        words = []
-        for i in range(0, len(payload_data), 4):
-            chunk = payload_data[i : i + 4]
-            if len(chunk) < 4:
-                chunk.extend([0] * (4 - len(chunk)))
-            word = (chunk[3] << 24) | (chunk[2] << 16) | (chunk[1] << 8) | chunk[0]
-            words.append(word)
-
-        for i, word in enumerate(words):
-            await RisingEdge(self.dut.tx_clk)
-
-            while not self.dut.out_slave_tx_tready.value:
-                await RisingEdge(self.dut.tx_clk)
-
-            self.dut.in_slave_tx_tdata.value = word
-            self.dut.in_slave_tx_tvalid.value = 1
-
-            if i == len(words) - 1:
-                self.dut.in_slave_tx_tlast.value = 1
-                remaining_bytes = len(payload_data) % 4
-                if remaining_bytes == 0:
-                    remaining_bytes = 4
-                keep_mask = (1 << remaining_bytes) - 1
-                self.dut.in_slave_tx_tkeep.value = keep_mask
-            else:
-                self.dut.in_slave_tx_tkeep.value = 0xF
-                self.dut.in_slave_tx_tlast.value = 0
-
-        await RisingEdge(self.dut.tx_clk)
-        self.dut.in_slave_tx_tvalid.value = 0
-        self.dut.in_slave_tx_tlast.value = 0
-        self.dut.in_slave_tx_tkeep.value = 0
+        self.source.send(payload_data)
+        await self.source.wait()
 
     async def capture_xgmii_frame(self, timeout_cycles=1000):
-        frame_data = []
+        data_words = []
+        ctl_words = []
         frame_started = False
         cycle_count = 0
 
@@ -95,46 +150,91 @@ class TxMacTestbench:
             xgmii_data = int(self.dut.out_xgmii_data.value)
             xgmii_ctl = int(self.dut.out_xgmii_ctl.value)
 
-            bytes_in_word = []
-            for i in range(4):
-                byte_val = (xgmii_data >> (i * 8)) & 0xFF
-                ctl_bit = (xgmii_ctl >> i) & 1
-                bytes_in_word.append((byte_val, ctl_bit))
+            self.xgmii_trace.record(cycle_count, xgmii_data, xgmii_ctl)
 
-            if cycle_count <= 55:
+            if not frame_started:
+                start_lane = find_control(xgmii_data, xgmii_ctl, self.XGMII_START, self.bytes_per_word)
+                if start_lane < 0:
+                    continue
+                frame_started = True
+                self.dut._log.info(f"Frame start detected at byte {start_lane}")
+
+            # raw words only; lanes are split in one pass once /T/ is seen
+            data_words.append(xgmii_data)
+            ctl_words.append(xgmii_ctl)
+
+            if find_control(xgmii_data, xgmii_ctl, self.XGMII_TERMINATE, self.bytes_per_word) >= 0:
+                frame_data = extract_xgmii_frame(data_words, ctl_words, self.bytes_per_word)
                 self.dut._log.info(
-                    f"Cycle {cycle_count}: data=0x{xgmii_data:08x}, ctl=0b{xgmii_ctl:04b}, bytes={[(hex(b), c) for b, c in bytes_in_word]}"
+                    f"Frame end detected, total bytes captured: {len(frame_data)}"
                 )
-
-            if not frame_started:
-                for i, (byte_val, ctl_bit) in enumerate(bytes_in_word):
-                    if ctl_bit and byte_val == self.XGMII_START:
-                        frame_started = True
-                        self.dut._log.info(f"Frame start detected at byte {i}")
-                        for j in range(i + 1, 4):
-                            if not bytes_in_word[j][1]:
-                                frame_data.append(bytes_in_word[j])
-                        break
-            else:
-                for byte_val, ctl_bit in bytes_in_word:
-                    if not ctl_bit:
-                        frame_data.append((byte_val, ctl_bit))
-                    elif ctl_bit and byte_val == self.XGMII_TERMINATE:
-                        self.dut._log.info(
-                            f"Frame end detected, total bytes captured: {len(frame_data)}"
-                        )
-                        return frame_data
+                return frame_data
 
         if not frame_started:
             raise TestFailure("No XGMII frame detected within timeout")
 
-        return frame_data
+        return extract_xgmii_frame(data_words, ctl_words, self.bytes_per_word)
 
-    def parse_ethernet_frame(self, xgmii_data):
-        frame_bytes = []
+    async def capture_xgmii_stream(self, num_frames, timeout_cycles=100000):
+        """
+        Raw XGMII words until num_frames /T/ have gone out, as
+        codec.xgmii_frames() (start, term, frame) tuples.
+        """
+        data_words = []
+        ctl_words = []
+        terms = 0
+        # the raw words, for checks on control characters
+        self.captured = (data_words, ctl_words)
 
-        for byte_val, ctl_bit in xgmii_data:
-            frame_bytes.append(byte_val)
+        for _ in range(timeout_cycles):
+            await RisingEdge(self.dut.tx_clk)
+            if not self.dut.out_xgmii_valid.value:
+                continue
+            xgmii_data = int(self.dut.out_xgmii_data.value)
+            xgmii_ctl = int(self.dut.out_xgmii_ctl.value)
+            data_words.append(xgmii_data)
+            ctl_words.append(xgmii_ctl)
+            if find_control(xgmii_data, xgmii_ctl, self.XGMII_TERMINATE, self.bytes_per_word) >= 0:
+                terms += 1
+                if terms == num_frames:
+                    break
+
+        return xgmii_frames(data_words, ctl_words, self.bytes_per_word)
+
+    async def monitor_frames(self, scoreboard, writer=None):
+        """
+        Every XGMII frame, preamble to FCS, into scoreboard as it ends, and
+        from the SFD on into writer, stamped with the time of its /S/.
+        """
+        dut = self.dut
+        bpw = self.bytes_per_word
+        data_words = []
+        ctl_words = []
+        start_ns = None
+        while True:
+            await RisingEdge(dut.tx_clk)
+            await ReadOnly()
+            if not dut.out_xgmii_valid.value:
+                continue
+            xgmii_data = int(dut.out_xgmii_data.value)
+            xgmii_ctl = int(dut.out_xgmii_ctl.value)
+            if start_ns is None:
+                if find_control(xgmii_data, xgmii_ctl, self.XGMII_START, bpw) < 0:
+                    continue
+                start_ns = get_sim_time("ns")
+            data_words.append(xgmii_data)
+            ctl_words.append(xgmii_ctl)
+            if find_control(xgmii_data, xgmii_ctl, self.XGMII_TERMINATE, bpw) >= 0:
+                frame = extract_xgmii_frame(data_words, ctl_words, bpw)
+                scoreboard.check(frame)
+                if writer is not None:
+                    writer.write(frame[7:], start_ns)
+                data_words = []
+                ctl_words = []
+                start_ns = None
+
+    def parse_ethernet_frame(self, xgmii_data):
+        frame_bytes = list(xgmii_data)
 
         self.dut._log.info(
             f"Extracted frame bytes: {[hex(b) for b in frame_bytes[:30]]}..."
@@ -182,7 +282,7 @@ class TxMacTestbench:
         }
 
     def calculate_crc32(self, data: bytes) -> int:
-        return ethernet_crc32_calc.checksum(data)
+        return crc32(data)
 
     def verify_frame(self, captured_frame, expected_payload):
         parsed = self.parse_ethernet_frame(captured_frame)
@@ -220,24 +320,18 @@ class TxMacTestbench:
                 f"EtherType mismatch: got {[hex(b) for b in parsed['ether_type']]}, expected {[hex(b) for b in expected_ether_type]}"
             )
 
-        actual_payload = parsed["payload"][: len(expected_payload)]
-        if actual_payload != expected_payload:
+        # frames end on the exact byte, short payloads are zero padded to
+        # a minimum size frame
+        min_payload = self.MIN_PAYLOAD_SIZE - self.ALIGN_SIZE
+        padded_payload = list(expected_payload) + [0] * (min_payload - len(expected_payload))
+        if parsed["payload"] != padded_payload:
             raise TestFailure(
-                f"Payload mismatch: got {[hex(b) for b in actual_payload]}, expected {[hex(b) for b in expected_payload]}"
+                f"Payload mismatch: got {len(parsed['payload'])} bytes {[hex(b) for b in parsed['payload'][:16]]}..., "
+                f"expected {len(padded_payload)} bytes {[hex(b) for b in padded_payload[:16]]}..."
             )
 
-        min_payload_size = max(len(expected_payload), self.MIN_PAYLOAD_SIZE)
-        if len(parsed["payload"]) < min_payload_size:
-            raise TestFailure(
-                f"Payload too short: {len(parsed['payload'])}, expected at least {min_payload_size}"
-            )
-
-        frame_for_crc = (
-            parsed["dest_mac"]
-            + parsed["src_mac"]
-            + parsed["ether_type"]
-            + parsed["payload"]
-        )
+        # everything between SFD and FCS, tx_mac's two padding bytes included
+        frame_for_crc = list(captured_frame)[7:-4]
         expected_crc = self.calculate_crc32(frame_for_crc)
         actual_crc = (
             (parsed["fcs"][3] << 24)
@@ -249,122 +343,134 @@ class TxMacTestbench:
         self.dut._log.info(
             f"CRC check: got 0x{actual_crc:08x}, expected 0x{expected_crc:08x}"
         )
+        if actual_crc != expected_crc:
+            raise TestFailure(
+                f"FCS mismatch: got 0x{actual_crc:08x}, expected 0x{expected_crc:08x}"
+            )
 
         return parsed
 
-    async def measure_latency_accurate(self, payload_data):
-        axis_start_time = None
-        xgmii_start_time = None
-        state_transition_time = None
-
-        async def monitor_state():
-            nonlocal state_transition_time
-            prev_state = None
-            cycle_count = 0
-
-            while cycle_count < 100:
-                await RisingEdge(self.dut.tx_clk)
-                cycle_count += 1
-
-                try:
-                    current_state = int(self.dut.current_state.value)
-                    if prev_state == 0 and current_state == 1:
-                        state_transition_time = cocotb.utils.get_sim_time("ns")
-                        self.dut._log.info(
-                            f"State transition IDLE->PREAMBLE at {state_transition_time} ns, cycle {cycle_count}"
-                        )
-                        break
-                    prev_state = current_state
-                except:
-                    break
-
-        async def monitor_xgmii():
-            nonlocal xgmii_start_time
-            cycle_count = 0
-
-            while cycle_count < 100:
-                await RisingEdge(self.dut.tx_clk)
-                cycle_count += 1
+    def frame_size(self, payload):
+        """Frame length tx_mac makes of a payload: header, alignment bytes, padding and FCS."""
+        return max(self.MIN_FRAME_SIZE, self.MAC_HEADER_SIZE + self.ALIGN_SIZE + len(payload) + self.FCS_SIZE)
 
-                if not self.dut.in_xgmii_pcs_ready.value:
-                    continue
-
-                xgmii_data = int(self.dut.out_xgmii_data.value)
-                xgmii_ctl = int(self.dut.out_xgmii_ctl.value)
-
-                for i in range(4):
-                    byte_val = (xgmii_data >> (i * 8)) & 0xFF
-                    ctl_bit = (xgmii_ctl >> i) & 1
-
-                    if ctl_bit and byte_val == self.XGMII_START:
-                        xgmii_start_time = cocotb.utils.get_sim_time("ns")
-                        self.dut._log.info(
-                            f"XGMII START detected at {xgmii_start_time} ns, cycle {cycle_count}"
-                        )
-                        return
-
-        state_task = cocotb.start_soon(monitor_state())
-        xgmii_task = cocotb.start_soon(monitor_xgmii())
+    async def check_stats(self):
+        """Read the statistics back and compare them with the model."""
+        counters, = await self.stats.read()
+        errors = self.stats_model.compare(counters)
+        assert not errors, "statistics: " + ", ".join(errors)
+        self.dut._log.info(f"statistics: {counters['good_frames']} good, {counters['bad_frames']} bad frames")
 
-        while not self.dut.out_slave_tx_tready.value:
+    async def count_status(self, counts):
+        """Adds up frame_valid and frame_error pulses into counts."""
+        while True:
             await RisingEdge(self.dut.tx_clk)
+            await ReadOnly()
+            counts["frame_valid"] += int(self.dut.frame_valid.value)
+            counts["frame_error"] += int(self.dut.frame_error.value)
 
-        await RisingEdge(self.dut.tx_clk)
-
-        chunk = (
-            payload_data[:4]
-            if len(payload_data) >= 4
-            else payload_data + [0] * (4 - len(payload_data))
-        )
-        word = (chunk[3] << 24) | (chunk[2] << 16) | (chunk[1] << 8) | chunk[0]
-
-        self.dut.in_slave_tx_tdata.value = word
-        self.dut.in_slave_tx_tvalid.value = 1
-        self.dut.in_slave_tx_tkeep.value = 0xF
-        if len(payload_data) <= 4:
-            self.dut.in_slave_tx_tlast.value = 1
+    async def drive_pcs_ready(self, pattern):
+        """in_xgmii_pcs_ready from a pattern of bools, one per clock."""
+        for ready in pattern:
+            await RisingEdge(self.dut.tx_clk)
+            self.dut.in_xgmii_pcs_ready.value = int(ready)
+
+    async def check_model(self, model, scoreboard):
+        """
+        Steps model with what tx_mac samples at every rising edge, and
+        checks the RTL's registered outputs and tready against it after
+        every edge. Start it before reset: the two line up at the first
+        clock tx_rst is low.
+        """
+        dut = self.dut
+        cycle = 0
+        synced = False
+        while True:
+            await RisingEdge(dut.tx_clk)
+            await ReadOnly()
+            cycle += 1
+            if synced:
+                scoreboard.expect(
+                    (
+                        model.out_xgmii_valid,
+                        model.out_xgmii_data,
+                        model.out_xgmii_ctl,
+                        model.frame_valid,
+                        model.frame_error,
+                        model.tready,
+                    ),
+                    f"clock {cycle}, {STATE_NAMES[model.state]}",
+                )
+                scoreboard.check(
+                    (
+                        bool(dut.out_xgmii_valid.value),
+                        int(dut.out_xgmii_data.value),
+                        int(dut.out_xgmii_ctl.value),
+                        bool(dut.frame_valid.value),
+                        bool(dut.frame_error.value),
+                        bool(dut.out_slave_tx_tready.value),
+                    )
+                )
+            if not dut.tx_rst.value:
+                model.reset()
+                synced = True
+            elif synced:
+                model.clock(
+                    dut.in_slave_tx_tvalid.value,
+                    int(dut.in_slave_tx_tdata.value),
+                    int(dut.in_slave_tx_tkeep.value),
+                    dut.in_slave_tx_tlast.value,
+                    dut.in_xgmii_pcs_ready.value,
+                )
 
-        axis_start_time = cocotb.utils.get_sim_time("ns")
-        self.dut._log.info(f"First AXI word sent at {axis_start_time} ns")
+    def frame_timestamps(self):
+        """
+        Latency monitor over the AXIS input and the XGMII output. Store and
+        forward starts a frame once its tlast is in the FIFO, cut-through as
+        soon as its first beat is, so /S/ may come out before tlast goes in.
+        last_to_term is the FIFO drain time.
+        """
+        dut = self.dut
+        ts = FrameTimestamps(dut.tx_clk, CLOCK_PERIOD_NS)
+        ts.axis("axis", dut.in_slave_tx_tvalid, dut.out_slave_tx_tready, dut.in_slave_tx_tlast)
+        ts.xgmii("xgmii", dut.out_xgmii_data, dut.out_xgmii_ctl, self.bytes_per_word, dut.out_xgmii_valid)
+        ts.latency("first_to_start", "axis_first", "xgmii_start")
+        ts.latency("last_to_term", "axis_last", "xgmii_term")
+        return ts
+
+    async def measure_latency_accurate(self, payload_data, timeout_cycles=1000):
+        """Latencies of a single frame, {name: {"cycles": n, "ns": t}}."""
+        ts = self.frame_timestamps()
+        ts.start()
 
         await self.send_axis_frame(payload_data)
-
-        await state_task
-        await xgmii_task
+        for _ in range(timeout_cycles):
+            if all(hist.count for hist in ts.histograms.values()):
+                break
+            await RisingEdge(self.dut.tx_clk)
+        ts.kill()
 
         latencies = {}
-        clock_period = 10
-
-        if axis_start_time and state_transition_time:
-            latency_ns = state_transition_time - axis_start_time
-            latency_cycles = latency_ns / clock_period
-            latencies["axis_to_state_transition"] = {
-                "ns": latency_ns,
-                "cycles": latency_cycles,
-            }
-
-        if axis_start_time and xgmii_start_time:
-            latency_ns = xgmii_start_time - axis_start_time
-            latency_cycles = latency_ns / clock_period
-            latencies["axis_to_xgmii_start"] = {
-                "ns": latency_ns,
-                "cycles": latency_cycles,
-            }
+        for name, hist in ts.histograms.items():
+            if hist.count:
+                cycles = hist.percentile(50)
+                latencies[name] = {"cycles": cycles, "ns": cycles * CLOCK_PERIOD_NS}
+            else:
+                self.dut._log.warning(f"{name}: frame did not reach both points")
 
         self.dut._log.info("=== ACCURATE LATENCY MEASUREMENTS ===")
         for metric, data in latencies.items():
-            self.dut._log.info(
-                f"{metric}: {data['ns']:.1f} ns ({data['cycles']:.1f} cycles)"
-            )
+            self.dut._log.info(f"{metric}: {data['ns']:.1f} ns ({data['cycles']} cycles)")
 
         return latencies
 
 
 @cocotb.test()
+@traced
 async def test_simple_frame(dut):
     tb = TxMacTestbench(dut)
 
-    cocotb.start_soon(Clock(dut.tx_clk, 10, units="ns").start())
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
     await tb.reset()
 
     payload = [0xAA, 0xBB, 0xCC, 0xDD]
@@ -380,13 +486,14 @@ async def test_simple_frame(dut):
 
 
 @cocotb.test()
+@traced
 async def test_minimum_frame(dut):
     tb = TxMacTestbench(dut)
 
-    cocotb.start_soon(Clock(dut.tx_clk, 10, units="ns").start())
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
     await tb.reset()
 
-    payload = list(range(46))
+    payload = list(range(tb.MIN_PAYLOAD_SIZE - tb.ALIGN_SIZE))
 
     send_task = cocotb.start_soon(tb.send_axis_frame(payload))
     capture_task = cocotb.start_soon(tb.capture_xgmii_frame())
@@ -396,8 +503,9 @@ async def test_minimum_frame(dut):
 
     parsed = tb.verify_frame(captured_frame, payload)
 
-    expected_min_length = ((tb.MIN_PAYLOAD_SIZE + 3) // 4) * 4
-    assert len(parsed["payload"]) >= expected_min_length
+    assert len(parsed["payload"]) == tb.MIN_PAYLOAD_SIZE - tb.ALIGN_SIZE
+    # preamble and SFD, then the frame
+    assert len(captured_frame) - 7 == tb.MIN_FRAME_SIZE, f"{len(captured_frame) - 7} byte frame"
 
     dut._log.info(
         f"Minimum frame test passed - payload length: {len(parsed['payload'])} bytes"
@@ -405,24 +513,103 @@ async def test_minimum_frame(dut):
 
 
 @cocotb.test()
+@traced
+async def test_frame_lengths(dut):
+    """
+    Back to back frames of every length over a few words plus the minimum:
+    exact frame ends, /S/ on a 4 byte lane and gaps kept to 12 bytes on
+    average by the deficit idle count
+    """
+    tb = TxMacTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    lengths = list(range(1, 4 * tb.bytes_per_word + 1)) + list(range(40, 54 + 2 * tb.bytes_per_word))
+    payloads = [bytes((n + i) & 0xFF for i in range(n)) for n in lengths]
+
+    capture_task = cocotb.start_soon(tb.capture_xgmii_stream(len(payloads)))
+    for payload in payloads:
+        tb.stats_model.frame(tb.frame_size(payload))
+        tb.source.send(payload)
+    frames = await capture_task
+
+    assert len(frames) == len(payloads), f"{len(frames)} frames out for {len(payloads)} in"
+    start_lanes = set()
+    deficit = 0
+    for i, ((start, term, frame), payload) in enumerate(zip(frames, payloads)):
+        tb.verify_frame(frame, list(payload))
+        assert start % 4 == 0, f"frame {i}: /S/ on lane {start % tb.bytes_per_word}"
+        start_lanes.add(start % tb.bytes_per_word)
+        if i + 1 < len(frames):
+            # idles short of IFG_SIZE so far, never more than three
+            gap = frames[i + 1][0] - term
+            deficit += tb.IFG_SIZE - gap
+            assert 0 <= deficit <= 3, f"frame {i}: {gap} byte gap after /T/, deficit {deficit}"
+
+    if tb.bytes_per_word == 8:
+        assert start_lanes == {0, 4}, f"start lanes {sorted(start_lanes)}"
+    await tb.check_stats()
+    dut._log.info(f"{len(payloads)} frames, start lanes {sorted(start_lanes)}")
+
+
+@cocotb.test()
+@traced
 async def test_accurate_latency(dut):
     tb = TxMacTestbench(dut)
 
-    cocotb.start_soon(Clock(dut.tx_clk, 10, units="ns").start())
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
     await tb.reset()
 
     payload = [0x11, 0x22, 0x33, 0x44]
 
     latencies = await tb.measure_latency_accurate(payload)
 
+    assert "first_to_start" in latencies, "frame never started on XGMII"
     dut._log.info("Accurate latency measurement completed")
 
 
 @cocotb.test()
+@traced
+async def test_latency_under_load(dut):
+    """
+    LATENCY_FRAMES random frames back to back, latency distributions written
+    to LATENCY_RESULTS for comparison with python -m common.latency.
+    """
+    tb = TxMacTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    ts = tb.frame_timestamps()
+    ts.start()
+
+    for payload in random_frames(SEED, LATENCY_FRAMES, tb.MIN_PAYLOAD_SIZE, tb.MAX_PAYLOAD_SIZE):
+        tb.stats_model.frame(tb.frame_size(payload))
+        tb.source.send(payload)
+    await tb.source.wait()
+
+    last = ts.histograms["last_to_term"]
+    for _ in range(4096):
+        if last.count == LATENCY_FRAMES:
+            break
+        await RisingEdge(dut.tx_clk)
+    ts.kill()
+
+    write_report(LATENCY_RESULTS, "tx_mac", ts, frames=LATENCY_FRAMES, seed=SEED)
+    for line in ts.describe():
+        dut._log.info(line)
+    for name, hist in ts.histograms.items():
+        assert hist.count == LATENCY_FRAMES, f"{name}: {hist.count} of {LATENCY_FRAMES} frames"
+    await tb.check_stats()
+
+
+@cocotb.test()
+@traced
 async def test_back_to_back_frames(dut):
     tb = TxMacTestbench(dut)
 
-    cocotb.start_soon(Clock(dut.tx_clk, 10, units="ns").start())
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
     await tb.reset()
 
     for i in range(3):
@@ -440,6 +627,288 @@ async def test_back_to_back_frames(dut):
         await ClockCycles(dut.tx_clk, 20)
 
 
+@cocotb.test()
+@traced
+async def test_starved_source(dut):
+    """
+    tvalid drops for a while in the middle of a frame: store and forward
+    waits for tlast and sends it whole, cut-through runs out of payload and
+    aborts it with /E/ and frame_error. The next frame goes out intact.
+    """
+    tb = TxMacTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+    counts = {"frame_valid": 0, "frame_error": 0}
+    cocotb.start_soon(tb.count_status(counts))
+
+    starved = bytes(i & 0xFF for i in range(200))
+    intact = bytes(0x80 | (i & 0x7F) for i in range(100))
+    tb.source.valid = itertools.chain([True] * 8, [False] * 32, always_ready())
+
+    capture_task = cocotb.start_soon(tb.capture_xgmii_stream(2))
+    tb.source.send(starved)
+    tb.source.send(intact)
+    frames = await capture_task
+    await ClockCycles(dut.tx_clk, 4)
+
+    assert len(frames) == 2, f"{len(frames)} frames out for 2 in"
+    tb.verify_frame(frames[1][2], list(intact))
+    if not CUT_THROUGH:
+        tb.verify_frame(frames[0][2], list(starved))
+        assert counts == {"frame_valid": 2, "frame_error": 0}, counts
+        tb.stats_model.frame(tb.frame_size(starved))
+        tb.stats_model.frame(tb.frame_size(intact))
+        await tb.check_stats()
+        return
+
+    # the aborted frame: preamble, header and what payload there was, then
+    # four /E/ where the FCS would be and /T/
+    _, term, frame = frames[0]
+    lanes, is_ctl = xgmii_to_lanes(*tb.captured, tb.bytes_per_word)
+    assert all(is_ctl[term - 4 : term]) and all(lanes[term - 4 : term] == tb.XGMII_ERROR), (
+        f"no /E/ before /T/: {lanes[term - 4 : term + 1].tolist()}"
+    )
+    sent = frame[7 + 16 :]
+    assert 0 < len(sent) < len(starved) and sent == starved[: len(sent)], (
+        f"{len(sent)} payload bytes before the abort do not match"
+    )
+    assert counts == {"frame_valid": 1, "frame_error": 1}, counts
+    # the aborted frame counts up to its /E/
+    tb.stats_model.frame(tb.MAC_HEADER_SIZE + tb.ALIGN_SIZE + len(sent), aborted=True)
+    tb.stats_model.frame(tb.frame_size(intact))
+    await tb.check_stats()
+    dut._log.info(f"aborted after {len(sent)} payload bytes")
+
+
+@cocotb.test()
+@traced
+async def test_frame_over_fifo(dut):
+    """
+    A payload longer than the FIFO never has its tlast beat in the FIFO
+    while the frame waits there, so store and forward starts it once it
+    fills the FIFO, as cut-through would have earlier. It goes out whole
+    with frame_error for its length, and the next frame follows intact.
+    """
+    tb = TxMacTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+    counts = {"frame_valid": 0, "frame_error": 0}
+    cocotb.start_soon(tb.count_status(counts))
+
+    long = bytes(i & 0xFF for i in range(FIFO_DEPTH * tb.bytes_per_word + 100))
+    intact = bytes(0x80 | (i & 0x7F) for i in range(100))
+
+    capture_task = cocotb.start_soon(tb.capture_xgmii_stream(2))
+    tb.source.send(long)
+    tb.source.send(intact)
+    frames = await capture_task
+    await ClockCycles(dut.tx_clk, 4)
+
+    assert len(frames) == 2, f"{len(frames)} frames out for 2 in"
+    tb.verify_frame(frames[0][2], list(long))
+    tb.verify_frame(frames[1][2], list(intact))
+    assert counts == {"frame_valid": 2, "frame_error": 1}, counts
+    tb.stats_model.frame(tb.frame_size(long))
+    tb.stats_model.frame(tb.frame_size(intact))
+    await tb.check_stats()
+
+
+@cocotb.test()
+@traced
+async def test_latency_by_frame_size(dut):
+    """
+    One frame of each standard size on an idle link, first_to_start and
+    last_to_term per size written to SIZE_RESULTS. Store and forward waits
+    for the whole frame before /S/, cut-through does not.
+    """
+    tb = TxMacTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    ts = FrameTimestamps(dut.tx_clk, CLOCK_PERIOD_NS)
+    ts.axis("axis", dut.in_slave_tx_tvalid, dut.out_slave_tx_tready, dut.in_slave_tx_tlast)
+    ts.xgmii("xgmii", dut.out_xgmii_data, dut.out_xgmii_ctl, tb.bytes_per_word, dut.out_xgmii_valid)
+    ts.start()
+
+    for size in FRAME_SIZES:
+        # one frame at a time, so that only this size's latencies pair up
+        first = ts.latency(f"first_to_start_{size}", "axis_first", "xgmii_start")
+        last = ts.latency(f"last_to_term_{size}", "axis_last", "xgmii_term")
+        tb.source.send(bytes(i & 0xFF for i in range(size - 20)))
+        tb.stats_model.frame(size)
+        for _ in range(1000):
+            await RisingEdge(dut.tx_clk)
+            if last.count:
+                break
+        assert first.count == 1 and last.count == 1, f"{size} byte frame did not get through"
+        await ClockCycles(dut.tx_clk, 8)
+        ts.stop(first.name)
+        ts.stop(last.name)
+    ts.kill()
+    await tb.check_stats()
+
+    write_report(SIZE_RESULTS, "tx_mac", ts, mode=MODE, frame_sizes=FRAME_SIZES)
+    for line in ts.describe():
+        dut._log.info(f"{MODE} {line}")
+
+    to_start = [ts.histograms[f"first_to_start_{size}"].percentile(50) for size in FRAME_SIZES]
+    if CUT_THROUGH:
+        assert len(set(to_start)) == 1, f"/S/ latency depends on the frame size: {to_start}"
+    else:
+        assert to_start == sorted(to_start) and to_start[0] < to_start[-1], to_start
+
+
+@cocotb.test()
+@windowed
+async def test_pcap_replay(dut):
+    """
+    The frames of a capture through tx_mac. tx_mac puts its own MAC header
+    on every frame, so what goes in on AXIS is each captured frame after
+    its MAC header, cut to the longest payload tx_mac takes. Every frame
+    out is checked as it ends and written to PCAP_OUT, FCS included.
+    """
+    tb = TxMacTestbench(dut)
+    header = (
+        tb.DEST_MAC.to_bytes(6, "big") + tb.SRC_MAC.to_bytes(6, "big") + tb.ETHER_TYPE.to_bytes(2, "big")
+        + bytes(tb.ALIGN_SIZE)
+    )
+    path = PCAP_IN
+    if not path:
+        path = f"{OUT_PREFIX}_replay.pcapng"
+        write_line_rate_capture(path, random_frames(SEED, PCAP_FRAMES or 200))
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    scoreboard = Scoreboard("pcap", dut._log)
+    waves = Waves(dut, CLOCK_PERIOD_NS)
+    waves.watch(scoreboard)
+    waves.watch_pulses(dut.frame_error)
+    writer = PcapWriter(PCAP_OUT, fcs_len=tb.FCS_SIZE)
+    monitor = cocotb.start_soon(tb.monitor_frames(scoreboard, writer))
+
+    start_ns = get_sim_time("ns")
+    first_ns = None
+    sent = 0
+    payload_bytes = 0
+    for time_ns, frame in read_frames(path, PCAP_FRAMES or None):
+        payload = bytes(frame[tb.MAC_HEADER_SIZE : tb.MAC_HEADER_SIZE + tb.MAX_PAYLOAD_SIZE]) or frame[:1]
+        data = header + payload.ljust(tb.MIN_PAYLOAD_SIZE - tb.ALIGN_SIZE, b"\0")
+        expected = bytes([tb.PREAMBLE_BYTE] * 6 + [tb.SFD_BYTE]) + data + crc32(data).to_bytes(4, "little")
+        scoreboard.expect(expected, f"frame {sent} ({len(frame)} bytes)")
+        tb.stats_model.frame(tb.frame_size(payload))
+
+        if first_ns is None:
+            first_ns = time_ns
+        # a short queue keeps memory flat however long the capture is
+        while len(tb.source.queue) > 8 or (
+            PCAP_TIMING and get_sim_time("ns") < start_ns + time_ns - first_ns
+        ):
+            await RisingEdge(dut.tx_clk)
+        tb.source.send(payload)
+        sent += 1
+        payload_bytes += len(payload)
+
+    await tb.source.wait()
+    for _ in range(2000):
+        if not scoreboard.pending:
+            break
+        await RisingEdge(dut.tx_clk)
+    monitor.kill()
+    writer.close()
+
+    elapsed_ns = get_sim_time("ns") - start_ns
+    dut._log.info(
+        f"{sent} frames from {path}, {payload_bytes} payload bytes in {elapsed_ns:.0f} ns "
+        f"({payload_bytes * 8 / elapsed_ns:.3f} Gb/s), {writer.packets} frames written to {PCAP_OUT}"
+    )
+    dut._log.info(scoreboard.summary())
+    assert scoreboard.errors == 0, scoreboard.summary()
+    await tb.check_stats()
+
+
+@cocotb.test()
+@windowed
+async def test_cycle_model(dut):
+    """
+    TxMacModel against the RTL clock by clock: XGMII words, frame_valid,
+    frame_error and tready must be the same on every clock. Random
+    payloads, some over MAX_PAYLOAD_SIZE, then two longer than the FIFO,
+    tvalid gaps (underruns and aborts with CUT_THROUGH or a frame started
+    on a full FIFO), in_xgmii_pcs_ready drops and a stall long enough to
+    fill the FIFO.
+    """
+    tb = TxMacTestbench(dut)
+    model = TxMacModel(tb.bytes_per_word, CUT_THROUGH)
+    scoreboard = Scoreboard("model", dut._log)
+    waves = Waves(dut, CLOCK_PERIOD_NS)
+    waves.watch(scoreboard)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    checker = cocotb.start_soon(tb.check_model(model, scoreboard))
+    await tb.reset()
+
+    counts = {"frame_valid": 0, "frame_error": 0}
+    cocotb.start_soon(tb.count_status(counts))
+    tb.source.valid = random_ready(95, SEED)
+    ready = itertools.chain(
+        itertools.islice(random_ready(90, SEED), 3000), itertools.repeat(False, 1500), random_ready(90, SEED + 1)
+    )
+    cocotb.start_soon(tb.drive_pcs_ready(ready))
+
+    num_frames = 200
+    over_fifo = bytes(i & 0xFF for i in range(FIFO_DEPTH * tb.bytes_per_word + 100))
+    payloads = random_frames(SEED, num_frames, min_len=1, max_len=tb.MAX_PAYLOAD_SIZE + 20)
+    for payload in itertools.chain(payloads, [over_fifo, over_fifo]):
+        tb.source.send(payload)
+    await tb.source.wait()
+    await ClockCycles(dut.tx_clk, 2000)
+    checker.kill()
+
+    dut._log.info(scoreboard.summary())
+    dut._log.info(f"{counts['frame_valid']} frame_valid, {counts['frame_error']} frame_error pulses")
+    assert scoreboard.errors == 0, scoreboard.summary()
+    assert counts["frame_valid"] > 0, "no frames out"
+
+
+@cocotb.test()
+async def test_line_schedule(dut):
+    """
+    Frames queued up in the FIFO while in_xgmii_pcs_ready is low, then
+    sent back to back: every /S/ and /T/ lane and every frame byte must be
+    where tx_mac_model.xgmii_stream() puts them without simulating a clock.
+    """
+    tb = TxMacTestbench(dut)
+
+    cocotb.start_soon(Clock(dut.tx_clk, CLOCK_PERIOD_NS, units="ns").start())
+    await tb.reset()
+
+    # padded, unpadded and every last word length; fits the FIFO at 32 bits
+    payloads = list(random_frames(SEED, 12, min_len=1, max_len=150))
+    dut.in_xgmii_pcs_ready.value = 0
+    for payload in payloads:
+        tb.source.send(payload)
+    await tb.source.wait()
+    await ClockCycles(dut.tx_clk, 4)
+    dut.in_xgmii_pcs_ready.value = 1
+    frames = await tb.capture_xgmii_stream(len(payloads))
+
+    data, ctl = xgmii_stream(payloads, tb.bytes_per_word)
+    expected = xgmii_frames(data, ctl, tb.bytes_per_word)
+    assert len(frames) == len(expected), f"{len(frames)} frames out for {len(expected)} in"
+    first = frames[0][0]
+    for n, ((start, term, frame), (model_start, model_term, model_frame)) in enumerate(zip(frames, expected)):
+        assert (start - first, term - first) == (model_start, model_term), (
+            f"frame {n}: /S/ and /T/ at {start - first} and {term - first}, "
+            f"the model has {model_start} and {model_term}"
+        )
+        assert frame == model_frame, f"frame {n}: {len(frame)} bytes, the model has {len(model_frame)}"
+    dut._log.info(f"{len(frames)} frames in {term - first + 1} lanes, as scheduled")
+
+
 if __name__ == "__main__":
     import pytest
 